@@ -2,10 +2,8 @@
 from __future__ import print_function, division
 import sys
 import os
-from arch import compute_routing_usage
-from arch import parse_routing
-from arch import compute_total_wire
-from arch import parse_placement, parse_cgra, compute_area_usage
+from arch import parse_routing_columnar, RoutingAnalytics
+from arch import parse_placement, parse_cgra
 from arch.cgra_route import parse_routing_resource, build_routing_resource
 
 
@@ -21,8 +19,12 @@ def main():
     packed_file = route_file.replace(".route", ".packed")
     placement_file = route_file.replace(".route", ".place")
     board_layout = parse_cgra(cgra_file)["CGRA"]
-    routing_result = parse_routing(route_file)
+    routing_result = parse_routing_columnar(route_file)
     placement, _ = parse_placement(placement_file)
+    r = parse_routing_resource(cgra_file)
+    routing_resource = build_routing_resource(r)
+    report = RoutingAnalytics(board_layout, routing_result, placement,
+                              routing_resource).report()
 
     if hasattr(sys.stdout, 'isatty') and sys.stdout.isatty():
         meta = os.popen('stty size', 'r').read().split()
@@ -35,9 +37,9 @@ def main():
 
     print("-" * cols)
     print("Area Usage:")
-    usage = compute_area_usage(placement, board_layout)
+    usage = report.area
     for entry in usage:
-        percentage = usage[entry][0] / usage[entry][1] * 100
+        percentage = usage[entry].used / usage[entry].total * 100
         num_bar = max(int(percentage / 100 * scale) - 2, 1)
         print("{0:4s} {1} {2} {3:.2f}%".format(entry.upper(),
                                                num_bar * '█',
@@ -45,27 +47,27 @@ def main():
                                                percentage))
 
     print("-" * cols)
-    net_wire = compute_total_wire(routing_result)
-    total_wire = sum([net_wire[x] for x in net_wire])
-    print("Total wire:", total_wire)
+    print("Total wire:", report.total_wire)
 
     # timing removed for future development
 
     print("-" * cols)
-    r = parse_routing_resource(cgra_file)
-    routing_resource = build_routing_resource(r)
-    resource_usage = compute_routing_usage(routing_result, routing_resource)
+    resource_usage = report.track_usage
     for bus in resource_usage:
         print("BUS:", bus)
         for track in resource_usage[bus]:
-            total, left = resource_usage[bus][track]
-            percentage = (total - left) / total * 100
+            used, total = resource_usage[bus][track]
+            percentage = used / total * 100
             num_bar = int(percentage / 100 * scale)
             print("TRACK {0} {1} {2} {3:.2f}%".format(track,
                                                       num_bar * '█',
                                                       ' ' * (scale -
                                                              num_bar - 5),
                                                       percentage))
+        congestion = report.congestion[bus]
+        y, x = divmod(int(congestion.argmax()), congestion.shape[1])
+        print("MAX TILE CONGESTION ({0}, {1}) {2:.2f}%".format(
+            x, y, congestion.max() * 100))
 
 
 if __name__ == '__main__':
@@ -4,6 +4,8 @@ from .cgra_packer import load_packed_file
 from .cgra_packer import read_netlist_json
 from .cgra_analytics import compute_routing_usage
 from .cgra_analytics import compute_total_wire, compute_area_usage
+from .cgra_analytics import RoutingAnalytics
 from .cgra import parse_placement, save_placement
 from .bookshelf import mock_board_meta
-from .parser import parse_routing
+from .parser import parse_routing, iter_routing_file
+from .parser import parse_routing_columnar, RoutingTable
@@ -187,19 +187,28 @@ def get_layout(board_layout):
     # bit_layer.blk_type = "B"
     # layout.add_layer(bit_layer, default_priority, 1)
     # set different layer priorities
-    layout.set_priority_major(' ', 0)
-    layout.set_priority_major('i', 1)
-    layout.set_priority_major("I", 2)
     # memory is a DSP-type, so lower priority
-    layout.set_priority_major('m', default_priority - 1)
+    priorities = {' ': 0, 'i': 1, 'I': 2, 'm': default_priority - 1}
+    # not every board has all of them, e.g. the mock ones
+    blk_types = layout.get_layer_types()
+    for blk_type, priority in priorities.items():
+        if blk_type in blk_types:
+            layout.set_priority_major(blk_type, priority)
     return layout
 
+def layer_positions(layer):
+    """available positions of a layer in the same order as
+    produce_available_pos(), read from its mask array"""
+    ys, xs = layer.mask_array().nonzero()
+    return list(zip(xs.tolist(), ys.tolist()))
+
+
 def set_io_mask(layout, io_mask_table):
     mask = pythunder.LayerMask()
     mask.blk_type = "I"
     mask.mask_blk_type = "i"
     io16_layer = layout.get_layer("I")
-    io16_pos = io16_layer.produce_available_pos()
+    io16_pos = layer_positions(io16_layer)
     for _, pos_list in io_mask_table.items():
         for pos in io16_pos:
             if pos in pos_list:
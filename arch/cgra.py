@@ -1,10 +1,23 @@
 from __future__ import print_function, division
 import arch
+import hashlib
 import json
+import multiprocessing
+import numpy as np
+import os
 import six
 
 from . import load_packed_file, read_netlist_json
-from .parser import parse_routing
+from .arch import layer_positions
+from .parser import parse_routing_columnar, NODE_PORT
+
+# output buffer for the bsb file
+BSB_BUFFER_SIZE = 1 << 20
+# minimum number of nets per worker process before we go parallel
+ROUTING_NETS_PER_WORKER = 256
+# per-tile and per-net index stored next to the bsb file
+BSB_INDEX_SUFFIX = ".index"
+BSB_INDEX_VERSION = 2
 
 
 def save_placement(board_pos, id_to_name, _, place_file):
@@ -49,9 +62,9 @@ def place_special_blocks(board, blks, board_pos, netlists,
                          place_on_board, layout):
     # put IO in fixed blocks
     one_bit_io_layer = layout.get_layer("i")
-    one_bit_io_locations = one_bit_io_layer.produce_available_pos()
+    one_bit_io_locations = layer_positions(one_bit_io_layer)
     sixteen_bit_io_layer = layout.get_layer("I")
-    sixteen_bit_io_locations = sixteen_bit_io_layer.produce_available_pos()
+    sixteen_bit_io_locations = layer_positions(sixteen_bit_io_layer)
 
     blks = list(blks)
     blks.sort(key=lambda b: int(b[1:]))
@@ -94,7 +107,10 @@ def get_blks(netlist):
 def generate_bitstream(board_filename, netlist_filename,
                        packed_filename, placement_filename,
                        routing_filename, output_filename,
-                       io_json):
+                       io_json, num_workers=None, incremental=False):
+    """if incremental is set, only the tiles and nets that changed since the
+    last run are regenerated. the rest is copied from the existing output,
+    using the index stored next to it"""
     netlists, folded_blocks, id_to_name, changed_pe = \
         load_packed_file(packed_filename)
     blks = get_blks(netlists)
@@ -108,16 +124,29 @@ def generate_bitstream(board_filename, netlist_filename,
 
     connections, instances = read_netlist_json(netlist_filename)
 
-    output_string = ""
-
     # TODO: refactor this
     name_to_id = {}
     for blk_id in id_to_name:
         name_to_id[id_to_name[blk_id]] = blk_id
 
+    # the index is only kept in incremental mode. previous index is only
+    # usable when placement and routing are the only things that have changed
+    previous = None
+    index = None
+    if incremental:
+        inputs = {"cgra": compute_file_hash(board_filename),
+                  "netlist": compute_file_hash(netlist_filename),
+                  "packed": compute_file_hash(packed_filename)}
+        previous = load_bsb_index(output_filename, inputs)
+        if previous is None:
+            print("INFO: no valid bsb index found. regenerate everything")
+        index = {"version": BSB_INDEX_VERSION, "inputs": inputs,
+                 "tiles": {}, "nets": {}}
+
     # build PE tiles types
     pe_tiles = {}
     type_str = "mpirI"
+    tab = "\t" * 6
     for name in instances:
         instance = instances[name]
         blk_id = name_to_id[name]
@@ -132,6 +161,13 @@ def generate_bitstream(board_filename, netlist_filename,
         pos = placement[blk_id]
         tile = tile_mapping[pos]
 
+        # reuse the previous line if the block hasn't moved
+        if previous is not None and blk_id in previous["tiles"]:
+            x, y, _, print_order, _, _ = previous["tiles"][blk_id]
+            if (x, y) == pos:
+                pe_tiles[blk_id] = (tile, print_order, None)
+                continue
+
         # find out the PE type
         tile_op, print_order = get_tile_op(instance, blk_id, changed_pe)
         if tile_op is None:
@@ -140,167 +176,359 @@ def generate_bitstream(board_filename, netlist_filename,
                              changed_pe, id_to_name, connections)
 
         # parse pins from the packing
+        if "mem" in tile_op:
+            line = "Tx{:04X}_{}{}#{}\n".format(tile, tile_op, tab,
+                                               id_to_name[blk_id])
+        else:
+            line = "Tx{:04X}_{}({}){}# {}\n".format(tile, tile_op,
+                                                    ",".join(pins), tab,
+                                                    id_to_name[blk_id])
 
-        pe_tiles[blk_id] = (tile, tile_op, pins, print_order)
+        pe_tiles[blk_id] = (tile, print_order, line)
 
-    tab = "\t" * 6
     # generate tile mapping
     # sort them for pretty printing
     pe_keys = list(pe_tiles.keys())
     pe_keys.sort(key=lambda x: int(pe_tiles[x][0]))
-    pe_keys.sort(key=lambda x: pe_tiles[x][-1])
-    output_string += "# PLACEMENT\n"
-    for blk_id in pe_keys:
-        tile, op, pins, _ = pe_tiles[blk_id]
-        if "mem" in op:
-            output_string += "Tx{:04X}_{}{}#{}\n".format(tile, op,
-                                                         tab,
-                                                         id_to_name[blk_id])
-        else:
-            output_string += "Tx{:04X}_{}({}){}# {}\n".format(tile, op,
-                                                              ",".join(pins),
-                                                              tab,
-                                                              id_to_name[
-                                                                  blk_id])
+    pe_keys.sort(key=lambda x: pe_tiles[x][1])
+
     # IO info
     io_pad_info, io_strings = generate_io(id_to_name, io16_tile, io_pad_bit,
                                           io_pad_name, placement, tile_mapping)
-
     assert len(io_strings) > 0
-    output_string += "\n\n#IO\n"
-    output_string += "\n".join(io_strings)
 
-    output_string += "\n\n#ROUTING\n"
+    routes = parse_routing_columnar(routing_filename)
+
+    # sections are streamed to the file as soon as they are produced so that
+    # we never hold the entire bitstream in memory. unchanged tiles and nets
+    # are copied over from the previous output
+    previous_file = None
+    if previous is not None:
+        previous_file = open(output_filename, "rb")
+    temp_filename = output_filename + ".tmp"
+    try:
+        with open(temp_filename, "wb", BSB_BUFFER_SIZE) as f:
+            write_bsb(f, "# PLACEMENT\n")
+            for blk_id in pe_keys:
+                tile, print_order, line = pe_tiles[blk_id]
+                offset = f.tell()
+                if line is None:
+                    copy_bsb_chunk(f, previous_file,
+                                   previous["tiles"][blk_id])
+                else:
+                    write_bsb(f, line)
+                if index is not None:
+                    x, y = placement[blk_id]
+                    index["tiles"][blk_id] = [x, y, tile, print_order,
+                                              offset, f.tell() - offset]
+
+            write_bsb(f, "\n\n#IO\n")
+            write_bsb(f, "\n".join(io_strings))
+
+            write_bsb(f, "\n\n#ROUTING\n")
+            write_routing(f, routes, netlists, id_to_name, tile_mapping,
+                          board_layout, num_workers, index, previous,
+                          previous_file)
+            if index is not None:
+                index["size"] = f.tell()
+    finally:
+        if previous_file is not None:
+            previous_file.close()
+    replace_file(temp_filename, output_filename)
+    if index is not None:
+        save_bsb_index(output_filename, index)
+    elif os.path.isfile(output_filename + BSB_INDEX_SUFFIX):
+        # it doesn't describe the new output any more
+        os.remove(output_filename + BSB_INDEX_SUFFIX)
 
-    routes = generate_routing(routing_filename, tile_mapping, board_layout)
-    net_id_list = list(routes.keys())
-    net_id_list.sort(key=lambda x: int(x[1:]))
+    with open(io_json, "w+") as f:
+        json.dump(io_pad_info, f, indent=2, separators=(',', ': '))
 
-    for net_id in net_id_list:
-        output_string += "\n# net id: {}\n".format(net_id)
-        netlist = netlists[net_id]
-        for p in netlist:
-            output_string += "# {}: {}::{}\n".format(p[0], id_to_name[p[0]],
-                                                     p[1])
-        output_string += routes[net_id]
 
-        output_string += "\n"
+def write_routing(f, routes, netlists, id_to_name, tile_mapping, board_layout,
+                  num_workers=None, index=None, previous=None,
+                  previous_file=None):
+    """writes the routing section (a RoutingTable) to a binary file f. If the
+    previous index is provided, nets whose route hasn't changed are copied
+    from previous_file instead of being regenerated"""
+    route_hashes = []
+    changed_nets = set()
+    for net_index, net_id in enumerate(routes.net_ids):
+        if index is None and previous is None:
+            changed_nets.add(net_index)
+            continue
+        route_hash = routes.hash_net(net_index)
+        route_hashes.append(route_hash)
+        if previous is None or net_id not in previous["nets"] or \
+                previous["nets"][net_id][0] != route_hash:
+            changed_nets.add(net_index)
+    if previous is not None:
+        print("INFO: regenerating", len(changed_nets), "out of",
+              len(routes), "nets")
+
+    generated_routes = iter_routing(routes, tile_mapping, board_layout,
+                                    num_workers, changed_nets)
+    for net_index in sort_net_indices(routes):
+        net_id = routes.net_ids[net_index]
+        offset = f.tell()
+        if net_index in changed_nets:
+            route_net_id, route = next(generated_routes)
+            assert route_net_id == net_id
+            write_bsb(f, "\n# net id: {}\n".format(net_id))
+            netlist = netlists[net_id]
+            for p in netlist:
+                write_bsb(f, "# {}: {}::{}\n".format(p[0], id_to_name[p[0]],
+                                                     p[1]))
+            write_bsb(f, route)
+            write_bsb(f, "\n")
+        else:
+            copy_bsb_chunk(f, previous_file, previous["nets"][net_id])
+        if index is not None:
+            index["nets"][net_id] = [route_hashes[net_index], offset,
+                                     f.tell() - offset]
 
-    with open(output_filename, "w+") as f:
-        f.write(output_string)
 
-    with open(io_json, "w+") as f:
-        json.dump(io_pad_info, f, indent=2, separators=(',', ': '))
+def write_bsb(f, text):
+    f.write(text.encode("utf-8"))
+
+
+def copy_bsb_chunk(f, previous_file, entry):
+    # offset and length are always the last two entries
+    offset, length = entry[-2:]
+    previous_file.seek(offset)
+    f.write(previous_file.read(length))
+
+
+def compute_file_hash(filename):
+    sha = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(BSB_BUFFER_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def load_bsb_index(output_filename, inputs):
+    index_filename = output_filename + BSB_INDEX_SUFFIX
+    if not os.path.isfile(output_filename) or \
+            not os.path.isfile(index_filename):
+        return None
+    try:
+        with open(index_filename) as f:
+            index = json.load(f)
+        if index["version"] != BSB_INDEX_VERSION or \
+                index["inputs"] != inputs or \
+                index["size"] != os.path.getsize(output_filename) or \
+                not isinstance(index["tiles"], dict) or \
+                not isinstance(index["nets"], dict):
+            return None
+    except (ValueError, KeyError, TypeError):
+        # truncated or corrupted
+        return None
+    return index
+
+
+def save_bsb_index(output_filename, index):
+    with open(output_filename + BSB_INDEX_SUFFIX, "w+") as f:
+        json.dump(index, f)
 
 
-def generate_routing(routing_file, tile_mapping, board_layout):
-    routes = parse_routing(routing_file)
+def replace_file(src, dst):
+    # os.replace is not available in Python 2
+    if hasattr(os, "replace"):
+        os.replace(src, dst)
+    else:
+        if os.path.isfile(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def generate_routing(routing_file, tile_mapping, board_layout,
+                     num_workers=None):
+    routes = parse_routing_columnar(routing_file)
     result = {}
-    for net_id in routes:
-        lines = []
-        line = ""
-        for segment in routes[net_id]:
-            last_node = ""
-            seg_index = 0
-            while seg_index < len(segment):
-                seg = segment[seg_index]
-                node_type = seg[0]
-                if node_type == "PORT" and seg_index == 0:
-                    port_name = seg[1]
-                    if port_name == "out" or port_name == "outb":
-                        port_name = "pe_" + port_name
-                    elif port_name == "valid":
-                        port_name = "validb"
-                    x, y = seg[2], seg[3]
-                    pos = (x, y)
-                    blk_type = board_layout.get_blk_type(x, y)
-                    if blk_type == "i" or blk_type == "I":
-                        seg_index += 2
-                        line = ""
-                        continue
-                    last_node = "Tx{:04X}".format(tile_mapping[pos]) \
-                                + "_" + port_name
+    for net_id, route in iter_routing(routes, tile_mapping, board_layout,
+                                      num_workers):
+        result[net_id] = route
+    return result
 
-                    line += last_node + " -> "
-                elif node_type == "REG" and seg_index != 0:
-                    # in BSB we actually don't care about the reg node
-                    # since it's implicit
-                    # we rewind the last line and add (r) to it
-                    # FIXME: change it back once steve fixed it
-                    assert seg_index == len(segment) - 1
-                    lines[-1] = lines[-1] + " (r)"
+
+def sort_net_indices(routes):
+    net_ids = routes.net_ids
+    net_indices = list(range(len(net_ids)))
+    net_indices.sort(key=lambda x: int(net_ids[x][1:]))
+    return net_indices
+
+
+def iter_routing(routes, tile_mapping, board_layout, num_workers=None,
+                 net_indices=None):
+    """yields (net_id, routing string) sorted by net id, for every net in the
+    RoutingTable or only the ones in net_indices. Routing strings are
+    produced by num_workers processes (default is all the cores). Small
+    designs are done in the current process"""
+    if net_indices is None:
+        net_indices = sort_net_indices(routes)
+    else:
+        net_indices = [i for i in sort_net_indices(routes)
+                       if i in net_indices]
+    # resolve the block types in the main process so that workers don't need
+    # the layout object
+    blk_types = get_port_blk_types(routes, board_layout)
+
+    if num_workers is None:
+        num_workers = multiprocessing.cpu_count()
+    num_workers = min(num_workers,
+                      len(net_indices) // ROUTING_NETS_PER_WORKER)
+    if num_workers <= 1:
+        for net_index in net_indices:
+            yield routes.net_ids[net_index], \
+                generate_net_routing(routes.get_route(net_index),
+                                     tile_mapping, blk_types)
+        return
+
+    pool = multiprocessing.Pool(num_workers, _init_routing_worker,
+                                (tile_mapping, blk_types))
+    try:
+        # workers only receive the array slices of their nets
+        args = (routes.net_table(net_index) for net_index in net_indices)
+        chunk_size = max(1, len(net_indices) // (num_workers * 4))
+        # imap keeps the input order, i.e. sorted by net id
+        for result in pool.imap(_generate_routing_worker, args, chunk_size):
+            yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+_routing_context = None
+
+
+def _init_routing_worker(tile_mapping, blk_types):
+    global _routing_context
+    _routing_context = (tile_mapping, blk_types)
+
+
+def _generate_routing_worker(net_table):
+    tile_mapping, blk_types = _routing_context
+    return net_table.net_ids[0], \
+        generate_net_routing(net_table.get_route(0), tile_mapping, blk_types)
+
+
+def get_port_blk_types(routes, board_layout):
+    mask = routes.kind == NODE_PORT
+    positions = np.stack([routes.x[mask], routes.y[mask]], axis=1)
+    blk_types = {}
+    if len(positions) == 0:
+        return blk_types
+    positions = np.unique(positions, axis=0)
+    codes = board_layout.blk_type_array()[positions[:, 1], positions[:, 0]]
+    for (x, y), code in zip(positions.tolist(), codes.tolist()):
+        blk_types[(x, y)] = chr(code)
+    return blk_types
+
+
+def generate_net_routing(segments, tile_mapping, blk_types):
+    lines = []
+    line = ""
+    for segment in segments:
+        last_node = ""
+        seg_index = 0
+        while seg_index < len(segment):
+            seg = segment[seg_index]
+            node_type = seg[0]
+            if node_type == "PORT" and seg_index == 0:
+                port_name = seg[1]
+                if port_name == "out" or port_name == "outb":
+                    port_name = "pe_" + port_name
+                elif port_name == "valid":
+                    port_name = "validb"
+                x, y = seg[2], seg[3]
+                pos = (x, y)
+                blk_type = blk_types[pos]
+                if blk_type == "i" or blk_type == "I":
+                    seg_index += 2
                     line = ""
-                elif node_type == "SB":
-                    track = seg[1]
-                    pos = (seg[2], seg[3])
-                    side = seg[4]
-                    io = seg[5]
-                    one_bit = seg[6] != 16
-                    last_node = "Tx{:04X}".format(tile_mapping[pos]) \
-                                + "_{}_".format("out" if io else "in") \
-                                + "s{}t{}{}".format(side, track,
-                                                    "b" if one_bit else "")
-                    line += last_node
-                    if io == 0:
-                        # coming in
-                        line += " -> "
-                    else:
-                        lines.append(line)
-                        line = ""
-                elif node_type == "PORT" and seg_index != 0:
-                    # this is sink
-                    # we need to double check if the previous one is coming
-                    # in or out
-                    # FIXME:
-                    # fix this hack
-                    pre_node = segment[seg_index - 1]
-                    port_name = seg[1]
-                    one_bit = seg[-1] != 16
-                    x, y = seg[2], seg[3]
-                    pos = (x, y)
-                    blk_type = board_layout.get_blk_type(x, y)
-                    if blk_type == "i" or blk_type == "I":
-                        seg_index += 1
-                        continue
-                    if pre_node[0] == "SB":
-                        if pre_node[2] != seg[2] or pre_node[3] != seg[3]:
-                            # we need to produce a fake one
-                            side = (pre_node[4] + 2) % 4
-                            track = pre_node[1]
-                            last_node = "Tx{:04X}".format(tile_mapping[pos]) \
-                                        + "_in_" \
-                                        + "s{}t{}{}".format(side, track,
-                                                            "b" if one_bit
-                                                            else "")
-                            line += last_node + " -> "
-                        else:
-                            line += last_node + " -> "
-                    elif pre_node[0] == "REG":
-                        # FIXME: hack an input track
-                        #        by using the register name
-                        _, reg_io, reg_side = pre_node[1].split("_")
-                        reg_track = int(reg_io)
-                        reg_side = (int(reg_side) + 2) % 4
-                        one_bit = False
-                        track = pre_node[2]
-                        assert reg_track == track
+                    continue
+                last_node = "Tx{:04X}".format(tile_mapping[pos]) \
+                            + "_" + port_name
+
+                line += last_node + " -> "
+            elif node_type == "REG" and seg_index != 0:
+                # in BSB we actually don't care about the reg node
+                # since it's implicit
+                # we rewind the last line and add (r) to it
+                # FIXME: change it back once steve fixed it
+                assert seg_index == len(segment) - 1
+                lines[-1] = lines[-1] + " (r)"
+                line = ""
+            elif node_type == "SB":
+                track = seg[1]
+                pos = (seg[2], seg[3])
+                side = seg[4]
+                io = seg[5]
+                one_bit = seg[6] != 16
+                last_node = "Tx{:04X}".format(tile_mapping[pos]) \
+                            + "_{}_".format("out" if io else "in") \
+                            + "s{}t{}{}".format(side, track,
+                                                "b" if one_bit else "")
+                line += last_node
+                if io == 0:
+                    # coming in
+                    line += " -> "
+                else:
+                    lines.append(line)
+                    line = ""
+            elif node_type == "PORT" and seg_index != 0:
+                # this is sink
+                # we need to double check if the previous one is coming
+                # in or out
+                # FIXME:
+                # fix this hack
+                pre_node = segment[seg_index - 1]
+                port_name = seg[1]
+                one_bit = seg[-1] != 16
+                x, y = seg[2], seg[3]
+                pos = (x, y)
+                blk_type = blk_types[pos]
+                if blk_type == "i" or blk_type == "I":
+                    seg_index += 1
+                    continue
+                if pre_node[0] == "SB":
+                    if pre_node[2] != seg[2] or pre_node[3] != seg[3]:
+                        # we need to produce a fake one
+                        side = (pre_node[4] + 2) % 4
+                        track = pre_node[1]
                         last_node = "Tx{:04X}".format(tile_mapping[pos]) \
                                     + "_in_" \
-                                    + "s{}t{}{}".format(reg_side, track,
+                                    + "s{}t{}{}".format(side, track,
                                                         "b" if one_bit
                                                         else "")
                         line += last_node + " -> "
                     else:
-                        raise Exception("Unknown node " + str(pre_node))
-                    line += "Tx{:04X}".format(tile_mapping[pos]) \
-                            + "_" + port_name
-                    lines.append(line)
-                    line = ""
-
-                seg_index += 1
-        result[net_id] = "\n".join(lines)
-
-    return result
+                        line += last_node + " -> "
+                elif pre_node[0] == "REG":
+                    # FIXME: hack an input track
+                    #        by using the register name
+                    _, reg_io, reg_side = pre_node[1].split("_")
+                    reg_track = int(reg_io)
+                    reg_side = (int(reg_side) + 2) % 4
+                    one_bit = False
+                    track = pre_node[2]
+                    assert reg_track == track
+                    last_node = "Tx{:04X}".format(tile_mapping[pos]) \
+                                + "_in_" \
+                                + "s{}t{}{}".format(reg_side, track,
+                                                    "b" if one_bit
+                                                    else "")
+                    line += last_node + " -> "
+                else:
+                    raise Exception("Unknown node " + str(pre_node))
+                line += "Tx{:04X}".format(tile_mapping[pos]) \
+                        + "_" + port_name
+                lines.append(line)
+                line = ""
+
+            seg_index += 1
+    return "\n".join(lines)
 
 
 def generate_io(id_to_name, io16_tile, io_pad_bit, io_pad_name, placement,
@@ -1,3 +1,7 @@
+import numpy as np
+from collections import namedtuple
+from .parser import RoutingTable, NODE_SB
+
 # FIXME
 # random numbers
 TIMING_INFO = {
@@ -39,6 +43,8 @@ def convert_timed_path(timed_paths, netlists, folded_blocks, name_to_id):
 
 
 def compute_total_wire(routing_result):
+    if isinstance(routing_result, RoutingTable):
+        return compute_total_wire_columnar(routing_result)
     wire_length = {}
     for net_id in routing_result:
         path = routing_result[net_id]
@@ -62,74 +68,247 @@ def compute_total_wire(routing_result):
     return wire_length
 
 
+def compute_total_wire_columnar(routes):
+    # same as compute_total_wire: count SB -> SB hops that leave the tile or
+    # change the track, where the source SB is only counted the first time
+    # it shows up in the net
+    is_sb = routes.kind == NODE_SB
+    last_in_seg = np.zeros(routes.num_nodes, dtype=bool)
+    last_in_seg[routes.seg_offsets[1:] - 1] = True
+    pairs = np.nonzero(is_sb[:-1] & is_sb[1:] & ~last_in_seg[:-1])[0]
+    nxt = pairs + 1
+    differ = (routes.track[pairs] != routes.track[nxt]) | \
+             (routes.x[pairs] != routes.x[nxt]) | \
+             (routes.y[pairs] != routes.y[nxt])
+    node_net = routes.node_net[pairs]
+    keys = pack_columns([node_net, routes.track[pairs], routes.x[pairs],
+                         routes.y[pairs], routes.side[pairs], routes.io[pairs],
+                         routes.width[pairs]])
+    _, first = np.unique(keys, return_index=True)
+    length = np.bincount(node_net[first], weights=differ[first],
+                         minlength=len(routes)).astype(np.int64)
+    length = np.maximum(length, 1)
+    wire_length = {}
+    for net_id, net_length in zip(routes.net_ids, length.tolist()):
+        wire_length[net_id] = net_length
+    return wire_length
+
+
+def pack_columns(columns):
+    """packs non-negative integer columns into a single int64 key per row so
+    that rows can be compared/uniquified as scalars"""
+    keys = np.zeros(len(columns[0]), dtype=np.int64)
+    total = 1
+    for column in columns:
+        radix = int(column.max()) + 1 if len(column) > 0 else 1
+        total *= radix
+        if total >= 2 ** 63:
+            raise ValueError("columns are too wide to be packed")
+        keys *= radix
+        keys += column
+    return keys
+
+
 def compute_area_usage(placement, board_layout):
+    area = compute_area(layout_blk_types(board_layout), placement)
     result = {}
-    height = board_layout.height()
-    width = board_layout.width()
-    for y in range(height):
-        for x in range(width):
-            blk_type = board_layout.get_blk_type(x, y)
-            if blk_type is None:
-                continue
-            if blk_type not in result:
-                result[blk_type] = [0, 0]
-            result[blk_type][-1] += 1
-    pos_set = set()
-    for blk_id in placement:
-        pos = placement[blk_id]
-        if pos in pos_set:
-            continue
-        x, y = pos
-        blk_type = board_layout.get_blk_type(x, y)
-        result[blk_type][0] += 1
-        pos_set.add(pos)
-    # remove entries
-    if " " in result:
-        result.pop(" ")
-    if "i" in result:
-        result.pop("i")
+    for blk_type in area:
+        usage = area[blk_type]
+        result[blk_type] = [usage.used, usage.total]
     return result
 
 
 def compute_routing_usage(routing_result, routing_resource):
-    route_resource = {}
-    for pos in routing_resource:
-        route_resource[pos] = routing_resource[pos]["route_resource"]
-
-    # construct all the available switch boxes, by bus, and then tracks
-    total_resource = {}
-    for tile in route_resource:
-        resource = route_resource[tile]
-        for conn1, conn2 in resource:
-            conns = [conn1, conn2]
-            for width, io, side, track in conns:
-                if width not in total_resource:
-                    total_resource[width] = {}
-                if track not in total_resource[width]:
-                    total_resource[width][track] = set()
-                total_resource[width][track].add((tile, io, side))
-
-    total_resource_count = {}
-    for bus in total_resource:
-        total_resource_count[bus] = {}
-        for track in total_resource[bus]:
-            total_resource_count[bus][track] = len(total_resource[bus][track])
+    if not isinstance(routing_result, RoutingTable):
+        routing_result = RoutingTable.from_routes(routing_result)
+    track_usage = compute_track_usage(build_resource_table(routing_resource),
+                                      used_sb_table(routing_result))
+    resource_usage = {}
+    for bus in track_usage:
+        resource_usage[bus] = {}
+        for track in track_usage[bus]:
+            usage = track_usage[bus][track]
+            resource_usage[bus][track] = (usage.total,
+                                          usage.total - usage.used)
+    return resource_usage
 
+
+def iter_used_sbs(routing_result):
+    """yields (bus, track, x, y, side, io) of the switch boxes used"""
+    if isinstance(routing_result, RoutingTable):
+        used_sbs = used_sb_table(routing_result)
+        columns = [used_sbs[name].tolist() for name in SB_COLUMNS]
+        for entry in zip(*columns):
+            yield entry
+        return
     for net_id in routing_result:
         path = routing_result[net_id]
         for segments in path:
             for seg in segments:
                 if seg[0] == "SB":
                     track, x, y, side, io, bus = seg[1:]
-                    entry = ((x, y), io, side)
-                    if entry in total_resource[bus][track]:
-                        total_resource[bus][track].remove(entry)
+                    yield bus, track, x, y, side, io
 
-    resource_usage = {}
-    for bus in total_resource_count:
-        resource_usage[bus] = {}
-        for track in total_resource_count[bus]:
-            resource_usage[bus][track] = (total_resource_count[bus][track],
-                                          len(total_resource[bus][track]))
 
-    return resource_usage
+AreaUsage = namedtuple("AreaUsage", ["used", "total"])
+TrackUsage = namedtuple("TrackUsage", ["used", "total"])
+AnalyticsReport = namedtuple("AnalyticsReport", ["wire_length", "total_wire",
+                                                 "area", "track_usage",
+                                                 "congestion"])
+
+# switch box columns shared by the routing resource and the routing result
+SB_COLUMNS = ("width", "track", "x", "y", "side", "io")
+
+
+class RoutingAnalytics(object):
+    """Post-PnR analytics on array views of the layout, the routing resource
+    and a columnar routing result. Every query returns structured results;
+    nothing is printed"""
+
+    def __init__(self, board_layout, routes, placement=None,
+                 routing_resource=None):
+        if not isinstance(routes, RoutingTable):
+            routes = RoutingTable.from_routes(routes)
+        self.routes = routes
+        self.placement = placement if placement is not None else {}
+        self.blk_types = layout_blk_types(board_layout)
+        self.used_sbs = used_sb_table(routes)
+        if routing_resource is not None:
+            self.resource = build_resource_table(routing_resource)
+        else:
+            self.resource = None
+
+    def wire_length(self):
+        return compute_total_wire_columnar(self.routes)
+
+    def area(self):
+        return compute_area(self.blk_types, self.placement)
+
+    def track_usage(self):
+        if self.resource is None:
+            raise ValueError("routing resource is required for track usage")
+        return compute_track_usage(self.resource, self.used_sbs)
+
+    def congestion(self):
+        """per bus, a (height, width) array of the ratio of used switch box
+        wires over the available ones in each tile, for every bus of the
+        routing resource. Without the routing resource it's the number of
+        used switch box wires instead"""
+        height, width = self.blk_types.shape
+        buses = self.used_sbs["width"]
+        if self.resource is not None:
+            # buses without any used switch box are all zeros
+            buses = np.concatenate([buses, self.resource["width"]])
+        result = {}
+        for bus in np.unique(buses).tolist():
+            mask = self.used_sbs["width"] == bus
+            demand = tile_counts(self.used_sbs["x"][mask],
+                                 self.used_sbs["y"][mask], width, height)
+            if self.resource is None:
+                result[bus] = demand
+                continue
+            mask = self.resource["width"] == bus
+            supply = tile_counts(self.resource["x"][mask],
+                                 self.resource["y"][mask], width, height)
+            ratio = np.zeros((height, width), dtype=np.float64)
+            np.divide(demand, supply, out=ratio, where=supply > 0)
+            result[bus] = ratio
+        return result
+
+    def report(self):
+        wire_length = self.wire_length()
+        track_usage = self.track_usage() if self.resource is not None \
+            else {}
+        return AnalyticsReport(wire_length=wire_length,
+                               total_wire=sum(wire_length.values()),
+                               area=self.area(), track_usage=track_usage,
+                               congestion=self.congestion())
+
+
+def layout_blk_types(board_layout):
+    """(height, width) array of block type codes"""
+    return board_layout.blk_type_array()
+
+
+def compute_area(blk_types, placement):
+    result = {}
+    blk_types = blk_types.view(np.uint8)
+    totals = np.bincount(blk_types.ravel(), minlength=256)
+    if placement:
+        positions = np.array(list(set(placement.values())), dtype=np.int64)
+        used_codes = blk_types[positions[:, 1], positions[:, 0]]
+    else:
+        used_codes = np.zeros(0, dtype=np.uint8)
+    used = np.bincount(used_codes, minlength=256)
+    for code in np.flatnonzero(totals).tolist():
+        blk_type = chr(code)
+        # empty tiles and 1-bit IOs are not reported
+        if blk_type == " " or blk_type == "i":
+            continue
+        result[blk_type] = AreaUsage(used=int(used[code]),
+                                     total=int(totals[code]))
+    return result
+
+
+def build_resource_table(routing_resource):
+    """unique switch box wires of the routing resource as columns. See
+    SB_COLUMNS"""
+    rows = []
+    for (x, y) in routing_resource:
+        for conns in routing_resource[(x, y)]["route_resource"]:
+            for width, io, side, track in conns:
+                rows.append((width, track, x, y, side, io))
+    return unique_sb_rows(rows)
+
+
+def used_sb_table(routes):
+    """unique switch box wires used by the routing result. See SB_COLUMNS"""
+    mask = routes.kind == NODE_SB
+    columns = [routes.width[mask], routes.track[mask], routes.x[mask],
+               routes.y[mask], routes.side[mask], routes.io[mask]]
+    return unique_sb_columns(columns)
+
+
+def unique_sb_rows(rows):
+    if rows:
+        data = np.array(rows, dtype=np.int64)
+    else:
+        data = np.zeros((0, len(SB_COLUMNS)), dtype=np.int64)
+    return unique_sb_columns([data[:, i] for i in range(len(SB_COLUMNS))])
+
+
+def unique_sb_columns(columns):
+    columns = [np.asarray(column, dtype=np.int64) for column in columns]
+    _, first = np.unique(pack_columns(columns), return_index=True)
+    table = {}
+    for name, column in zip(SB_COLUMNS, columns):
+        table[name] = column[first]
+    return table
+
+
+def compute_track_usage(resource, used_sbs):
+    columns = [np.concatenate([resource[name], used_sbs[name]])
+               for name in SB_COLUMNS]
+    keys = pack_columns(columns)
+    num_resource = len(resource["width"])
+    used = np.isin(keys[:num_resource], keys[num_resource:])
+    # group by (bus, track)
+    group = pack_columns([resource["width"], resource["track"]])
+    groups, first, inverse = np.unique(group, return_index=True,
+                                       return_inverse=True)
+    totals = np.bincount(inverse, minlength=len(groups))
+    used_counts = np.bincount(inverse, weights=used, minlength=len(groups))
+    result = {}
+    for index, start in enumerate(first.tolist()):
+        bus = int(resource["width"][start])
+        track = int(resource["track"][start])
+        if bus not in result:
+            result[bus] = {}
+        result[bus][track] = TrackUsage(used=int(used_counts[index]),
+                                        total=int(totals[index]))
+    return result
+
+
+def tile_counts(xs, ys, width, height):
+    counts = np.bincount(ys * width + xs, minlength=width * height)
+    return counts.reshape((height, width))
@@ -1,4 +1,6 @@
 from __future__ import print_function
+import hashlib
+import numpy as np
 
 
 # parse the ones generated by word2vec
@@ -23,32 +25,295 @@ def parse_emb(filename, filter_hyperedge=True):
 
 
 def parse_routing(filename):
-    with open(filename) as f:
-        lines = f.readlines()
-
     routes = {}
-    line_index = 0
-    while line_index < len(lines):
-        line = lines[line_index].strip()
-        line_index += 1
-        if line[:3] == "Net":
-            tokens = line.split(" ")
+    for net_id, segments in iter_routing_file(filename):
+        routes[net_id] = segments
+    return routes
+
+
+def iter_routing_file(filename):
+    """streams the routing result one net at a time. yields (net_id, segments)
+    in file order, where each segment is a list of node tokens"""
+    with open(filename) as f:
+        for line in f:
+            if line[:3] != "Net":
+                continue
+            tokens = line.split()
             net_id = tokens[2]
-            routes[net_id] = []
             num_seg = int(tokens[-1])
+            segments = []
             for seg_index in range(num_seg):
-                segment = []
-                line = lines[line_index].strip()
-                line_index += 1
+                line = next(f)
                 assert line[:len("Segment")] == "Segment"
+                seg_size = int(line.split()[-1])
+                segment = [parse_route_node(next(f)) for _ in range(seg_size)]
+                segments.append(segment)
+            yield net_id, segments
+
+
+def parse_route_node(line):
+    # node format is <TYPE> [name] (<int>, <int>, ...)
+    head, _, tail = line.partition("(")
+    tokens = [int(x) if x.isdigit() else x for x in head.split()]
+    tail = tail.strip()[:-1]
+    if tail:
+        tokens.extend([int(x) for x in tail.split(",")])
+    return tokens
+
+
+# node kinds used in the columnar routing table
+NODE_SB = 0
+NODE_PORT = 1
+NODE_REG = 2
+NODE_RMUX = 3
+NODE_GENERIC = 4
+NODE_KINDS = {"SB": NODE_SB, "PORT": NODE_PORT, "REG": NODE_REG,
+              "RMUX": NODE_RMUX, "NODE": NODE_GENERIC}
+NODE_KIND_NAMES = {value: key for key, value in NODE_KINDS.items()}
+
+
+class RoutingTable(object):
+    """Columnar routing result. Every node attribute lives in a flat array
+    indexed by node. Net i owns segments net_offsets[i]:net_offsets[i + 1]
+    and segment j owns nodes seg_offsets[j]:seg_offsets[j + 1]. Fields that
+    a node kind doesn't have are -1 (side and io are only set for SB)"""
+
+    def __init__(self, net_ids, net_offsets, seg_offsets, kind, track, x, y,
+                 side, io, width, names):
+        self.net_ids = net_ids
+        self.net_offsets = net_offsets
+        self.seg_offsets = seg_offsets
+        self.kind = kind
+        self.track = track
+        self.x = x
+        self.y = y
+        self.side = side
+        self.io = io
+        self.width = width
+        self.names = names
+        self._net_index = None
+        self._node_net = None
+
+    def __len__(self):
+        return len(self.net_ids)
+
+    @property
+    def num_nodes(self):
+        return len(self.kind)
+
+    def net_index(self, net_id):
+        if self._net_index is None:
+            self._net_index = {}
+            for index, n_id in enumerate(self.net_ids):
+                self._net_index[n_id] = index
+        return self._net_index[net_id]
+
+    def node_range(self, index):
+        seg_start = self.net_offsets[index]
+        seg_end = self.net_offsets[index + 1]
+        return int(self.seg_offsets[seg_start]), int(self.seg_offsets[seg_end])
+
+    @property
+    def node_net(self):
+        """net index of every node"""
+        if self._node_net is None:
+            nodes_per_net = self.seg_offsets[self.net_offsets[1:]] - \
+                self.seg_offsets[self.net_offsets[:-1]]
+            self._node_net = np.repeat(np.arange(len(self.net_ids)),
+                                       nodes_per_net)
+        return self._node_net
+
+    def net_table(self, index):
+        """table that only holds the net at index. arrays are views"""
+        seg_start = self.net_offsets[index]
+        seg_end = self.net_offsets[index + 1]
+        start, end = self.node_range(index)
+        return RoutingTable([self.net_ids[index]],
+                            self.net_offsets[index:index + 2] - seg_start,
+                            self.seg_offsets[seg_start:seg_end + 1] - start,
+                            self.kind[start:end], self.track[start:end],
+                            self.x[start:end], self.y[start:end],
+                            self.side[start:end], self.io[start:end],
+                            self.width[start:end], self.names[start:end])
+
+    def get_route(self, index):
+        """nested list form of the net at index, identical to what
+        parse_routing produces"""
+        start, end = self.node_range(index)
+        kind = self.kind[start:end].tolist()
+        track = self.track[start:end].tolist()
+        xs = self.x[start:end].tolist()
+        ys = self.y[start:end].tolist()
+        side = self.side[start:end].tolist()
+        io = self.io[start:end].tolist()
+        width = self.width[start:end].tolist()
+        names = self.names[start:end]
+        segments = []
+        seg_start = self.net_offsets[index]
+        seg_end = self.net_offsets[index + 1]
+        for seg_index in range(seg_start, seg_end):
+            segment = []
+            for i in range(self.seg_offsets[seg_index] - start,
+                           self.seg_offsets[seg_index + 1] - start):
+                node_kind = kind[i]
+                tokens = [NODE_KIND_NAMES[node_kind]]
+                if node_kind == NODE_SB:
+                    tokens += [track[i], xs[i], ys[i], side[i], io[i],
+                               width[i]]
+                else:
+                    name = names[i]
+                    tokens.append(int(name) if name.isdigit() else name)
+                    if node_kind == NODE_REG or node_kind == NODE_GENERIC:
+                        tokens.append(track[i])
+                    tokens += [xs[i], ys[i], width[i]]
+                segment.append(tokens)
+            segments.append(segment)
+        return segments
+
+    def to_dict(self):
+        result = {}
+        for index, net_id in enumerate(self.net_ids):
+            result[net_id] = self.get_route(index)
+        return result
+
+    def hash_net(self, index):
+        """digest of everything that determines the net's route"""
+        start, end = self.node_range(index)
+        seg_start = self.net_offsets[index]
+        seg_end = self.net_offsets[index + 1]
+        sha = hashlib.sha1()
+        sha.update((self.seg_offsets[seg_start:seg_end + 1] -
+                    start).tobytes())
+        for array in (self.kind, self.track, self.x, self.y, self.side,
+                      self.io, self.width):
+            sha.update(array[start:end].tobytes())
+        sha.update(" ".join(self.names[start:end]).encode("utf-8"))
+        return sha.hexdigest()
+
+    @staticmethod
+    def from_routes(routes):
+        """builds the table from (net_id, segments) pairs or a dict returned
+        by parse_routing"""
+        if isinstance(routes, dict):
+            routes = routes.items()
+        builder = _RoutingTableBuilder()
+        for net_id, segments in routes:
+            builder.add_net(net_id, len(segments))
+            for segment in segments:
+                builder.add_segment(len(segment))
+                for tokens in segment:
+                    builder.add_node(tokens)
+        return builder.build()
+
+
+class _RoutingTableBuilder(object):
+    def __init__(self):
+        self.net_ids = []
+        self.net_offsets = [0]
+        self.seg_offsets = [0]
+        self.columns = ([], [], [], [], [], [], [])
+        self.names = []
+
+    def add_net(self, net_id, num_seg):
+        self.net_ids.append(net_id)
+        self.net_offsets.append(self.net_offsets[-1] + num_seg)
+
+    def add_segment(self, seg_size):
+        self.seg_offsets.append(self.seg_offsets[-1] + seg_size)
+
+    def add_node(self, tokens):
+        node_kind = NODE_KINDS[tokens[0]]
+        if node_kind == NODE_SB:
+            track, x, y, side, io, width = tokens[1:]
+            name = ""
+        elif node_kind == NODE_REG or node_kind == NODE_GENERIC:
+            name, track, x, y, width = tokens[1:]
+            side = io = -1
+        else:
+            name, x, y, width = tokens[1:]
+            track = side = io = -1
+        values = (node_kind, track, x, y, side, io, width)
+        for column, value in zip(self.columns, values):
+            column.append(value)
+        self.names.append(str(name))
+
+    def build(self):
+        kind, track, x, y, side, io, width = \
+            [np.array(column, dtype=np.int32) for column in self.columns]
+        return RoutingTable(self.net_ids,
+                            np.array(self.net_offsets, dtype=np.int64),
+                            np.array(self.seg_offsets, dtype=np.int64),
+                            kind, track, x, y, side, io, width, self.names)
+
+
+def parse_routing_columnar(filename):
+    """parses the routing result straight into a RoutingTable. Node lines are
+    only split into their header and number list here; numbers are converted
+    and scattered into columns in bulk afterwards"""
+    net_ids = []
+    net_sizes = []
+    seg_sizes = []
+    kinds = []
+    names = []
+    numbers = []
+    # node headers repeat a lot, e.g. "SB " or "PORT data0 "
+    head_cache = {}
+    with open(filename) as f:
+        for line in f:
+            if line[:3] == "Net":
                 tokens = line.split()
-                seg_size = int(tokens[-1])
-                for i in range(seg_size):
-                    line = lines[line_index].strip()
-                    line_index += 1
-                    line = "".join([x for x in line if x not in ",()"])
-                    tokens = line.split()
-                    tokens = [int(x) if x.isdigit() else x for x in tokens]
-                    segment.append(tokens)
-                routes[net_id].append(segment)
-    return routes
+                net_ids.append(tokens[2])
+                net_sizes.append(int(tokens[-1]))
+            elif line[:7] == "Segment":
+                seg_sizes.append(int(line.split()[-1]))
+            elif line[0] != "\n":
+                head, _, tail = line.partition("(")
+                if head not in head_cache:
+                    tokens = head.split()
+                    name = tokens[1] if len(tokens) > 1 else ""
+                    head_cache[head] = (NODE_KINDS[tokens[0]], name)
+                node_kind, name = head_cache[head]
+                kinds.append(node_kind)
+                names.append(name)
+                numbers.append(tail.rstrip()[:-1])
+
+    kind = np.array(kinds, dtype=np.int32)
+    num_nodes = len(kind)
+    if numbers:
+        values = np.array(",".join(numbers).split(","), dtype=np.int32)
+    else:
+        values = np.zeros(0, dtype=np.int32)
+    # number of integers each node kind has
+    num_fields = np.array([6, 3, 4, 3, 4], dtype=np.int64)
+    starts = np.zeros(num_nodes, dtype=np.int64)
+    if num_nodes > 0:
+        np.cumsum(num_fields[kind][:-1], out=starts[1:])
+        assert starts[-1] + num_fields[kind[-1]] == len(values)
+
+    columns = {}
+    for field in ("track", "x", "y", "side", "io", "width"):
+        columns[field] = np.full(num_nodes, -1, dtype=np.int32)
+    # field order per kind, see the node to_string() functions in cyclone
+    layouts = {NODE_SB: ("track", "x", "y", "side", "io", "width"),
+               NODE_PORT: ("x", "y", "width"),
+               NODE_RMUX: ("x", "y", "width"),
+               NODE_REG: ("track", "x", "y", "width"),
+               NODE_GENERIC: ("track", "x", "y", "width")}
+    for node_kind, fields in layouts.items():
+        mask = kind == node_kind
+        if not mask.any():
+            continue
+        kind_starts = starts[mask]
+        for offset, field in enumerate(fields):
+            columns[field][mask] = values[kind_starts + offset]
+
+    net_offsets = np.zeros(len(net_sizes) + 1, dtype=np.int64)
+    np.cumsum(net_sizes, out=net_offsets[1:])
+    seg_offsets = np.zeros(len(seg_sizes) + 1, dtype=np.int64)
+    np.cumsum(seg_sizes, out=seg_offsets[1:])
+    assert net_offsets[-1] == len(seg_sizes)
+    assert seg_offsets[-1] == num_nodes
+    return RoutingTable(net_ids, net_offsets, seg_offsets, kind,
+                        columns["track"], columns["x"], columns["y"],
+                        columns["side"], columns["io"], columns["width"],
+                        names)
@@ -0,0 +1,147 @@
+from __future__ import print_function, division
+import os
+import sys
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import pythunder
+from arch.parser import parse_routing_columnar, NODE_SB
+from arch.cgra import write_routing
+
+
+def make_layout(size):
+    rows = []
+    for y in range(size):
+        row = []
+        for x in range(size):
+            if x == 0 or y == 0 or x == size - 1 or y == size - 1:
+                row.append("I")
+            else:
+                row.append("p")
+        rows.append(row)
+    return pythunder.Layout(rows)
+
+
+def random_route(size, length):
+    x = random.randint(1, size - 2)
+    y = random.randint(1, size - 2)
+    track = random.randint(0, 4)
+    nodes = ["PORT out ({0}, {1}, 16)".format(x, y)]
+    for _ in range(length):
+        side = random.randint(0, 3)
+        next_x, next_y = x, y
+        if side == 0:
+            next_x += 1
+        elif side == 1:
+            next_y += 1
+        elif side == 2:
+            next_x -= 1
+        else:
+            next_y -= 1
+        if next_x < 1 or next_y < 1 or next_x > size - 2 or next_y > size - 2:
+            continue
+        nodes.append("SB ({0}, {1}, {2}, {3}, 1, 16)".format(track, x, y,
+                                                              side))
+        x, y = next_x, next_y
+        nodes.append("SB ({0}, {1}, {2}, {3}, 0, 16)".format(track, x, y,
+                                                              (side + 2) % 4))
+    nodes.append("PORT data0 ({0}, {1}, 16)".format(x, y))
+    return nodes
+
+
+def write_route_file(filename, size, num_nets, num_sinks, length):
+    netlists = {}
+    with open(filename, "w") as f:
+        for i in range(num_nets):
+            net_id = "e" + str(i)
+            f.write("Net ID: {0} Segment Size: {1}\n".format(net_id,
+                                                             num_sinks))
+            for seg_index in range(num_sinks):
+                nodes = random_route(size, length)
+                f.write("Segment: {0} Size: {1}\n".format(seg_index,
+                                                          len(nodes)))
+                for node in nodes:
+                    f.write(node + "\n")
+            f.write("\n")
+            netlists[net_id] = [("p" + str(i), "out")] + \
+                               [("p" + str(i + j + 1), "data0")
+                                for j in range(num_sinks)]
+    return netlists
+
+
+def main():
+    parser = ArgumentParser("Bitstream routing section benchmark")
+    parser.add_argument("-s", "--size", help="Board size", type=int,
+                        default=64, dest="size")
+    parser.add_argument("-n", "--nets", help="Number of nets", type=int,
+                        default=20000, dest="num_nets")
+    parser.add_argument("-k", "--sinks", help="Number of sinks per net",
+                        type=int, default=3, dest="num_sinks")
+    parser.add_argument("-l", "--length", help="Route length per sink",
+                        type=int, default=20, dest="length")
+    parser.add_argument("-j", "--jobs", help="Worker processes to compare",
+                        type=int, nargs="+", default=[1, 2, 4, 8],
+                        dest="jobs")
+    parser.add_argument("--eco", help="Ratio of nets changed for the " +
+                                      "incremental refresh", type=float,
+                        default=0.01, dest="eco_ratio")
+    args = parser.parse_args()
+    random.seed(0)
+
+    layout = make_layout(args.size)
+    tile_mapping = {}
+    for y in range(args.size):
+        for x in range(args.size):
+            tile_mapping[(x, y)] = y * args.size + x
+
+    with tempfile.TemporaryDirectory() as temp:
+        route_file = os.path.join(temp, "design.route")
+        netlists = write_route_file(route_file, args.size, args.num_nets,
+                                    args.num_sinks, args.length)
+        id_to_name = {}
+        for net_id in netlists:
+            for blk_id, _ in netlists[net_id]:
+                id_to_name[blk_id] = blk_id
+
+        start = time.time()
+        routes = parse_routing_columnar(route_file)
+        print("parse_routing_columnar: {0:.3f}s".format(time.time() - start))
+
+        bsb_file = os.path.join(temp, "design.bsb")
+        index = None
+        for num_workers in args.jobs:
+            index = {"nets": {}}
+            start = time.time()
+            with open(bsb_file, "wb") as f:
+                write_routing(f, routes, netlists, id_to_name, tile_mapping,
+                              layout, num_workers, index)
+            print("routing with {0} worker(s): {1:.3f}s ({2} bytes)".format(
+                num_workers, time.time() - start, os.path.getsize(bsb_file)))
+
+        # move a small fraction of the nets to another track and refresh
+        # incrementally
+        net_indices = list(range(len(routes)))
+        random.shuffle(net_indices)
+        num_changed = max(1, int(len(net_indices) * args.eco_ratio))
+        for net_index in net_indices[:num_changed]:
+            start, end = routes.node_range(net_index)
+            sb = routes.kind[start:end] == NODE_SB
+            routes.track[start:end][sb] = (routes.track[start:end][sb] + 1) % 5
+        eco_file = os.path.join(temp, "eco.bsb")
+        start = time.time()
+        with open(bsb_file, "rb") as previous_file:
+            with open(eco_file, "wb") as f:
+                write_routing(f, routes, netlists, id_to_name, tile_mapping,
+                              layout, args.jobs[0], {"nets": {}}, index,
+                              previous_file)
+        print("incremental routing with {0} changed net(s): {1:.3f}s".format(
+            num_changed, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
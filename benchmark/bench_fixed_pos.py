@@ -0,0 +1,83 @@
+from __future__ import print_function, division
+import os
+import resource
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import pythunder
+from util import FixedPosOverlay
+
+
+def copy_fixed_pos(fixed_blk_pos, centroids):
+    # how the per-cluster inputs used to be built
+    result = []
+    for c_id in centroids:
+        blk_pos = fixed_blk_pos.copy()
+        for i in centroids:
+            if i == c_id:
+                continue
+            blk_pos["x" + str(i)] = centroids[i]
+        result.append(pythunder.FixedPosOverlay(blk_pos))
+    return result
+
+
+def overlay_fixed_pos(fixed_blk_pos, centroids):
+    base_pos = fixed_blk_pos.copy()
+    for i in centroids:
+        base_pos["x" + str(i)] = centroids[i]
+    base_table = pythunder.FixedPosOverlay(base_pos)
+    result = []
+    for c_id in centroids:
+        blk_pos = FixedPosOverlay(base_pos, removed=["x" + str(c_id)])
+        result.append(base_table.derive(blk_pos.overlay, blk_pos.removed))
+    return result
+
+
+def main():
+    parser = ArgumentParser("Per-cluster fixed position setup benchmark")
+    parser.add_argument("-c", "--clusters", help="Number of clusters",
+                        type=int, default=500, dest="num_clusters")
+    parser.add_argument("-f", "--fixed", help="Number of fixed blocks",
+                        type=int, default=2000, dest="num_fixed")
+    parser.add_argument("--mode", help="Run a single setup mode",
+                        choices=["copy", "overlay"], default=None,
+                        dest="mode")
+    args = parser.parse_args()
+
+    if args.mode is None:
+        # each mode runs in its own process to get a clean peak memory
+        for mode in ["copy", "overlay"]:
+            subprocess.check_call([sys.executable, os.path.abspath(__file__),
+                                   "-c", str(args.num_clusters),
+                                   "-f", str(args.num_fixed),
+                                   "--mode", mode])
+        return
+
+    fixed_blk_pos = {}
+    for i in range(args.num_fixed):
+        fixed_blk_pos["I" + str(i)] = (i % 64, i // 64)
+    centroids = {}
+    for i in range(args.num_clusters):
+        centroids[i] = (i % 32, i // 32)
+
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    if args.mode == "copy":
+        result = copy_fixed_pos(fixed_blk_pos, centroids)
+    else:
+        result = overlay_fixed_pos(fixed_blk_pos, centroids)
+    duration = time.time() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    assert len(result) == args.num_clusters
+    # ru_maxrss is in KiB on Linux
+    print("{0:8s} setup {1:.3f}s, peak memory +{2:.1f} MiB".format(
+        args.mode, duration, (peak_rss - start_rss) / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from __future__ import print_function, division
+import os
+import random
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import pythunder
+from arch.arch import get_layout
+
+
+def make_layout(size, memory_repeat=8):
+    # IO tiles on the top and bottom rows, memory columns in between
+    board_layout = []
+    for y in range(size):
+        row = []
+        for x in range(size):
+            if y == 0 or y == size - 1:
+                row.append("i" if x % 2 == 1 else None)
+            elif x % memory_repeat == memory_repeat - 1:
+                row.append("m")
+            else:
+                row.append("p")
+        board_layout.append(row)
+    return get_layout(board_layout)
+
+
+def make_design(layout, fill_ratio, cluster_size):
+    # blocks are laid out on a virtual grid and only connect to their
+    # neighbors, so tiling the grid gives reasonable clusters
+    clb_type = layout.get_clb_type()
+    num_cells = len(layout.get_layer(clb_type).produce_available_pos())
+    num_blks = int(num_cells * fill_ratio)
+    grid_width = int(num_blks ** 0.5)
+    netlist = {}
+    for i in range(num_blks):
+        x, y = i % grid_width, i // grid_width
+        sinks = []
+        for _ in range(random.randint(1, 3)):
+            dx = random.randint(-2, 2)
+            dy = random.randint(-2, 2)
+            sink = (y + dy) * grid_width + x + dx
+            if 0 <= x + dx < grid_width and 0 <= sink < num_blks and \
+                    sink != i:
+                sinks.append("p" + str(sink))
+        if sinks:
+            netlist["e" + str(i)] = ["p" + str(i)] + sinks
+
+    # IOs drive the first row
+    fixed_pos = {}
+    io_pos = layout.get_layer("i").produce_available_pos()
+    for index, pos in enumerate(io_pos):
+        blk_id = "i" + str(index)
+        fixed_pos[blk_id] = pos
+        netlist["io" + str(index)] = [blk_id, "p" + str(index)]
+
+    tile = max(1, int(cluster_size ** 0.5))
+    clusters = {}
+    for i in range(num_blks):
+        x, y = i % grid_width, i // grid_width
+        c_id = "x{0}_{1}".format(x // tile, y // tile)
+        clusters.setdefault(c_id, set()).add("p" + str(i))
+    return clusters, netlist, fixed_pos
+
+
+def compute_hpwl(netlist, clusters, fixed_pos, gp_result):
+    # cluster level HPWL based on the realized cells
+    centers = {}
+    for c_id, cells in gp_result.items():
+        cells = set().union(*cells.values())
+        x = sum(pos[0] for pos in cells) / len(cells)
+        y = sum(pos[1] for pos in cells) / len(cells)
+        for blk_id in clusters[c_id]:
+            centers[blk_id] = (x, y)
+    centers.update(fixed_pos)
+    hpwl = 0
+    for net in netlist.values():
+        xs = [centers[blk][0] for blk in net]
+        ys = [centers[blk][1] for blk in net]
+        hpwl += max(xs) - min(xs) + max(ys) - min(ys)
+    return hpwl
+
+
+def run(size, mode, args):
+    random.seed(0)
+    layout = make_layout(size)
+    clusters, netlist, fixed_pos = make_design(layout, args.fill_ratio,
+                                               args.cluster_size)
+    start = time.time()
+    gp = pythunder.GlobalPlacer(clusters, netlist, fixed_pos, layout)
+    if mode == "flat":
+        gp.solve()
+    else:
+        gp.solve_multilevel(args.coarsest_size)
+    gp.anneal()
+    gp_result = gp.realize()
+    elapsed = time.time() - start
+    hpwl = compute_hpwl(netlist, clusters, fixed_pos, gp_result)
+    print("RESULT {0} {1} {2} {3:.3f} {4:.1f}".format(size, mode,
+                                                      len(clusters), elapsed,
+                                                      hpwl))
+
+
+def main():
+    parser = ArgumentParser("Global placement scaling benchmark")
+    parser.add_argument("-s", "--sizes", help="Mock board sizes", type=int,
+                        nargs="+", default=[16, 32, 48, 64], dest="sizes")
+    parser.add_argument("--fill", help="Ratio of PE tiles used", type=float,
+                        default=0.7, dest="fill_ratio")
+    parser.add_argument("-c", "--cluster-size", help="Blocks per cluster",
+                        type=int, default=25, dest="cluster_size")
+    parser.add_argument("--coarsest", help="Number of clusters at the " +
+                                           "coarsest level", type=int,
+                        default=16, dest="coarsest_size")
+    parser.add_argument("-t", "--timeout", help="Timeout in seconds for " +
+                                                "each run", type=int,
+                        default=120, dest="timeout")
+    parser.add_argument("--mode", help="Run a single placement",
+                        choices=["flat", "multilevel"], default=None,
+                        dest="mode")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        run(args.sizes[0], args.mode, args)
+        return
+
+    print("size mode clusters time(s) hpwl")
+    for size in args.sizes:
+        for mode in ["flat", "multilevel"]:
+            # each run is its own process so that it can be timed out
+            cmd = [sys.executable, os.path.abspath(__file__),
+                   "-s", str(size), "--fill", str(args.fill_ratio),
+                   "-c", str(args.cluster_size),
+                   "--coarsest", str(args.coarsest_size), "--mode", mode]
+            try:
+                output = subprocess.check_output(cmd, timeout=args.timeout,
+                                                 stderr=subprocess.DEVNULL)
+            except subprocess.TimeoutExpired:
+                print(size, mode, "-", "timeout", "-")
+                continue
+            for line in output.decode().splitlines():
+                if line.startswith("RESULT"):
+                    print(*line.split()[1:])
+
+
+if __name__ == "__main__":
+    main()
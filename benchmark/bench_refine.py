@@ -0,0 +1,111 @@
+from __future__ import print_function, division
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                ".."))
+
+import pythunder
+from bench_global_place import make_layout, make_design
+
+
+def make_placement(layout, clusters, fixed_pos, swap_ratio, radius=4):
+    # blocks keep the shape of their virtual grid on the board, then some of
+    # them are swapped with a nearby block. this is roughly what detailed
+    # placement leaves behind, the refinement only has to clean up locally
+    clb_type = layout.get_clb_type()
+    cells = layout.get_layer(clb_type).produce_available_pos()
+    blks = sorted(set().union(*clusters.values()),
+                  key=lambda blk: int(blk[1:]))
+    grid_width = int(len(blks) ** 0.5)
+    grid_height = (len(blks) + grid_width - 1) // grid_width
+    scale_x = layout.width() / grid_width
+    scale_y = layout.height() / grid_height
+    placement = {}
+    free_cells = set(cells)
+    for index, blk in enumerate(blks):
+        x = (index % grid_width + 0.5) * scale_x
+        y = (index // grid_width + 0.5) * scale_y
+        pos = min(free_cells, key=lambda p: (abs(p[0] - x) + abs(p[1] - y),
+                                             p))
+        free_cells.remove(pos)
+        placement[blk] = pos
+    for _ in range(int(len(blks) * swap_ratio)):
+        a = random.choice(blks)
+        ax, ay = placement[a]
+        near = [b for b in blks if abs(placement[b][0] - ax) +
+                abs(placement[b][1] - ay) <= radius]
+        b = random.choice(near)
+        placement[a], placement[b] = placement[b], placement[a]
+    placement.update(fixed_pos)
+    return placement
+
+
+def compute_hpwl(netlist, placement):
+    hpwl = 0
+    for net in netlist.values():
+        xs = [placement[blk][0] for blk in net]
+        ys = [placement[blk][1] for blk in net]
+        hpwl += max(xs) - min(xs) + max(ys) - min(ys)
+    return hpwl
+
+
+def run_serial(layout, placement, netlist, fixed_pos):
+    placer = pythunder.DetailedPlacer(placement, netlist,
+                                      layout.produce_available_pos(),
+                                      fixed_pos, layout.get_clb_type(), True)
+    placer.refine(int(100 * (len(placement) ** 1.33)), 0.001, False)
+    return placer.realize()
+
+
+def run_windows(layout, placement, netlist, fixed_pos, num_threads):
+    return pythunder.refine_global(placement, netlist, fixed_pos, layout,
+                                   True, num_threads)
+
+
+def main():
+    parser = ArgumentParser("Global refinement benchmark")
+    parser.add_argument("-s", "--sizes", help="Mock board sizes", type=int,
+                        nargs="+", default=[16, 32, 48], dest="sizes")
+    parser.add_argument("--fill", help="Ratio of PE tiles used", type=float,
+                        default=0.7, dest="fill_ratio")
+    parser.add_argument("--swap", help="Ratio of blocks swapped before " +
+                                       "the refinement", type=float,
+                        default=0.5, dest="swap_ratio")
+    parser.add_argument("-j", "--threads", help="Threads for the region " +
+                                                "parallel refinement",
+                        type=int, default=0, dest="num_threads")
+    parser.add_argument("--skip-serial", help="Skip the serial refinement",
+                        action="store_true", dest="skip_serial")
+    args = parser.parse_args()
+
+    print("size blocks mode time(s) hpwl")
+    for size in args.sizes:
+        random.seed(0)
+        layout = make_layout(size)
+        clusters, netlist, fixed_pos = make_design(layout, args.fill_ratio, 1)
+        placement = make_placement(layout, clusters, fixed_pos,
+                                   args.swap_ratio)
+        num_blks = len(placement) - len(fixed_pos)
+        print(size, num_blks, "initial", "-",
+              compute_hpwl(netlist, placement))
+        modes = ["windows"]
+        if not args.skip_serial:
+            modes.insert(0, "serial")
+        for mode in modes:
+            start = time.time()
+            if mode == "serial":
+                result = run_serial(layout, placement, netlist, fixed_pos)
+            else:
+                result = run_windows(layout, placement, netlist, fixed_pos,
+                                     args.num_threads)
+            elapsed = time.time() - start
+            print(size, num_blks, mode, "{0:.3f}".format(elapsed),
+                  compute_hpwl(netlist, result))
+
+
+if __name__ == "__main__":
+    main()
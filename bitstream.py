@@ -33,6 +33,17 @@ def main():
                                           "<output.json>",
                         required=False, action="store", dest="io_json",
                         default="")
+    parser.add_argument("-j", "--jobs", help="Number of worker processes " +
+                                             "used to generate routing. " +
+                                             "Default is all the cores",
+                        required=False, action="store", dest="jobs",
+                        type=int, default=None)
+    parser.add_argument("--incremental", help="If set, only regenerate " +
+                                              "tiles and nets that changed " +
+                                              "since the last run, using " +
+                                              "the index next to the output",
+                        action="store_true", required=False,
+                        dest="incremental", default=False)
     args = parser.parse_args()
     arch_filename = args.arch_filename
     netlist_file = args.netlist_file
@@ -53,11 +64,13 @@ def main():
     print("INFO:", "route:", routing_file)
     print("INFO:", "fold_reg:", fold_reg)
     print("INFO:", "io_json:", io_json)
+    print("INFO:", "incremental:", args.incremental)
 
     generate_bitstream(arch_filename, netlist_file, packed_filename,
                        placement_file,
                        routing_file,
-                       output_filename, io_json)
+                       output_filename, io_json, args.jobs,
+                       args.incremental)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,7 @@
 #include "../src/global.hh"
 #include "../src/util.hh"
 #include "../src/io.hh"
+#include "../src/timing.hh"
 
 namespace py = pybind11;
 using std::to_string;
@@ -220,6 +221,14 @@ void init_graph(py::module &m) {
              py::overload_cast<uint32_t,
                                uint32_t>(&RoutingGraph::has_tile))
         .def("__getitem__", &RoutingGraph::operator[])
+        .def(py::pickle(
+            [](RoutingGraph &g) {
+                return py::bytes(serialize_routing_graph(g));
+            },
+            [](const py::bytes &state) {
+                auto data = static_cast<std::string>(state);
+                return deserialize_routing_graph(data.data(), data.size());
+            }))
         .def("__iter__", [](RoutingGraph &r) {
             return py::make_key_iterator(r.begin(), r.end());
         }, py::keep_alive<0, 1>())
@@ -296,12 +305,36 @@ void init_io(py::module &m) {
     auto io_m = m.def_submodule("io");
     io_m.def("dump_routing_graph", &dump_routing_graph)
         .def("load_routing_graph", &load_routing_graph)
+        .def("serialize_routing_graph", [](RoutingGraph &g) {
+            return py::bytes(serialize_routing_graph(g));
+        })
+        .def("deserialize_routing_graph", [](const py::buffer &buffer) {
+            // reads directly from the buffer, e.g. a shared memory block
+            auto info = buffer.request();
+            auto size = static_cast<uint64_t>(info.size * info.itemsize);
+            py::gil_scoped_release release;
+            return deserialize_routing_graph(
+                    static_cast<const char *>(info.ptr), size);
+        })
         .def("load_placement", &load_placement)
         .def("load_netlist", &load_netlist)
         .def("dump_routing_result", &dump_routing_result)
         .def("setup_router_input", &setup_router_input);
 }
 
+void init_timing(py::module &m) {
+    py::enum_<TimingCost>(m, "TimingCost")
+        .value("CLB_OP", TimingCost::CLB_OP)
+        .value("MEM", TimingCost::MEM)
+        .value("CLB_SB", TimingCost::CLB_SB)
+        .value("MEM_SB", TimingCost::MEM_SB)
+        .value("RMUX", TimingCost::RMUX)
+        .value("REG", TimingCost::REG)
+        .export_values();
+
+    m.def("get_default_timing_info", &get_default_timing_info);
+}
+
 PYBIND11_MODULE(pycyclone, m) {
     m.doc() = "pycyclone";
     init_graph(m);
@@ -309,4 +342,5 @@ PYBIND11_MODULE(pycyclone, m) {
     init_util(m);
     init_io(m);
     init_netlist(m);
+    init_timing(m);
 }
@@ -62,6 +62,9 @@ public:
     bool has_edge(const std::shared_ptr<Node> &node);
 
     uint32_t get_edge_cost(const std::shared_ptr<Node> &node);
+    // cost recorded by add_edge(), i.e. node->delay + wire_delay
+    uint32_t get_wire_cost(const std::shared_ptr<Node> &node) const
+    { return edge_cost_.at(node); }
 
     // helper function to allow iteration
     auto begin() const { return neighbors_.begin(); }
@@ -3,8 +3,10 @@
 #include <iostream>
 #include <fstream>
 #include <algorithm>
+#include <cstring>
 #include <functional>
 #include <sstream>
+#include <unordered_map>
 #include <unordered_set>
 
 using std::ifstream;
@@ -402,6 +404,242 @@ RoutingGraph load_routing_graph(const std::string &filename) {
     return g;
 }
 
+constexpr char GRAPH_MAGIC[] = "CYRG";
+constexpr uint32_t GRAPH_VERSION = 1;
+
+template<class T>
+void write_value(::string &buf, const T &value) {
+    buf.append(reinterpret_cast<const char *>(&value), sizeof(T));
+}
+
+void write_value(::string &buf, const ::string &value) {
+    write_value(buf, static_cast<uint32_t>(value.size()));
+    buf.append(value);
+}
+
+class GraphReader {
+public:
+    GraphReader(const char *data, uint64_t size) : data_(data), size_(size) {}
+
+    template<class T>
+    T read() {
+        check(sizeof(T));
+        T value;
+        std::memcpy(&value, data_ + pos_, sizeof(T));
+        pos_ += sizeof(T);
+        return value;
+    }
+
+    ::string read_string() {
+        auto size = read<uint32_t>();
+        check(size);
+        ::string value(data_ + pos_, size);
+        pos_ += size;
+        return value;
+    }
+
+private:
+    const char *data_;
+    uint64_t size_;
+    uint64_t pos_ = 0;
+
+    void check(uint64_t size) const {
+        if (pos_ + size > size_)
+            throw ::runtime_error("truncated routing graph data");
+    }
+};
+
+void write_node(::string &buf, const std::shared_ptr<Node> &node) {
+    write_value(buf, static_cast<uint8_t>(node->type));
+    write_value(buf, node->x);
+    write_value(buf, node->y);
+    write_value(buf, node->width);
+    write_value(buf, node->track);
+    write_value(buf, node->delay);
+    if (node->type == NodeType::SwitchBox) {
+        auto sb = std::static_pointer_cast<SwitchBoxNode>(node);
+        write_value(buf, static_cast<uint8_t>(gsv(sb->side)));
+        write_value(buf, static_cast<uint8_t>(get_io_value(sb->io)));
+    } else {
+        write_value(buf, node->name);
+    }
+}
+
+std::shared_ptr<Node> read_node(GraphReader &reader, RoutingGraph &g) {
+    auto type = static_cast<NodeType>(reader.read<uint8_t>());
+    auto x = reader.read<uint32_t>();
+    auto y = reader.read<uint32_t>();
+    auto width = reader.read<uint32_t>();
+    auto track = reader.read<uint32_t>();
+    auto delay = reader.read<uint32_t>();
+    auto tile_iter = g.find({x, y});
+    if (tile_iter == g.end())
+        throw ::runtime_error("unable to find tile at (" + ::to_string(x) +
+                              ", " + ::to_string(y) + ")");
+    auto &tile = tile_iter->second;
+    std::shared_ptr<Node> node;
+    switch (type) {
+        case NodeType::SwitchBox: {
+            auto side = gsi(reader.read<uint8_t>());
+            auto io = gii(reader.read<uint8_t>());
+            node = tile.switchbox[{track, side, io}];
+            break;
+        }
+        case NodeType::Port: {
+            auto name = reader.read_string();
+            auto &port = tile.ports[name];
+            if (!port)
+                port = std::make_shared<PortNode>(name, x, y, width);
+            node = port;
+            break;
+        }
+        case NodeType::Register: {
+            auto name = reader.read_string();
+            auto &reg = tile.registers[name];
+            if (!reg)
+                reg = std::make_shared<RegisterNode>(name, x, y, width,
+                                                     track);
+            node = reg;
+            break;
+        }
+        case NodeType::Generic: {
+            auto name = reader.read_string();
+            auto &rmux = tile.rmux_nodes[name];
+            if (!rmux)
+                rmux = std::make_shared<RegisterMuxNode>(name, x, y, width,
+                                                         track);
+            node = rmux;
+            break;
+        }
+        default:
+            throw ::runtime_error("unknown node type");
+    }
+    node->delay = delay;
+    return node;
+}
+
+std::string serialize_routing_graph(RoutingGraph &graph) {
+    ::string buf(GRAPH_MAGIC, 4);
+    write_value(buf, GRAPH_VERSION);
+
+    // tiles. switch boxes are stored per tile since they are small
+    ::vector<std::shared_ptr<Node>> nodes;
+    std::unordered_map<const Node *, uint32_t> node_index;
+    auto add_node = [&](const std::shared_ptr<Node> &node) {
+        node_index.insert({node.get(), static_cast<uint32_t>(nodes.size())});
+        nodes.emplace_back(node);
+    };
+    auto num_tiles = std::distance(graph.begin(), graph.end());
+    write_value(buf, static_cast<uint32_t>(num_tiles));
+    for (auto const &iter : graph) {
+        auto const &tile = iter.second;
+        write_value(buf, tile.x);
+        write_value(buf, tile.y);
+        write_value(buf, tile.height);
+        auto const &switchbox = tile.switchbox;
+        write_value(buf, switchbox.id);
+        write_value(buf, switchbox.width);
+        write_value(buf, switchbox.num_track);
+        auto const wires = switchbox.internal_wires();
+        write_value(buf, static_cast<uint32_t>(wires.size()));
+        for (auto const &[track_from, side_from, track_to, side_to] : wires) {
+            write_value(buf, track_from);
+            write_value(buf, static_cast<uint8_t>(gsv(side_from)));
+            write_value(buf, track_to);
+            write_value(buf, static_cast<uint8_t>(gsv(side_to)));
+        }
+
+        for (uint32_t side = 0; side < Switch::SIDES; side++) {
+            for (auto const &sb : switchbox.get_sbs_by_side(gsi(side)))
+                add_node(sb);
+        }
+        for (auto const &iter : tile.ports)
+            add_node(iter.second);
+        for (auto const &iter : tile.registers)
+            add_node(iter.second);
+        for (auto const &iter : tile.rmux_nodes)
+            add_node(iter.second);
+    }
+
+    // nodes and then edges, in the neighbor order
+    write_value(buf, static_cast<uint32_t>(nodes.size()));
+    for (auto const &node : nodes)
+        write_node(buf, node);
+    for (auto const &node : nodes) {
+        write_value(buf, static_cast<uint32_t>(node->size()));
+        for (auto const &n : *node) {
+            auto next = n.lock();
+            auto iter = node_index.find(next.get());
+            if (iter == node_index.end())
+                throw ::runtime_error(next->to_string() + " is not in the "
+                                      "routing graph");
+            write_value(buf, iter->second);
+            write_value(buf, node->get_wire_cost(next));
+        }
+    }
+    return buf;
+}
+
+RoutingGraph deserialize_routing_graph(const char *data, uint64_t size) {
+    if (size < 4 || ::string(data, 4) != ::string(GRAPH_MAGIC, 4))
+        throw ::runtime_error("not a routing graph");
+    GraphReader reader(data + 4, size - 4);
+    auto version = reader.read<uint32_t>();
+    if (version != GRAPH_VERSION)
+        throw ::runtime_error("unsupported routing graph version " +
+                              ::to_string(version));
+
+    RoutingGraph g;
+    auto num_tiles = reader.read<uint32_t>();
+    for (uint32_t i = 0; i < num_tiles; i++) {
+        auto x = reader.read<uint32_t>();
+        auto y = reader.read<uint32_t>();
+        auto height = reader.read<uint32_t>();
+        auto id = reader.read<uint32_t>();
+        auto width = reader.read<uint32_t>();
+        auto num_track = reader.read<uint32_t>();
+        auto num_wires = reader.read<uint32_t>();
+        std::set<std::tuple<uint32_t, SwitchBoxSide, uint32_t,
+                            SwitchBoxSide>> wires;
+        for (uint32_t j = 0; j < num_wires; j++) {
+            auto track_from = reader.read<uint32_t>();
+            auto side_from = gsi(reader.read<uint8_t>());
+            auto track_to = reader.read<uint32_t>();
+            auto side_to = gsi(reader.read<uint8_t>());
+            wires.insert({track_from, side_from, track_to, side_to});
+        }
+        Switch switchbox(x, y, num_track, width, id, wires);
+        g.add_tile(Tile(x, y, height, switchbox));
+    }
+
+    auto num_nodes = reader.read<uint32_t>();
+    ::vector<std::shared_ptr<Node>> nodes;
+    nodes.reserve(num_nodes);
+    for (uint32_t i = 0; i < num_nodes; i++)
+        nodes.emplace_back(read_node(reader, g));
+    for (auto const &node : nodes) {
+        auto num_edges = reader.read<uint32_t>();
+        // switch box internal wires are created along with the tiles and
+        // they always come first
+        auto num_internal = node->size();
+        for (uint32_t j = 0; j < num_edges; j++) {
+            auto index = reader.read<uint32_t>();
+            auto cost = reader.read<uint32_t>();
+            if (index >= nodes.size())
+                throw ::runtime_error("invalid node index");
+            auto const &next = nodes[index];
+            if (j < num_internal) {
+                if (!node->has_edge(next))
+                    throw ::runtime_error("unexpected switch box wiring");
+                continue;
+            }
+            // add_edge() adds the node delay back
+            node->add_edge(next, cost - next->delay);
+        }
+    }
+    return g;
+}
+
 void dump_routing_result(const Router &r, const std::string &filename) {
     std::ofstream out;
     out.open(filename, std::ofstream::out | std::ofstream::app);
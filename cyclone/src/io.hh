@@ -21,6 +21,12 @@ void dump_wave_info(const std::map<std::string, uint64_t> &wave_info, const std:
 
 RoutingGraph load_routing_graph(const std::string &filename);
 
+// compact binary form of the routing graph, used for pickling and
+// shared memory. unlike the text dump, it keeps every node, the node delays
+// and the edge costs
+std::string serialize_routing_graph(RoutingGraph &graph);
+RoutingGraph deserialize_routing_graph(const char *data, uint64_t size);
+
 void dump_routing_result(const Router &r, const std::string &filename);
 
 void setup_router_input(Router &r, const std::string &packed_filename,
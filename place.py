@@ -1,7 +1,8 @@
 from __future__ import print_function, division
 
-from util import reduce_cluster_graph, compute_centroids
-from util import SetEncoder, choose_resource
+from util import reduce_cluster_graphs, compute_centroids
+from util import SetEncoder, choose_resource, FixedPosOverlay
+from runtime_model import load_runtime_model, placement_features
 import os
 import pythunder
 import json
@@ -23,6 +24,7 @@ def detailed_placement_thunder(args, context=None):
                                       fixed_pos, clb_type,
                                       fold_reg)
     placer.set_seed(seed)
+    placer.set_time_budget(args.get("time_budget", 0))
     placer.anneal()
     placer.refine(1000, 0.01, False)
     placement = placer.realize()
@@ -41,63 +43,50 @@ def detailed_placement_thunder(args, context=None):
                 }
 
 
-def estimate_placement_time(args):
-    blks = list(args["clusters"])
-    cells = args["cells"]
-    netlist = args["new_netlist"]
-    blk_pos = args["blk_pos"]
-    fold_reg = args["fold_reg"]
-    clb_type = args["clb_type"]
-    fixed_pos = {}
-    for blk_id in blk_pos:
-        fixed_pos[blk_id] = list(blk_pos[blk_id])
-    new_cells = {}
-    for blk_type in cells:
-        new_cells[blk_type] = list(cells[blk_type])
-    placer = pythunder.DetailedPlacer(blks, netlist, new_cells,
-                                      fixed_pos, clb_type,
-                                      fold_reg)
-    t = placer.estimate(10000)
-    return t
+def estimate_placement_time(args, model=None):
+    if model is None:
+        model = load_runtime_model(args.get("runtime_model", ""))
+    return model.predict(placement_features(args))
 
 
 def get_lambda_arn(map_args, aws_config):
-    from six.moves import queue
-    threads = []
-    que = queue.Queue()
-    for i in range(len(map_args)):
-        t = threading.Thread(target=lambda q, arg, index: q.put(
-            (index, estimate_placement_time(arg))), args=(que, map_args[i], i))
-        threads.append(t)
-    for t in threads:
-        t.start()
-    for t in threads:
-        t.join()
-    estimates = [-1] * len(map_args)
-    while not que.empty():
-        index, estimate = que.get()
-        estimates[index] = estimate
-
-    for t in estimates:
-        assert t != -1
+    model = load_runtime_model(map_args[0].get("runtime_model", ""))
+    estimates = [estimate_placement_time(arg, model) for arg in map_args]
     return choose_resource(estimates, aws_config)
 
 
-def refine_global_thunder(layout, pre_placement, netlists, fixed_pos,
-                          fold_reg):
-    clb_type = layout.get_clb_type()
-    available_pos = layout.produce_available_pos()
-    global_refine = pythunder.DetailedPlacer(pre_placement,
-                                             netlists,
-                                             available_pos,
-                                             fixed_pos,
-                                             clb_type,
-                                             fold_reg)
+def default_timing_delay():
+    # the delays the router retimes with
+    delay = pythunder.TimingDelay()
+    try:
+        import pycyclone
+    except ImportError:
+        return delay
+    info = pycyclone.get_default_timing_info()
+    delay.clb_op = info[pycyclone.TimingCost.CLB_OP]
+    delay.mem = info[pycyclone.TimingCost.MEM]
+    delay.clb_sb = info[pycyclone.TimingCost.CLB_SB]
+    delay.mem_sb = info[pycyclone.TimingCost.MEM_SB]
+    delay.rmux = info[pycyclone.TimingCost.RMUX]
+    delay.reg = info[pycyclone.TimingCost.REG]
+    return delay
 
-    global_refine.refine(int(100 * (len(pre_placement) ** 1.33)),
-                         0.001, True)
 
-    return global_refine.realize()
+def refine_global_thunder(layout, pre_placement, netlists, fixed_pos,
+                          fold_reg, seed=0, num_threads=0,
+                          congestion_weight=0, timing_weight=0):
+    # windows of the board are refined in parallel
+    timing_delay = default_timing_delay()
+    result = pythunder.refine_global(pre_placement, netlists, fixed_pos,
+                                     layout, fold_reg, num_threads, seed,
+                                     congestion_weight=congestion_weight,
+                                     timing_weight=timing_weight,
+                                     timing_delay=timing_delay)
+    if timing_weight > 0:
+        critical_path, _ = pythunder.estimate_timing(
+            result, netlists, layout.get_clb_type(), timing_delay)
+        print("INFO: Estimated critical path", critical_path, "ps")
+    return result
 
 
 def place_on_board(board, blk_id, pos):
@@ -122,6 +111,7 @@ def main():
     from arch.fpga import load_packed_fpga_netlist
     from arch import mock_board_meta
     from visualize import visualize_placement_cgra
+    from preflight import check_capacity
 
     parser = ArgumentParser("CGRA Placer")
     parser.add_argument("-i", "--input", help="Packed netlist file, " +
@@ -151,6 +141,55 @@ def main():
                         "that arn",
                         dest="aws_config", type=str, required=False,
                         action="store", default="")
+    parser.add_argument("-j", "--jobs", help="Number of threads used for " +
+                                             "detailed placement, and for " +
+                                             "the partition seeds if " +
+                                             "igraph is built thread safe. " +
+                                             "default uses all the cores",
+                        type=int, default=0, dest="num_threads")
+    parser.add_argument("--time-budget", help="Time budget in seconds for " +
+                                              "each cluster's detailed " +
+                                              "placement. default is no " +
+                                              "limit", type=float, default=0,
+                        dest="time_budget")
+    parser.add_argument("--runtime-model", help="File that keeps the " +
+                                                "runtimes of past detailed " +
+                                                "placements to predict the " +
+                                                "next ones. It's only " +
+                                                "updated when set here or " +
+                                                "with PLACER_RUNTIME_MODEL",
+                        type=str, default="", dest="runtime_model")
+    parser.add_argument("--no-balance", help="If set, the placer won't " +
+                                             "split or merge the clusters " +
+                                             "before detailed placement",
+                        action="store_true", required=False,
+                        dest="no_balance", default=False)
+    parser.add_argument("--partition-seeds", help="Number of seeds tried " +
+                                                  "by the netlist " +
+                                                  "partitioner. The seeds " +
+                                                  "run one after another " +
+                                                  "unless igraph is built " +
+                                                  "thread safe, so N seeds " +
+                                                  "take N times as long. " +
+                                                  "default is 1",
+                        type=int, default=1, dest="partition_seeds")
+    parser.add_argument("--partition-cache", help="Directory to cache the " +
+                                                  "netlist partition in",
+                        type=str, default="", dest="partition_cache")
+    parser.add_argument("--congestion", help="Weight of the routing " +
+                                             "congestion in the global " +
+                                             "refinement. default is 0, " +
+                                             "only the wire length",
+                        type=float, default=0, dest="congestion_weight")
+    parser.add_argument("--timing", help="Weight of the timing criticality " +
+                                         "of the nets in the global " +
+                                         "refinement. default is 0, only " +
+                                         "the wire length",
+                        type=float, default=0, dest="timing_weight")
+    parser.add_argument("--eco", help="Previous placement result. If set, " +
+                                      "only the blocks that changed since " +
+                                      "then are placed",
+                        type=str, default="", dest="eco_placement")
     parser.add_argument("-f", "--fpga", action="store", dest="fpga_arch",
                         default="", help="ISPD FPGA architecture file")
     parser.add_argument("-l", "--layout", action="store", dest="cgra_layout",
@@ -220,6 +259,13 @@ def main():
         raw_netlist, folded_blocks, id_to_name, changed_pe = \
             load_packed_file(packed_filename)
         netlists = prune_netlist(raw_netlist)
+        # fail now rather than deep inside the placer
+        errors = check_capacity({blk for net in netlists.values()
+                                 for blk in net}, layout)
+        if errors:
+            for error in errors:
+                print("ERROR:", error)
+            exit(1)
         for blk in id_to_name:
             if blk[0] == "i" or blk[0] == "I":
                 special_blocks.add(blk)
@@ -229,21 +275,15 @@ def main():
                              place_on_board,
                              layout)
 
-    # common routine
-    # produce layout structure
-    centroids, cluster_cells, clusters = perform_global_placement(
-        fixed_blk_pos, netlists, layout, seed=seed, vis=vis_opt)
-
-    # placer with each cluster
-    board_pos = perform_detailed_placement(centroids,
-                                           cluster_cells, clusters,
-                                           fixed_blk_pos, netlists,
-                                           fold_reg, seed,
-                                           layout,
-                                           aws_config)
-    # refinement
-    board_pos = refine_global_thunder(layout, board_pos, netlists,
-                                      fixed_blk_pos, fold_reg)
+    if args.eco_placement:
+        # incremental placement on top of the previous result
+        board_pos = perform_eco_placement(args.eco_placement, id_to_name,
+                                          netlists, fixed_blk_pos, layout,
+                                          fold_reg, seed)
+    else:
+        board_pos = perform_placement(fixed_blk_pos, netlists, layout,
+                                      fold_reg, seed, vis_opt, aws_config,
+                                      args)
 
     for blk_id in board_pos:
         pos = board_pos[blk_id]
@@ -257,8 +297,51 @@ def main():
         visualize_placement_cgra(layout, board_pos, design_name, changed_pe)
 
 
+def perform_placement(fixed_blk_pos, netlists, layout, fold_reg, seed, vis,
+                      aws_config, args):
+    # produce layout structure
+    centroids, cluster_cells, clusters = perform_global_placement(
+        fixed_blk_pos, netlists, layout, seed=seed, vis=vis,
+        num_threads=args.num_threads, balance=not args.no_balance,
+        partition_seeds=args.partition_seeds,
+        partition_cache=args.partition_cache)
+
+    # placer with each cluster
+    board_pos = perform_detailed_placement(centroids,
+                                           cluster_cells, clusters,
+                                           fixed_blk_pos, netlists,
+                                           fold_reg, seed,
+                                           layout,
+                                           aws_config,
+                                           args.num_threads,
+                                           args.time_budget,
+                                           args.runtime_model)
+    # refinement
+    return refine_global_thunder(layout, board_pos, netlists,
+                                 fixed_blk_pos, fold_reg, seed,
+                                 args.num_threads, args.congestion_weight,
+                                 args.timing_weight)
+
+
+def perform_eco_placement(prev_filename, id_to_name, netlists, fixed_blk_pos,
+                          layout, fold_reg, seed):
+    from arch.cgra import parse_placement
+    prev_pos, prev_id_to_name = parse_placement(prev_filename)
+    prev_pos = pythunder.match_placement(prev_pos, prev_id_to_name,
+                                         id_to_name)
+    board_pos = pythunder.eco_placement(prev_pos, netlists, fixed_blk_pos,
+                                        layout, fold_reg, seed)
+    moved = sum(1 for blk_id in board_pos if blk_id not in fixed_blk_pos and
+                prev_pos.get(blk_id) != board_pos[blk_id])
+    print("INFO: ECO placed {0} of {1} block(s)".format(
+        moved, len(board_pos) - len(fixed_blk_pos)))
+    return board_pos
+
+
 def perform_global_placement(fixed_blk_pos, netlists,
-                             layout, seed, vis=True, partition_threshold=10):
+                             layout, seed, vis=True, partition_threshold=10,
+                             num_threads=0, balance=True, partition_seeds=1,
+                             partition_cache=""):
     from visualize import visualize_clustering_cgra
     # simple heuristics to calculate the clusters
     # if we have less than 10 blocks. no need to partition it
@@ -270,8 +353,11 @@ def perform_global_placement(fixed_blk_pos, netlists,
     if len(blk_set) <= partition_threshold:
         clusters = {0: blk_set}
     else:
-        clusters = pythunder.graph.partition_netlist(netlists)
+        clusters = pythunder.graph.partition_netlist_cached(
+            netlists, partition_cache, partition_seeds, num_threads)
         clusters = pythunder.util.filter_clusters(clusters, fixed_blk_pos)
+        if balance:
+            clusters = balance_clusters(clusters, netlists, num_threads)
 
     # prepare for the input
     new_clusters = {}
@@ -285,15 +371,16 @@ def perform_global_placement(fixed_blk_pos, netlists,
     gp = pythunder.GlobalPlacer(new_clusters, netlists, fixed_blk_pos,
                                 layout)
     gp.set_seed(seed)
+    gp.set_num_threads(num_threads)
     # compute the anneal parameter here
-    total_blocks = layout.get_layer(layout.get_clb_type()).produce_available_pos()
-    fill_ratio = min(0.99, len(blk_set) / len(total_blocks))
+    total_blocks = layout.layer_mask_array(layout.get_clb_type()).sum()
+    fill_ratio = min(0.99, len(blk_set) / total_blocks)
     base_factor = 1.0
     if fill_ratio > 0.8:
         base_factor = 1.2
     gp.anneal_param_factor = base_factor / (1 - fill_ratio)
     print("use anneal param factor:", gp.anneal_param_factor)
-    gp.solve()
+    gp.solve_multilevel()
     gp.anneal()
     cluster_cells_ = gp.realize()
 
@@ -311,7 +398,7 @@ def perform_global_placement(fixed_blk_pos, netlists,
     return centroids, cluster_cells, clusters
 
 
-def detailed_placement_thunder_wrapper(args):
+def detailed_placement_thunder_wrapper(args, num_threads=0):
     clusters = {}
     cells = {}
     netlists = {}
@@ -319,23 +406,64 @@ def detailed_placement_thunder_wrapper(args):
     clb_type = args[0]["clb_type"]
     fold_reg = args[0]["fold_reg"]
     seed = args[0]["seed"]
+    time_budget = args[0].get("time_budget", 0)
+    # the predicted runtimes order the clusters, longest first
+    model = load_runtime_model(args[0].get("runtime_model", ""))
+    costs = {}
+    # convert each shared base table only once
+    base_tables = {}
     for i in range(len(args)):
         c_id = "x" + str(i)
         arg = args[i]
+        costs[c_id] = estimate_placement_time(arg, model)
         clusters[c_id] = arg["clusters"]
         cells[c_id] = arg["cells"]
         netlists[c_id] = arg["new_netlist"]
-        fixed_blocks[c_id] = arg["blk_pos"]
-    return pythunder.detailed_placement(clusters, cells, netlists, fixed_blocks,
-                                        clb_type,
-                                        fold_reg,
-                                        seed)
+        blk_pos = arg["blk_pos"]
+        if not isinstance(blk_pos, FixedPosOverlay):
+            blk_pos = FixedPosOverlay(blk_pos)
+        base_id = id(blk_pos.base)
+        if base_id not in base_tables:
+            base_tables[base_id] = pythunder.FixedPosOverlay(blk_pos.base)
+        fixed_blocks[c_id] = base_tables[base_id].derive(blk_pos.overlay,
+                                                         blk_pos.removed)
+    placement, runtimes = pythunder.detailed_placement_with_runtimes(
+        clusters, cells, netlists, fixed_blocks, clb_type, fold_reg, seed,
+        num_threads, time_budget, costs)
+    if runtimes:
+        slowest = max(runtimes, key=lambda x: runtimes[x])
+        print("INFO: slowest cluster", slowest, "placed in",
+              "{0:.3f}s (predicted {1:.3f}s),".format(runtimes[slowest],
+                                                      costs[slowest]),
+              "{0:.3f}s in total".format(sum(runtimes.values())))
+    # runs cut short by the time budget would bias the model
+    if not time_budget:
+        for i in range(len(args)):
+            c_id = "x" + str(i)
+            model.record(placement_features(args[i]), runtimes[c_id])
+        model.save()
+    return placement
+
+
+def balance_clusters(clusters, netlists, num_threads):
+    # split the oversized clusters and merge the tiny ones so that the
+    # detailed placement is not bound by the biggest cluster
+    before = pythunder.util.parallel_efficiency(clusters, netlists,
+                                                num_threads)
+    clusters = pythunder.util.balance_clusters(clusters, netlists,
+                                               num_threads)
+    after = pythunder.util.parallel_efficiency(clusters, netlists,
+                                               num_threads)
+    print("INFO: parallel efficiency {0:.2f} -> {1:.2f} with {2} "
+          "cluster(s)".format(before, after, len(clusters)))
+    return clusters
 
 
 def perform_detailed_placement(centroids, cluster_cells, clusters,
                                fixed_blk_pos, netlists,
                                fold_reg, seed, layout,
-                               aws_config=""):
+                               aws_config="", num_threads=0, time_budget=0,
+                               runtime_model=""):
     from six.moves import queue
     import boto3
     board_pos = fixed_blk_pos.copy()
@@ -343,24 +471,25 @@ def perform_detailed_placement(centroids, cluster_cells, clusters,
 
     clb_type = layout.get_clb_type()
 
+    reduced_netlists = reduce_cluster_graphs(netlists, clusters,
+                                             fixed_blk_pos)
+    # every cluster sees the other clusters' centroids as fixed blocks
+    base_pos = fixed_blk_pos.copy()
+    for i in centroids:
+        base_pos["x" + str(i)] = centroids[i]
     for c_id in cluster_cells:
         cells = cluster_cells[c_id]
-        new_netlist = reduce_cluster_graph(netlists, clusters,
-                                           fixed_blk_pos, c_id)
-        blk_pos = fixed_blk_pos.copy()
-        for i in centroids:
-            if i == c_id:
-                continue
-            node_id = "x" + str(i)
-            pos = centroids[i]
-            blk_pos[node_id] = pos
+        new_netlist = reduced_netlists[c_id]
+        blk_pos = FixedPosOverlay(base_pos, removed=["x" + str(c_id)])
         args = {"clusters": clusters[c_id], "cells": cells,
                 "new_netlist": new_netlist,
                 "blk_pos": blk_pos, "fold_reg": fold_reg,
-                "seed": seed, "clb_type": clb_type}
+                "seed": seed, "clb_type": clb_type,
+                "time_budget": time_budget,
+                "runtime_model": runtime_model}
         map_args.append(args)
     if not aws_config:
-        return detailed_placement_thunder_wrapper(map_args)
+        return detailed_placement_thunder_wrapper(map_args, num_threads)
     else:
         # user need to specify a region in the environment
         client = boto3.client("lambda")
@@ -0,0 +1,319 @@
+from __future__ import print_function, division
+import sys
+import os
+from argparse import ArgumentParser
+import pythunder
+
+
+# IO blocks of both widths are put on the 16-bit IO positions,
+# see place_special_blocks()
+IO_TYPES = "iI"
+
+
+def check_capacity(blks, layout):
+    """compares the number of blocks of every type with the legal positions
+    of the layout. returns a list of error messages, empty if every block
+    can be placed"""
+    counts = {}
+    for blk_id in blks:
+        blk_type = "I" if blk_id[0] in IO_TYPES else blk_id[0]
+        counts[blk_type] = counts.get(blk_type, 0) + 1
+    errors = []
+    for blk_type in sorted(counts):
+        num_pos = len(layout.available_pos_array(blk_type))
+        if counts[blk_type] > num_pos:
+            errors.append("{0} '{1}' blocks but the layout only has {2} '{1}' "
+                          "positions. use a larger layout or split the "
+                          "design".format(counts[blk_type], blk_type,
+                                          num_pos))
+    return errors
+
+
+def check_placement(blks, placement, layout):
+    """every block has to be placed on a legal position of its type, and
+    no two blocks of a type can share a position. returns a list of error
+    messages"""
+    errors = []
+    width, height = layout.width(), layout.height()
+    taken = {}
+    for blk_id in sorted(blks):
+        if blk_id not in placement:
+            errors.append("{0} is not placed".format(blk_id))
+            continue
+        x, y = placement[blk_id]
+        blk_type = "I" if blk_id[0] in IO_TYPES else blk_id[0]
+        if not (0 <= x < width and 0 <= y < height):
+            errors.append("{0} at ({1}, {2}) is outside of the "
+                          "{3}x{4} layout".format(blk_id, x, y, width, height))
+            continue
+        if blk_type not in IO_TYPES and \
+                not layout.is_legal(blk_id, x, y):
+            errors.append("{0} at ({1}, {2}) is not a legal '{3}' "
+                          "position".format(blk_id, x, y, blk_type))
+        key = (blk_type, x, y)
+        if key in taken:
+            errors.append("{0} and {1} are both placed at ({2}, {3})".format(
+                taken[key], blk_id, x, y))
+        else:
+            taken[key] = blk_id
+    return errors
+
+
+def track_supply(graph):
+    """number of tracks of every tile of a routing graph, keyed by
+    position. tall tiles supply their tracks on every row they cover"""
+    supply = {}
+    for pos in graph:
+        tile = graph[pos]
+        for dy in range(tile.height):
+            supply[(tile.x, tile.y + dy)] = tile.switchbox.num_track
+    return supply
+
+
+def _routing_pos(pos, supply, cache):
+    """tiles without tracks (IO) connect to the tracks of the closest tile
+    that has them"""
+    if supply.get(pos, 0) > 0:
+        return pos
+    if pos not in cache:
+        x, y = pos
+        cache[pos] = min((abs(xx - x) + abs(yy - y), (xx, yy))
+                         for (xx, yy), tracks in supply.items()
+                         if tracks > 0)[1]
+    return cache[pos]
+
+
+def _net_pins(nets, placement, supply):
+    """positions of the pins of every net, the driver first"""
+    cache = {}
+    for net in nets:
+        yield [_routing_pos(placement[blk], supply, cache) for blk in net]
+
+
+def check_cuts(nets, placement, supply, width, height):
+    """a net whose driver is on the left of a cut line and with a sink on
+    the right needs at least one left-to-right track across that line,
+    no matter how it gets routed. if more nets have to cross a line in one
+    direction than there are tracks, the design can't be routed. returns a
+    list of (description, demand, supply) of the overflowing cuts"""
+    # difference arrays of the nets crossing each cut, one per direction
+    crossing = {"left to right": [0] * (width + 1),
+                "right to left": [0] * (width + 1),
+                "bottom to top": [0] * (height + 1),
+                "top to bottom": [0] * (height + 1)}
+
+    def add(direction, start, end):
+        # the net crosses the cuts start..end - 1
+        if start < end:
+            crossing[direction][start] += 1
+            crossing[direction][end] -= 1
+
+    for pins in _net_pins(nets, placement, supply):
+        (dx, dy), sinks = pins[0], pins[1:]
+        if not sinks:
+            continue
+        xs = [x for x, _ in sinks]
+        ys = [y for _, y in sinks]
+        add("left to right", dx, max(xs))
+        add("right to left", min(xs), dx)
+        add("top to bottom", dy, max(ys))
+        add("bottom to top", min(ys), dy)
+
+    def tracks(a, b):
+        return min(supply.get(a, 0), supply.get(b, 0))
+
+    result = []
+    for direction, diff in crossing.items():
+        vertical = direction in ("left to right", "right to left")
+        num_cuts = width - 1 if vertical else height - 1
+        demand = 0
+        for cut in range(num_cuts):
+            demand += diff[cut]
+            if vertical:
+                total = sum(tracks((cut, y), (cut + 1, y))
+                            for y in range(height))
+                line = "columns {0} and {1}".format(cut, cut + 1)
+            else:
+                total = sum(tracks((x, cut), (x, cut + 1))
+                            for x in range(width))
+                line = "rows {0} and {1}".format(cut, cut + 1)
+            if demand > total:
+                result.append(("between {0}, {1}".format(line, direction),
+                               demand, total))
+    return result
+
+
+def channel_demand(nets, placement, supply, width, height):
+    """RUDY estimate of the wires in the channels of every tile, the
+    horizontal channel of (x, y) goes to (x + 1, y) and the vertical one to
+    (x, y + 1). the wire length of a net in each direction is spread evenly
+    over the channels of its bounding box. returns two height x width
+    lists"""
+    # 2D difference arrays, every net adds its density to a rectangle
+    diff_h = [[0.0] * (width + 1) for _ in range(height + 1)]
+    diff_v = [[0.0] * (width + 1) for _ in range(height + 1)]
+
+    def add(diff, xmin, xmax, ymin, ymax, value):
+        diff[ymin][xmin] += value
+        diff[ymin][xmax + 1] -= value
+        diff[ymax + 1][xmin] -= value
+        diff[ymax + 1][xmax + 1] += value
+
+    for pins in _net_pins(nets, placement, supply):
+        xmin = min(x for x, _ in pins)
+        xmax = max(x for x, _ in pins)
+        ymin = min(y for _, y in pins)
+        ymax = max(y for _, y in pins)
+        if xmax > xmin:
+            add(diff_h, xmin, xmax - 1, ymin, ymax, 1 / (ymax - ymin + 1))
+        if ymax > ymin:
+            add(diff_v, xmin, xmax, ymin, ymax - 1, 1 / (xmax - xmin + 1))
+
+    def integrate(diff):
+        result = [[0.0] * width for _ in range(height)]
+        for y in range(height):
+            for x in range(width):
+                value = diff[y][x]
+                if x > 0:
+                    value += result[y][x - 1]
+                if y > 0:
+                    value += result[y - 1][x]
+                if x > 0 and y > 0:
+                    value -= result[y - 1][x - 1]
+                result[y][x] = value
+        return result
+
+    return integrate(diff_h), integrate(diff_v)
+
+
+def find_hot_spots(nets, placement, supply, width, height, threshold=0.9):
+    """channels where the estimated demand is at least threshold of the
+    tracks. a channel has num_track tracks in each direction. returns a list
+    of (utilization, x, y, channel, demand, tracks), worst first"""
+    demand_h, demand_v = channel_demand(nets, placement, supply,
+                                        width, height)
+    result = []
+    for y in range(height):
+        for x in range(width):
+            for channel, demand, end in (
+                    ("horizontal", demand_h[y][x], (x + 1, y)),
+                    ("vertical", demand_v[y][x], (x, y + 1))):
+                # rounding left over from the prefix sums
+                if demand < 1e-6:
+                    continue
+                tracks = 2 * min(supply.get((x, y), 0), supply.get(end, 0))
+                utilization = demand / tracks if tracks else float("inf")
+                if utilization >= threshold:
+                    result.append((utilization, x, y, channel, demand,
+                                   tracks))
+    result.sort(key=lambda entry: (-entry[0], entry[1], entry[2]))
+    return result
+
+
+def split_nets(netlist, bus):
+    """groups the nets by bus width and drops the port names"""
+    result = {}
+    for net_id, net in netlist.items():
+        result.setdefault(bus[net_id], []).append([blk for blk, _ in net])
+    return result
+
+
+def check_routability(netlist, bus, placement, supplies, width, height,
+                      threshold=0.9, num_hot_spots=10):
+    """runs the cut and hot spot checks for every bus width. supplies maps a
+    bus width to the track_supply() of its routing graph. returns the
+    errors and the warnings"""
+    errors = []
+    warnings = []
+    nets_by_width = split_nets(netlist, bus)
+    for bus_width in sorted(nets_by_width):
+        nets = nets_by_width[bus_width]
+        if bus_width not in supplies:
+            errors.append("no routing graph for the {0}-bit nets".format(
+                bus_width))
+            continue
+        supply = supplies[bus_width]
+        for line, demand, tracks in check_cuts(nets, placement, supply,
+                                               width, height):
+            errors.append("{0}-bit: {1} nets have to cross {2}, but there "
+                          "are only {3} tracks. place again with "
+                          "--congestion or use a larger board".format(
+                              bus_width, demand, line, tracks))
+        hot_spots = find_hot_spots(nets, placement, supply, width, height,
+                                   threshold)
+        for utilization, x, y, channel, demand, tracks in \
+                hot_spots[:num_hot_spots]:
+            warnings.append("{0}-bit: {1} demand at ({2}, {3}) is {4:.1f} of "
+                            "{5} tracks ({6:.0f}%)".format(
+                                bus_width, channel, x, y, demand, tracks,
+                                utilization * 100))
+        if len(hot_spots) > num_hot_spots:
+            warnings.append("{0}-bit: {1} more hot spots".format(
+                bus_width, len(hot_spots) - num_hot_spots))
+    return errors, warnings
+
+
+def get_blks(netlist):
+    return {blk for net in netlist.values() for blk, _ in net}
+
+
+def load_supplies(graph_dirname):
+    """track supply of the 1-bit and the 16-bit routing graphs"""
+    from pycyclone.io import load_routing_graph
+    from process_graph import GRAPH_1, GRAPH_16
+    supplies = {}
+    for bus_width, filename in ((1, GRAPH_1), (16, GRAPH_16)):
+        graph = load_routing_graph(os.path.join(graph_dirname, filename))
+        supplies[bus_width] = track_supply(graph)
+    return supplies
+
+
+def main():
+    from arch import parse_placement
+    parser = ArgumentParser("CGRA pre-flight check")
+    parser.add_argument("-i", "--input", help="Packed netlist file, " +
+                                              "e.g. harris.packed",
+                        required=True, action="store", dest="packed_filename")
+    parser.add_argument("-l", "--layout", help="CGRA layout file",
+                        required=True, action="store", dest="layout_filename")
+    parser.add_argument("-p", "--placement", help="Placement file. "
+                        "Without it only the capacity is checked",
+                        action="store", dest="placement_filename",
+                        default="")
+    parser.add_argument("-g", "--graph", help="Routing graph folder. "
+                        "Needed for the routability check",
+                        action="store", dest="graph_dirname", default="")
+    parser.add_argument("--threshold", help="Utilization of a channel that "
+                        "is reported as a hot spot", type=float,
+                        default=0.9, action="store", dest="threshold")
+    parser.add_argument("--strict", help="Fail on hot spots as well",
+                        action="store_true", dest="strict")
+    args = parser.parse_args()
+
+    layout = pythunder.io.load_layout(args.layout_filename)
+    netlist, bus = pythunder.io.load_netlist(args.packed_filename)
+    blks = get_blks(netlist)
+
+    errors = check_capacity(blks, layout)
+    warnings = []
+    if not errors and args.placement_filename:
+        placement, _ = parse_placement(args.placement_filename)
+        errors = check_placement(blks, placement, layout)
+        if not errors and args.graph_dirname:
+            supplies = load_supplies(args.graph_dirname)
+            errors, warnings = check_routability(netlist, bus, placement,
+                                                 supplies, layout.width(),
+                                                 layout.height(),
+                                                 args.threshold)
+
+    for warning in warnings:
+        print("WARN:", warning)
+    for error in errors:
+        print("ERROR:", error, file=sys.stderr)
+    if errors or (args.strict and warnings):
+        exit(1)
+    print("INFO: pre-flight check passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,8 @@ ALU_DELAY = 200
 GRAPH_16 = "16bit.graph"
 GRAPH_1 = "1bit.graph"
 
+EMPTY_TILE = ord(' ')
+
 
 def get_new_coord(x, y, side):
     # this is relative to the (x, y) itself
@@ -34,8 +36,8 @@ def get_new_coord(x, y, side):
         raise Exception(str(side) + " is not a valid side")
 
 
-def is_fu_tile(layout, x, y):
-    return layout.get_blk_type(x, y) != ' '
+def is_fu_tile(blk_types, x, y):
+    return blk_types[y][x] != EMPTY_TILE
 
 
 def build_routing_graph(routing_resource, layout):
@@ -50,8 +52,10 @@ def build_routing_graph(routing_resource, layout):
     SWITCH_ID = 0
     layout_width = layout.width()
     layout_height = layout.height()
-    clb_type = layout.get_clb_type()
+    clb_type = ord(layout.get_clb_type())
     margin = layout.get_layout_margin()[0]
+    # block type codes as nested lists, indexed by [y][x]
+    blk_types = layout.blk_type_array().tolist()
 
     sb_16 = Switch(0, 0, NUM_TRACK, 16, SWITCH_ID,
                    get_disjoint_sb_wires(NUM_TRACK))
@@ -61,7 +65,7 @@ def build_routing_graph(routing_resource, layout):
     for i in range(2):
         tiles.sort(key=lambda x: x[i])
     for x, y in tiles:
-        if not is_fu_tile(layout, x, y):
+        if not is_fu_tile(blk_types, x, y):
             continue
         # if "out" not in routing_resource[(x, y)]["port"]:
         #    continue
@@ -72,8 +76,8 @@ def build_routing_graph(routing_resource, layout):
 
     for y in range(layout_height - 1):
         for x in range(margin, layout_width - margin):
-            if (not is_fu_tile(layout, x, y)) or \
-                    (not is_fu_tile(layout, x, y + 1)):
+            if (not is_fu_tile(blk_types, x, y)) or \
+                    (not is_fu_tile(blk_types, x, y + 1)):
                 continue
             if not g_16.has_tile(x, y) or not g_16.has_tile(x, y + 1):
                 continue
@@ -91,7 +95,7 @@ def build_routing_graph(routing_resource, layout):
                                               SwitchBoxIO.SB_IN)
                     g.add_edge(sb_top, sb_bottom)
                     # also add reg as well
-                    if width == 16 and layout.get_blk_type(x, y) == clb_type:
+                    if width == 16 and blk_types[y][x] == clb_type:
                         reg1 = RegisterNode("reg_" + str(track) + "_"
                                             + str(gsv(SwitchBoxSide.Bottom)),
                                             x, y,
@@ -104,7 +108,7 @@ def build_routing_graph(routing_resource, layout):
                     sb_top.io = SwitchBoxIO.SB_IN
                     g.add_edge(sb_bottom, sb_top)
                     if width == 16 and\
-                       layout.get_blk_type(x, y + 1) == clb_type:
+                       blk_types[y + 1][x] == clb_type:
                         reg2 = RegisterNode("reg_" + str(track) + "_"
                                             + str(gsv(SwitchBoxSide.Top)),
                                             x, y + 1,
@@ -116,8 +120,8 @@ def build_routing_graph(routing_resource, layout):
     for y in range(margin, layout_height - margin):
         # connect from left to right and right to left
         for x in range(layout_width - 1):
-            if (not is_fu_tile(layout, x, y)) or \
-                    (not is_fu_tile(layout, x + 1, y)):
+            if (not is_fu_tile(blk_types, x, y)) or \
+                    (not is_fu_tile(blk_types, x + 1, y)):
                 continue
             if not g_16.has_tile(x, y) or not g_16.has_tile(x + 1, y):
                 continue
@@ -135,7 +139,7 @@ def build_routing_graph(routing_resource, layout):
                                              SwitchBoxIO.SB_IN)
                     g.add_edge(sb_left, sb_right)
                     # also add reg as well
-                    if width == 16  and layout.get_blk_type(x, y) == clb_type:
+                    if width == 16  and blk_types[y][x] == clb_type:
                         reg1 = RegisterNode("reg_" + str(track) + "_"
                                             + str(gsv(SwitchBoxSide.Right)),
                                             x, y,
@@ -149,7 +153,7 @@ def build_routing_graph(routing_resource, layout):
                     g.add_edge(sb_right, sb_left)
                     # also add reg as well
                     if width == 16 and \
-                            layout.get_blk_type(x + 1, y) == clb_type:
+                            blk_types[y][x + 1] == clb_type:
                         reg2 = RegisterNode("reg_" + str(track) + "_"
                                             + str(gsv(SwitchBoxSide.Left)),
                                             x + 1, y,
@@ -161,7 +165,7 @@ def build_routing_graph(routing_resource, layout):
         ports = routing_resource[(x, y)]["port"]
         port_io = routing_resource[(x, y)]["port_io"]
 
-        if not is_fu_tile(layout, x, y):
+        if not is_fu_tile(blk_types, x, y):
             for port in ports:
                 assert len(ports[port]) == 0
             continue
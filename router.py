@@ -10,6 +10,106 @@ from pycyclone.io import load_routing_graph
 from process_graph import GRAPH_16, GRAPH_1
 
 
+def share_routing_graph(graph):
+    """copies the routing graph into a shared memory block so that worker
+    processes can load it without each of them receiving a pickled copy.
+    returns the shared memory block and the handle to pass to
+    attach_routing_graph(). the caller owns the block and has to unlink it"""
+    from multiprocessing import shared_memory
+    data = pycyclone.io.serialize_routing_graph(graph)
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    shm.buf[:len(data)] = data
+    return shm, (shm.name, len(data))
+
+
+def attach_routing_graph(handle):
+    """loads the routing graph from a block created by
+    share_routing_graph()"""
+    from multiprocessing import shared_memory
+    name, size = handle
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        return pycyclone.io.deserialize_routing_graph(view)
+    finally:
+        view.release()
+        shm.close()
+
+
+def route_graph(handle, packed_filename, placement_filename, bus_width):
+    """routes the nets of one bus width on the routing graph shared by
+    share_routing_graph(). returns the routing result as text"""
+    import tempfile
+    graph = attach_routing_graph(handle)
+    r = GlobalRouter(40, graph)
+    setup_router_input(r, packed_filename, placement_filename, bus_width)
+    r.set_init_pn(10000)
+    r.route()
+    temp_dir = tempfile.mkdtemp()
+    route_file = os.path.join(temp_dir, "{0}.route".format(bus_width))
+    try:
+        pycyclone.io.dump_routing_result(r, route_file)
+        with open(route_file) as f:
+            return f.read()
+    finally:
+        if os.path.isfile(route_file):
+            os.remove(route_file)
+        os.rmdir(temp_dir)
+
+
+def _route_graph_worker(args):
+    return route_graph(*args)
+
+
+def route_parallel(graphs, packed_filename, placement_filename):
+    """routes every bus width of graphs in its own worker process. the
+    workers attach to a shared copy of their graph instead of loading it
+    again. returns the routing results in the order of the bus widths"""
+    import multiprocessing
+    bus_widths = sorted(graphs)
+    blocks = []
+    try:
+        args = []
+        for bus_width in bus_widths:
+            shm, handle = share_routing_graph(graphs[bus_width])
+            blocks.append(shm)
+            args.append((handle, packed_filename, placement_filename,
+                         bus_width))
+        pool = multiprocessing.Pool(len(args))
+        try:
+            return pool.map(_route_graph_worker, args)
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+
+def preflight_check(packed_filename, placement_filename, layout_filename,
+                    graphs):
+    import pythunder
+    from arch import parse_placement
+    from preflight import check_placement, check_routability, get_blks
+    from preflight import track_supply
+    layout = pythunder.io.load_layout(layout_filename)
+    netlist, bus = pythunder.io.load_netlist(packed_filename)
+    placement, _ = parse_placement(placement_filename)
+    errors = check_placement(get_blks(netlist), placement, layout)
+    warnings = []
+    if not errors:
+        supplies = {width: track_supply(graphs[width]) for width in graphs}
+        errors, warnings = check_routability(netlist, bus, placement,
+                                             supplies, layout.width(),
+                                             layout.height())
+    for warning in warnings:
+        print("WARN:", warning)
+    for error in errors:
+        print("ERROR:", error, file=sys.stderr)
+    return len(errors) == 0
+
+
 def main():
     parser = ArgumentParser("CGRA Router")
     parser.add_argument("-i", "--input", help="Packed netlist file, " +
@@ -24,6 +124,10 @@ def main():
     parser.add_argument("-p", "--placement", help="Placement file",
                         required=True, action="store",
                         dest="placement_filename")
+    parser.add_argument("-l", "--layout", help="CGRA layout file. When "
+                        "given, the placement is checked for routability "
+                        "before routing", action="store",
+                        dest="layout_filename", default="")
 
     args = parser.parse_args()
 
@@ -39,6 +143,28 @@ def main():
     g_1 = load_routing_graph(g1_filename)
     g_16 = load_routing_graph(g16_filename)
 
+    if args.layout_filename:
+        # refuse a hopeless design instead of running all the iterations
+        if not preflight_check(packed_filename, placement_filename,
+                               args.layout_filename, {1: g_1, 16: g_16}):
+            exit(1)
+
+    if os.path.isfile(route_file):
+        print("removing existing", route_file)
+        os.remove(route_file)
+
+    # route these nets
+    print("start routing")
+    if sys.version_info >= (3, 8):
+        # 1-bit and 16-bit nets are routed at the same time
+        results = route_parallel({1: g_1, 16: g_16}, packed_filename,
+                                 placement_filename)
+        print("saving result to", route_file)
+        with open(route_file, "w+") as f:
+            for result in results:
+                f.write(result)
+        return
+
     r_1 = GlobalRouter(40, g_1)
     r_16 = GlobalRouter(40, g_16)
 
@@ -49,14 +175,9 @@ def main():
     r_1.set_init_pn(10000)
     r_16.set_init_pn(10000)
 
-    # route these nets
-    print("start routing")
     r_1.route()
     r_16.route()
 
-    if os.path.isfile(route_file):
-        print("removing existing", route_file)
-        os.remove(route_file)
     print("saving result to", route_file)
     pycyclone.io.dump_routing_result(r_1, route_file)
     pycyclone.io.dump_routing_result(r_16, route_file)
@@ -0,0 +1,111 @@
+from __future__ import division
+import json
+import math
+import os
+
+
+FEATURES = ("blocks", "nets", "pins", "cells", "fold_reg")
+
+# fitted on local annealing runs: log(runtime) grows with log(blocks) and
+# log(pins), the other features start at 0 until there is telemetry. the
+# same form is used by cluster_cost() in thunder/src/multi_place.cc
+DEFAULT_COEFFICIENTS = [-8.0, 0.75, 0.0, 0.85, 0.0, 0.0]
+
+
+# read when no model is configured, but never written to
+DEFAULT_MODEL_PATH = os.path.join(os.path.expanduser("~"), ".cache",
+                                  "cgra_pnr", "runtime_model.json")
+
+
+def load_runtime_model(filename=""):
+    """the model kept in filename, or in PLACER_RUNTIME_MODEL if it's not
+    given. only a configured model is updated with new runs, without one the
+    default model is read if it exists and never saved"""
+    filename = filename or os.environ.get("PLACER_RUNTIME_MODEL", "")
+    if filename:
+        return RuntimeModel(filename)
+    return RuntimeModel(DEFAULT_MODEL_PATH, read_only=True)
+
+
+def placement_features(args):
+    """cheap features of a detailed placement job, args is the same dict
+    passed to detailed_placement_thunder"""
+    netlist = args["new_netlist"]
+    cells = args["cells"]
+    return {"blocks": len(args["clusters"]),
+            "nets": len(netlist),
+            "pins": sum(len(netlist[net_id]) for net_id in netlist),
+            "cells": sum(len(cells[blk_type]) for blk_type in cells),
+            "fold_reg": bool(args["fold_reg"])}
+
+
+def feature_vector(features):
+    return [1.0,
+            math.log(max(features["blocks"], 1)),
+            math.log(features["nets"] + 1),
+            math.log(features["pins"] + 1),
+            math.log(features["cells"] + 1),
+            1.0 if features["fold_reg"] else 0.0]
+
+
+class RuntimeModel(object):
+    """predicts the annealing time of a cluster in seconds. the model is
+    linear in log space and is calibrated against the runtimes of past runs,
+    which are kept in a json file. the fit is pulled towards the default
+    coefficients, so a handful of samples doesn't throw it off"""
+    def __init__(self, filename=None, max_samples=1000, prior_weight=4.0,
+                 read_only=False):
+        self.filename = filename
+        self.read_only = read_only
+        self.max_samples = max_samples
+        self.prior_weight = prior_weight
+        self.samples = []
+        self.coefficients = list(DEFAULT_COEFFICIENTS)
+        if filename and os.path.isfile(filename):
+            try:
+                with open(filename) as f:
+                    self.samples = json.load(f)["samples"]
+            except (ValueError, KeyError):
+                print("WARNING: ignoring corrupted runtime model", filename)
+                self.samples = []
+            self.fit()
+
+    def predict(self, features):
+        x = feature_vector(features)
+        return math.exp(sum(c * v for c, v in zip(self.coefficients, x)))
+
+    def record(self, features, runtime):
+        if runtime <= 0:
+            return
+        sample = dict(features)
+        sample["runtime"] = runtime
+        self.samples.append(sample)
+        # keep the recent runs only, the machine and the placer both change
+        self.samples = self.samples[-self.max_samples:]
+
+    def fit(self):
+        # not needed on the lambda side, which only runs the placement
+        import numpy as np
+        prior = np.array(DEFAULT_COEFFICIENTS)
+        if not self.samples:
+            self.coefficients = list(DEFAULT_COEFFICIENTS)
+            return
+        x = np.array([feature_vector(s) for s in self.samples])
+        y = np.log([s["runtime"] for s in self.samples])
+        # ridge regression around the prior
+        reg = self.prior_weight * np.eye(len(prior))
+        a = x.T.dot(x) + reg
+        b = x.T.dot(y) + reg.dot(prior)
+        self.coefficients = np.linalg.solve(a, b).tolist()
+
+    def save(self):
+        if not self.filename or self.read_only:
+            return
+        dirname = os.path.dirname(self.filename)
+        if dirname and not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        # write then rename so that concurrent runs never see half a file
+        tmp_filename = self.filename + ".tmp" + str(os.getpid())
+        with open(tmp_filename, "w") as f:
+            json.dump({"features": FEATURES, "samples": self.samples}, f)
+        os.rename(tmp_filename, self.filename)
@@ -38,6 +38,7 @@ cp ${temp_cmake} ${thunder_cmake}
 cp -r ${ROOTDIR}/arch ${DST_DIR}/
 cp ${ROOTDIR}/place.py ${DST_DIR}/
 cp ${ROOTDIR}/util.py ${DST_DIR}/
+cp ${ROOTDIR}/runtime_model.py ${DST_DIR}/
 
 pushd ${DST_DIR}
 touch serverless.yml
@@ -0,0 +1,40 @@
+import pythunder
+
+
+def compute_hpwl(netlist, placement):
+    hpwl = 0
+    for net in netlist.values():
+        xs = [placement[blk][0] for blk in net]
+        ys = [placement[blk][1] for blk in net]
+        hpwl += max(xs) - min(xs) + max(ys) - min(ys)
+    return hpwl
+
+
+def chain_netlist(blks):
+    """every block drives the next one"""
+    netlist = {}
+    for i in range(len(blks) - 1):
+        netlist["e" + str(i)] = [blks[i], blks[i + 1]]
+    return netlist
+
+
+def make_cells(width, height=None):
+    """every position of a width x height array is legal for PEs and
+    registers"""
+    if height is None:
+        height = width
+    pos = [(x, y) for x in range(width) for y in range(height)]
+    return {"p": pos, "r": pos}
+
+
+def make_layout(width, height=None):
+    """a PE only layout"""
+    if height is None:
+        height = width
+    return pythunder.Layout([["p"] * width for _ in range(height)])
+
+
+def make_placer(blks, netlist, cells, seed=0, fold_reg=False):
+    placer = pythunder.DetailedPlacer(blks, netlist, cells, {}, "p", fold_reg)
+    placer.set_seed(seed)
+    return placer
@@ -0,0 +1,92 @@
+import pythunder
+from conftest import chain_netlist, make_cells, make_placer
+
+
+def make_chain_placer():
+    # a chain of blocks on a small array
+    blks = ["p" + str(i) for i in range(16)]
+    return make_placer(blks, chain_netlist(blks), make_cells(6))
+
+
+def test_anneal_frozen():
+    placer = make_chain_placer()
+    placer.anneal()
+    stats = placer.anneal_stats()
+    assert stats.stop_reason == pythunder.AnnealStop.Frozen
+    assert 0 < stats.accepted < stats.moves
+    assert stats.final_energy <= stats.initial_energy
+
+    # the full schedule only runs when the tests are disabled
+    placer = make_chain_placer()
+    placer.min_accept_rate = 0
+    placer.anneal()
+    full = placer.anneal_stats()
+    assert full.stop_reason == pythunder.AnnealStop.Schedule
+    assert full.iterations > stats.iterations
+
+
+def test_anneal_budget():
+    placer = make_chain_placer()
+    placer.max_moves = 1000
+    placer.anneal()
+    stats = placer.anneal_stats()
+    assert stats.stop_reason == pythunder.AnnealStop.MoveBudget
+    assert stats.moves >= 1000
+
+    placer.refine(100, 0.001, False)
+    assert placer.anneal_stats().stop_reason in \
+        {pythunder.AnnealStop.Converged, pythunder.AnnealStop.MoveBudget}
+
+
+def test_anneal_telemetry():
+    placer = make_chain_placer()
+    calls = []
+    placer.set_telemetry_callback(lambda t: calls.append(t), 5)
+    placer.anneal()
+    telemetry = placer.telemetry()
+    num_iter = placer.anneal_stats().iterations
+    for name in ["temperature", "accept_rate", "energy", "d_limit",
+                 "moves_per_sec", "elapsed"]:
+        assert telemetry[name].shape == (num_iter,)
+    # cooling down
+    assert telemetry["temperature"][0] > telemetry["temperature"][-1]
+    assert (telemetry["accept_rate"] <= 1).all()
+    assert telemetry["energy"][-1] == placer.anneal_stats().final_energy
+    # every 5 iterations plus the last one
+    assert len(calls) == num_iter // 5 + (num_iter % 5 != 0)
+    assert len(calls[0]["energy"]) == 5
+    assert len(calls[-1]["energy"]) == num_iter
+
+    # the callback can be removed
+    placer = make_chain_placer()
+    placer.set_telemetry_callback(None)
+    placer.anneal()
+    assert len(placer.telemetry()["energy"]) > 0
+
+
+def test_anneal_tempering():
+    placer = make_chain_placer()
+    placer.min_accept_rate = 0
+    placer.anneal()
+    single = placer.anneal_stats()
+
+    placer = make_chain_placer()
+    placer.min_accept_rate = 0
+    placer.num_replicas = 4
+    placer.anneal()
+    stats = placer.anneal_stats()
+    # same schedule, every replica moves at every temperature
+    assert stats.iterations == single.iterations
+    assert stats.moves == 4 * single.moves
+    assert stats.exchanges > 0
+    assert stats.final_energy <= stats.initial_energy
+    assert placer.telemetry()["energy"][-1] >= stats.final_energy
+    result = placer.realize()
+    assert len(set(result.values())) == len(result)
+
+    # deterministic for a given seed
+    other = make_chain_placer()
+    other.min_accept_rate = 0
+    other.num_replicas = 4
+    other.anneal()
+    assert other.realize() == result
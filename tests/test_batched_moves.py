@@ -0,0 +1,44 @@
+from conftest import compute_hpwl, make_cells, make_placer
+
+
+def make_mesh_placer(seed, batch_size):
+    # a 6x6 mesh of blocks on a slightly larger array
+    blks = ["p{0}".format(i) for i in range(36)]
+    netlist = {}
+    for i in range(36):
+        x, y = i % 6, i // 6
+        if x < 5:
+            netlist["h" + str(i)] = [blks[i], blks[i + 1]]
+        if y < 5:
+            netlist["v" + str(i)] = [blks[i], blks[i + 6]]
+    placer = make_placer(blks, netlist, make_cells(8), seed)
+    placer.batch_size = batch_size
+    # the same schedule for both modes
+    placer.min_accept_rate = 0
+    return placer, netlist
+
+
+def run(batch_size, num_seeds=12):
+    energies = []
+    for seed in range(num_seeds):
+        placer, netlist = make_mesh_placer(seed, batch_size)
+        placer.anneal()
+        result = placer.realize()
+        assert len(set(result.values())) == len(result)
+        # the incremental energy matches the placement
+        assert placer.anneal_stats().final_energy == \
+            compute_hpwl(netlist, result)
+        energies.append(placer.telemetry()["energy"])
+    num_iter = min(len(e) for e in energies)
+    return [sum(e[i] for e in energies) / num_seeds for i in range(num_iter)]
+
+
+def test_batched_moves():
+    sequential = run(1)
+    batched = run(8)
+    assert len(sequential) == len(batched)
+    # the mean energy trajectory follows the sequential one
+    diff = [abs(seq - batch) / seq for seq, batch in zip(sequential, batched)]
+    assert sum(diff) / len(diff) <= 0.05
+    assert max(diff) <= 0.15
+    assert batched[-1] <= 1.1 * sequential[-1]
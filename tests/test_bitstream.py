@@ -0,0 +1,174 @@
+import json
+import os
+import tempfile
+import arch.cgra
+from arch import parse_cgra, parse_routing_columnar
+from arch.cgra import generate_bitstream, save_placement, BSB_INDEX_SUFFIX
+from arch.cgra import iter_routing
+
+
+# I0 -> p1 -> p2 -> p3 -> p4 -> I5 on a 4x4 board, IO tiles on the first row
+ID_TO_NAME = {"I0": "io16in_in_0", "p1": "add_1", "p2": "add_2",
+              "p3": "add_3", "p4": "add_4", "I5": "io16_out_0"}
+CHAIN = ["I0", "p1", "p2", "p3", "p4", "I5"]
+SIZE = 4
+
+
+def write_board(filename):
+    lines = ["<CGRA>"]
+    for y in range(SIZE):
+        for x in range(SIZE):
+            addr = "0x{:04X}".format(y * SIZE + x)
+            if y == 0:
+                lines.append('<tile type="io1bit" col="{}" row="{}" '
+                             'tile_addr="{}" name="pad_{}">'
+                             '<p2f_wide/><io_bit>{}</io_bit></tile>'
+                             .format(x, y, addr, x, x))
+            else:
+                lines.append('<tile type="pe_tile_new" col="{}" row="{}" '
+                             'tile_addr="{}"/>'.format(x, y, addr))
+    lines.append("</CGRA>")
+    with open(filename, "w") as f:
+        f.write("\n".join(lines))
+
+
+def write_netlist(filename):
+    instances = {ID_TO_NAME["I0"]: {"genref": "cgralib.IO"},
+                 ID_TO_NAME["I5"]: {"genref": "cgralib.IO"}}
+    connections = []
+    for blk_id in CHAIN[1:-1]:
+        instances[ID_TO_NAME[blk_id]] = {"genref": "cgralib.PE",
+                                         "genargs": {"op_kind":
+                                                     ["String", "alu"]},
+                                         "modargs": {"alu_op":
+                                                     ["String", "add"]}}
+    for src, dst in zip(CHAIN, CHAIN[1:]):
+        src_port = "out" if src[0] == "I" else "data.out"
+        dst_ports = ["in"] if dst[0] == "I" else ["data.in.0", "data.in.1"]
+        for port in dst_ports:
+            connections.append([ID_TO_NAME[src] + "." + src_port,
+                                ID_TO_NAME[dst] + "." + port])
+    design = {"top": "global.top",
+              "namespaces": {"global": {"modules": {"top": {
+                  "instances": instances, "connections": connections}}}}}
+    with open(filename, "w") as f:
+        json.dump(design, f)
+
+
+def write_packed(filename):
+    lines = ["Netlists:"]
+    for i, (src, dst) in enumerate(zip(CHAIN, CHAIN[1:])):
+        lines.append("e{}: ({}, out)\t({}, data0)".format(i, src, dst))
+    lines += ["", "Folded Blocks:", "", "ID to Names:"]
+    for blk_id in CHAIN:
+        lines.append("{}: {}".format(blk_id, ID_TO_NAME[blk_id]))
+    lines += ["", "Changed to PE:", "", "Netlist Bus:"]
+    for i in range(len(CHAIN) - 1):
+        lines.append("e{}: 16".format(i))
+    with open(filename, "w") as f:
+        f.write("\n".join(lines + ["", ""]))
+
+
+def write_route(filename, placement, tracks):
+    """one segment per net, coming into the sink from the south"""
+    lines = []
+    for i, (src, dst) in enumerate(zip(CHAIN, CHAIN[1:])):
+        sx, sy = placement[src]
+        dx, dy = placement[dst]
+        lines += ["Net ID: e{} Segment Size: 1".format(i),
+                  "Segment: 0 Size: 3",
+                  "PORT out ({}, {}, 16)".format(sx, sy),
+                  "SB ({}, {}, {}, 1, 0, 16)".format(tracks[i], dx, dy),
+                  "PORT data0 ({}, {}, 16)".format(dx, dy), ""]
+    with open(filename, "w") as f:
+        f.write("\n".join(lines + [""]))
+
+
+def run(temp, placement, tracks, output, incremental, num_workers=1):
+    files = {name: os.path.join(temp, name) for name in
+             ["design.xml", "design.json", "design.packed", "design.place",
+              "design.route", "io.json"]}
+    write_board(files["design.xml"])
+    write_netlist(files["design.json"])
+    write_packed(files["design.packed"])
+    save_placement(placement, ID_TO_NAME, None, files["design.place"])
+    write_route(files["design.route"], placement, tracks)
+    generate_bitstream(files["design.xml"], files["design.json"],
+                       files["design.packed"], files["design.place"],
+                       files["design.route"], output, files["io.json"],
+                       num_workers=num_workers, incremental=incremental)
+    with open(output, "rb") as f:
+        return f.read()
+
+
+def check_index(output, data):
+    with open(output + BSB_INDEX_SUFFIX) as f:
+        index = json.load(f)
+    assert index["size"] == len(data)
+    assert len(index["tiles"]) == 4 and len(index["nets"]) == 5
+    for blk_id, (_, _, tile, _, offset, length) in index["tiles"].items():
+        line = data[offset:offset + length].decode()
+        assert line.startswith("Tx{:04X}_add".format(tile))
+        assert line.endswith("# " + ID_TO_NAME[blk_id] + "\n")
+    for net_id, (_, offset, length) in index["nets"].items():
+        chunk = data[offset:offset + length].decode()
+        assert chunk.startswith("\n# net id: {}\n".format(net_id))
+
+
+PLACEMENT = {"I0": (0, 0), "p1": (0, 1), "p2": (1, 1), "p3": (2, 1),
+             "p4": (3, 1), "I5": (3, 0)}
+
+
+def test_parallel_routing(monkeypatch):
+    # every net gets its own worker
+    monkeypatch.setattr(arch.cgra, "ROUTING_NETS_PER_WORKER", 1)
+    tracks = [0, 1, 2, 3, 4]
+    with tempfile.TemporaryDirectory() as temp:
+        board = os.path.join(temp, "design.xml")
+        route = os.path.join(temp, "design.route")
+        write_board(board)
+        write_route(route, PLACEMENT, tracks)
+        layout, _, tile_mapping = parse_cgra(board, True)["CGRA"]
+        routes = parse_routing_columnar(route)
+        serial = list(iter_routing(routes, tile_mapping, layout, 1))
+        assert len(serial) == 5
+        assert list(iter_routing(routes, tile_mapping, layout, 2)) == serial
+        assert list(iter_routing(routes, tile_mapping, layout, 2,
+                                 {1, 3, 4})) == \
+            [serial[1], serial[3], serial[4]]
+
+        # the streamed bitstream doesn't depend on the number of workers
+        output = os.path.join(temp, "design.bsb")
+        assert run(temp, PLACEMENT, tracks, output, False, 2) == \
+            run(temp, PLACEMENT, tracks, output, False, 1)
+
+
+def test_incremental_bitstream(capsys):
+    placement = dict(PLACEMENT)
+    tracks = [0, 0, 0, 0, 0]
+    with tempfile.TemporaryDirectory() as temp:
+        output = os.path.join(temp, "design.bsb")
+        full_output = os.path.join(temp, "full.bsb")
+        old = run(temp, placement, tracks, output, True)
+        check_index(output, old)
+
+        # move p2 and reroute one of its nets on another track
+        placement["p2"] = (1, 2)
+        tracks[1] = 3
+        capsys.readouterr()
+        new = run(temp, placement, tracks, output, True)
+        assert "regenerating 2 out of 5 nets" in capsys.readouterr().out
+        assert new != old
+        assert new == run(temp, placement, tracks, full_output, False)
+        check_index(output, new)
+        # only incremental runs keep an index
+        assert not os.path.isfile(full_output + BSB_INDEX_SUFFIX)
+
+        # a corrupted index falls back to a full regeneration
+        with open(output + BSB_INDEX_SUFFIX, "w") as f:
+            f.write("{\"version\": ")
+        assert run(temp, placement, tracks, output, True) == new
+        check_index(output, new)
+        # and a full regeneration drops the stale index
+        run(temp, placement, tracks, output, False)
+        assert not os.path.isfile(output + BSB_INDEX_SUFFIX)
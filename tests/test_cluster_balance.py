@@ -0,0 +1,49 @@
+import pythunder
+
+
+def make_uneven_clusters():
+    # one long chain and a few tiny clusters hanging off it
+    netlist = {}
+    chain = ["p" + str(i) for i in range(200)]
+    for i in range(len(chain) - 1):
+        netlist["e" + str(i)] = [chain[i], chain[i + 1]]
+    clusters = {0: set(chain)}
+    for c_id in range(1, 8):
+        blks = ["q{0}_{1}".format(c_id, i) for i in range(3)]
+        clusters[c_id] = set(blks)
+        netlist["f" + str(c_id)] = blks + [chain[c_id * 20]]
+    return clusters, netlist
+
+
+def test_balance_clusters():
+    clusters, netlist = make_uneven_clusters()
+    num_threads = 8
+    result = pythunder.util.balance_clusters(clusters, netlist, num_threads)
+    # every block is kept exactly once
+    blks = [blk for c_id in result for blk in result[c_id]]
+    assert len(blks) == len(set(blks))
+    assert set(blks) == set().union(*clusters.values())
+    # within the size band
+    target = len(blks) / max(num_threads, len(clusters))
+    for c_id in result:
+        assert target * 0.25 <= len(result[c_id]) <= target * 1.5
+    # deterministic
+    assert result == pythunder.util.balance_clusters(clusters, netlist,
+                                                     num_threads)
+
+    before = pythunder.util.parallel_efficiency(clusters, netlist,
+                                                num_threads)
+    after = pythunder.util.parallel_efficiency(result, netlist, num_threads)
+    assert after > before
+
+
+def test_parallel_efficiency_cost():
+    # two clusters on two threads, the cost is the one multi_place schedules
+    # with: blocks^0.75 x (pins + 1)^0.85 over the nets of the cluster
+    clusters = {0: {"p0", "p1", "p2", "p3"}, 1: {"p4", "p5"}}
+    netlist = {"e0": ["p0", "p1"], "e1": ["p2", "p3", "p4"],
+               "e2": ["p4", "p5"]}
+    costs = [4 ** 0.75 * (5 + 1) ** 0.85, 2 ** 0.75 * (5 + 1) ** 0.85]
+    expected = sum(costs) / (2 * max(costs))
+    efficiency = pythunder.util.parallel_efficiency(clusters, netlist, 2)
+    assert abs(efficiency - expected) < 1e-9
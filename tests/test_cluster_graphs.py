@@ -0,0 +1,18 @@
+import pythunder
+
+
+def test_reduce_cluster_graphs():
+    clusters = {"x0": {"p0", "p1"}, "x1": {"p2", "p3"}, "x2": {"p4"}}
+    fixed = {"i0": (0, 0)}
+    netlist = {"e0": ["i0", "p0"], "e1": ["p1", "p2", "p4"],
+               "e2": ["p2", "p3"], "e3": ["p3", "i0"]}
+    result = pythunder.util.reduce_cluster_graphs(netlist, clusters, fixed)
+    assert result["x0"] == {"e0": ["i0", "p0"], "e1": ["p1", "x1", "x2"]}
+    assert result["x1"] == {"e1": ["x0", "p2", "x2"], "e2": ["p2", "p3"],
+                            "e3": ["p3", "i0"]}
+    assert result["x2"] == {"e1": ["x0", "x1", "p4"]}
+    for c_id, cluster_netlist in result.items():
+        full = pythunder.util.reduce_cluster_graph(netlist, clusters, fixed,
+                                                   c_id)
+        assert cluster_netlist == {net_id: full[net_id]
+                                   for net_id in cluster_netlist}
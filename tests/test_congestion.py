@@ -0,0 +1,65 @@
+import pythunder
+from conftest import compute_hpwl, make_cells, make_layout, make_placer
+
+
+def test_rudy_map():
+    rudy = pythunder.RudyMap(8, 8, 1)
+    # a 4 x 2 box spreads 6 tracks over 8 tiles
+    assert rudy.update(0, 3, 0, 1) == 0
+    assert rudy.demand(0, 0) == 0.75
+    assert rudy.demand(4, 0) == 0
+    rudy.update(0, 1, 0, 1)
+    assert rudy.demand(0, 0) == 1.75
+    assert rudy.overflow() == 4 * 0.75
+    assert rudy.demand_array().shape == (8, 8)
+    # removing a net undoes it exactly
+    assert rudy.update(0, 1, 0, 1, -1) == -3
+    assert rudy.overflow() == 0
+    assert rudy.max_demand() == 0.75
+
+
+def make_design():
+    # pairs of blocks that would all like to sit in the same spot
+    netlist = {}
+    blks = []
+    for i in range(8):
+        a, b = "p" + str(2 * i), "p" + str(2 * i + 1)
+        netlist["e" + str(i)] = [a, b]
+        blks += [a, b]
+    return blks, netlist, make_cells(6)
+
+
+def test_congestion_weight():
+    blks, netlist, cells = make_design()
+    overflow = {}
+    for weight in [0, 4]:
+        placer = make_placer(blks, netlist, cells)
+        placer.congestion_weight = weight
+        placer.congestion_capacity = 1
+        placer.anneal()
+        result = placer.realize()
+        rudy = pythunder.RudyMap(6, 6, 1)
+        rudy.add_nets(netlist, result)
+        overflow[weight] = rudy.overflow()
+        # the incremental cost matches the placement
+        assert placer.anneal_stats().final_energy == \
+            compute_hpwl(netlist, result) + weight * rudy.overflow()
+    assert overflow[4] <= overflow[0]
+
+
+def test_refine_global_congestion():
+    blks, netlist, _ = make_design()
+    placement = {blk: (i % 4, i // 4) for i, blk in enumerate(blks)}
+    layout = make_layout(6)
+    result = pythunder.refine_global(placement, netlist, {}, layout, False,
+                                     num_threads=2, window_size=6,
+                                     congestion_weight=4,
+                                     congestion_capacity=1)
+    assert set(result) == set(placement)
+    assert len(set(result.values())) == len(result)
+    rudy = pythunder.RudyMap(6, 6, 1)
+    rudy.add_nets(netlist, placement)
+    before = compute_hpwl(netlist, placement) + 4 * rudy.overflow()
+    rudy = pythunder.RudyMap(6, 6, 1)
+    rudy.add_nets(netlist, result)
+    assert compute_hpwl(netlist, result) + 4 * rudy.overflow() <= before
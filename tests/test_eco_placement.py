@@ -0,0 +1,41 @@
+import pythunder
+from conftest import chain_netlist, make_layout
+
+
+def make_design():
+    # a chain of blocks laid out row by row, the last block is new
+    blks = ["p" + str(i) for i in range(20)]
+    netlist = chain_netlist(blks)
+    prev = {}
+    for i in range(len(blks) - 1):
+        prev[blks[i]] = (i % 8, i // 8)
+    layout = make_layout(8)
+    return netlist, prev, layout
+
+
+def test_eco_placement():
+    netlist, prev, layout = make_design()
+    # nothing changed
+    full = dict(prev)
+    full["p19"] = (3, 2)
+    assert pythunder.eco_placement(full, netlist, {}, layout, False) == full
+
+    result = pythunder.eco_placement(prev, netlist, {}, layout, False,
+                                     window_radius=1)
+    assert len(result) == 20
+    assert len(set(result.values())) == 20
+    # inserted next to the block it connects to
+    x, y = result["p19"]
+    assert abs(x - result["p18"][0]) + abs(y - result["p18"][1]) <= 2
+    # blocks far from the edit are not touched
+    for i in range(8):
+        assert result["p" + str(i)] == prev["p" + str(i)]
+
+
+def test_match_placement():
+    prev = {"p0": (1, 1), "p1": (2, 2), "p2": (3, 3)}
+    prev_names = {"p0": "a", "p1": "b", "p2": "c"}
+    # b got removed and the packer renumbered c
+    names = {"p0": "a", "p1": "c", "p2": "d"}
+    result = pythunder.match_placement(prev, prev_names, names)
+    assert result == {"p0": (1, 1), "p1": (3, 3)}
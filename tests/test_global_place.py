@@ -0,0 +1,114 @@
+import pythunder
+from arch.arch import get_layout
+
+
+def make_board(size, memory_repeat=8):
+    # IO tiles on the top and bottom rows, memory columns in between
+    board = []
+    for y in range(size):
+        row = []
+        for x in range(size):
+            if y == 0 or y == size - 1:
+                row.append("i" if x % 2 == 1 else None)
+            elif x % memory_repeat == memory_repeat - 1:
+                row.append("m")
+            else:
+                row.append("p")
+        board.append(row)
+    return get_layout(board)
+
+
+def make_design(layout, width, height, tile=3):
+    """a width x height grid of blocks connected to their right and bottom
+    neighbors, cut into tile x tile clusters. some of them are memories"""
+    blks = {}
+    clusters = {}
+    for y in range(height):
+        for x in range(width):
+            blk_type = "m" if x % 7 == 3 and y % 3 == 0 else "p"
+            blk = blk_type + str(y * width + x)
+            blks[(x, y)] = blk
+            c_id = "x{0}_{1}".format(x // tile, y // tile)
+            clusters.setdefault(c_id, set()).add(blk)
+    netlist = {}
+    for (x, y), blk in blks.items():
+        sinks = [blks[pos] for pos in [(x + 1, y), (x, y + 1)]
+                 if pos in blks]
+        if sinks:
+            netlist["e" + blk[1:]] = [blk] + sinks
+    # IOs drive the first row
+    fixed_pos = {}
+    io_pos = layout.get_layer("i").produce_available_pos()
+    for x in range(min(width, len(io_pos))):
+        blk = "i" + str(x)
+        fixed_pos[blk] = io_pos[x]
+        netlist["io" + str(x)] = [blk, blks[(x, 0)]]
+    return clusters, netlist, fixed_pos
+
+
+def global_place(clusters, netlist, fixed_pos, layout, seed=0,
+                 multilevel=False):
+    gp = pythunder.GlobalPlacer(clusters, netlist, fixed_pos, layout)
+    gp.set_seed(seed)
+    gp.set_num_threads(1)
+    if multilevel:
+        gp.solve_multilevel()
+    else:
+        gp.solve()
+    return gp.realize()
+
+
+def check_legal(layout, clusters, netlist, fixed_pos, gp_result):
+    # clusters never share a cell
+    assert set(gp_result) == set(clusters)
+    used = {}
+    for c_id, cells in gp_result.items():
+        blk_types = set(blk[0] for blk in clusters[c_id])
+        for blk_type in blk_types:
+            assert len(cells[blk_type]) >= \
+                sum(blk[0] == blk_type for blk in clusters[c_id])
+        for blk_type, positions in cells.items():
+            # registers share the PE cells
+            if blk_type == "r":
+                assert positions == cells["p"]
+                continue
+            for x, y in positions:
+                assert layout.get_blk_type(x, y) == blk_type
+                assert used.setdefault((x, y), c_id) == c_id
+    assert not set(used) & set(fixed_pos.values())
+
+    # every block gets exactly one cell of its type
+    placement = pythunder.detailed_placement(clusters, netlist, fixed_pos,
+                                             gp_result, layout,
+                                             num_threads=1)
+    blks = set().union(*clusters.values())
+    assert blks <= set(placement)
+    assert len(set(placement[blk] for blk in blks)) == len(blks)
+    for blk in blks:
+        x, y = placement[blk]
+        assert layout.get_blk_type(x, y) == blk[0]
+        assert placement[blk] in gp_result[
+            next(c for c in clusters if blk in clusters[c])][blk[0]]
+
+
+def test_global_legalizer():
+    layout = make_board(24)
+    clusters, netlist, fixed_pos = make_design(layout, 18, 12)
+    assert len(clusters) > 16
+    # no annealing, the boxes still overlap a lot
+    gp_result = global_place(clusters, netlist, fixed_pos, layout, seed=1)
+    check_legal(layout, clusters, netlist, fixed_pos, gp_result)
+    assert gp_result == global_place(clusters, netlist, fixed_pos, layout,
+                                     seed=1)
+
+
+def test_multilevel_global_place(capfd):
+    layout = make_board(24)
+    clusters, netlist, fixed_pos = make_design(layout, 18, 12)
+    # more clusters than the coarsest level, so they get merged and
+    # interpolated back
+    assert len(clusters) > 16
+    gp_result = global_place(clusters, netlist, fixed_pos, layout,
+                             multilevel=True)
+    assert "Multilevel global placement with" in capfd.readouterr().out
+    check_legal(layout, clusters, netlist, fixed_pos, gp_result)
@@ -0,0 +1,29 @@
+import pythunder
+from arch.arch import layer_positions
+
+
+def make_layout():
+    layout = pythunder.Layout([list("ipppi"), list("pmpmp"), list("ipppi")])
+    io_layer = pythunder.Layer("I", 5, 3)
+    for pos in [(0, 0), (4, 0), (0, 2)]:
+        io_layer.mark_available(*pos)
+    layout.add_layer(io_layer)
+    return layout
+
+
+def test_layout_arrays():
+    layout = make_layout()
+    available = layout.produce_available_pos()
+    for blk_type in layout.get_layer_types():
+        layer = layout.get_layer(blk_type)
+        positions = layer.produce_available_pos()
+        assert layer_positions(layer) == positions
+        mask = layout.layer_mask_array(blk_type)
+        assert (mask == layer.mask_array()).all()
+        assert mask.sum() == len(positions)
+        for x, y in positions:
+            assert mask[y, x] and layer[x, y]
+        pos_array = layout.available_pos_array(blk_type)
+        assert [tuple(pos) for pos in pos_array.tolist()] == \
+            available[blk_type]
+    assert len(layout.available_pos_array("x")) == 0
@@ -0,0 +1,86 @@
+import os
+import pickle
+import tempfile
+import pythunder
+import pycyclone
+from pycyclone.io import dump_routing_graph, load_routing_graph
+from pycyclone.io import dump_routing_result, setup_router_input
+from router import route_parallel
+
+
+test_dir = os.path.dirname(os.path.abspath(__file__))
+vectors_dir = os.path.join(test_dir, "vectors")
+
+
+def test_layout_pickle():
+    layout = pythunder.io.load_layout(os.path.join(vectors_dir, "harris",
+                                                   "design.layout"))
+    new_layout = pickle.loads(pickle.dumps(layout))
+    assert repr(new_layout) == repr(layout)
+    assert (new_layout.blk_type_array() == layout.blk_type_array()).all()
+    assert new_layout.produce_available_pos() == \
+        layout.produce_available_pos()
+
+
+def test_routing_graph_pickle():
+    graph_file = os.path.join(vectors_dir, "harris", "16.graph")
+    graph = load_routing_graph(graph_file)
+    data = pycyclone.io.serialize_routing_graph(graph)
+    graphs = [graph, pickle.loads(pickle.dumps(graph)),
+              pycyclone.io.deserialize_routing_graph(memoryview(data))]
+    dumps = []
+    with tempfile.TemporaryDirectory() as temp:
+        for index, g in enumerate(graphs):
+            filename = os.path.join(temp, "{0}.graph".format(index))
+            dump_routing_graph(g, filename)
+            with open(filename) as f:
+                dumps.append(f.read())
+    assert dumps[0] == dumps[1] == dumps[2]
+
+
+PACKED = """Netlists:
+e0: (p0, alu_res)\t(p1, data0)
+e1: (p1, alu_res)\t(p2, data0)
+
+ID to Names:
+p0: add0
+p1: add1
+p2: add2
+
+Netlist Bus:
+e0: 16
+e1: 16
+"""
+
+PLACEMENT = """Block Name\t\t\tX\tY\t\t#Block ID
+---------------------------
+add0\t\t9\t4\t\t#p0
+add1\t\t10\t4\t\t#p1
+add2\t\t10\t7\t\t#p2
+"""
+
+
+def test_route_shared_graph():
+    graph_file = os.path.join(vectors_dir, "harris", "16.graph")
+    with tempfile.TemporaryDirectory() as temp:
+        packed_file = os.path.join(temp, "design.packed")
+        placement_file = os.path.join(temp, "design.place")
+        route_file = os.path.join(temp, "design.route")
+        with open(packed_file, "w") as f:
+            f.write(PACKED)
+        with open(placement_file, "w") as f:
+            f.write(PLACEMENT)
+
+        # the worker routes from the shared graph
+        results = route_parallel({16: load_routing_graph(graph_file)},
+                                 packed_file, placement_file)
+
+        r = pycyclone.GlobalRouter(40, load_routing_graph(graph_file))
+        setup_router_input(r, packed_file, placement_file, 16)
+        r.set_init_pn(10000)
+        r.route()
+        dump_routing_result(r, route_file)
+        with open(route_file) as f:
+            expected = f.read()
+    assert "Net ID: e1" in expected
+    assert results == [expected]
@@ -0,0 +1,44 @@
+import os
+import tempfile
+import pythunder
+
+
+def make_netlist():
+    netlist = {}
+    for i in range(20):
+        netlist["e" + str(i)] = ["p" + str(i), "p" + str(i + 1),
+                                 "r" + str(i)]
+    return netlist
+
+
+def test_netlist_hash():
+    netlist = make_netlist()
+    netlist_hash = pythunder.graph.netlist_hash(netlist)
+    assert pythunder.graph.netlist_hash(make_netlist()) == netlist_hash
+    netlist["e3"] = ["p3", "p5", "r3"]
+    assert pythunder.graph.netlist_hash(netlist) != netlist_hash
+
+
+def test_partition_cache():
+    netlist = make_netlist()
+    blks = {blk for net in netlist.values() for blk in net}
+    with tempfile.TemporaryDirectory() as temp:
+        clusters = pythunder.graph.partition_netlist_cached(netlist, temp)
+        assert set().union(*clusters.values()) == blks
+        filenames = os.listdir(temp)
+        assert len(filenames) == 1
+        assert filenames[0].startswith(
+            "{0:016x}".format(pythunder.graph.netlist_hash(netlist)))
+
+        # a partition the partitioner doesn't produce, to tell a cache hit
+        # from a new run
+        with open(os.path.join(temp, filenames[0]), "w") as f:
+            f.write("42 " + " ".join(sorted(blks)) + "\n")
+        clusters = pythunder.graph.partition_netlist_cached(netlist, temp)
+        assert clusters == {42: blks}
+
+        # another design doesn't hit the cache
+        netlist["e3"] = ["p3", "p5", "r3"]
+        clusters = pythunder.graph.partition_netlist_cached(netlist, temp)
+        assert 42 not in clusters
+        assert len(os.listdir(temp)) == 2
@@ -0,0 +1,68 @@
+from pythunder import Layout
+from preflight import check_capacity, check_placement, check_routability
+
+
+def make_layout():
+    # one row of IO on top of a 4x4 PE array
+    return Layout([["I"] * 4] + [["p"] * 4 for _ in range(4)])
+
+
+def test_check_capacity():
+    layout = make_layout()
+    blks = ["p" + str(i) for i in range(16)] + ["i0", "I1"]
+    assert check_capacity(blks, layout) == []
+    errors = check_capacity(blks + ["p16", "m0"], layout)
+    assert len(errors) == 2
+    assert "'m'" in errors[0] and "'p'" in errors[1]
+
+
+def test_check_placement():
+    layout = make_layout()
+    placement = {"p0": (0, 1), "p1": (0, 1), "p2": (1, 0), "I0": (0, 0)}
+    errors = check_placement(["p0", "p1", "p2", "p3", "I0"], placement,
+                             layout)
+    assert len(errors) == 3
+    assert "p0 and p1" in errors[0]
+    assert "p2" in errors[1]
+    assert "p3 is not placed" in errors[2]
+
+
+def test_check_routability():
+    supply = {(x, y): 2 for x in range(4) for y in range(1, 5)}
+    supply.update({(x, 0): 0 for x in range(4)})
+    # every net goes from the left column to the right one
+    netlist = {}
+    placement = {}
+    for i in range(4):
+        placement["p" + str(2 * i)] = (0, i + 1)
+        placement["p" + str(2 * i + 1)] = (3, i + 1)
+        netlist["e" + str(i)] = [("p" + str(2 * i), "out"),
+                                 ("p" + str(2 * i + 1), "in")]
+    bus = {net_id: 16 for net_id in netlist}
+    errors, warnings = check_routability(netlist, bus, placement,
+                                         {16: supply}, 4, 5)
+    assert errors == []
+    assert warnings == []
+
+    # twice the nets on the same rows need more tracks than a column cut has
+    for i in range(4, 10):
+        placement["p" + str(2 * i)] = (0, i % 4 + 1)
+        placement["p" + str(2 * i + 1)] = (3, i % 4 + 1)
+        netlist["e" + str(i)] = [("p" + str(2 * i), "out"),
+                                 ("p" + str(2 * i + 1), "in")]
+        bus["e" + str(i)] = 16
+    errors, warnings = check_routability(netlist, bus, placement,
+                                         {16: supply}, 4, 5, threshold=0.7)
+    assert len(errors) == 3
+    assert "10 nets" in errors[0] and "8 tracks" in errors[0]
+    assert warnings
+
+    # the IO row has no tracks and uses the ones of the row below
+    netlist = {"e0": [("I0", "out"), ("p0", "in")]}
+    placement = {"I0": (1, 0), "p0": (1, 2)}
+    errors, _ = check_routability(netlist, {"e0": 16}, placement,
+                                  {16: supply}, 4, 5)
+    assert errors == []
+    errors, _ = check_routability(netlist, {"e0": 1}, placement,
+                                  {16: supply}, 4, 5)
+    assert errors == ["no routing graph for the 1-bit nets"]
@@ -0,0 +1,51 @@
+import random
+import pythunder
+from conftest import compute_hpwl, make_layout
+
+
+def make_design(size=16):
+    # a grid of blocks connected to their neighbors, shuffled locally
+    random.seed(0)
+    netlist = {}
+    for y in range(size):
+        for x in range(size):
+            blk = "p{0}_{1}".format(x, y)
+            if x + 1 < size:
+                netlist["h{0}_{1}".format(x, y)] = [
+                    blk, "p{0}_{1}".format(x + 1, y)]
+            if y + 1 < size:
+                netlist["v{0}_{1}".format(x, y)] = [
+                    blk, "p{0}_{1}".format(x, y + 1)]
+    placement = {}
+    for y in range(size):
+        for x in range(size):
+            placement["p{0}_{1}".format(x, y)] = (x, y)
+    blks = sorted(placement)
+    for _ in range(size * size):
+        a, b = random.sample(blks, 2)
+        ax, ay = placement[a]
+        bx, by = placement[b]
+        if abs(ax - bx) + abs(ay - by) <= 3:
+            placement[a], placement[b] = placement[b], placement[a]
+    layout = make_layout(size)
+    return netlist, placement, layout
+
+
+def test_refine_global():
+    netlist, placement, layout = make_design()
+    result = pythunder.refine_global(placement, netlist, {}, layout, False,
+                                     num_threads=1, window_size=6)
+    assert set(result) == set(placement)
+    assert len(set(result.values())) == len(result)
+    assert compute_hpwl(netlist, result) < compute_hpwl(netlist, placement)
+
+
+def test_refine_global_threads():
+    # the result doesn't depend on the number of threads
+    netlist, placement, layout = make_design()
+    result = pythunder.refine_global(placement, netlist, {}, layout, False,
+                                     num_threads=1, window_size=6)
+    for num_threads in [2, 4]:
+        assert pythunder.refine_global(placement, netlist, {}, layout, False,
+                                       num_threads=num_threads,
+                                       window_size=6) == result
@@ -0,0 +1,28 @@
+from conftest import make_cells, make_placer
+
+
+def make_reg_placer(batch_size):
+    # PEs driving each other through registers
+    netlist = {}
+    for i in range(12):
+        netlist["e{0}".format(i)] = ["p" + str(i), "r" + str(i)]
+        netlist["e{0}_r".format(i)] = ["r" + str(i), "p" + str((i + 1) % 12)]
+    blks = ["p" + str(i) for i in range(12)] + \
+        ["r" + str(i) for i in range(12)]
+    placer = make_placer(blks, netlist, make_cells(4), fold_reg=True)
+    placer.batch_size = batch_size
+    return placer, netlist
+
+
+def test_reg_fold():
+    for batch_size in [1, 8]:
+        placer, netlist = make_reg_placer(batch_size)
+        placer.anneal()
+        result = placer.realize()
+        # a register never shares a tile with a PE it connects to
+        for net in netlist.values():
+            regs = [blk for blk in net if blk[0] == "r"]
+            for reg in regs:
+                for blk in net:
+                    if blk[0] != "r":
+                        assert result[reg] != result[blk]
@@ -0,0 +1,99 @@
+from __future__ import division
+import os
+import tempfile
+from pythunder import Layout
+from arch import parse_routing, parse_routing_columnar, RoutingTable
+from arch import compute_total_wire, compute_routing_usage
+from arch import RoutingAnalytics
+from arch.cgra_analytics import iter_used_sbs
+
+
+ROUTE = """Net ID: e1 Segment Size: 2
+Segment: 0 Size: 6
+PORT res (1, 2, 16)
+SB (0, 1, 2, 0, 1, 16)
+SB (0, 2, 2, 2, 0, 16)
+SB (0, 2, 2, 1, 1, 16)
+SB (0, 2, 3, 3, 0, 16)
+PORT data0 (2, 3, 16)
+Segment: 1 Size: 5
+PORT res (1, 2, 16)
+SB (0, 1, 2, 0, 1, 16)
+SB (0, 2, 2, 2, 0, 16)
+REG 0_2 (0, 2, 2, 16)
+RMUX 2_0 (2, 2, 16)
+
+Net ID: e0 Segment Size: 1
+Segment: 0 Size: 3
+PORT res_p (5, 13, 1)
+SB (3, 5, 13, 2, 1, 1)
+PORT bit0 (4, 13, 1)
+
+"""
+
+
+def load_routes(parse_fn):
+    with tempfile.TemporaryDirectory() as temp:
+        route_file = os.path.join(temp, "design.route")
+        with open(route_file, "w") as f:
+            f.write(ROUTE)
+        return parse_fn(route_file)
+
+
+def test_columnar_routing():
+    routes = load_routes(parse_routing)
+    table = load_routes(parse_routing_columnar)
+
+    assert table.net_ids == ["e1", "e0"]
+    assert table.to_dict() == routes
+    assert RoutingTable.from_routes(routes).to_dict() == routes
+    index = table.net_index("e0")
+    assert table.net_table(index).get_route(0) == routes["e0"]
+    assert table.net_table(index).hash_net(0) == table.hash_net(index)
+
+    assert compute_total_wire(table) == compute_total_wire(routes)
+    assert set(iter_used_sbs(table)) == set(iter_used_sbs(routes))
+
+
+def test_routing_analytics():
+    routes = load_routes(parse_routing_columnar)
+    layout = Layout([["p"] * 8 for _ in range(16)])
+    placement = {"p0": (1, 2), "p1": (2, 3), "p2": (2, 3)}
+    routing_resource = {}
+    for bus, track, x, y, side, io in iter_used_sbs(routes):
+        for t in range(4):
+            conn1 = (bus, io, side, t)
+            conn2 = (bus, 1 - io, side, t)
+            entry = routing_resource.setdefault((x, y),
+                                                {"route_resource": set()})
+            entry["route_resource"].add((conn1, conn2))
+
+    report = RoutingAnalytics(layout, routes, placement,
+                              routing_resource).report()
+    assert report.total_wire == sum(compute_total_wire(routes).values())
+    assert report.area["p"] == (2, 8 * 16)
+    assert report.track_usage[16][0] == (4, 8)
+    assert report.track_usage[16][1] == (0, 8)
+    assert report.track_usage[1][3] == (1, 2)
+    assert report.congestion[16].shape == (16, 8)
+    assert report.congestion[16][2, 2] == 2 / 16
+    assert compute_routing_usage(routes, routing_resource)[16][1] == (8, 8)
+
+
+def test_congestion_unused_bus():
+    routes = load_routes(parse_routing_columnar)
+    layout = Layout([["p"] * 8 for _ in range(16)])
+    # only the 16-bit net is routed, the 1-bit tracks are left unused
+    table = routes.net_table(routes.net_index("e1"))
+    routing_resource = {}
+    for bus, track, x, y, side, io in iter_used_sbs(routes):
+        entry = routing_resource.setdefault((x, y), {"route_resource": set()})
+        entry["route_resource"].add(((bus, io, side, track),
+                                     (bus, 1 - io, side, track)))
+
+    report = RoutingAnalytics(layout, table, {}, routing_resource).report()
+    assert sorted(report.track_usage) == [1, 16]
+    assert sorted(report.congestion) == [1, 16]
+    assert report.congestion[1].shape == (16, 8)
+    assert report.congestion[1].max() == 0
+    assert report.congestion[16].max() > 0
@@ -0,0 +1,54 @@
+import os
+import runtime_model
+from runtime_model import RuntimeModel, load_runtime_model
+
+
+def make_features(num_blocks, fold_reg=False):
+    return {"blocks": num_blocks, "nets": num_blocks,
+            "pins": 3 * num_blocks, "cells": 2 * num_blocks,
+            "fold_reg": fold_reg}
+
+
+def test_runtime_model(tmpdir):
+    filename = str(tmpdir.join("runtime_model.json"))
+    model = RuntimeModel(filename)
+    # bigger clusters take longer even without any telemetry
+    assert model.predict(make_features(200)) > model.predict(make_features(20))
+
+    # a machine ten times slower than the default
+    for num_blocks in (10, 20, 40, 80, 160):
+        features = make_features(num_blocks)
+        model.record(features, 10 * model.predict(features))
+    model.save()
+
+    calibrated = RuntimeModel(filename)
+    assert len(calibrated.samples) == 5
+    for num_blocks in (15, 100):
+        features = make_features(num_blocks)
+        ratio = calibrated.predict(features) / model.predict(features)
+        assert 5 < ratio < 15
+
+
+def test_runtime_model_read_only(tmpdir, monkeypatch):
+    filename = str(tmpdir.join("runtime_model.json"))
+    monkeypatch.setattr(runtime_model, "DEFAULT_MODEL_PATH", filename)
+    monkeypatch.delenv("PLACER_RUNTIME_MODEL", raising=False)
+    # without a configured model nothing is written
+    model = load_runtime_model()
+    model.record(make_features(10), 1.0)
+    model.save()
+    assert not os.path.exists(filename)
+
+    monkeypatch.setenv("PLACER_RUNTIME_MODEL", filename)
+    model = load_runtime_model()
+    model.record(make_features(10), 1.0)
+    model.save()
+    assert os.path.isfile(filename)
+
+    # the default model is still read
+    monkeypatch.delenv("PLACER_RUNTIME_MODEL")
+    model = load_runtime_model()
+    assert len(model.samples) == 1
+    model.record(make_features(20), 2.0)
+    model.save()
+    assert len(RuntimeModel(filename).samples) == 1
@@ -0,0 +1,81 @@
+import random
+import pythunder
+from conftest import make_cells, make_placer
+
+
+def test_estimate_timing():
+    # i0 -> p0 -> p1 -> r0, with a short branch p0 -> r1
+    netlist = {"e0": ["i0", "p0"], "e1": ["p0", "p1", "r1"],
+               "e2": ["p1", "r0"]}
+    placement = {"i0": (0, 0), "p0": (0, 1), "p1": (0, 3), "r0": (0, 3),
+                 "r1": (0, 2)}
+    critical_path, criticality = pythunder.estimate_timing(placement, netlist)
+    delay = pythunder.TimingDelay()
+    hop = delay.clb_sb + delay.rmux
+    # the register shares the tile with p1
+    assert critical_path == hop + delay.clb_op + 2 * hop + delay.clb_op
+    assert criticality == {"e0": 1, "e1": 1, "e2": 1}
+
+    # the branch to r1 is not critical any more
+    netlist["e1"] = ["p0", "p1"]
+    netlist["e3"] = ["p0", "r1"]
+    _, criticality = pythunder.estimate_timing(placement, netlist)
+    assert criticality["e1"] == 1
+    assert 0 < criticality["e3"] < 1
+
+    delay.clb_op = 0
+    critical_path, _ = pythunder.estimate_timing(placement, netlist,
+                                                 delay=delay)
+    assert critical_path == 3 * hop
+
+
+def make_design():
+    # a long chain of operators between two registers, next to a lot of
+    # short register to register nets that compete for the same cells
+    netlist = {"e0": ["r0", "p0"]}
+    for i in range(7):
+        netlist["e" + str(i + 1)] = ["p" + str(i), "p" + str(i + 1)]
+    netlist["e8"] = ["p7", "r1"]
+    for i in range(8, 24):
+        netlist["e" + str(i + 1)] = ["r" + str(i), "p" + str(i)]
+        netlist["e" + str(i + 17)] = ["p" + str(i), "r" + str(i + 16)]
+    blks = sorted({blk for net in netlist.values() for blk in net})
+    return blks, netlist, make_cells(8)
+
+
+def test_timing_weight():
+    blks, netlist, cells = make_design()
+    delays = {}
+    for weight in [0, 4]:
+        total = 0
+        for seed in range(4):
+            placer = make_placer(blks, netlist, cells, seed)
+            placer.timing_weight = weight
+            placer.anneal()
+            critical_path, _ = pythunder.estimate_timing(placer.realize(),
+                                                         netlist)
+            if weight > 0:
+                assert placer.critical_path() > 0
+            total += critical_path
+        delays[weight] = total
+    assert delays[4] < delays[0]
+
+
+def test_refine_global_timing():
+    blks, netlist, cells = make_design()
+    mask = [[True] * 8 for _ in range(8)]
+    layout = pythunder.Layout({"p": mask, "r": mask})
+    # a scrambled legal placement
+    rand = random.Random(0)
+    placement = {}
+    for blk_type in "pr":
+        type_blks = [blk for blk in blks if blk[0] == blk_type]
+        pos = rand.sample(cells[blk_type], len(type_blks))
+        placement.update(zip(type_blks, pos))
+    delays = {}
+    for weight in [0, 4]:
+        result = pythunder.refine_global(placement, netlist, {}, layout,
+                                         False, timing_weight=weight)
+        assert sorted(result) == sorted(placement)
+        delays[weight], _ = pythunder.estimate_timing(result, netlist)
+    assert delays[4] < delays[0]
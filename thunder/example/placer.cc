@@ -1,3 +1,4 @@
+#include <algorithm>
 #include <sstream>
 #include "../src/io.hh"
 #include "../src/graph.hh"
@@ -6,6 +7,10 @@
 #include "../src/util.hh"
 #include "../src/multi_place.hh"
 #include "../src/detailed.hh"
+#include "../src/balance.hh"
+#include "../src/eco.hh"
+#include "../src/refine.hh"
+#include "../src/timing.hh"
 
 constexpr uint32_t dim_threshold = 6;
 
@@ -79,6 +84,17 @@ prefixed_placement(const std::map<std::string,
     return result;
 }
 
+::string partition_cache_dir() {
+    auto const *value = std::getenv("PLACER_PARTITION_CACHE");  // NOLINT
+    return value ? value : "";
+}
+
+// the seeds run one after another unless igraph is built thread safe
+uint32_t partition_seeds() {
+    auto const *value = std::getenv("PLACER_PARTITION_SEEDS");  // NOLINT
+    return value ? static_cast<uint32_t>(std::stoul(value)) : 1;
+}
+
 void
 threshold_partition_netlist(const std::map<std::string,
         std::vector<std::string>> &netlist,
@@ -94,7 +110,9 @@ threshold_partition_netlist(const std::map<std::string,
         }
     }
     if (blks.size() > partition_threshold) {
-        raw_clusters = partition_netlist(netlist);
+        raw_clusters = partition_netlist_cached(netlist,
+                                                partition_cache_dir(),
+                                                partition_seeds(), 0);
     } else {
         // just use the set
         raw_clusters.insert({0, blks});
@@ -138,14 +156,17 @@ check_placement(const ::map<::string,
 }
 
 void print_help_message(char *argv[]) {
-    std::cerr << "Usage: " << argv[0] << " [-h] [-f] <cgra.layout> "
-              << "<netlist.packed> <result.place>" << std::endl;
+    std::cerr << "Usage: " << argv[0] << " [-h] [-f] [-e <previous.place>] "
+              << "<cgra.layout> <netlist.packed> <result.place>" << std::endl
+              << "  -e: ECO mode, only places the blocks that changed since "
+              << "the previous placement" << std::endl;
 }
 
 // parse the command line options
-std::tuple<::string, ::string, ::string, bool>
+std::tuple<::string, ::string, ::string, bool, ::string>
 parse_cli_args(int argc, char *argv[]) {
     bool use_prefix = false;
+    ::string eco_filename;
     std::vector<::string> args;
     for (int i = 1; i < argc; i++) {
         if (::string(argv[i]).empty())
@@ -153,15 +174,18 @@ parse_cli_args(int argc, char *argv[]) {
         if (argv[i][0] != '-') {
             args.emplace_back(argv[i]);
         } else if (argv[i][1] == 'h') {
-            return std::make_tuple("", "", "", false);
+            return std::make_tuple("", "", "", false, "");
         } else if (argv[i][1] == 'f') {
             use_prefix = true;
+        } else if (argv[i][1] == 'e' && i + 1 < argc) {
+            eco_filename = argv[++i];
         }
     }
     if (args.size() != 3)
-        return std::make_tuple("", "", "", false);
+        return std::make_tuple("", "", "", false, "");
     else
-        return std::make_tuple(args[0], args[1], args[2], use_prefix);
+        return std::make_tuple(args[0], args[1], args[2], use_prefix,
+                               eco_filename);
 }
 
 bool early_termination(const std::map<::string, std::pair<int, int>> &prefix,
@@ -193,9 +217,33 @@ bool disable_global_placement() {
     return (std::getenv("DISABLE_GP") != nullptr) || (std::getenv("SKIP_GP") != nullptr);  // NOLINT
 }
 
+bool disable_cluster_balance() {
+    return std::getenv("DISABLE_BALANCE") != nullptr;  // NOLINT
+}
+
+uint32_t detailed_placement_threads() {
+    auto const *value = std::getenv("PLACER_THREADS");  // NOLINT
+    return value ? static_cast<uint32_t>(std::stoul(value)) : 0;
+}
+
+double detailed_placement_time_budget() {
+    auto const *value = std::getenv("PLACER_TIME_BUDGET");  // NOLINT
+    return value ? std::stod(value) : 0;
+}
+
+double congestion_weight() {
+    auto const *value = std::getenv("PLACER_CONGESTION");  // NOLINT
+    return value ? std::stod(value) : 0;
+}
+
+double timing_weight() {
+    auto const *value = std::getenv("PLACER_TIMING");  // NOLINT
+    return value ? std::stod(value) : 0;
+}
+
 int main(int argc, char *argv[]) {
-    auto const[layout_file, netlist_file, result_filename, use_prefix] =
-    parse_cli_args(argc, argv);
+    auto const[layout_file, netlist_file, result_filename, use_prefix,
+               eco_filename] = parse_cli_args(argc, argv);
     if (layout_file.empty() || netlist_file.empty()
         || result_filename.empty()) {
         print_help_message(argv);
@@ -207,6 +255,20 @@ int main(int argc, char *argv[]) {
 
     // remove unnecessary information
     auto netlist = convert_netlist(raw_netlist);
+
+    if (!eco_filename.empty()) {
+        // incremental placement on top of the previous result
+        auto prev = match_placement(load_placement(eco_filename),
+                                    load_placement_id_to_name(eco_filename),
+                                    id_to_name);
+        auto io_pos = prefixed_placement(netlist, layout, {false, ""});
+        auto result = eco_placement(prev, netlist, io_pos, layout, true,
+                                    seed);
+        check_placement(raw_netlist, result, layout);
+        save_placement(result, id_to_name, result_filename);
+        return EXIT_SUCCESS;
+    }
+
     std::map<int, std::set<std::string>> raw_clusters;
     threshold_partition_netlist(netlist, raw_clusters);
 
@@ -224,6 +286,20 @@ int main(int argc, char *argv[]) {
         return EXIT_SUCCESS;
     }
 
+    if (!disable_cluster_balance()) {
+        // split the oversized clusters and merge the tiny ones
+        auto const num_threads = detailed_placement_threads();
+        auto filtered_clusters = filter_clusters(raw_clusters, fixed_pos);
+        auto before = parallel_efficiency(filtered_clusters, netlist,
+                                          num_threads);
+        raw_clusters = balance_clusters(filtered_clusters, netlist,
+                                        num_threads);
+        auto after = parallel_efficiency(raw_clusters, netlist, num_threads);
+        std::cout << "Parallel efficiency " << before << " -> " << after
+                  << " with " << raw_clusters.size() << " cluster(s)"
+                  << std::endl;
+    }
+
     auto clusters = convert_clusters(raw_clusters, fixed_pos);
     // notice that if there is only one cluster and the board is very small
     // we just do it flat
@@ -249,6 +325,7 @@ int main(int argc, char *argv[]) {
         // global placement
         auto gp = GlobalPlacer(clusters, netlist, fixed_pos, layout);
         gp.set_seed(seed);
+        gp.set_num_threads(detailed_placement_threads());
         // compute the anneal param based on some heuristics
         uint64_t num_blks_layout = layout.get_layer(layout.get_clb_type()).
                 produce_available_pos().size();
@@ -267,29 +344,43 @@ int main(int argc, char *argv[]) {
         gp.anneal_param_factor = base_factor / (1 - fill_ratio);
         std::cout << "Use anneal_param_factor " << gp.anneal_param_factor
                   << std::endl;
-        gp.solve();
+        gp.solve_multilevel();
         gp.anneal();
 
         gp_result = gp.realize();
     }
 
+    map<string, double> runtimes;
     map<string, pair<int, int>> dp_result = detailed_placement(clusters,
                                                                netlist,
                                                                fixed_pos,
                                                                gp_result,
-                                                               layout);
+                                                               layout,
+                                                               detailed_placement_threads(),
+                                                               detailed_placement_time_budget(),
+                                                               &runtimes);
+    if (!runtimes.empty()) {
+        auto const slowest = std::max_element(
+                runtimes.begin(), runtimes.end(),
+                [](auto const &a, auto const &b) {
+                    return a.second < b.second;
+                });
+        std::cout << "Slowest cluster " << slowest->first << " placed in "
+                  << slowest->second << "s" << std::endl;
+    }
 
     // global refinement
-    auto global_refine = DetailedPlacer(dp_result,
-                                        netlist,
-                                        layout.produce_available_pos(),
-                                        fixed_pos,
-                                        layout.get_clb_type(),
-                                        true);
-    // compute the refine parameters
-    auto it = static_cast<uint32_t>(100 * pow(dp_result.size(), 1.33));
-    global_refine.refine(it, 0.001, true);
-    auto result = global_refine.realize();
+    auto result = refine_global(dp_result, netlist, fixed_pos, layout, true,
+                                detailed_placement_threads(), seed, 12, 2, 4,
+                                0.001, congestion_weight(), 8,
+                                timing_weight());
+    if (timing_weight() > 0) {
+        double critical_path = 0;
+        net_criticality(result, netlist, layout.get_clb_type(), {},
+                        &critical_path);
+        std::cout << "Estimated critical path " << critical_path << " ps"
+                  << std::endl;
+    }
 
     // check the placement
     check_placement(raw_netlist, result, layout);
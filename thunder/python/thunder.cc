@@ -1,5 +1,6 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include <vector>
 #include <algorithm>
 #include "../src/detailed.hh"
@@ -10,6 +11,11 @@
 #include "../src/io.hh"
 #include "../src/graph.hh"
 #include "../src/util.hh"
+#include "../src/balance.hh"
+#include "../src/eco.hh"
+#include "../src/refine.hh"
+#include "../src/rudy.hh"
+#include "../src/timing.hh"
 
 namespace py = pybind11;
 using std::move;
@@ -26,7 +32,8 @@ void init_io(py::module &m) {
     io_m.def("load_layout", &load_layout)
         .def("dump_layout", &dump_layout)
         .def("load_id_to_name", &load_id_to_name)
-        .def("load_placement", &load_id_to_name)
+        .def("load_placement", &load_placement)
+        .def("load_placement_id_to_name", &load_placement_id_to_name)
         .def("save_placement", &save_placement)
         .def("load_netlist", &load_netlist);
 }
@@ -34,16 +41,100 @@ void init_io(py::module &m) {
 void init_graph(py::module &m) {
     auto graph_m = m.def_submodule("graph");
 
-    graph_m.def("partition_netlist", &partition_netlist);
+    graph_m.def("partition_netlist",
+                py::overload_cast<const ::map<::string, ::vector<::string>>&,
+                                  uint32_t, uint32_t>(&partition_netlist),
+                py::arg("netlists"), py::arg("num_seeds") = 1,
+                py::arg("num_threads") = 0,
+                py::call_guard<py::gil_scoped_release>(),
+                "Partitions the netlist with seeds 0 to num_seeds - 1 and "
+                "keeps the best modularity. The seeds run one after another "
+                "unless igraph is built thread safe, so N seeds take N times "
+                "as long as one");
+    graph_m.def("partition_netlist_cached", &partition_netlist_cached,
+                py::arg("netlists"), py::arg("cache_dir"),
+                py::arg("num_seeds") = 1, py::arg("num_threads") = 0,
+                py::call_guard<py::gil_scoped_release>(),
+                "Same as partition_netlist but the result is cached in "
+                "cache_dir. The seeds run one after another unless igraph is "
+                "built thread safe, so N seeds take N times as long as one");
+    graph_m.def("netlist_hash", &netlist_hash);
 }
 
 void init_util(py::module &m) {
     auto util_m = m.def_submodule("util");
     util_m.def("convert_clusters", &convert_clusters);
     util_m.def("filter_clusters", &filter_clusters);
+    util_m.def("reduce_cluster_graph", &reduce_cluster_graph);
+    util_m.def("reduce_cluster_graphs", &reduce_cluster_graphs);
+    util_m.def("balance_clusters", &balance_clusters, py::arg("clusters"),
+               py::arg("netlist"), py::arg("num_threads") = 0,
+               py::arg("lower_ratio") = 0.25, py::arg("upper_ratio") = 1.5,
+               py::arg("min_split_size") = 10);
+    util_m.def("parallel_efficiency", &parallel_efficiency,
+               py::arg("clusters"), py::arg("netlist"),
+               py::arg("num_threads") = 0);
 }
 
 
+template<class T>
+py::array shared_array(std::shared_ptr<const std::vector<T>> data,
+                       const std::vector<py::ssize_t> &shape) {
+    // zero-copy read-only view. the capsule keeps the buffer alive
+    auto holder = new std::shared_ptr<const std::vector<T>>(data);
+    py::capsule base(holder, [](void *ptr) {
+        delete reinterpret_cast<std::shared_ptr<const std::vector<T>> *>(ptr);
+    });
+    py::array result(py::dtype::of<T>(), shape, data->data(), base);
+    result.attr("setflags")(py::arg("write") = false);
+    return result;
+}
+
+py::array layer_array(const Layer &layer, py::handle base, bool writable) {
+    auto [width, height] = layer.get_size();
+    py::array result(py::dtype::of<bool>(),
+                     {static_cast<py::ssize_t>(height),
+                      static_cast<py::ssize_t>(width)},
+                     reinterpret_cast<const bool *>(layer.data()), base);
+    if (!writable)
+        result.attr("setflags")(py::arg("write") = false);
+    return result;
+}
+
+py::tuple layer_state(const Layer &layer) {
+    auto [width, height] = layer.get_size();
+    auto data = reinterpret_cast<const char *>(layer.data());
+    return py::make_tuple(layer.blk_type, width, height,
+                          py::bytes(data, width * height));
+}
+
+Layer layer_from_state(const py::tuple &state) {
+    if (state.size() != 4)
+        throw std::runtime_error("invalid layer state");
+    auto width = state[1].cast<uint32_t>();
+    auto height = state[2].cast<uint32_t>();
+    auto data = static_cast<std::string>(state[3].cast<py::bytes>());
+    if (data.size() != static_cast<uint64_t>(width) * height)
+        throw std::runtime_error("invalid layer state");
+    Layer layer(state[0].cast<char>(), width, height);
+    std::copy(data.begin(), data.end(), layer.data());
+    return layer;
+}
+
+py::tuple layer_mask_state(const LayerMask &mask) {
+    return py::make_tuple(mask.blk_type, mask.mask_blk_type, mask.mask_pos);
+}
+
+LayerMask layer_mask_from_state(const py::tuple &state) {
+    if (state.size() != 3)
+        throw std::runtime_error("invalid layer mask state");
+    LayerMask mask;
+    mask.blk_type = state[0].cast<char>();
+    mask.mask_blk_type = state[1].cast<char>();
+    mask.mask_pos = state[2].cast<decltype(mask.mask_pos)>();
+    return mask;
+}
+
 void init_layout(py::module &m) {
     py::class_<Layer>(m, "Layer")
             .def(py::init<char, uint32_t, uint32_t>())
@@ -56,7 +147,12 @@ void init_layout(py::module &m) {
             .def("__getitem__", [](const Layer &layer,
                                    const std::pair<uint32_t, uint32_t> &pos) {
                 return layer[pos];
-            });
+            })
+            .def("mask_array", [](py::object self) {
+                return layer_array(self.cast<const Layer &>(), self, true);
+            }, "(height, width) boolean view of the layer. writes go through "
+               "to the layer")
+            .def(py::pickle(&layer_state, &layer_from_state));
     py::class_<Layout>(m, "Layout")
             .def(py::init<>())
             .def(py::init<const std::map<char,
@@ -84,6 +180,55 @@ void init_layout(py::module &m) {
             .def("get_layout_margin", &Layout::get_layout_margin)
             .def("height", &Layout::height)
             .def("width", &Layout::width)
+            .def("blk_type_array", [](const Layout &layout) {
+                return shared_array<char>(layout.blk_type_grid(),
+                                          {static_cast<py::ssize_t>(
+                                                   layout.height()),
+                                           static_cast<py::ssize_t>(
+                                                   layout.width())});
+            }, "(height, width) read-only array of block type codes, i.e. "
+               "ord(get_blk_type(x, y)) at [y, x]")
+            .def("layer_mask_array", [](py::object self, char blk_type) {
+                auto const &layout = self.cast<const Layout &>();
+                return layer_array(layout.get_layer(blk_type), self, false);
+            }, "(height, width) read-only boolean view of a layer")
+            .def("available_pos_array", [](const Layout &layout,
+                                           char blk_type) {
+                auto pos = layout.available_pos(blk_type);
+                auto size = static_cast<py::ssize_t>(pos->size() / 2);
+                return shared_array<int32_t>(pos, {size, 2});
+            }, "(n, 2) read-only array of produce_available_pos()[blk_type]")
+            .def(py::pickle(
+                [](const Layout &layout) {
+                    // layers are stored as raw bytes, one per tile
+                    py::list layers;
+                    for (auto const blk_type : layout.get_layer_types()) {
+                        layers.append(py::make_tuple(
+                                layer_state(layout.get_layer(blk_type)),
+                                layout.get_priority_major(blk_type),
+                                layout.get_priority_minor(blk_type)));
+                    }
+                    py::list masks;
+                    for (auto const &iter : layout.get_layer_masks())
+                        masks.append(layer_mask_state(iter.second));
+                    return py::make_tuple(layers, masks);
+                },
+                [](const py::tuple &state) {
+                    if (state.size() != 2)
+                        throw std::runtime_error("invalid layout state");
+                    Layout layout;
+                    for (auto const &entry : state[0].cast<py::list>()) {
+                        auto layer_entry = entry.cast<py::tuple>();
+                        layout.add_layer(
+                                layer_from_state(layer_entry[0]),
+                                layer_entry[1].cast<uint32_t>(),
+                                layer_entry[2].cast<uint32_t>());
+                    }
+                    for (auto const &entry : state[1].cast<py::list>())
+                        layout.add_layer_mask(
+                                layer_mask_from_state(entry.cast<py::tuple>()));
+                    return layout;
+                }))
             .def("__repr__", &Layout::layout_repr);
 
     py::class_<LayerMask>(m, "LayerMask")
@@ -99,13 +244,66 @@ void init_layout(py::module &m) {
                 mask.mask_pos[blk_pos] = list;
             })
             .def_readwrite("mask_pos", &LayerMask::mask_pos,
-                           py::return_value_policy::reference);
+                           py::return_value_policy::reference)
+            .def(py::pickle(&layer_mask_state, &layer_mask_from_state));
+}
+
+py::dict telemetry_dict(const AnnealTelemetry &telemetry) {
+    // copies, the annealer keeps appending to its own vectors
+    auto to_array = [](const std::vector<double> &values) {
+        return py::array_t<double>(static_cast<py::ssize_t>(values.size()),
+                                   values.data());
+    };
+    py::dict result;
+    result["temperature"] = to_array(telemetry.temperature);
+    result["accept_rate"] = to_array(telemetry.accept_rate);
+    result["energy"] = to_array(telemetry.energy);
+    result["d_limit"] = to_array(telemetry.d_limit);
+    result["moves_per_sec"] = to_array(telemetry.moves_per_sec);
+    result["elapsed"] = to_array(telemetry.elapsed);
+    return result;
+}
+
+template<class T>
+py::dict annealer_telemetry(const T &annealer) {
+    return telemetry_dict(annealer.telemetry());
+}
+
+template<class T>
+void set_annealer_telemetry_callback(T &annealer, const py::object &callback,
+                                     uint32_t interval) {
+    if (callback.is_none()) {
+        annealer.set_telemetry_callback(nullptr);
+        return;
+    }
+    annealer.set_telemetry_callback(
+            [callback](const AnnealTelemetry &telemetry) {
+        callback(telemetry_dict(telemetry));
+    }, interval);
 }
 
 void init_pythunder(py::module &m) {
     py::class_<DetailedMove>(m, "DetailedMove")
             .def(py::init<>());
 
+    py::enum_<AnnealStop>(m, "AnnealStop")
+            .value("Schedule", AnnealStop::Schedule)
+            .value("Frozen", AnnealStop::Frozen)
+            .value("Plateau", AnnealStop::Plateau)
+            .value("TimeBudget", AnnealStop::TimeBudget)
+            .value("MoveBudget", AnnealStop::MoveBudget)
+            .value("Converged", AnnealStop::Converged);
+
+    py::class_<AnnealStats>(m, "AnnealStats")
+            .def_readonly("stop_reason", &AnnealStats::stop_reason)
+            .def_readonly("moves", &AnnealStats::moves)
+            .def_readonly("accepted", &AnnealStats::accepted)
+            .def_readonly("exchanges", &AnnealStats::exchanges)
+            .def_readonly("iterations", &AnnealStats::iterations)
+            .def_readonly("initial_energy", &AnnealStats::initial_energy)
+            .def_readonly("final_energy", &AnnealStats::final_energy)
+            .def_readonly("elapsed", &AnnealStats::elapsed);
+
     py::class_<DetailedPlacer>(m, "DetailedPlacer")
             .def(py::init<::vector<::string>,
                  ::map<::string, ::vector<std::string>>,
@@ -124,9 +322,69 @@ void init_pythunder(py::module &m) {
             .def("refine", &SimAnneal::refine)
             .def("estimate", &DetailedPlacer::estimate)
             .def("set_seed", &DetailedPlacer::set_seed)
+            .def("set_time_budget", &DetailedPlacer::set_time_budget)
+            .def("anneal_stats", &SimAnneal::anneal_stats)
+            .def("telemetry", &annealer_telemetry<DetailedPlacer>)
+            .def("set_telemetry_callback",
+                 &set_annealer_telemetry_callback<DetailedPlacer>,
+                 py::arg("callback"), py::arg("interval") = 1)
             .def_readwrite("steps", &DetailedPlacer::steps)
             .def_readwrite("tmax", &DetailedPlacer::tmax)
-            .def_readwrite("tmin", &DetailedPlacer::tmin);
+            .def_readwrite("tmin", &DetailedPlacer::tmin)
+            .def_readwrite("min_accept_rate", &SimAnneal::min_accept_rate)
+            .def_readwrite("plateau_tolerance", &SimAnneal::plateau_tolerance)
+            .def_readwrite("convergence_window",
+                           &SimAnneal::convergence_window)
+            .def_readwrite("max_time", &SimAnneal::max_time)
+            .def_readwrite("max_moves", &SimAnneal::max_moves)
+            .def_readwrite("num_replicas", &DetailedPlacer::num_replicas)
+            .def_readwrite("tempering_ratio",
+                           &DetailedPlacer::tempering_ratio)
+            .def_readwrite("batch_size", &DetailedPlacer::batch_size)
+            .def_readwrite("congestion_weight",
+                           &DetailedPlacer::congestion_weight)
+            .def_readwrite("congestion_capacity",
+                           &DetailedPlacer::congestion_capacity)
+            .def("set_congestion_base", &DetailedPlacer::set_congestion_base)
+            .def("congestion_map", &DetailedPlacer::congestion_map)
+            .def_readwrite("timing_weight", &DetailedPlacer::timing_weight)
+            .def_readwrite("criticality_exponent",
+                           &DetailedPlacer::criticality_exponent)
+            .def_readwrite("timing_update_interval",
+                           &DetailedPlacer::timing_update_interval)
+            .def_readwrite("timing_delay", &DetailedPlacer::timing_delay)
+            .def("set_net_criticality", &DetailedPlacer::set_net_criticality)
+            .def("critical_path", &DetailedPlacer::critical_path);
+
+    py::class_<RudyMap>(m, "RudyMap")
+            .def(py::init<uint32_t, uint32_t, double>(), py::arg("width"),
+                 py::arg("height"), py::arg("capacity"))
+            .def("add_nets", &RudyMap::add_nets)
+            .def("update", [](RudyMap &map, int xmin, int xmax, int ymin,
+                              int ymax, int sign) {
+                return map.update({xmin, xmax, ymin, ymax}, sign);
+            }, py::arg("xmin"), py::arg("xmax"), py::arg("ymin"),
+               py::arg("ymax"), py::arg("sign") = 1)
+            .def("overflow", &RudyMap::overflow)
+            .def("demand", &RudyMap::demand)
+            .def("max_demand", &RudyMap::max_demand)
+            .def("capacity", &RudyMap::capacity)
+            .def("demand_array", [](const RudyMap &map) {
+                auto const demand = map.demand_map();
+                py::array_t<double> result({map.height(), map.width()});
+                std::copy(demand.begin(), demand.end(),
+                          result.mutable_data());
+                return result;
+            }, "(height, width) array of the demand");
+
+    py::class_<TimingDelay>(m, "TimingDelay")
+            .def(py::init<>())
+            .def_readwrite("clb_op", &TimingDelay::clb_op)
+            .def_readwrite("mem", &TimingDelay::mem)
+            .def_readwrite("clb_sb", &TimingDelay::clb_sb)
+            .def_readwrite("mem_sb", &TimingDelay::mem_sb)
+            .def_readwrite("rmux", &TimingDelay::rmux)
+            .def_readwrite("reg", &TimingDelay::reg);
 
     py::class_<VPRPlacer>(m, "VPRPlacer")
             .def(py::init<std::map<std::string, std::pair<int, int>>,
@@ -136,7 +394,12 @@ void init_pythunder(py::module &m) {
                     char,
                     bool>())
             .def("anneal", &VPRPlacer::anneal)
-            .def("realize", &VPRPlacer::realize);
+            .def("realize", &VPRPlacer::realize)
+            .def("anneal_stats", &SimAnneal::anneal_stats)
+            .def("telemetry", &annealer_telemetry<VPRPlacer>)
+            .def("set_telemetry_callback",
+                 &set_annealer_telemetry_callback<VPRPlacer>,
+                 py::arg("callback"), py::arg("interval") = 1);
 
     py::class_<GlobalPlacer>(m, "GlobalPlacer")
             .def(py::init<std::map<std::string, std::set<std::string>>,
@@ -144,12 +407,26 @@ void init_pythunder(py::module &m) {
                     std::map<std::string, std::pair<int, int>>,
                     const Layout&>())
             .def("solve", &GlobalPlacer::solve)
+            .def("solve_multilevel", &GlobalPlacer::solve_multilevel,
+                 py::arg("coarsest_size") = 16)
             .def("realize", &GlobalPlacer::realize)
             .def("anneal", &SimAnneal::anneal)
             .def("set_seed", &GlobalPlacer::set_seed)
+            .def("set_num_threads", &GlobalPlacer::set_num_threads)
+            .def("anneal_stats", &SimAnneal::anneal_stats)
+            .def("telemetry", &annealer_telemetry<GlobalPlacer>)
+            .def("set_telemetry_callback",
+                 &set_annealer_telemetry_callback<GlobalPlacer>,
+                 py::arg("callback"), py::arg("interval") = 1)
             .def_readwrite("anneal_param_factor",
                            &GlobalPlacer::anneal_param_factor)
-            .def_readwrite("steps", &GlobalPlacer::steps);
+            .def_readwrite("steps", &GlobalPlacer::steps)
+            .def_readwrite("min_accept_rate", &SimAnneal::min_accept_rate)
+            .def_readwrite("plateau_tolerance", &SimAnneal::plateau_tolerance)
+            .def_readwrite("convergence_window",
+                           &SimAnneal::convergence_window)
+            .def_readwrite("max_time", &SimAnneal::max_time)
+            .def_readwrite("max_moves", &SimAnneal::max_moves);
 }
 
 void init_detailed_placement(py::module &m) {
@@ -165,7 +442,83 @@ void init_detailed_placement(py::module &m) {
              const ::map<::string, ::map<::string, std::vector<std::string>>>&,
              const ::map<::string, ::map<::string, std::pair<int, int>>>&,
              char, bool, uint32_t>(&multi_place))
-      .def("detailed_placement", &detailed_placement);
+      .def("detailed_placement",
+             py::overload_cast<const ::map<::string, std::set<std::string>>&,
+             const ::map<::string, ::map<char, std::set<std::pair<int, int>>>>&,
+             const ::map<::string, ::map<::string, std::vector<std::string>>>&,
+             const ::map<::string, FixedPosOverlay>&,
+             char, bool, uint32_t>(&multi_place))
+      .def("detailed_placement",
+           [](const ::map<::string, ::set<::string>> &clusters,
+              const ::map<::string, ::vector<::string>> &netlist,
+              const ::map<::string, ::pair<int, int>> &fixed_pos,
+              const ::map<::string, ::map<char,
+                                          ::set<::pair<int, int>>>> &gp_result,
+              const Layout &layout, uint32_t num_threads, double time_budget) {
+               return detailed_placement(clusters, netlist, fixed_pos,
+                                         gp_result, layout, num_threads,
+                                         time_budget);
+           },
+           py::arg("clusters"), py::arg("netlist"), py::arg("fixed_pos"),
+           py::arg("gp_result"), py::arg("layout"), py::arg("num_threads") = 0,
+           py::arg("time_budget") = 0.0)
+      .def("detailed_placement_with_runtimes",
+           [](const ::map<::string, ::set<::string>> &clusters,
+              const ::map<::string, ::map<char, ::set<::pair<int, int>>>> &cells,
+              const ::map<::string, ::map<::string, ::vector<::string>>> &netlists,
+              const ::map<::string, FixedPosOverlay> &fixed_blocks,
+              char clb_type, bool fold_reg, uint32_t seed,
+              uint32_t num_threads, double time_budget,
+              const ::map<::string, double> &costs) {
+               ::map<::string, double> runtimes;
+               py::gil_scoped_release release;
+               auto result = multi_place(clusters, cells, netlists,
+                                         fixed_blocks, clb_type, fold_reg,
+                                         seed, num_threads, time_budget,
+                                         &runtimes, &costs);
+               return std::make_pair(result, runtimes);
+           }, py::arg("clusters"), py::arg("cells"), py::arg("netlists"),
+           py::arg("fixed_blocks"), py::arg("clb_type"), py::arg("fold_reg"),
+           py::arg("seed") = 0, py::arg("num_threads") = 0,
+           py::arg("time_budget") = 0.0,
+           py::arg("costs") = ::map<::string, double>())
+      .def("cluster_seed", &cluster_seed)
+      .def("match_placement", &match_placement, py::arg("prev_placement"),
+           py::arg("prev_id_to_name"), py::arg("id_to_name"))
+      .def("eco_placement", &eco_placement, py::arg("prev_placement"),
+           py::arg("netlist"), py::arg("fixed_pos"), py::arg("layout"),
+           py::arg("fold_reg"), py::arg("seed") = 0,
+           py::arg("window_radius") = 2, py::arg("temperature") = 0.05,
+           py::call_guard<py::gil_scoped_release>())
+      .def("refine_global", &refine_global, py::arg("placement"),
+           py::arg("netlist"), py::arg("fixed_pos"), py::arg("layout"),
+           py::arg("fold_reg"), py::arg("num_threads") = 0,
+           py::arg("seed") = 0, py::arg("window_size") = 12,
+           py::arg("halo") = 2, py::arg("max_passes") = 4,
+           py::arg("threshold") = 0.001, py::arg("congestion_weight") = 0,
+           py::arg("congestion_capacity") = 8, py::arg("timing_weight") = 0,
+           py::arg("timing_delay") = TimingDelay(),
+           py::call_guard<py::gil_scoped_release>())
+      .def("estimate_timing",
+           [](const ::map<::string, ::pair<int, int>> &placement,
+              const ::map<::string, ::vector<::string>> &netlist,
+              char clb_type, const TimingDelay &delay) {
+               double critical_path = 0;
+               auto criticality = net_criticality(placement, netlist, clb_type,
+                                                  delay, &critical_path);
+               return std::make_pair(critical_path, criticality);
+           }, py::arg("placement"), py::arg("netlist"),
+           py::arg("clb_type") = 'p', py::arg("delay") = TimingDelay(),
+           "critical path delay and the criticality of every net");
+
+    py::class_<FixedPosOverlay>(m, "FixedPosOverlay")
+            .def(py::init<::map<::string, ::pair<int, int>>>())
+            .def("derive", &FixedPosOverlay::derive,
+                 py::arg("overlay") = ::map<::string, ::pair<int, int>>(),
+                 py::arg("removed") = ::set<::string>())
+            .def("materialize", &FixedPosOverlay::materialize)
+            .def("base_size", &FixedPosOverlay::base_size)
+            .def("overlay_size", &FixedPosOverlay::overlay_size);
 }
 
 PYBIND11_MODULE(pythunder, m) {
@@ -1,4 +1,5 @@
 #include <math.h>
+#include <algorithm>
 #include <chrono>
 #include "anneal.hh"
 #include "include/tqdm.h"
@@ -10,10 +11,24 @@ SimAnneal::SimAnneal() {
 
 void SimAnneal::anneal() {
     auto t_factor = -log(tmax / tmin);
+    // convergence is checked every window of moves
+    constexpr int num_windows = 100;
+    const int window = std::max(steps / num_windows, 1);
+    uint64_t accepted = 0;
+    uint64_t moves = 0;
+    start_stats();
     // random setup
     tqdm bar;
     for (current_step = 0; current_step < steps; current_step++) {
         bar.progress(current_step, steps);
+        if (moves == static_cast<uint64_t>(window)) {
+            auto t = tmax * exp(t_factor * current_step / steps);
+            if (end_iteration(t, moves, accepted))
+                break;
+            moves = 0;
+            accepted = 0;
+        }
+        moves++;
         auto t = tmax * exp(t_factor * current_step / steps);
         // make changes
         move();
@@ -24,16 +39,25 @@ void SimAnneal::anneal() {
         } else {
             commit_changes();
             this->curr_energy = new_energy;
+            accepted++;
         }
     }
+    if (current_step >= steps) {
+        // the last window is not checked
+        stats_.moves += moves;
+        stats_.accepted += accepted;
+    }
     bar.finish();
+    finish_stats();
 }
 
 void SimAnneal::refine(int num_iter, double threshold, bool print_improvement) {
     tqdm bar;
     double total_improvement = 0;
+    start_stats();
     while (true) {
         double old_energy = this->curr_energy;
+        uint64_t accepted = 0;
         for (int i = 0; i < num_iter; i++) {
             bar.progress(i, num_iter);
             move();
@@ -42,19 +66,136 @@ void SimAnneal::refine(int num_iter, double threshold, bool print_improvement) {
             if (de < 0) {
                 commit_changes();
                 this->curr_energy = new_energy;
+                accepted++;
             }
         }
-        double improvement = (old_energy - this->curr_energy) / old_energy;
+        double improvement = old_energy > 0 ?
+                             (old_energy - this->curr_energy) / old_energy : 0;
         if (print_improvement) {
             printf("%f -> %f improvement: %f total: %f\n",
                    old_energy, this->curr_energy, improvement,
                    total_improvement);
             total_improvement += improvement;
         }
-        if (improvement < threshold)
+        // greedy, so there is no temperature
+        bool stop = end_iteration(0, static_cast<uint64_t>(num_iter),
+                                  accepted);
+        if (improvement < threshold) {
+            stats_.stop_reason = AnnealStop::Converged;
+            break;
+        }
+        if (stop)
             break;
     }
     bar.finish();
+    finish_stats();
+}
+
+void AnnealTelemetry::clear() {
+    temperature.clear();
+    accept_rate.clear();
+    energy.clear();
+    d_limit.clear();
+    moves_per_sec.clear();
+    elapsed.clear();
+}
+
+void SimAnneal::set_telemetry_callback(
+        std::function<void(const AnnealTelemetry &)> callback,
+        uint32_t interval) {
+    telemetry_callback_ = std::move(callback);
+    telemetry_interval_ = std::max(interval, 1u);
+}
+
+void SimAnneal::start_stats() {
+    stats_ = AnnealStats();
+    stats_.initial_energy = curr_energy;
+    telemetry_.clear();
+    start_time_ = std::chrono::steady_clock::now();
+    iteration_time_ = start_time_;
+    window_.clear();
+}
+
+bool SimAnneal::end_iteration(double temperature, uint64_t moves,
+                              uint64_t accepted, double d_limit) {
+    auto now = std::chrono::steady_clock::now();
+    double duration = std::chrono::duration<double>(now -
+                                                    iteration_time_).count();
+    iteration_time_ = now;
+    telemetry_.temperature.emplace_back(temperature);
+    telemetry_.accept_rate.emplace_back(moves ? (double)accepted / moves : 0);
+    telemetry_.energy.emplace_back(curr_energy);
+    telemetry_.d_limit.emplace_back(d_limit);
+    telemetry_.moves_per_sec.emplace_back(duration > 0 ? moves / duration
+                                                       : 0);
+    telemetry_.elapsed.emplace_back(
+            std::chrono::duration<double>(now - start_time_).count());
+
+    bool stop = check_convergence(moves, accepted);
+    if (telemetry_callback_ &&
+        (stop || telemetry_.size() % telemetry_interval_ == 0))
+        telemetry_callback_(telemetry_);
+    return stop;
+}
+
+bool SimAnneal::check_convergence(uint64_t moves, uint64_t accepted) {
+    stats_.moves += moves;
+    stats_.accepted += accepted;
+    stats_.iterations++;
+    // one extra entry so that the energy change spans the whole window
+    window_.emplace_back(moves, accepted, curr_energy);
+    if (window_.size() > convergence_window + 1)
+        window_.erase(window_.begin());
+
+    if (convergence_window > 0 && window_.size() == convergence_window + 1) {
+        uint64_t window_moves = 0;
+        uint64_t window_accepted = 0;
+        double min_energy = std::get<2>(window_[0]);
+        double max_energy = min_energy;
+        for (uint32_t i = 0; i < window_.size(); i++) {
+            auto const &[m, a, e] = window_[i];
+            if (i > 0) {
+                window_moves += m;
+                window_accepted += a;
+            }
+            min_energy = std::min(min_energy, e);
+            max_energy = std::max(max_energy, e);
+        }
+        if (min_accept_rate > 0 && window_moves > 0 &&
+            window_accepted < min_accept_rate * window_moves) {
+            stats_.stop_reason = AnnealStop::Frozen;
+            return true;
+        }
+        if (plateau_tolerance > 0 &&
+            max_energy - min_energy <=
+            plateau_tolerance * std::abs(std::get<2>(window_[0]))) {
+            stats_.stop_reason = AnnealStop::Plateau;
+            return true;
+        }
+    }
+    return check_budget();
+}
+
+bool SimAnneal::check_budget() {
+    if (max_moves > 0 && stats_.moves >= max_moves) {
+        stats_.stop_reason = AnnealStop::MoveBudget;
+        return true;
+    }
+    if (max_time > 0) {
+        auto now = std::chrono::steady_clock::now();
+        if (std::chrono::duration<double>(now - start_time_).count() >=
+            max_time) {
+            stats_.stop_reason = AnnealStop::TimeBudget;
+            return true;
+        }
+    }
+    return false;
+}
+
+void SimAnneal::finish_stats() {
+    stats_.final_energy = curr_energy;
+    auto now = std::chrono::steady_clock::now();
+    stats_.elapsed = std::chrono::duration<double>(now - start_time_).count();
 }
 
 double SimAnneal::estimate(const uint32_t steps) {
@@ -1,11 +1,52 @@
 #ifndef THUNDER_ANNEAL_HH
 #define THUNDER_ANNEAL_HH
 
+#include <chrono>
+#include <functional>
 #include <set>
 #include <map>
+#include <tuple>
 #include "include/randutils.hpp"
 #include "util.hh"
 
+enum class AnnealStop {
+    Schedule,       // walked the whole schedule
+    Frozen,         // acceptance rate dropped below min_accept_rate
+    Plateau,        // energy moved less than plateau_tolerance
+    TimeBudget,
+    MoveBudget,
+    Converged       // refine(): improvement dropped below the threshold
+};
+
+struct AnnealStats {
+    AnnealStop stop_reason = AnnealStop::Schedule;
+    uint64_t moves = 0;
+    uint64_t accepted = 0;
+    // temperature swaps between the replicas of a parallel tempering anneal
+    uint64_t exchanges = 0;
+    // temperatures for the detailed placer, windows of moves otherwise
+    uint32_t iterations = 0;
+    double initial_energy = 0;
+    double final_energy = 0;
+    // in seconds
+    double elapsed = 0;
+};
+
+
+// one entry per temperature for the detailed placers and per window of
+// moves for the plain annealer
+struct AnnealTelemetry {
+    std::vector<double> temperature;
+    std::vector<double> accept_rate;
+    std::vector<double> energy;
+    std::vector<double> d_limit;
+    std::vector<double> moves_per_sec;
+    // since the start of the anneal, in seconds
+    std::vector<double> elapsed;
+
+    uint64_t size() const { return temperature.size(); }
+    void clear();
+};
 
 class SimAnneal {
 public:
@@ -17,6 +58,14 @@ public:
     virtual void refine(int num_iter, double threshold, bool print_improvement);
     double estimate(uint32_t steps);
     virtual double estimate() { return estimate(10000); }
+    // how the last anneal() or refine() went
+    const AnnealStats &anneal_stats() const { return stats_; }
+    const AnnealTelemetry &telemetry() const { return telemetry_; }
+    // called with the telemetry so far every interval iterations. an empty
+    // callback disables it
+    void set_telemetry_callback(
+            std::function<void(const AnnealTelemetry &)> callback,
+            uint32_t interval = 1);
 
     // attributes
     // default values
@@ -24,12 +73,44 @@ public:
     double tmax = 25000;
     double tmin = 3;
 
+    // early termination. the annealer is frozen once the acceptance rate
+    // over convergence_window iterations is below min_accept_rate, or the
+    // energy moved less than plateau_tolerance (relative) over them. either
+    // test is disabled by setting it to 0
+    double min_accept_rate = 1e-3;
+    double plateau_tolerance = 0;
+    uint32_t convergence_window = 3;
+    // hard limits for a single anneal() or refine(). 0 means no limit
+    double max_time = 0;
+    uint64_t max_moves = 0;
+
 protected:
     virtual void move() {}
     virtual void commit_changes() {}
     double curr_energy = 0;
     int current_step = 0;
     randutils::random_generator<std::mt19937> rand_;
+
+    void start_stats();
+    // called at the end of every iteration with the moves and accepted
+    // moves in it. records the telemetry and returns true if the anneal
+    // should stop
+    bool end_iteration(double temperature, uint64_t moves, uint64_t accepted,
+                       double d_limit = 0);
+    bool check_budget();
+    void finish_stats();
+    AnnealStats stats_;
+    AnnealTelemetry telemetry_;
+
+private:
+    bool check_convergence(uint64_t moves, uint64_t accepted);
+
+    std::function<void(const AnnealTelemetry &)> telemetry_callback_;
+    uint32_t telemetry_interval_ = 1;
+    std::chrono::steady_clock::time_point start_time_;
+    std::chrono::steady_clock::time_point iteration_time_;
+    // per iteration (moves, accepted, energy) in the current window
+    std::vector<std::tuple<uint64_t, uint64_t, double>> window_;
 };
 
 
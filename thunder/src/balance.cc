@@ -0,0 +1,370 @@
+#include <algorithm>
+#include <cmath>
+#include <functional>
+#include <queue>
+#include <thread>
+#include <unordered_map>
+#include <unordered_set>
+#include "balance.hh"
+#include "multi_place.hh"
+
+using std::map;
+using std::pair;
+using std::set;
+using std::string;
+using std::vector;
+
+
+static uint32_t get_num_threads(uint32_t num_threads) {
+    if (num_threads == 0)
+        num_threads = std::thread::hardware_concurrency();
+    // 0 will be returned if it's not detected.
+    return std::max(1u, num_threads);
+}
+
+// netlist in terms of block indices. blocks that are not in any cluster,
+// e.g. the fixed ones, are dropped
+struct IndexedNetlist {
+    vector<string> blk_names;
+    vector<vector<uint32_t>> nets;
+    vector<vector<uint32_t>> blk_nets;
+};
+
+static IndexedNetlist
+index_netlist(const ::map<int, ::set<::string>> &clusters,
+              const ::map<::string, ::vector<::string>> &netlist,
+              ::vector<::vector<uint32_t>> &cluster_blks) {
+    IndexedNetlist result;
+    std::unordered_map<::string, uint32_t> blk_index;
+    for (auto const &[cluster_id, blks] : clusters) {
+        if (blks.empty())
+            continue;
+        ::vector<uint32_t> indices;
+        indices.reserve(blks.size());
+        for (auto const &blk : blks) {
+            if (blk_index.find(blk) != blk_index.end())
+                continue;
+            auto index = static_cast<uint32_t>(result.blk_names.size());
+            blk_index.emplace(blk, index);
+            result.blk_names.emplace_back(blk);
+            indices.emplace_back(index);
+        }
+        if (!indices.empty())
+            cluster_blks.emplace_back(std::move(indices));
+    }
+    result.blk_nets.resize(result.blk_names.size());
+    for (auto const &iter : netlist) {
+        ::vector<uint32_t> net;
+        for (auto const &blk : iter.second) {
+            auto it = blk_index.find(blk);
+            if (it != blk_index.end())
+                net.emplace_back(it->second);
+        }
+        if (net.size() < 2)
+            continue;
+        auto net_id = static_cast<uint32_t>(result.nets.size());
+        for (auto const blk : net)
+            result.blk_nets[blk].emplace_back(net_id);
+        result.nets.emplace_back(std::move(net));
+    }
+    return result;
+}
+
+static ::vector<uint32_t>
+bfs_order(const ::vector<::vector<uint32_t>> &adj, uint32_t start,
+          bool whole_graph) {
+    const auto n = static_cast<uint32_t>(adj.size());
+    ::vector<bool> visited(n, false);
+    ::vector<uint32_t> order;
+    order.reserve(n);
+    uint32_t next_start = 0;
+    while (true) {
+        std::queue<uint32_t> working_set;
+        working_set.push(start);
+        visited[start] = true;
+        while (!working_set.empty()) {
+            auto node = working_set.front();
+            working_set.pop();
+            order.emplace_back(node);
+            for (auto const next : adj[node]) {
+                if (!visited[next]) {
+                    visited[next] = true;
+                    working_set.push(next);
+                }
+            }
+        }
+        if (!whole_graph)
+            break;
+        // disconnected graph: restart from the next unvisited node
+        while (next_start < n && visited[next_start])
+            next_start++;
+        if (next_start == n)
+            break;
+        start = next_start;
+    }
+    return order;
+}
+
+static pair<::vector<uint32_t>, ::vector<uint32_t>>
+bisect(const ::vector<uint32_t> &blks, uint32_t size_a,
+       const IndexedNetlist &netlist) {
+    const auto n = static_cast<uint32_t>(blks.size());
+    std::unordered_map<uint32_t, uint32_t> local;
+    for (uint32_t i = 0; i < n; i++)
+        local.emplace(blks[i], i);
+
+    // induced subgraph with the same star model as the partitioner
+    ::vector<::vector<uint32_t>> adj(n);
+    std::unordered_set<uint32_t> visited_nets;
+    for (auto const blk : blks) {
+        for (auto const net_id : netlist.blk_nets[blk]) {
+            if (!visited_nets.emplace(net_id).second)
+                continue;
+            ::vector<uint32_t> members;
+            for (auto const member : netlist.nets[net_id]) {
+                auto it = local.find(member);
+                if (it != local.end())
+                    members.emplace_back(it->second);
+            }
+            for (uint32_t i = 1; i < members.size(); i++) {
+                adj[members[0]].emplace_back(members[i]);
+                adj[members[i]].emplace_back(members[0]);
+            }
+        }
+    }
+
+    // grow the first half from a pseudo-peripheral node
+    auto start = bfs_order(adj, 0, false).back();
+    auto order = bfs_order(adj, start, true);
+    ::vector<uint8_t> side(n, 1);
+    for (uint32_t i = 0; i < size_a; i++)
+        side[order[i]] = 0;
+
+    // greedy refinement. every move strictly reduces the cut so it
+    // terminates
+    const int64_t tolerance = std::max<int64_t>(1, n / 20);
+    int64_t count_a = size_a;
+    constexpr uint32_t max_pass = 4;
+    for (uint32_t pass = 0; pass < max_pass; pass++) {
+        bool improved = false;
+        for (uint32_t node = 0; node < n; node++) {
+            int64_t same = 0, other = 0;
+            for (auto const next : adj[node]) {
+                if (side[next] == side[node])
+                    same++;
+                else
+                    other++;
+            }
+            if (other <= same)
+                continue;
+            auto new_count = count_a + (side[node] == 0 ? -1 : 1);
+            if (std::abs(new_count - static_cast<int64_t>(size_a)) > tolerance
+                || new_count < 1 || new_count > n - 1)
+                continue;
+            side[node] ^= 1u;
+            count_a = new_count;
+            improved = true;
+        }
+        if (!improved)
+            break;
+    }
+
+    pair<::vector<uint32_t>, ::vector<uint32_t>> result;
+    for (uint32_t i = 0; i < n; i++) {
+        if (side[i] == 0)
+            result.first.emplace_back(blks[i]);
+        else
+            result.second.emplace_back(blks[i]);
+    }
+    return result;
+}
+
+static void split_cluster(const ::vector<uint32_t> &blks,
+                          uint32_t num_parts, const IndexedNetlist &netlist,
+                          ::vector<::vector<uint32_t>> &result) {
+    if (num_parts <= 1 || blks.size() <= 1) {
+        result.emplace_back(blks);
+        return;
+    }
+    const auto n = static_cast<uint32_t>(blks.size());
+    const uint32_t parts_a = num_parts / 2;
+    auto size_a = static_cast<uint32_t>(
+            std::lround(static_cast<double>(n) * parts_a / num_parts));
+    size_a = std::clamp(size_a, 1u, n - 1);
+    auto [blks_a, blks_b] = bisect(blks, size_a, netlist);
+    split_cluster(blks_a, parts_a, netlist, result);
+    split_cluster(blks_b, num_parts - parts_a, netlist, result);
+}
+
+static void merge_clusters(::vector<::vector<uint32_t>> &clusters,
+                           const IndexedNetlist &netlist, uint64_t min_size,
+                           uint64_t max_size) {
+    const auto num_clusters = static_cast<uint32_t>(clusters.size());
+    ::vector<uint32_t> blk_cluster(netlist.blk_names.size());
+    for (uint32_t i = 0; i < num_clusters; i++) {
+        for (auto const blk : clusters[i])
+            blk_cluster[blk] = i;
+    }
+    ::vector<bool> alive(num_clusters, true);
+    ::vector<bool> stuck(num_clusters, false);
+    uint32_t num_alive = num_clusters;
+
+    while (num_alive > 1) {
+        // smallest cluster first
+        int64_t small = -1;
+        for (uint32_t i = 0; i < num_clusters; i++) {
+            if (!alive[i] || stuck[i] || clusters[i].size() >= min_size)
+                continue;
+            if (small < 0 || clusters[i].size() < clusters[small].size())
+                small = i;
+        }
+        if (small < 0)
+            break;
+        const auto small_size = clusters[small].size();
+
+        ::map<uint32_t, uint64_t> connections;
+        for (auto const blk : clusters[small]) {
+            for (auto const net_id : netlist.blk_nets[blk]) {
+                for (auto const member : netlist.nets[net_id]) {
+                    auto const cluster_id = blk_cluster[member];
+                    if (cluster_id != small)
+                        connections[cluster_id]++;
+                }
+            }
+        }
+        int64_t target = -1;
+        uint64_t best_connection = 0;
+        for (auto const &[cluster_id, count] : connections) {
+            if (small_size + clusters[cluster_id].size() > max_size)
+                continue;
+            if (target < 0 || count > best_connection ||
+                (count == best_connection &&
+                 clusters[cluster_id].size() < clusters[target].size())) {
+                target = cluster_id;
+                best_connection = count;
+            }
+        }
+        // not connected to anything that fits. use the smallest one
+        if (target < 0) {
+            for (uint32_t i = 0; i < num_clusters; i++) {
+                if (!alive[i] || i == small ||
+                    small_size + clusters[i].size() > max_size)
+                    continue;
+                if (target < 0 || clusters[i].size() < clusters[target].size())
+                    target = i;
+            }
+        }
+        if (target < 0) {
+            stuck[small] = true;
+            continue;
+        }
+
+        for (auto const blk : clusters[small]) {
+            blk_cluster[blk] = static_cast<uint32_t>(target);
+            clusters[target].emplace_back(blk);
+        }
+        clusters[small].clear();
+        alive[small] = false;
+        num_alive--;
+    }
+
+    clusters.erase(std::remove_if(clusters.begin(), clusters.end(),
+                                  [](const ::vector<uint32_t> &blks) {
+                                      return blks.empty();
+                                  }), clusters.end());
+}
+
+
+std::map<int, std::set<std::string>>
+balance_clusters(const ::map<int, ::set<::string>> &clusters,
+                 const ::map<::string, ::vector<::string>> &netlist,
+                 uint32_t num_threads, double lower_ratio,
+                 double upper_ratio, uint32_t min_split_size) {
+    num_threads = get_num_threads(num_threads);
+    ::vector<::vector<uint32_t>> cluster_blks;
+    auto indexed_netlist = index_netlist(clusters, netlist, cluster_blks);
+    const auto num_blks = indexed_netlist.blk_names.size();
+
+    ::map<int, ::set<::string>> result;
+    if (cluster_blks.empty())
+        return result;
+
+    const double target = static_cast<double>(num_blks) /
+            std::max<uint64_t>(num_threads, cluster_blks.size());
+    const auto max_size = std::max<uint64_t>(
+            min_split_size, static_cast<uint64_t>(std::ceil(target *
+                                                            upper_ratio)));
+    const auto min_size = static_cast<uint64_t>(std::ceil(target *
+                                                          lower_ratio));
+
+    ::vector<::vector<uint32_t>> balanced;
+    for (auto const &blks : cluster_blks) {
+        if (blks.size() > max_size) {
+            auto num_parts = static_cast<uint32_t>(
+                    (blks.size() + max_size - 1) / max_size);
+            split_cluster(blks, num_parts, indexed_netlist, balanced);
+        } else {
+            balanced.emplace_back(blks);
+        }
+    }
+    merge_clusters(balanced, indexed_netlist, min_size, max_size);
+
+    int cluster_id = 0;
+    for (auto const &blks : balanced) {
+        auto &cluster = result[cluster_id++];
+        for (auto const blk : blks)
+            cluster.emplace(indexed_netlist.blk_names[blk]);
+    }
+    return result;
+}
+
+double
+parallel_efficiency(const ::map<int, ::set<::string>> &clusters,
+                    const ::map<::string, ::vector<::string>> &netlist,
+                    uint32_t num_threads) {
+    num_threads = get_num_threads(num_threads);
+    std::unordered_map<::string, int> blk_cluster;
+    for (auto const &[cluster_id, blks] : clusters) {
+        for (auto const &blk : blks)
+            blk_cluster.emplace(blk, cluster_id);
+    }
+    // pins of the reduced netlist of every cluster. reducing a net keeps
+    // its size
+    ::map<int, uint64_t> num_pins;
+    for (auto const &iter : netlist) {
+        ::set<int> net_clusters;
+        for (auto const &blk : iter.second) {
+            auto it = blk_cluster.find(blk);
+            if (it != blk_cluster.end())
+                net_clusters.emplace(it->second);
+        }
+        for (auto const cluster_id : net_clusters)
+            num_pins[cluster_id] += iter.second.size();
+    }
+
+    ::vector<double> costs;
+    for (auto const &[cluster_id, blks] : clusters) {
+        if (blks.empty())
+            continue;
+        auto pins = num_pins.find(cluster_id) == num_pins.end() ?
+                    0 : num_pins.at(cluster_id);
+        costs.emplace_back(cluster_cost(blks.size(), pins));
+    }
+    if (costs.empty())
+        return 1;
+
+    std::sort(costs.begin(), costs.end(), std::greater<>());
+    std::priority_queue<double, ::vector<double>, std::greater<>> loads;
+    for (uint32_t i = 0; i < num_threads; i++)
+        loads.push(0);
+    double total = 0;
+    double makespan = 0;
+    for (auto const cost : costs) {
+        auto load = loads.top() + cost;
+        loads.pop();
+        loads.push(load);
+        total += cost;
+        makespan = std::max(makespan, load);
+    }
+    return total / (num_threads * makespan);
+}
@@ -0,0 +1,32 @@
+#ifndef THUNDER_BALANCE_HH
+#define THUNDER_BALANCE_HH
+
+#include <map>
+#include <set>
+#include <string>
+#include <vector>
+
+// splits oversized clusters with recursive bisection on their induced
+// subgraph and merges tiny ones into their most connected neighbor. the
+// target size is the number of blocks divided by max(num_threads,
+// num_clusters) and clusters are kept within
+// [lower_ratio, upper_ratio] x target. clusters no bigger than
+// min_split_size are never split. num_threads = 0 uses all the cores
+std::map<int, std::set<std::string>>
+balance_clusters(const std::map<int, std::set<std::string>> &clusters,
+                 const std::map<std::string,
+                                std::vector<std::string>> &netlist,
+                 uint32_t num_threads, double lower_ratio = 0.25,
+                 double upper_ratio = 1.5, uint32_t min_split_size = 10);
+
+// ratio between the total cost and num_threads x the makespan of the
+// longest processing time first schedule. the cost of a cluster is
+// cluster_cost() on the nets it has blocks on, same as multi_place without
+// predicted costs
+double
+parallel_efficiency(const std::map<int, std::set<std::string>> &clusters,
+                    const std::map<std::string,
+                                   std::vector<std::string>> &netlist,
+                    uint32_t num_threads);
+
+#endif //THUNDER_BALANCE_HH
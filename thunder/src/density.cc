@@ -0,0 +1,273 @@
+#include <algorithm>
+#include <cmath>
+#include <complex>
+#include <stdexcept>
+#include <thread>
+#include "include/cxxpool.h"
+#include "density.hh"
+
+using std::vector;
+using std::pair;
+using std::complex;
+
+// bins below this are solved on the calling thread, the pool overhead is
+// bigger than the work
+constexpr uint32_t min_parallel_bins = 64 * 64;
+
+static bool is_power_of_two(uint32_t n) {
+    return n > 0 && (n & (n - 1)) == 0;
+}
+
+static void fft(::vector<::complex<double>> &data, bool inverse) {
+    // iterative radix-2, no normalization
+    const auto n = static_cast<uint32_t>(data.size());
+    for (uint32_t i = 1, j = 0; i < n; i++) {
+        uint32_t bit = n >> 1u;
+        for (; j & bit; bit >>= 1u)
+            j ^= bit;
+        j ^= bit;
+        if (i < j)
+            std::swap(data[i], data[j]);
+    }
+    for (uint32_t len = 2; len <= n; len <<= 1u) {
+        const double angle = 2 * M_PI / len * (inverse ? 1 : -1);
+        const ::complex<double> w_len(std::cos(angle), std::sin(angle));
+        for (uint32_t i = 0; i < n; i += len) {
+            ::complex<double> w(1);
+            for (uint32_t j = 0; j < len / 2; j++) {
+                auto const u = data[i + j];
+                auto const v = data[i + j + len / 2] * w;
+                data[i + j] = u + v;
+                data[i + j + len / 2] = u - v;
+                w *= w_len;
+            }
+        }
+    }
+}
+
+// out_u = sum_x in_x cos(pi u (x + 0.5) / n), computed with a 2n FFT.
+// in and out are strided so that the same function works on rows and
+// columns
+static void cosine_transform(const double *in, double *out, uint32_t n,
+                             uint32_t stride) {
+    ::vector<::complex<double>> buf(2 * n);
+    for (uint32_t x = 0; x < n; x++)
+        buf[x] = in[x * stride];
+    fft(buf, false);
+    for (uint32_t u = 0; u < n; u++) {
+        const double angle = -M_PI * u / (2 * n);
+        out[u * stride] = (buf[u] * std::polar(1.0, angle)).real();
+    }
+}
+
+// cos_x = sum_u in_u cos(pi u (x + 0.5) / n) and
+// sin_x = sum_u in_u sin(pi u (x + 0.5) / n). either output can be null
+static void inverse_transform(const double *in, double *cos_out,
+                              double *sin_out, uint32_t n, uint32_t stride) {
+    ::vector<::complex<double>> buf(2 * n);
+    for (uint32_t u = 0; u < n; u++)
+        buf[u] = in[u * stride] * std::polar(1.0, M_PI * u / (2 * n));
+    fft(buf, true);
+    for (uint32_t x = 0; x < n; x++) {
+        if (cos_out)
+            cos_out[x * stride] = buf[x].real();
+        if (sin_out)
+            sin_out[x * stride] = buf[x].imag();
+    }
+}
+
+DensityGrid::DensityGrid(double width, double height, uint32_t num_bins_x,
+                         uint32_t num_bins_y, uint32_t num_threads)
+                         : nx_(num_bins_x), ny_(num_bins_y),
+                           bin_width_(width / num_bins_x),
+                           bin_height_(height / num_bins_y),
+                           width_(width), height_(height),
+                           rho_(num_bins_x * num_bins_y, 0),
+                           psi_(num_bins_x * num_bins_y, 0),
+                           field_x_(num_bins_x * num_bins_y, 0),
+                           field_y_(num_bins_x * num_bins_y, 0) {
+    if (!is_power_of_two(nx_) || !is_power_of_two(ny_))
+        throw std::runtime_error("number of bins has to be a power of two");
+    if (width <= 0 || height <= 0)
+        throw std::runtime_error("empty density grid");
+    if (num_threads == 0)
+        num_threads = std::thread::hardware_concurrency();
+    if (num_threads > 1 && nx_ * ny_ >= min_parallel_bins) {
+        pool_ = std::make_unique<cxxpool::thread_pool>(num_threads);
+        num_tasks_ = num_threads;
+    }
+}
+
+DensityGrid::~DensityGrid() = default;
+
+uint32_t DensityGrid::num_bins(uint64_t num_rects) {
+    // about four bins per rect, the FFT needs a power of two
+    const auto target = static_cast<uint32_t>(
+            std::ceil(2 * std::sqrt(static_cast<double>(num_rects))));
+    uint32_t result = 16;
+    while (result < target && result < 1024)
+        result <<= 1u;
+    return result;
+}
+
+template<typename F>
+void DensityGrid::parallel_for(uint32_t size, F &&func) const {
+    // every index is computed independently, so the result doesn't depend
+    // on the number of threads
+    if (!pool_) {
+        for (uint32_t i = 0; i < size; i++)
+            func(i);
+        return;
+    }
+    const uint32_t chunk = (size + num_tasks_ - 1) / num_tasks_;
+    ::vector<std::future<void>> tasks;
+    for (uint32_t start = 0; start < size; start += chunk) {
+        const uint32_t end = std::min(size, start + chunk);
+        tasks.emplace_back(pool_->push([&func, start, end]() {
+            for (uint32_t i = start; i < end; i++)
+                func(i);
+        }));
+    }
+    for (auto &task : tasks)
+        task.get();
+}
+
+void DensityGrid::update(const ::vector<DensityRect> &rects) {
+    spread(rects);
+    solve();
+}
+
+void DensityGrid::spread(const ::vector<DensityRect> &rects) {
+    // each task owns a row of bins and adds the rects in order
+    const double bin_area = bin_width_ * bin_height_;
+    parallel_for(ny_, [&](uint32_t y) {
+        double *row = &rho_[y * nx_];
+        std::fill(row, row + nx_, 0);
+        const double bin_ymin = y * bin_height_;
+        const double bin_ymax = bin_ymin + bin_height_;
+        for (auto const &rect : rects) {
+            const double overlap_y = std::min(bin_ymax,
+                                              rect.ymin + rect.height) -
+                                     std::max(bin_ymin, rect.ymin);
+            if (overlap_y <= 0)
+                continue;
+            const double xmax = rect.xmin + rect.width;
+            auto x_start = static_cast<int64_t>(
+                    std::floor(rect.xmin / bin_width_));
+            auto x_end = static_cast<int64_t>(std::ceil(xmax / bin_width_));
+            x_start = std::max<int64_t>(x_start, 0);
+            x_end = std::min<int64_t>(x_end, nx_);
+            for (auto x = x_start; x < x_end; x++) {
+                const double bin_xmin = x * bin_width_;
+                const double overlap_x = std::min(bin_xmin + bin_width_,
+                                                  xmax) -
+                                         std::max(bin_xmin, rect.xmin);
+                if (overlap_x > 0)
+                    row[x] += overlap_x * overlap_y / bin_area;
+            }
+        }
+    });
+}
+
+void DensityGrid::solve() {
+    // rho = sum_uv a_uv cos(w_u x) cos(w_v y), with x, y at the bin centers
+    ::vector<double> coef(nx_ * ny_);
+    parallel_for(ny_, [&](uint32_t y) {
+        cosine_transform(&rho_[y * nx_], &coef[y * nx_], nx_, 1);
+    });
+    parallel_for(nx_, [&](uint32_t u) {
+        cosine_transform(&coef[u], &coef[u], ny_, nx_);
+    });
+
+    // Poisson equation: psi_uv = a_uv / (w_u^2 + w_v^2). the DC term is
+    // dropped, which takes out the average density
+    ::vector<double> psi_coef(nx_ * ny_);
+    ::vector<double> field_x_coef(nx_ * ny_);
+    ::vector<double> field_y_coef(nx_ * ny_);
+    parallel_for(ny_, [&](uint32_t v) {
+        const double w_v = M_PI * v / height_;
+        const double c_v = (v == 0 ? 1.0 : 2.0) / ny_;
+        for (uint32_t u = 0; u < nx_; u++) {
+            const auto index = v * nx_ + u;
+            if (u == 0 && v == 0) {
+                psi_coef[index] = 0;
+                field_x_coef[index] = 0;
+                field_y_coef[index] = 0;
+                continue;
+            }
+            const double w_u = M_PI * u / width_;
+            const double c_u = (u == 0 ? 1.0 : 2.0) / nx_;
+            const double a = coef[index] * c_u * c_v / (w_u * w_u + w_v * w_v);
+            psi_coef[index] = a;
+            field_x_coef[index] = a * w_u;
+            field_y_coef[index] = a * w_v;
+        }
+    });
+
+    // back to the bins. the field is -grad(psi), so the derivative of a
+    // cosine becomes a sine without a sign change
+    parallel_for(nx_, [&](uint32_t u) {
+        inverse_transform(&psi_coef[u], &psi_coef[u], nullptr, ny_, nx_);
+        inverse_transform(&field_x_coef[u], &field_x_coef[u], nullptr, ny_,
+                          nx_);
+        inverse_transform(&field_y_coef[u], nullptr, &field_y_coef[u], ny_,
+                          nx_);
+    });
+    parallel_for(ny_, [&](uint32_t y) {
+        auto const offset = y * nx_;
+        inverse_transform(&psi_coef[offset], &psi_[offset], nullptr, nx_, 1);
+        inverse_transform(&field_x_coef[offset], nullptr, &field_x_[offset],
+                          nx_, 1);
+        inverse_transform(&field_y_coef[offset], &field_y_[offset], nullptr,
+                          nx_, 1);
+    });
+}
+
+double DensityGrid::energy() const {
+    double result = 0;
+    for (uint32_t i = 0; i < rho_.size(); i++)
+        result += rho_[i] * psi_[i];
+    return result * bin_width_ * bin_height_;
+}
+
+void DensityGrid::field(const ::vector<DensityRect> &rects,
+                        ::vector<::pair<double, double>> &result) const {
+    result.resize(rects.size());
+    parallel_for(static_cast<uint32_t>(rects.size()), [&](uint32_t i) {
+        auto const &rect = rects[i];
+        const double xmax = rect.xmin + rect.width;
+        const double ymax = rect.ymin + rect.height;
+        auto x_start = std::max<int64_t>(static_cast<int64_t>(
+                std::floor(rect.xmin / bin_width_)), 0);
+        auto x_end = std::min<int64_t>(static_cast<int64_t>(
+                std::ceil(xmax / bin_width_)), nx_);
+        auto y_start = std::max<int64_t>(static_cast<int64_t>(
+                std::floor(rect.ymin / bin_height_)), 0);
+        auto y_end = std::min<int64_t>(static_cast<int64_t>(
+                std::ceil(ymax / bin_height_)), ny_);
+        double field_x = 0, field_y = 0, total = 0;
+        for (auto y = y_start; y < y_end; y++) {
+            const double bin_ymin = y * bin_height_;
+            const double overlap_y = std::min(bin_ymin + bin_height_, ymax) -
+                                     std::max(bin_ymin, rect.ymin);
+            if (overlap_y <= 0)
+                continue;
+            for (auto x = x_start; x < x_end; x++) {
+                const double bin_xmin = x * bin_width_;
+                const double overlap_x = std::min(bin_xmin + bin_width_,
+                                                  xmax) -
+                                         std::max(bin_xmin, rect.xmin);
+                if (overlap_x <= 0)
+                    continue;
+                const double weight = overlap_x * overlap_y;
+                field_x += field_x_[y * nx_ + x] * weight;
+                field_y += field_y_[y * nx_ + x] * weight;
+                total += weight;
+            }
+        }
+        if (total > 0)
+            result[i] = {field_x / total, field_y / total};
+        else
+            result[i] = {0, 0};
+    });
+}
@@ -0,0 +1,68 @@
+#ifndef THUNDER_DENSITY_HH
+#define THUNDER_DENSITY_HH
+
+#include <memory>
+#include <utility>
+#include <vector>
+
+namespace cxxpool {
+class thread_pool;
+}
+
+struct DensityRect {
+    double xmin = 0;
+    double ymin = 0;
+    double width = 0;
+    double height = 0;
+};
+
+// electrostatic density model from ePlace. the rects are spread into a
+// grid of bins as charge, the Poisson equation is solved with a cosine
+// transform (Neumann boundary, so nothing is pushed off the board) and the
+// potential and the electric field are read back from the bins.
+// the number of bins in each direction has to be a power of two
+class DensityGrid {
+public:
+    DensityGrid(double width, double height, uint32_t num_bins_x,
+                uint32_t num_bins_y, uint32_t num_threads = 0);
+    ~DensityGrid();
+
+    // spreads the rects and solves for the potential and the field
+    void update(const std::vector<DensityRect> &rects);
+    // sum of charge x potential over the board
+    double energy() const;
+    // electric field averaged over the area of each rect. the gradient of
+    // energy() with respect to a rect position is -area x field
+    void field(const std::vector<DensityRect> &rects,
+               std::vector<std::pair<double, double>> &result) const;
+
+    // bins per direction for num_rects rects, about four per rect
+    static uint32_t num_bins(uint64_t num_rects);
+
+    double density(uint32_t x, uint32_t y) const { return rho_[y * nx_ + x]; }
+    double potential(uint32_t x, uint32_t y) const { return psi_[y * nx_ + x]; }
+
+private:
+    template<typename F>
+    void parallel_for(uint32_t size, F &&func) const;
+
+    void spread(const std::vector<DensityRect> &rects);
+    void solve();
+
+    uint32_t nx_;
+    uint32_t ny_;
+    double bin_width_;
+    double bin_height_;
+    double width_;
+    double height_;
+
+    std::vector<double> rho_;
+    std::vector<double> psi_;
+    std::vector<double> field_x_;
+    std::vector<double> field_y_;
+
+    std::unique_ptr<cxxpool::thread_pool> pool_;
+    uint32_t num_tasks_ = 1;
+};
+
+#endif //THUNDER_DENSITY_HH
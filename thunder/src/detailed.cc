@@ -2,9 +2,11 @@
 #include <iostream>
 #include <cassert>
 #include <string>
+#include <chrono>
 #include <cmath>
 #include "detailed.hh"
 #include "include/tqdm.h"
+#include "include/cxxpool.h"
 
 #define CLAMP(x, low, high)  (((x) > (high)) ? (high) : \
                              (((x) < (low)) ? (low) : (x)))
@@ -74,8 +76,7 @@ DetailedPlacer
     // set bounds
     set_bounds(available_pos);
 
-    // check if clb fixed
-    check_clb_fixed(fixed_pos);
+    index_reg_conflicts();
 }
 
 void DetailedPlacer::set_seed(uint32_t seed) {
@@ -164,8 +165,7 @@ DetailedPlacer
     // set bounds
     set_bounds(available_pos);
 
-    // check if clb fixed
-    check_clb_fixed(fixed_pos);
+    index_reg_conflicts();
 }
 
 void DetailedPlacer
@@ -521,27 +521,59 @@ void DetailedPlacer::compute_reg_no_pos(
     }
 }
 
-bool DetailedPlacer::is_reg_net(const Instance &ins, const Point &next_pos) {
-    int blk_id = ins.id;
-    if (reg_no_pos_.find(blk_id) != reg_no_pos_.end()) {
-        for (auto const &id : reg_no_pos_[blk_id]) {
-            if (next_pos == instances_[id].pos)
-                return false;
+void DetailedPlacer::index_reg_conflicts() {
+    reg_row_.assign(instances_.size(), -1);
+    reg_linked_rows_.assign(instances_.size(), {});
+    reg_conflicts_.clear();
+    if (!fold_reg_ || reg_no_pos_.empty())
+        return;
+    // fixed blocks can be outside of the available positions
+    int xmax = max_dim_, ymax = max_dim_;
+    for (auto const &ins : instances_) {
+        xmax = std::max(xmax, ins.pos.x);
+        ymax = std::max(ymax, ins.pos.y);
+    }
+    reg_grid_width_ = xmax + 1;
+    reg_grid_size_ = static_cast<uint32_t>(reg_grid_width_ * (ymax + 1));
+
+    int row = 0;
+    for (auto const &[blk_id, ids] : reg_no_pos_) {
+        reg_row_[blk_id] = row;
+        for (auto const id : ids)
+            reg_linked_rows_[id].emplace_back(row);
+        row++;
+    }
+    reg_conflicts_.assign(reg_grid_size_ * row, 0);
+    for (auto const &[blk_id, ids] : reg_no_pos_) {
+        const uint64_t offset = static_cast<uint64_t>(reg_row_[blk_id]) *
+                                reg_grid_size_;
+        for (auto const id : ids) {
+            auto const &pos = instances_[id].pos;
+            reg_conflicts_[offset + pos.y * reg_grid_width_ + pos.x]++;
         }
     }
-    return true;
 }
 
-void DetailedPlacer::check_clb_fixed(const std::map<std::string,
-        std::pair<int, int>> &fixed_pos) {
-    for (auto const &iter : fixed_pos) {
-        if (iter.first[0] == clb_type_) {
-            has_clb_fixed_ = true;
-            return;
-        }
+void DetailedPlacer::update_reg_conflicts(int blk_id, const Point &old_pos,
+                                          const Point &new_pos) {
+    for (auto const row : reg_linked_rows_[blk_id]) {
+        const uint64_t offset = static_cast<uint64_t>(row) * reg_grid_size_;
+        reg_conflicts_[offset + old_pos.y * reg_grid_width_ + old_pos.x]--;
+        reg_conflicts_[offset + new_pos.y * reg_grid_width_ + new_pos.x]++;
     }
 }
 
+bool DetailedPlacer::is_reg_net(const Instance &ins, const Point &next_pos) {
+    // the number of linked blocks on every cell is kept up to date, so the
+    // check doesn't need to look at them
+    const int row = reg_row_[ins.id];
+    if (row < 0)
+        return true;
+    const uint64_t offset = static_cast<uint64_t>(row) * reg_grid_size_;
+    return reg_conflicts_[offset + next_pos.y * reg_grid_width_ +
+                          next_pos.x] == 0;
+}
+
 void DetailedPlacer::move() {
 #if DEBUG
     double real_hpwl = get_hpwl(this->netlist_, this->instances_);
@@ -607,11 +639,9 @@ void DetailedPlacer::move() {
     if (curr_ins.name == next_ins.name)
         return;
 
-    // can't be a fixed instance
-    // we also need to some optimization to avoid unnecessary look up
-    // which is the case in most of the time. Unless you want to do
-    // partial reconfiguration
-    if (has_clb_fixed_ && next_ins.fixed)
+    // can't be a fixed instance. this happens with partial reconfiguration
+    // and ECO, where placed blocks of any type are fixed around the cluster
+    if (next_ins.fixed)
         return;
 
     // check if it's legal in reg net
@@ -629,55 +659,319 @@ void DetailedPlacer::move() {
 }
 
 void DetailedPlacer::anneal() {
+    // the congestion options are set after the constructor
+    curr_energy = init_energy();
     // the anneal schedule is different from VPR's because we want to
     // estimate the overall iterations
     sa_setup();
+    if (time_budget_ > 0)
+        apply_time_budget();
+    if (tmax_factor < 1)
+        d_limit_ = std::max(1.0, d_limit_ * tmax_factor);
+    if (num_replicas > 1) {
+        anneal_tempering();
+        return;
+    }
+    start_stats();
     tqdm bar;
     uint32_t total_swaps = estimate_num_swaps() * num_swap_;
     double temp = tmax;
     uint32_t current_swap = 0;
+    const bool refresh_timing = timing_weight > 0 && net_criticality_.empty()
+                                && timing_update_interval > 0;
     while (temp >= tmin) {
-        uint32_t accept = 0;
-        for (uint32_t i = 0; i < num_swap_; i++) {
-            move();
-            double new_energy = energy();
-            double de = new_energy - this->curr_energy;
-            if (de == 0)
+        const double iteration_temp = temp;
+        uint32_t accept = anneal_iteration(temp);
+        temp = next_temperature(temp);
+
+        bar.progress(current_swap++, total_swaps);
+        // the criticalities follow the placement
+        if (refresh_timing && current_swap % timing_update_interval == 0)
+            curr_energy = init_energy();
+
+        // most of the tail of the schedule doesn't move anything
+        if (end_iteration(iteration_temp, num_swap_, accept, d_limit_))
+            break;
+    }
+    bar.finish();
+    finish_stats();
+}
+
+uint32_t DetailedPlacer::anneal_iteration(double temp) {
+    if (batch_size > 1 && congestion_weight <= 0 && timing_weight <= 0)
+        return anneal_iteration_batched(temp);
+    uint32_t accept = 0;
+    for (uint32_t i = 0; i < num_swap_; i++) {
+        move();
+        double new_energy = energy();
+        double de = new_energy - this->curr_energy;
+        if (de == 0)
+            continue;
+        if (de > 0.0 && exp(-de / temp) < rand_.uniform<double>(0.0, 1.0)) {
+            continue;
+        } else {
+            commit_changes();
+            curr_energy = new_energy;
+            accept++;
+        }
+    }
+
+    double r_accept = (double)accept / num_swap_;
+    d_limit_ = d_limit_ * (1 - 0.44 + r_accept);
+    d_limit_ = CLAMP(d_limit_, 1, max_dim_);
+    return accept;
+}
+
+uint32_t DetailedPlacer::anneal_iteration_batched(double temp) {
+    if (net_stamp_.size() != netlist_.size()) {
+        net_stamp_.assign(netlist_.size(), 0);
+        blk_stamp_.assign(instances_.size(), 0);
+    }
+    uint32_t accept = 0;
+    batch_stamp_++;
+    for (uint32_t i = 0; i < num_swap_; i++) {
+        move();
+        if (moves_.empty())
+            continue;
+        auto const blk_a = moves_.begin()->blk_id;
+        auto const blk_b = moves_.rbegin()->blk_id;
+        if (!add_to_batch(blk_a, blk_b)) {
+            // the swap overlaps with the batch. it is still the same swap
+            // after the batch unless one of its blocks moved, in which case
+            // it is dropped like an illegal move
+            auto const pos_a = instances_[blk_a].pos;
+            auto const pos_b = instances_[blk_b].pos;
+            accept += flush_batch(temp);
+            if (!(instances_[blk_a].pos == pos_a) ||
+                !(instances_[blk_b].pos == pos_b))
                 continue;
-            if (de > 0.0 && exp(-de / temp) < rand_.uniform<double>(0.0, 1.0)) {
+            if (fold_reg_ && (!is_reg_net(instances_[blk_a], pos_b) ||
+                              !is_reg_net(instances_[blk_b], pos_a)))
                 continue;
-            } else {
-                commit_changes();
-                curr_energy = new_energy;
-                accept++;
+            add_to_batch(blk_a, blk_b);
+        }
+        if (batch_swaps_.size() >= batch_size)
+            accept += flush_batch(temp);
+    }
+    accept += flush_batch(temp);
+    moves_.clear();
+
+    double r_accept = (double)accept / num_swap_;
+    d_limit_ = d_limit_ * (1 - 0.44 + r_accept);
+    d_limit_ = CLAMP(d_limit_, 1, max_dim_);
+    return accept;
+}
+
+bool DetailedPlacer::add_to_batch(int blk_a, int blk_b) {
+    auto const &ins_a = instances_[blk_a];
+    auto const &ins_b = instances_[blk_b];
+    if (blk_stamp_[blk_a] == batch_stamp_ || blk_stamp_[blk_b] == batch_stamp_)
+        return false;
+    for (auto const *ins : {&ins_a, &ins_b}) {
+        for (auto const net_id : ins->nets) {
+            if (net_stamp_[net_id] == batch_stamp_)
+                return false;
+        }
+        // the register folding check looks at these blocks as well
+        if (fold_reg_) {
+            auto const iter = reg_no_pos_.find(ins->id);
+            if (iter == reg_no_pos_.end())
+                continue;
+            for (auto const id : iter->second) {
+                if (blk_stamp_[id] == batch_stamp_)
+                    return false;
             }
         }
+    }
 
-        // same schedule as estimation
-        // 0.5
-        if (temp == tmax) {
-            temp /= 2;
+    blk_stamp_[blk_a] = batch_stamp_;
+    blk_stamp_[blk_b] = batch_stamp_;
+    for (auto const *ins : {&ins_a, &ins_b}) {
+        for (auto const net_id : ins->nets) {
+            // the two blocks can share a net
+            if (net_stamp_[net_id] == batch_stamp_)
+                continue;
+            net_stamp_[net_id] = batch_stamp_;
+            for (auto const blk_id : netlist_[net_id].instances) {
+                auto const &pos = instances_[blk_id].pos;
+                auto const &new_pos = blk_id == blk_a ? ins_b.pos :
+                                      blk_id == blk_b ? ins_a.pos : pos;
+                batch_x_.emplace_back(pos.x);
+                batch_y_.emplace_back(pos.y);
+                batch_new_x_.emplace_back(new_pos.x);
+                batch_new_y_.emplace_back(new_pos.y);
+            }
+            batch_net_end_.emplace_back(batch_x_.size());
         }
-        // 0.9
-        else if (temp >= tmax * 0.1) {
-            temp *= 0.9;
+    }
+    batch_swaps_.emplace_back(blk_a, blk_b);
+    batch_swap_end_.emplace_back(batch_net_end_.size());
+    return true;
+}
+
+uint32_t DetailedPlacer::flush_batch(double temp) {
+    // score every net of the batch in one pass
+    ::vector<int> delta(batch_net_end_.size());
+    uint32_t start = 0;
+    for (uint32_t n = 0; n < batch_net_end_.size(); n++) {
+        const uint32_t end = batch_net_end_[n];
+        int xmin = INT32_MAX, xmax = INT32_MIN;
+        int ymin = INT32_MAX, ymax = INT32_MIN;
+        int new_xmin = INT32_MAX, new_xmax = INT32_MIN;
+        int new_ymin = INT32_MAX, new_ymax = INT32_MIN;
+        for (uint32_t i = start; i < end; i++) {
+            xmin = std::min(xmin, batch_x_[i]);
+            xmax = std::max(xmax, batch_x_[i]);
+            ymin = std::min(ymin, batch_y_[i]);
+            ymax = std::max(ymax, batch_y_[i]);
+            new_xmin = std::min(new_xmin, batch_new_x_[i]);
+            new_xmax = std::max(new_xmax, batch_new_x_[i]);
+            new_ymin = std::min(new_ymin, batch_new_y_[i]);
+            new_ymax = std::max(new_ymax, batch_new_y_[i]);
         }
-        // 0.95
-        else if (temp >= tmax * 0.0001) {
-            temp *= 0.95;
+        delta[n] = (new_xmax - new_xmin) + (new_ymax - new_ymin) -
+                   (xmax - xmin) - (ymax - ymin);
+        start = end;
+    }
+
+    // the swaps don't share nets, so accepting one doesn't change the delta
+    // of the others
+    uint32_t accept = 0;
+    uint32_t net_start = 0;
+    for (uint32_t m = 0; m < batch_swaps_.size(); m++) {
+        double de = 0;
+        for (uint32_t n = net_start; n < batch_swap_end_[m]; n++)
+            de += delta[n];
+        net_start = batch_swap_end_[m];
+        if (de == 0)
+            continue;
+        if (de > 0.0 && exp(-de / temp) < rand_.uniform<double>(0.0, 1.0))
+            continue;
+        auto &ins_a = instances_[batch_swaps_[m].first];
+        auto &ins_b = instances_[batch_swaps_[m].second];
+        if (fold_reg_) {
+            update_reg_conflicts(ins_a.id, ins_a.pos, ins_b.pos);
+            update_reg_conflicts(ins_b.id, ins_b.pos, ins_a.pos);
         }
-        // 0.8
-        else if (temp >= tmin) {
-            temp *= 0.8;
+        std::swap(ins_a.pos, ins_b.pos);
+        auto &locs = loc_instances_[ins_a.name[0]];
+        locs[{ins_a.pos.x, ins_a.pos.y}] = ins_a.id;
+        locs[{ins_b.pos.x, ins_b.pos.y}] = ins_b.id;
+        curr_energy += de;
+        accept++;
+    }
+
+    batch_swaps_.clear();
+    batch_x_.clear();
+    batch_y_.clear();
+    batch_new_x_.clear();
+    batch_new_y_.clear();
+    batch_net_end_.clear();
+    batch_swap_end_.clear();
+    batch_stamp_++;
+    return accept;
+}
+
+double DetailedPlacer::next_temperature(double temp) const {
+    // same schedule as estimation
+    // 0.5
+    if (temp == tmax) {
+        temp /= 2;
+    }
+    // 0.9
+    else if (temp >= tmax * 0.1) {
+        temp *= 0.9;
+    }
+    // 0.95
+    else if (temp >= tmax * 0.0001) {
+        temp *= 0.95;
+    }
+    // 0.8
+    else if (temp >= tmin) {
+        temp *= 0.8;
+    }
+    return temp;
+}
+
+void DetailedPlacer::anneal_tempering() {
+    start_stats();
+    // the replicas start from the current placement with their own seeds
+    const uint32_t count = num_replicas;
+    std::vector<DetailedPlacer> replicas(count, *this);
+    for (auto &replica : replicas) {
+        replica.detail_rand_.seed(detail_rand_.uniform(0u, UINT32_MAX));
+        replica.rand_.seed(detail_rand_.uniform(0u, UINT32_MAX));
+        replica.set_telemetry_callback(nullptr);
+    }
+    // order[k] is the replica at the k-th temperature, the coldest first.
+    // the replicas swap temperatures rather than placements
+    std::vector<uint32_t> order(count);
+    for (uint32_t k = 0; k < count; k++)
+        order[k] = k;
+    cxxpool::thread_pool pool{count};
+    const bool refresh_timing = timing_weight > 0 && net_criticality_.empty()
+                                && timing_update_interval > 0;
+
+    // every temperature of the schedule is spread into a geometric ladder
+    double temp = tmax;
+    uint32_t iteration = 0;
+    while (temp >= tmin) {
+        ::vector<std::future<uint32_t>> tasks;
+        const bool refresh = refresh_timing && iteration > 0 &&
+                             iteration % timing_update_interval == 0;
+        for (uint32_t k = 0; k < count; k++) {
+            auto replica = &replicas[order[k]];
+            const double t = temp * std::pow(tempering_ratio, k);
+            tasks.emplace_back(pool.push([replica, t, refresh]() {
+                if (refresh)
+                    replica->curr_energy = replica->init_energy();
+                return replica->anneal_iteration(t);
+            }));
+        }
+        uint32_t accept = 0;
+        for (auto &task : tasks)
+            accept += task.get();
+
+        // neighboring temperatures swap with the Metropolis criterion,
+        // even and odd pairs in turn
+        for (uint32_t k = iteration % 2; k + 1 < count; k += 2) {
+            const double beta_i = 1 / (temp * std::pow(tempering_ratio, k));
+            const double beta_j = beta_i / tempering_ratio;
+            const double e_i = replicas[order[k]].curr_energy;
+            const double e_j = replicas[order[k + 1]].curr_energy;
+            const double delta = (beta_i - beta_j) * (e_i - e_j);
+            if (delta >= 0 || exp(delta) > rand_.uniform<double>(0.0, 1.0)) {
+                std::swap(order[k], order[k + 1]);
+                stats_.exchanges++;
+            }
         }
 
-        bar.progress(current_swap++, total_swaps);
+        // the telemetry follows the coldest replica
+        auto const &cold = replicas[order.front()];
+        curr_energy = cold.curr_energy;
+        const double iteration_temp = temp;
+        temp = next_temperature(temp);
+        iteration++;
+        if (end_iteration(iteration_temp, num_swap_ * count, accept,
+                          cold.d_limit_))
+            break;
+    }
 
-        double r_accept = (double)accept / num_swap_;
-        d_limit_ = d_limit_ * (1 - 0.44 + r_accept);
-        d_limit_ = CLAMP(d_limit_, 1, max_dim_);
+    // keep the best placement, normally the one at the coldest temperature
+    const DetailedPlacer *best = &replicas[order.front()];
+    for (auto const &replica : replicas) {
+        if (replica.curr_energy < best->curr_energy)
+            best = &replica;
     }
-    bar.finish();
+    instances_ = best->instances_;
+    loc_instances_ = best->loc_instances_;
+    reg_conflicts_ = best->reg_conflicts_;
+    rudy_ = best->rudy_;
+    timing_ = best->timing_;
+    net_weights_ = best->net_weights_;
+    curr_energy = best->curr_energy;
+    d_limit_ = best->d_limit_;
+    finish_stats();
 }
 
 void DetailedPlacer::sa_setup() {
@@ -709,6 +1003,31 @@ void DetailedPlacer::sa_setup() {
         cerr << "Unable to determine tmax. Use default temperature\n";
         tmax = 3000;
     }
+    if (tmax_factor < 1)
+        tmax = std::max(tmax * tmax_factor, tmin);
+}
+
+void DetailedPlacer::apply_time_budget() {
+    // time a small batch of moves to get the cost per swap, then scale
+    // down the swaps per temperature to fit in the budget
+    constexpr uint32_t max_sample = 1000;
+    const uint32_t sample = std::max(1u, std::min(num_swap_, max_sample));
+    auto start = std::chrono::steady_clock::now();
+    for (uint32_t i = 0; i < sample; i++) {
+        move();
+        energy();
+    }
+    moves_.clear();
+    auto end = std::chrono::steady_clock::now();
+    double swap_time = std::chrono::duration<double>(end - start).count()
+                       / sample;
+    double total_time = swap_time * num_swap_ * estimate_num_swaps();
+    if (total_time <= time_budget_)
+        return;
+    double ratio = time_budget_ / total_time;
+    // keep at least one swap per block per temperature
+    num_swap_ = std::max(num_blocks_,
+                         static_cast<uint32_t>(num_swap_ * ratio));
 }
 
 double DetailedPlacer::estimate() {
@@ -761,7 +1080,12 @@ double DetailedPlacer::energy() {
         for (auto const net_id : changed_net) {
             nets[count++] = netlist_[net_id];
         }
-        double old_hpwl = get_hpwl(nets, this->instances_);
+        double old_hpwl = net_weights_.empty() ?
+                          get_hpwl(nets, this->instances_) :
+                          weighted_hpwl(changed_net);
+        ::vector<BoundingBox> old_boxes;
+        if (congestion_weight > 0)
+            old_boxes = net_boxes(nets);
 
         // change the locations
         for (const auto &move : moves_) {
@@ -770,13 +1094,19 @@ double DetailedPlacer::energy() {
         }
 
         // compute the new hpwl
-        double new_hpwl = get_hpwl(nets, this->instances_);
+        double new_hpwl = net_weights_.empty() ?
+                          get_hpwl(nets, this->instances_) :
+                          weighted_hpwl(changed_net);
+        double congestion = 0;
+        if (congestion_weight > 0)
+            congestion = congestion_delta(old_boxes, net_boxes(nets), false);
 
         // revert
         for (const auto &iter : original)
             instances_[iter.first].pos = iter.second;
 
-        return this->curr_energy + (new_hpwl - old_hpwl);
+        return this->curr_energy + (new_hpwl - old_hpwl) +
+               congestion_weight * congestion;
 
     } else {
         return this->curr_energy;
@@ -784,18 +1114,140 @@ double DetailedPlacer::energy() {
 }
 
 void DetailedPlacer::commit_changes() {
+    ::vector<Net> nets;
+    ::vector<BoundingBox> old_boxes;
+    if (congestion_weight > 0) {
+        set<int> changed_net;
+        for (auto const &move : moves_) {
+            auto const &net_ids = instances_[move.blk_id].nets;
+            changed_net.insert(net_ids.begin(), net_ids.end());
+        }
+        for (auto const net_id : changed_net)
+            nets.emplace_back(netlist_[net_id]);
+        old_boxes = net_boxes(nets);
+    }
     for (const auto &move : moves_) {
         auto new_pos = std::make_pair(move.new_pos.x, move.new_pos.y);
         const char blk_type = instances_[move.blk_id].name[0];
         loc_instances_[blk_type][new_pos] = move.blk_id;
 
         int blk_id = move.blk_id;
+        if (fold_reg_)
+            update_reg_conflicts(blk_id, instances_[blk_id].pos,
+                                 move.new_pos);
         instances_[blk_id].pos = Point(move.new_pos);
     }
+    if (congestion_weight > 0)
+        congestion_delta(old_boxes, net_boxes(nets), true);
 }
 
 double DetailedPlacer::init_energy() {
-    return get_hpwl(this->netlist_, this->instances_);
+    update_timing();
+    double hpwl = get_hpwl(this->netlist_, this->instances_);
+    if (!net_weights_.empty()) {
+        hpwl = 0;
+        for (uint64_t i = 0; i < netlist_.size(); i++) {
+            auto const box = net_box(netlist_[i]);
+            hpwl += net_weights_[i] *
+                    ((box.xmax - box.xmin) + (box.ymax - box.ymin));
+        }
+    }
+    if (congestion_weight <= 0)
+        return hpwl;
+    if (congestion_base_.width() > 0) {
+        rudy_ = congestion_base_;
+    } else {
+        int xmax = max_dim_, ymax = max_dim_;
+        for (auto const &ins : instances_) {
+            xmax = std::max(xmax, ins.pos.x);
+            ymax = std::max(ymax, ins.pos.y);
+        }
+        rudy_ = RudyMap(xmax + 1, ymax + 1, congestion_capacity);
+    }
+    for (auto const &net : netlist_)
+        rudy_.update(net_box(net), 1);
+    return hpwl + congestion_weight * rudy_.overflow();
+}
+
+void DetailedPlacer::set_net_criticality(
+        const ::map<::string, double> &criticality) {
+    net_criticality_ = criticality;
+}
+
+void DetailedPlacer::update_timing() {
+    if (timing_weight <= 0) {
+        net_weights_.clear();
+        return;
+    }
+    ::vector<double> criticality(netlist_.size(), 0);
+    if (net_criticality_.empty()) {
+        // the delays are set after the constructor
+        if (!timing_ready_) {
+            timing_ = TimingEstimate(netlist_, instances_, clb_type_,
+                                     timing_delay);
+            timing_ready_ = true;
+        }
+        timing_.update(instances_);
+        criticality = timing_.criticality();
+    } else {
+        for (uint64_t i = 0; i < netlist_.size(); i++) {
+            auto const iter = net_criticality_.find(netlist_[i].net_id);
+            if (iter != net_criticality_.end())
+                criticality[i] = iter->second;
+        }
+    }
+    net_weights_.resize(netlist_.size());
+    for (uint64_t i = 0; i < netlist_.size(); i++)
+        net_weights_[i] = 1 + timing_weight *
+                              std::pow(criticality[i], criticality_exponent);
+}
+
+double DetailedPlacer::weighted_hpwl(const ::set<int> &net_ids) const {
+    double result = 0;
+    for (auto const net_id : net_ids) {
+        auto const box = net_box(netlist_[net_id]);
+        result += net_weights_[net_id] *
+                  ((box.xmax - box.xmin) + (box.ymax - box.ymin));
+    }
+    return result;
+}
+
+BoundingBox DetailedPlacer::net_box(const Net &net) const {
+    BoundingBox box{INT32_MAX, INT32_MIN, INT32_MAX, INT32_MIN};
+    for (auto const blk_id : net.instances) {
+        auto const &pos = instances_[blk_id].pos;
+        box.xmin = std::min(box.xmin, pos.x);
+        box.xmax = std::max(box.xmax, pos.x);
+        box.ymin = std::min(box.ymin, pos.y);
+        box.ymax = std::max(box.ymax, pos.y);
+    }
+    return box;
+}
+
+::vector<BoundingBox>
+DetailedPlacer::net_boxes(const ::vector<Net> &nets) const {
+    ::vector<BoundingBox> boxes;
+    boxes.reserve(nets.size());
+    for (auto const &net : nets)
+        boxes.emplace_back(net_box(net));
+    return boxes;
+}
+
+double DetailedPlacer::congestion_delta(const ::vector<BoundingBox> &old_boxes,
+                                        const ::vector<BoundingBox> &new_boxes,
+                                        bool commit) {
+    double delta = 0;
+    for (uint64_t i = 0; i < old_boxes.size(); i++) {
+        delta += rudy_.update(old_boxes[i], -1);
+        delta += rudy_.update(new_boxes[i], 1);
+    }
+    if (!commit) {
+        for (uint64_t i = old_boxes.size(); i > 0; i--) {
+            rudy_.update(new_boxes[i - 1], -1);
+            rudy_.update(old_boxes[i - 1], 1);
+        }
+    }
+    return delta;
 }
 
 ::map<std::string, std::pair<int, int>> DetailedPlacer::realize() {
@@ -810,5 +1262,6 @@ double DetailedPlacer::init_energy() {
 void DetailedPlacer::refine(int num_iter, double threshold,
                           bool print_improvement) {
     d_limit_ = sqrt(max_dim_) * 2;
+    curr_energy = init_energy();
     SimAnneal::refine(num_iter, threshold, print_improvement);
 }
@@ -3,6 +3,8 @@
 
 #include "util.hh"
 #include "anneal.hh"
+#include "rudy.hh"
+#include "timing.hh"
 
 struct DetailedMove {
     int blk_id;
@@ -34,6 +36,43 @@ public:
                 bool print_improvement) override;
 
     void set_seed(uint32_t seed);
+    // wall clock budget for anneal() in seconds. 0 means no limit
+    void set_time_budget(double seconds) { time_budget_ = seconds; }
+
+    // scales the starting temperature and the move range of anneal(). below
+    // 1 the anneal only polishes the initial placement instead of scrambling
+    // it
+    double tmax_factor = 1;
+    // parallel tempering. above 1 anneal() runs that many replicas on their
+    // own threads, each temperature of the schedule is spread over them by
+    // tempering_ratio and neighboring replicas swap their temperatures
+    uint32_t num_replicas = 1;
+    double tempering_ratio = 1.5;
+    // above 1 anneal() scores up to that many swaps at once. the swaps of a
+    // batch don't share any net, so their deltas are independent and the
+    // acceptance still runs one swap after the other. it only covers the
+    // plain HPWL cost
+    uint32_t batch_size = 1;
+    // weight of the RUDY overflow in the cost, 0 is pure HPWL
+    double congestion_weight = 0;
+    // routing tracks per tile
+    double congestion_capacity = 8;
+    // demand of the nets outside the placer, it has to cover the board
+    void set_congestion_base(const RudyMap &base) { congestion_base_ = base; }
+    const RudyMap &congestion_map() const { return rudy_; }
+    // timing-driven placement. the HPWL of every net is weighted by
+    // 1 + timing_weight * criticality ^ criticality_exponent, 0 is pure HPWL.
+    // anneal() estimates the timing again every timing_update_interval
+    // temperatures
+    double timing_weight = 0;
+    double criticality_exponent = 8;
+    uint32_t timing_update_interval = 1;
+    TimingDelay timing_delay;
+    // criticality of the nets by name, from an estimate of the whole board.
+    // the placer keeps them instead of estimating its own nets
+    void set_net_criticality(const std::map<std::string, double> &criticality);
+    // of the last timing estimate
+    double critical_path() const { return timing_.critical_path(); }
 
     static char REG_BLK_TYPE;
 
@@ -55,14 +94,24 @@ protected:
     bool is_reg_net(const Instance &ins, const Point &next_pos);
 
     std::map<int, std::set<int>> reg_no_pos_;
+    // register folding. every block in reg_no_pos_ has a row with the number
+    // of its linked blocks on each cell, and reg_linked_rows_ lists the rows
+    // a block is counted in
+    std::vector<int> reg_row_;
+    std::vector<std::vector<int>> reg_linked_rows_;
+    std::vector<uint8_t> reg_conflicts_;
+    int reg_grid_width_ = 0;
+    uint32_t reg_grid_size_ = 0;
+    void index_reg_conflicts();
+    void update_reg_conflicts(int blk_id, const Point &old_pos,
+                              const Point &new_pos);
 
     std::map<char, std::map<std::pair<int, int>, int>> loc_instances_;
     double d_limit_ = 0;
     int max_dim_ = 0;
     uint32_t num_blocks_ = 0;
     uint32_t num_swap_ = 0;
-
-    bool has_clb_fixed_ = false;
+    double time_budget_ = 0;
 
 private:
     void init_place_regular(const std::vector<std::string> &cluster_blocks,
@@ -114,15 +163,53 @@ private:
             const std::map<char,
                            std::vector<std::pair<int, int>>> &available_pos);
 
-    void check_clb_fixed(const std::map<std::string,
-                                        std::pair<int, int>> &fixed_pos);
-
     void sa_setup();
     void index_loc() ;
+    // one temperature of the schedule, returns the accepted moves
+    uint32_t anneal_iteration(double temp);
+    uint32_t anneal_iteration_batched(double temp);
+    bool add_to_batch(int blk_a, int blk_b);
+    uint32_t flush_batch(double temp);
+    double next_temperature(double temp) const;
+    void anneal_tempering();
 
     uint32_t estimate_num_swaps() const;
+    void apply_time_budget();
 
     std::map<std::string, std::pair<int, int>> fixed_pos_;
+
+    RudyMap rudy_;
+    RudyMap congestion_base_;
+    BoundingBox net_box(const Net &net) const;
+    std::vector<BoundingBox> net_boxes(const std::vector<Net> &nets) const;
+    // applies the moved bounding boxes to the map and returns the change of
+    // the overflow. the map is restored unless commit is set
+    double congestion_delta(const std::vector<BoundingBox> &old_boxes,
+                            const std::vector<BoundingBox> &new_boxes,
+                            bool commit);
+
+    TimingEstimate timing_;
+    bool timing_ready_ = false;
+    std::map<std::string, double> net_criticality_;
+    std::vector<double> net_weights_;
+    // estimates the timing and sets the net weights
+    void update_timing();
+    double weighted_hpwl(const std::set<int> &net_ids) const;
+
+    // batched evaluation. a net or block belongs to the current batch if
+    // its stamp is batch_stamp_
+    std::vector<uint32_t> net_stamp_;
+    std::vector<uint32_t> blk_stamp_;
+    uint32_t batch_stamp_ = 0;
+    std::vector<std::pair<int, int>> batch_swaps_;
+    // pin positions of the nets in the batch before and after the swaps,
+    // one contiguous range per net
+    std::vector<int> batch_x_;
+    std::vector<int> batch_y_;
+    std::vector<int> batch_new_x_;
+    std::vector<int> batch_new_y_;
+    std::vector<uint32_t> batch_net_end_;
+    std::vector<uint32_t> batch_swap_end_;
 };
 
 
@@ -0,0 +1,162 @@
+#include <algorithm>
+#include <set>
+#include <stdexcept>
+#include "eco.hh"
+#include "detailed.hh"
+#include "legalize.hh"
+#include "refine.hh"
+
+using std::map;
+using std::pair;
+using std::set;
+using std::string;
+using std::vector;
+
+::map<::string, ::pair<int, int>>
+match_placement(const ::map<::string, ::pair<int, int>> &prev_placement,
+                const ::map<::string, ::string> &prev_id_to_name,
+                const ::map<::string, ::string> &id_to_name) {
+    ::map<::string, ::string> name_to_prev_id;
+    for (auto const &[blk_id, name] : prev_id_to_name)
+        name_to_prev_id.emplace(name, blk_id);
+
+    ::map<::string, ::pair<int, int>> result;
+    for (auto const &[blk_id, name] : id_to_name) {
+        auto const iter = name_to_prev_id.find(name);
+        if (iter == name_to_prev_id.end())
+            continue;
+        // the block type is part of the ID. a block that changed its type
+        // has to be placed again
+        auto const &prev_id = iter->second;
+        if (prev_id[0] != blk_id[0])
+            continue;
+        auto const pos = prev_placement.find(prev_id);
+        if (pos != prev_placement.end())
+            result.emplace(blk_id, pos->second);
+    }
+    for (auto const &[blk_id, pos] : prev_placement) {
+        if (id_to_name.find(blk_id) == id_to_name.end())
+            result.emplace(blk_id, pos);
+    }
+    return result;
+}
+
+::map<::string, ::pair<int, int>>
+eco_placement(const ::map<::string, ::pair<int, int>> &prev_placement,
+              const ::map<::string, ::vector<::string>> &netlist,
+              const ::map<::string, ::pair<int, int>> &fixed_pos,
+              const Layout &layout, bool fold_reg, uint32_t seed,
+              uint32_t window_radius, double temperature) {
+    ::map<::string, ::vector<::string>> blk_nets;
+    for (auto const &[net_id, net] : netlist) {
+        for (auto const &blk : net) {
+            if (fixed_pos.find(blk) == fixed_pos.end())
+                blk_nets[blk].emplace_back(net_id);
+        }
+    }
+
+    // legal positions that are not taken yet
+    ::map<char, ::set<::pair<int, int>>> free_pos;
+    for (auto const &[blk_type, pos_list] : layout.produce_available_pos())
+        free_pos[blk_type].insert(pos_list.begin(), pos_list.end());
+    for (auto const &[blk_id, pos] : fixed_pos) {
+        if (free_pos.find(blk_id[0]) != free_pos.end())
+            free_pos[blk_id[0]].erase(pos);
+    }
+
+    // unchanged blocks keep their position. the first block wins if two of
+    // them claim the same cell
+    auto placement = fixed_pos;
+    ::vector<::string> changed;
+    for (auto const &iter : blk_nets) {
+        auto const &blk_id = iter.first;
+        auto const prev = prev_placement.find(blk_id);
+        auto const cells = free_pos.find(blk_id[0]);
+        if (prev != prev_placement.end() && cells != free_pos.end() &&
+            cells->second.erase(prev->second)) {
+            placement.emplace(blk_id, prev->second);
+        } else {
+            changed.emplace_back(blk_id);
+        }
+    }
+    if (changed.empty())
+        return placement;
+
+    const auto width = static_cast<uint32_t>(layout.width());
+    const auto height = static_cast<uint32_t>(layout.height());
+    ::map<char, CellGrid> grids;
+    for (auto const &[blk_type, pos_set] : free_pos) {
+        grids.emplace(blk_type, CellGrid(::vector<::pair<int, int>>(
+                pos_set.begin(), pos_set.end()), width, height));
+    }
+    auto insert = [&](const ::string &blk_id, double x, double y) {
+        auto const grid = grids.find(blk_id[0]);
+        if (grid == grids.end())
+            throw std::runtime_error("no position for blk " + blk_id);
+        auto const cells = grid->second.take_nearest(x, y, 1);
+        if (cells.empty())
+            throw std::runtime_error("no position for blk " + blk_id);
+        placement.emplace(blk_id, cells.front());
+        free_pos[blk_id[0]].erase(cells.front());
+    };
+
+    // insert the changed blocks at the center of their placed neighbors,
+    // so a chain of new blocks grows out of the old placement
+    auto pending = changed;
+    while (!pending.empty()) {
+        ::vector<::string> next;
+        for (auto const &blk_id : pending) {
+            double x = 0, y = 0;
+            uint32_t count = 0;
+            for (auto const &net_id : blk_nets.at(blk_id)) {
+                for (auto const &blk : netlist.at(net_id)) {
+                    auto const pos = placement.find(blk);
+                    if (blk == blk_id || pos == placement.end())
+                        continue;
+                    x += pos->second.first;
+                    y += pos->second.second;
+                    count++;
+                }
+            }
+            if (count == 0)
+                next.emplace_back(blk_id);
+            else
+                insert(blk_id, x / count, y / count);
+        }
+        if (next.size() == pending.size()) {
+            // not connected to anything placed
+            insert(next.front(), width / 2.0, height / 2.0);
+            next.erase(next.begin());
+        }
+        pending.swap(next);
+    }
+
+    // windows around the inserted blocks
+    ::vector<bool> covered(width * height, false);
+    const auto radius = static_cast<int>(window_radius);
+    for (auto const &blk_id : changed) {
+        auto const [x, y] = placement.at(blk_id);
+        for (int yy = std::max(y - radius, 0);
+             yy <= std::min(y + radius, static_cast<int>(height) - 1); yy++) {
+            for (int xx = std::max(x - radius, 0);
+                 xx <= std::min(x + radius, static_cast<int>(width) - 1); xx++)
+                covered[yy * width + xx] = true;
+        }
+    }
+
+    // every block inside the windows is placed again, on the free cells and
+    // the cells of these blocks
+    auto window = make_window(covered, width, placement, netlist, blk_nets,
+                              free_pos);
+
+    DetailedPlacer placer(window.placement, window.netlist, window.cells,
+                          window.fixed_pos, layout.get_clb_type(), fold_reg);
+    placer.set_seed(seed);
+    placer.tmax_factor = temperature;
+    placer.anneal();
+    for (auto const &[blk_id, pos] : placer.realize()) {
+        if (window.placement.find(blk_id) != window.placement.end())
+            placement[blk_id] = pos;
+    }
+    return placement;
+}
@@ -0,0 +1,30 @@
+#ifndef THUNDER_ECO_HH
+#define THUNDER_ECO_HH
+
+#include <map>
+#include <string>
+#include <vector>
+#include "layout.hh"
+
+// previous placement keyed by the block IDs of the new netlist. blocks are
+// matched by name since the packer may renumber them after an edit, the
+// IDs are only used for the blocks without a name in the new netlist
+std::map<std::string, std::pair<int, int>>
+match_placement(const std::map<std::string, std::pair<int, int>> &prev_placement,
+                const std::map<std::string, std::string> &prev_id_to_name,
+                const std::map<std::string, std::string> &id_to_name);
+
+// incremental placement after a small netlist edit. blocks that kept a legal
+// position in prev_placement stay where they are, the new or changed ones
+// are inserted next to the blocks they connect to. then a low temperature
+// anneal runs only inside the windows of window_radius around the inserted
+// blocks, where the old blocks may be moved a bit as well.
+// the blocks in fixed_pos (IO) never move
+std::map<std::string, std::pair<int, int>>
+eco_placement(const std::map<std::string, std::pair<int, int>> &prev_placement,
+              const std::map<std::string, std::vector<std::string>> &netlist,
+              const std::map<std::string, std::pair<int, int>> &fixed_pos,
+              const Layout &layout, bool fold_reg, uint32_t seed = 0,
+              uint32_t window_radius = 2, double temperature = 0.05);
+
+#endif //THUNDER_ECO_HH
@@ -1,7 +1,9 @@
 #include <string>
 #include <cmath>
 #include <limits>
+#include <memory>
 #include "global.hh"
+#include "legalize.hh"
 
 using std::map;
 using std::vector;
@@ -34,6 +36,7 @@ GlobalPlacer::GlobalPlacer(const ::map<::string, ::set<::string>> &clusters,
                            clb_type_(board_layout.get_clb_type()),
                            clusters_(clusters),
                            netlists_(),
+                           raw_netlists_(netlists),
                            fixed_pos_(fixed_pos),
                            board_layout_(board_layout),
                            reduced_board_layout_(),
@@ -68,10 +71,13 @@ GlobalPlacer::GlobalPlacer(const ::map<::string, ::set<::string>> &clusters,
 
     // set annealing parameters
     this->tmax = tmin * 2;
-    this->steps = (int)(std::pow(clusters_.size()* nets.size(), 1.8));
+    this->steps = (int)std::min<double>(
+            std::pow(clusters_.size() * nets.size(), 1.8),
+            std::numeric_limits<int>::max());
 }
 
 void GlobalPlacer::set_seed(uint32_t seed) {
+    seed_ = seed;
     global_rand_.seed(seed);
 }
 
@@ -345,6 +351,8 @@ void GlobalPlacer::solve() {
     double old_obj_value = 0;
     ::map<double, ::vector<ClusterBox>> states;
 
+    init_density();
+
     for (uint32_t iter = 0; iter < max_iter; iter++) {
         obj_value = eval_f();
         printf("HPWL: %f\n", obj_value);
@@ -471,7 +479,181 @@ void GlobalPlacer::solve() {
     this->curr_energy = init_energy();
 }
 
-double GlobalPlacer::eval_f(double overlap_param) const {
+void GlobalPlacer::solve_multilevel(uint32_t coarsest_size) {
+    // coarsening. parents[i] maps the cluster ids of level i - 1 (this
+    // placer for i = 0) to the ones in levels[i]
+    ::vector<std::unique_ptr<GlobalPlacer>> levels;
+    ::vector<::map<::string, ::string>> parents;
+    const GlobalPlacer *current = this;
+    while (current->clusters_.size() > coarsest_size) {
+        auto groups = current->match_clusters();
+        // stop if the matching doesn't reduce the size much
+        if (groups.size() > 0.9 * current->clusters_.size())
+            break;
+        ::map<::string, ::set<::string>> coarse_clusters;
+        ::map<::string, ::string> parent_of;
+        for (uint32_t i = 0; i < groups.size(); i++) {
+            auto const cluster_id = "c" + std::to_string(levels.size()) +
+                                    "_" + std::to_string(i);
+            auto &blks = coarse_clusters[cluster_id];
+            for (auto const &child_id : groups[i]) {
+                auto const &child = current->clusters_.at(child_id);
+                blks.insert(child.begin(), child.end());
+                parent_of[child_id] = cluster_id;
+            }
+        }
+        levels.emplace_back(std::make_unique<GlobalPlacer>(coarse_clusters,
+                                                           raw_netlists_,
+                                                           fixed_pos_,
+                                                           board_layout_));
+        levels.back()->set_seed(seed_);
+        levels.back()->set_num_threads(num_threads_);
+        levels.back()->anneal_param_factor = anneal_param_factor;
+        parents.emplace_back(parent_of);
+        current = levels.back().get();
+    }
+
+    if (levels.empty()) {
+        solve();
+        return;
+    }
+    printf("Multilevel global placement with %ld level(s)\n",
+           static_cast<long>(levels.size() + 1));
+
+    // the flat number of steps explodes with the netlist size. the coarsest
+    // level gets a full anneal and every finer level a short refinement
+    constexpr double coarse_steps_per_cluster = 2000;
+    constexpr double refine_steps_per_cluster = 300;
+    auto &coarsest = *levels.back();
+    coarsest.steps = (int)std::min<double>(
+            coarsest.steps,
+            coarse_steps_per_cluster * coarsest.clusters_.size());
+    coarsest.solve();
+    coarsest.anneal();
+
+    // uncoarsening
+    for (auto i = static_cast<int64_t>(levels.size()) - 1; i >= 0; i--) {
+        GlobalPlacer &fine = i > 0 ? *levels[i - 1] : *this;
+        fine.interpolate(*levels[i], parents[i]);
+        fine.steps = (int)std::min<double>(
+                fine.steps, refine_steps_per_cluster * fine.clusters_.size());
+        fine.solve();
+        if (i > 0)
+            fine.anneal();
+    }
+}
+
+::vector<::vector<::string>> GlobalPlacer::match_clusters() const {
+    // connection weights between the movable boxes. nets are weighted by
+    // 1 / (|net| - 1) so that the big ones don't dominate
+    constexpr uint32_t max_net_size = 32;
+    const auto num_boxes = boxes_.size();
+    ::vector<::map<int, double>> weights(num_boxes);
+    for (auto const &net : netlists_) {
+        if (net.size() > max_net_size)
+            continue;
+        const double weight = 1.0 / (net.size() - 1);
+        for (uint32_t i = 0; i < net.size(); i++) {
+            if (boxes_[net[i]].fixed)
+                continue;
+            for (uint32_t j = i + 1; j < net.size(); j++) {
+                if (boxes_[net[j]].fixed)
+                    continue;
+                weights[net[i]][net[j]] += weight;
+                weights[net[j]][net[i]] += weight;
+            }
+        }
+    }
+
+    // a merged box can't be bigger than an even share of the board
+    ::vector<int> order;
+    uint64_t total_size = 0;
+    for (auto const &box : boxes_) {
+        if (box.fixed)
+            continue;
+        order.emplace_back(box.index);
+        total_size += std::max(box.clb_size, 1);
+    }
+    const double max_size = std::max<double>(
+            total_size / (order.size() / 2.0), 1);
+    // visit the small boxes first so that the sizes stay even
+    std::stable_sort(order.begin(), order.end(), [&](int a, int b) {
+        return boxes_[a].clb_size < boxes_[b].clb_size;
+    });
+
+    ::vector<bool> matched(num_boxes, false);
+    ::vector<::vector<::string>> groups;
+    for (auto const index : order) {
+        if (matched[index])
+            continue;
+        matched[index] = true;
+        const double size = std::max(boxes_[index].clb_size, 1);
+        int best = -1;
+        double best_rating = 0;
+        for (auto const &[next, weight] : weights[index]) {
+            if (matched[next])
+                continue;
+            const double next_size = std::max(boxes_[next].clb_size, 1);
+            if (size + next_size > max_size)
+                continue;
+            // heavy edge, normalized by the size
+            double rating = weight / (size * next_size);
+            if (rating > best_rating) {
+                best = next;
+                best_rating = rating;
+            }
+        }
+        ::vector<::string> group = {boxes_[index].id};
+        if (best >= 0) {
+            matched[best] = true;
+            group.emplace_back(boxes_[best].id);
+        }
+        groups.emplace_back(group);
+    }
+    return groups;
+}
+
+void GlobalPlacer::interpolate(const GlobalPlacer &coarse,
+                               const ::map<::string, ::string> &parent_of) {
+    ::map<::string, int> coarse_index;
+    for (auto const &box : coarse.boxes_)
+        coarse_index[box.id] = box.index;
+    ::map<::string, ::vector<int>> children;
+    for (auto const &box : boxes_) {
+        if (!box.fixed)
+            children[parent_of.at(box.id)].emplace_back(box.index);
+    }
+
+    for (auto const &[parent_id, indices] : children) {
+        auto const &parent = coarse.boxes_[coarse_index.at(parent_id)];
+        // spread the children on a grid inside the parent box
+        auto const num_children = static_cast<uint32_t>(indices.size());
+        auto const cols = static_cast<uint32_t>(
+                std::ceil(std::sqrt(num_children)));
+        auto const rows = (num_children + cols - 1) / cols;
+        for (uint32_t i = 0; i < num_children; i++) {
+            auto &box = boxes_[indices[i]];
+            box.cx = parent.xmin + (i % cols + 0.5) * parent.width / cols;
+            box.cy = parent.ymin + (i / cols + 0.5) * parent.height / rows;
+            // same bound as the CG
+            double xmin = box.cx - box.width / 2.0;
+            double ymin = box.cy - box.height / 2.0;
+            xmin = std::max<double>(xmin, 0);
+            xmin = std::min<double>(xmin, reduced_width_ - box.width);
+            ymin = std::max<double>(ymin, margin_top_);
+            ymin = std::min<double>(ymin, reduced_height_ - box.height
+                                          - margin_bottom_);
+            box.cx = xmin + box.width / 2.0;
+            box.cy = ymin + box.height / 2.0;
+            box.xmin = xmin;
+            box.ymin = ymin;
+            box.xmax = xmin + box.width;
+            box.ymax = ymin + box.height;
+        }
+    }
+}
+
+double GlobalPlacer::eval_f(double overlap_param) {
     // first part is HPWL.
     double hpwl = 0;
     for (const auto & net : netlists_) {
@@ -494,31 +676,8 @@ double GlobalPlacer::eval_f(double overlap_param) const {
     }
 
     // second part is the spreading potential
-    double overlap = 0;
-    for (const auto &box1 : boxes_) {
-        if (box1.fixed)
-            continue;
-        double x1 = box1.cx;
-        double y1 = box1.cy;
-
-        for (const auto &box2 : boxes_) {
-            if (box2.fixed || box1.index == box2.index)
-                continue;
-            // compute the distance
-            double x2 = box2.cx;
-            double y2 = box2.cy;
-            double d_2 = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1);
-            double ref_d_2 = (box1.width + box2.width + box1.height +
-                              box2.height)
-                             * (box1.width + box2.width + box1.height +
-                                box2.height) / 4.0;
-            if (d_2 >= ref_d_2) {
-                continue;
-            } else {
-                overlap += (d_2 - ref_d_2) * (d_2 - ref_d_2);
-            }
-        }
-    }
+    update_density();
+    double overlap = density_->energy();
 
     // third part is the legalization
     double legal = 0;
@@ -544,7 +703,7 @@ double GlobalPlacer::eval_f(double overlap_param) const {
 
     // NOTE:
     // disable aspect force for now since it's not stable
-    return hpwl * hpwl_param_ + overlap * potential_param_ * overlap_param +
+    return hpwl * hpwl_param_ + overlap * density_param_ * overlap_param +
            legal * legal_param_;
 }
 
@@ -591,38 +750,8 @@ void  GlobalPlacer::eval_grad_f(::vector<::pair<double, double>> &grad_f,
         }
     }
     // second part is the spreading potential
-    for (const auto &box1 : boxes_) {
-        if (box1.fixed)
-            continue;
-        double x1 = box1.cx;
-        double y1 = box1.cy;
-
-        for (const auto &box2 : boxes_) {
-            if (box2.fixed || box1.index == box2.index)
-                continue;
-            // compute the distance
-            double x2 = box2.cx;
-            double y2 = box2.cy;
-            double d_2 = (x2 - x1) * (x2 - x1) + (y2 - y1) * (y2 - y1);
-            double ref_d_2 = (box1.width + box2.width + box1.height +
-                              box2.height)
-                             * (box1.width + box2.width + box1.height +
-                                box2.height) / 4.0;
-            if (d_2 >= ref_d_2) {
-                continue;
-            } else if (d_2 == 0) {
-                //give a little bit nudge
-                x1 = x2 + global_rand_.uniform(-1.0, 1.0);
-                y1 = y2 + global_rand_.uniform(-1.0, 1.0);
-            }
-            // compute the gradient
-            double value = std::abs(2 * (d_2 - ref_d_2));
-            double norm = std::sqrt(d_2);
-            overlap[box1.index].first -= (x1 - x2) / norm * value;
-            overlap[box1.index].second -= (y1 - y2) / norm * value;
-
-        }
-    }
+    update_density();
+    density_grad(overlap);
 
     // third part is the legalization
     for (const auto &box : boxes_) {
@@ -659,18 +788,86 @@ void  GlobalPlacer::eval_grad_f(::vector<::pair<double, double>> &grad_f,
     for (const auto &box : boxes_) {
         auto index = box.index;
         grad_f[index].first = hpwl[index].first * hpwl_param_
-                              + overlap[index].first * potential_param_
+                              + overlap[index].first * density_param_
                                 * (std::max<double>(current_step, 0.5))
                                 + legal[index].first * legal_param_
                               + aspect[index].first * aspect_param_;
         grad_f[index].second = hpwl[index].second * hpwl_param_
-                               + overlap[index].second * potential_param_
+                               + overlap[index].second * density_param_
                                  * (std::max<double>(current_step, 0.5))
                                  + legal[index].second * legal_param_
                                + aspect[index].second * aspect_param_;
     }
 }
 
+void GlobalPlacer::init_density() {
+    density_index_.clear();
+    for (auto const &box : boxes_) {
+        if (!box.fixed)
+            density_index_.emplace_back(box.index);
+    }
+    density_rects_.resize(density_index_.size());
+    const auto num_bins = DensityGrid::num_bins(density_index_.size());
+    density_ = std::make_unique<DensityGrid>(reduced_width_, reduced_height_,
+                                             num_bins, num_bins, num_threads_);
+
+    // lambda_0 from ePlace: the density force starts out as strong as the
+    // wire length force, scaled by the potential parameter
+    ::vector<::pair<double, double>> grad;
+    density_param_ = 1;
+    update_density();
+    density_grad(grad);
+    double density_norm = 0;
+    for (auto const &[x, y] : grad)
+        density_norm += std::abs(x) + std::abs(y);
+    double hpwl_norm = 0;
+    for (const auto &net : netlists_) {
+        const auto N = static_cast<double>(net.size());
+        double x_sum = 0;
+        double y_sum = 0;
+        for (const auto &index : net) {
+            x_sum += boxes_[index].cx;
+            y_sum += boxes_[index].cy;
+        }
+        for (const auto &index : net) {
+            if (boxes_[index].fixed)
+                continue;
+            hpwl_norm += 2 * std::abs(boxes_[index].cx - x_sum / N);
+            hpwl_norm += 2 * std::abs(boxes_[index].cy - y_sum / N);
+        }
+    }
+    if (density_norm > 0 && hpwl_norm > 0)
+        density_param_ = potential_param_ * hpwl_norm / density_norm;
+    else
+        density_param_ = potential_param_;
+}
+
+void GlobalPlacer::update_density() {
+    for (uint32_t i = 0; i < density_index_.size(); i++) {
+        auto const &box = boxes_[density_index_[i]];
+        auto &rect = density_rects_[i];
+        rect.xmin = box.cx - box.width / 2.0;
+        rect.ymin = box.cy - box.height / 2.0;
+        rect.width = box.width;
+        rect.height = box.height;
+    }
+    density_->update(density_rects_);
+}
+
+void GlobalPlacer::density_grad(::vector<::pair<double, double>> &grad) {
+    // the gradient of the energy is -charge x field
+    ::vector<::pair<double, double>> field;
+    density_->field(density_rects_, field);
+    grad.resize(boxes_.size());
+    std::fill(grad.begin(), grad.end(), std::make_pair(0.0, 0.0));
+    for (uint32_t i = 0; i < density_index_.size(); i++) {
+        auto const &rect = density_rects_[i];
+        const double charge = rect.width * rect.height;
+        grad[density_index_[i]] = {-charge * field[i].first,
+                                   -charge * field[i].second};
+    }
+}
+
 double
 GlobalPlacer::find_beta(const ::vector<::pair<double, double>> &grad_f,
                         const ::vector<::pair<double, double>> &last_grad_f) {
@@ -805,76 +1002,64 @@ GlobalPlacer::realize() {
         bboard[y][x] = false;
     }
 
+    // count how many boxes cover each cell instead of intersecting every
+    // pair of boxes
+    int coverage_width = 0;
+    int coverage_height = 0;
     for (const auto &iter : boxes) {
-        ::set<Point> overlapped_cells;
-        int box_index = iter.first;
-        ::set<Point> box_pos;
-        auto points = iter.second;
-        for (int y = points.first.y; y < points.second.y; y++) {
-            for (int x = points.first.x; x < points.second.x; x++) {
-                box_pos.insert({x, y});
-            }
-        }
-        for (const auto &iter2 : boxes) {
-            if (iter2.first == box_index)
-                continue;
-            auto [dx, dy] = compute_overlap(points.first,
-                                            points.second,
-                                            iter2.second.first,
-                                            iter2.second.second);
-            if (dx <= 0 || dy <= 0)
-                continue;
-            // well compute the actual cells;
-            auto next_points = iter2.second;
-            ::set<Point> next_box_pos;
-            for (int y = next_points.first.y; y < next_points.second.y; y++) {
-                for (int x = next_points.first.x; x < next_points.second.x;
-                     x++) {
-                    next_box_pos.insert({x, y});
-                }
-            }
-            for (const auto &pos : next_box_pos) {
-                if (box_pos.find(pos) != box_pos.end())
-                    overlapped_cells.insert(pos);
-            }
+        coverage_width = std::max(coverage_width, iter.second.second.x);
+        coverage_height = std::max(coverage_height, iter.second.second.y);
+    }
+    ::vector<::vector<int>> coverage(coverage_height,
+                                     ::vector<int>(coverage_width, 0));
+    for (const auto &iter : boxes) {
+        auto const &[p1, p2] = iter.second;
+        for (int y = std::max(p1.y, 0); y < p2.y; y++) {
+            for (int x = std::max(p1.x, 0); x < p2.x; x++)
+                coverage[y][x]++;
         }
+    }
 
-        overlap_stats[box_index] = overlapped_cells.size() /
-                                   (double)boxes_[box_index].clb_size;
+    for (const auto &iter : boxes) {
+        int box_index = iter.first;
+        auto const &[p1, p2] = iter.second;
+        uint32_t num_overlapped = 0;
         // assign non-overlapped now
         ::set<::pair<int, int>> clb_cells;
-        for (const auto &pos : box_pos) {
-            if (overlapped_cells.find(pos) != overlapped_cells.end())
-                continue;
-            // remap them
-            const int new_x = (int)column_mapping_[pos.x];
-            const int new_y = pos.y;
-            // if the position is pre-fixed (used), continue
-            if (new_y >= static_cast<int>(bboard.size()))
-                continue;
-            if (new_x >= static_cast<int>(bboard[new_y].size()))
-                continue;
-            if (!bboard[new_y][new_x])
-                continue;
+        for (int y = std::max(p1.y, 0); y < p2.y; y++) {
+            for (int x = std::max(p1.x, 0); x < p2.x; x++) {
+                if (coverage[y][x] > 1) {
+                    num_overlapped++;
+                    continue;
+                }
+                // remap them
+                const int new_x = (int)column_mapping_[x];
+                const int new_y = y;
+                // if the position is pre-fixed (used), continue
+                if (new_y >= static_cast<int>(bboard.size()))
+                    continue;
+                if (new_x >= static_cast<int>(bboard[new_y].size()))
+                    continue;
+                if (!bboard[new_y][new_x])
+                    continue;
 
-            auto blk_type = board_layout_.get_blk_type(
-                    static_cast<uint32_t>(new_x), static_cast<uint32_t>(new_y));
-            if (blk_type == REGISTER)
-                continue;
-            if (blk_type != clb_type_) {
-                // printf("new_y: %d new_x: %d %c\n", new_y, new_x,
-                //         blk_type);
-                // printf("pos x: %d y: %d\n", pos.x, pos.y);
-                throw std::runtime_error("error in assign clb cells "
-                    "got cell type " + std::string(1, blk_type));
+                auto blk_type = board_layout_.get_blk_type(
+                        static_cast<uint32_t>(new_x),
+                        static_cast<uint32_t>(new_y));
+                if (blk_type == REGISTER)
+                    continue;
+                if (blk_type != clb_type_) {
+                    throw std::runtime_error("error in assign clb cells "
+                        "got cell type " + std::string(1, blk_type));
+                }
+                clb_cells.insert(std::make_pair(new_x, new_y));
+                bboard[new_y][new_x] = false;
             }
-            clb_cells.insert(std::make_pair(new_x, new_y));
-            bboard[new_y][new_x] = false;
         }
+        overlap_stats[box_index] = num_overlapped /
+                                   (double)boxes_[box_index].clb_size;
         for (auto const &clb_type : clb_types_) {
-            auto cells = ::set<::pair<int, int>>(clb_cells.begin(),
-                                                 clb_cells.end());
-            result[boxes_[box_index].id][clb_type] = cells;
+            result[boxes_[box_index].id][clb_type] = clb_cells;
         }
     }
     // fill in the one based one which one needs most
@@ -883,117 +1068,91 @@ GlobalPlacer::realize() {
     for (const auto &iter : overlap_stats)
             cluster_ids.emplace_back(iter.first);
 
-    std::sort(cluster_ids.begin(), cluster_ids.end(), [&](auto &val1,
-                                                          auto &val2) {
+    std::stable_sort(cluster_ids.begin(), cluster_ids.end(),
+                     [&](auto &val1, auto &val2) {
         return overlap_stats[val1] > overlap_stats[val2];
     });
 
-    for (auto const index : cluster_ids) {
-        // fill them in in order
-        int64_t needed = boxes_[index].clb_size -
-                          result[boxes_[index].id][clb_type_].size();
-        // compute_centroid;
-        double x_sum = 0;
-        double y_sum = 0;
-        for (const auto &iter : result[boxes_[index].id][clb_type_]) {
-            x_sum += iter.first;
-            y_sum += iter.second;
+    // free cells are kept in a bucketed grid per block type
+    auto free_cells = [&](char blk_type) {
+        ::vector<::pair<int, int>> cells;
+        for (uint32_t y = 0; y < height; y++) {
+            for (uint32_t x = 0; x < width; x++) {
+                if (bboard[y][x] && board_layout_.get_blk_type(x, y) ==
+                                    blk_type)
+                    cells.emplace_back(x, y);
+            }
         }
-        double c_x = x_sum / result[boxes_[index].id][clb_type_].size();
-        double c_y = y_sum / result[boxes_[index].id][clb_type_].size();
-        if (needed > 0) {
-            // find exterior set
-            int effort;
-            auto radius = static_cast<int>(std::max(height, width));
-            for (effort = 0; effort < radius; effort++) {
-                if (needed <= 0)
-                    break;
-                ::vector<::pair<int, int>> cells;
-                find_exterior_set(bboard, result[boxes_[index].id][clb_type_],
-                                  cells, effort + 1);
-
-                ::vector<uint32_t> cell_index;
-                cell_index.resize(cells.size());
-                for (uint32_t i = 0; i < cell_index.size(); i++)
-                    cell_index[i] = i;
-                std::sort(cell_index.begin(), cell_index.end(),
-                          [=](const auto &p1,
-                              const auto &p2) {
-                              return std::abs(c_x - cells[p1].first)
-                                     + std::abs(c_y - cells[p1].second) <
-                                     std::abs(c_x - cells[p2].first) +
-                                     std::abs(c_y - cells[p2].second);
-                          });
-                for (uint32_t i = 0; i < cells.size(); i++) {
-                    uint32_t ii = cell_index[i];
-                    auto[x, y] = cells[ii];
-                    for (auto const &clb_type : clb_types_) {
-                        result[boxes_[index].id][clb_type].insert(cells[ii]);
-                    }
-                    bboard[y][x] = false;
-                    needed--;
-                    if (needed <= 0)
-                        break;
-                }
+        return CellGrid(cells, width, height);
+    };
+
+    // centroid of what the cluster already has. a box that got nothing
+    // uses its own center
+    ::vector<::pair<double, double>> centers;
+    ::vector<uint64_t> demands;
+    for (auto const index : cluster_ids) {
+        auto const &box = boxes_[index];
+        auto const &cells = result[box.id][clb_type_];
+        if (cells.empty()) {
+            auto const x = std::clamp<int64_t>(
+                    static_cast<int64_t>(box.cx), 0, reduced_width_ - 1);
+            centers.emplace_back(column_mapping_[static_cast<uint32_t>(x)],
+                                 box.cy);
+        } else {
+            double x_sum = 0;
+            double y_sum = 0;
+            for (const auto &[x, y] : cells) {
+                x_sum += x;
+                y_sum += y;
             }
-            if (effort > static_cast<int>(height / 2))
-                std::cerr << "WARN: exhaustive search used. "
-                          << "results may not be optimal" << std::endl;
-            if (needed > 0)
-                 throw std::runtime_error("cannot find enough space "
-                                          "de-overlapping");
+            centers.emplace_back(x_sum / cells.size(), y_sum / cells.size());
         }
-        // assign special blocks
+        auto const needed = static_cast<int64_t>(box.clb_size) -
+                            static_cast<int64_t>(cells.size());
+        demands.emplace_back(std::max<int64_t>(needed, 0));
+    }
+
+    // min-cost assignment of the missing clb cells
+    auto clb_grid = free_cells(clb_type_);
+    auto const clb_assignment = clb_grid.assign(centers, demands);
+    for (uint32_t i = 0; i < cluster_ids.size(); i++) {
+        auto const &id = boxes_[cluster_ids[i]].id;
+        if (clb_assignment[i].size() < demands[i])
+            throw std::runtime_error("cannot find enough space "
+                                     "de-overlapping");
+        for (auto const &cell : clb_assignment[i]) {
+            for (auto const &clb_type : clb_types_)
+                result[id][clb_type].insert(cell);
+            bboard[cell.second][cell.first] = false;
+        }
+    }
+
+    // assign special blocks, closest first in the same order
+    ::map<char, CellGrid> special_grids;
+    for (uint32_t i = 0; i < cluster_ids.size(); i++) {
+        auto const &id = boxes_[cluster_ids[i]].id;
+        auto const [c_x, c_y] = centers[i];
         ::map<char, int> dsp_blocks;
-        for (auto const &blk_name : clusters_[boxes_[index].id]) {
+        for (auto const &blk_name : clusters_[id]) {
             char blk_type = blk_name[0];
-            if (clb_types_.find(blk_type) != clb_types_.end()) {
-                continue;
-            } else {
-                if (dsp_blocks.find(blk_type) == dsp_blocks.end())
-                    dsp_blocks[blk_type] = 0;
+            if (clb_types_.find(blk_type) == clb_types_.end())
                 dsp_blocks[blk_type]++;
-            }
         }
 
-        for (const auto &iter : dsp_blocks) {
-            const char blk_type = iter.first;
-            ::vector<::pair<int, int>> cells;
-            ::vector<uint32_t> blk_index;
-            for (uint32_t y = 0; y < height; y++) {
-                for (uint32_t x = 0; x < width; x++) {
-                    auto b_type = board_layout_.get_blk_type(x, y);
-                    if (bboard[y][x] && b_type == blk_type) {
-                        cells.emplace_back(std::make_pair(x, y));
-                        blk_index.emplace_back(blk_index.size());
-                    }
-                }
-            }
-            if (blk_index.size() < (uint32_t)iter.second)
+        for (const auto &[blk_type, num_blocks] : dsp_blocks) {
+            if (special_grids.find(blk_type) == special_grids.end())
+                special_grids.emplace(blk_type, free_cells(blk_type));
+            auto &grid = special_grids.at(blk_type);
+            if (grid.size() < static_cast<uint64_t>(num_blocks))
                 throw std::runtime_error("not enough space for blk type " +
                                          ::string(1, blk_type));
-            std::sort(blk_index.begin(), blk_index.end(),
-                      [=](const auto &p1,
-                          const auto &p2) {
-                          return pow(c_x - cells[p1].first, 2)
-                                 + pow(c_y - cells[p1].second, 2) <
-                                 pow(c_x - cells[p2].first, 2) +
-                                 pow(c_y - cells[p2].second, 2);
-                      });
-
             // TODO: fix MEM assignment
             // for now add 2 extra
-            result[boxes_[index].id][blk_type] = {};
-            auto total_num_blocks = std::min(static_cast<int>(cells.size()),
-                                                              iter.second + 2);
-            for (int i = 0; i < total_num_blocks; i++) {
-                auto cell_i = blk_index[i];
-                auto cell = cells[cell_i];
-                result[boxes_[index].id][blk_type].insert(cell);
-                auto [x, y] = cell;
+            auto const cells = grid.take_nearest(c_x, c_y, num_blocks + 2);
+            result[id][blk_type] = ::set<::pair<int, int>>(cells.begin(),
+                                                           cells.end());
+            for (auto const &[x, y] : cells)
                 bboard[y][x] = false;
-            }
-
         }
     }
 
@@ -1203,13 +1362,13 @@ double GlobalPlacer::init_energy() {
     double special = 0;
     for (const auto &box : boxes_) {
         // compute the dsps
-        auto dsp_blocks = box_dsp_blocks_[box.id];
+        auto const &dsp_blocks = box_dsp_blocks_[box.id];
         auto xmin = box.xmin;
         auto xmax = box.xmax;
         for (const auto &iter : dsp_blocks) {
             int needed = iter.second;
             const char blk_type = iter.first;
-            auto columns = hidden_columns[blk_type];
+            auto const &columns = hidden_columns[blk_type];
             for (const auto &xx : columns) {
                 if (xx < xmax && xx >=xmin)
                     needed -= box.height;
@@ -1236,42 +1395,6 @@ void GlobalPlacer::commit_changes() {
     current_move_.box2.index = -1;
 }
 
-void GlobalPlacer
-::find_exterior_set(const ::vector<::vector<bool>> &bboard,
-                    const ::set<::pair<int, int>> &assigned,
-                    ::vector<::pair<int, int>> &empty_cells,
-                    const int &max_dist) const  {
-    ::vector<int> xs;
-    ::vector<int> ys;
-    for (const auto &iter : assigned) {
-        xs.emplace_back(iter.first);
-        ys.emplace_back(iter.first);
-    }
-
-    if (assigned.empty()) {
-        throw std::runtime_error("box completely empty during de-overlapping");
-    }
-    std::sort(xs.begin(), xs.end());
-    std::sort(ys.begin(), ys.end());
-    int xmin = xs[0];
-    int xmax = xs.back();
-    int ymin = ys[0];
-    int ymax = ys.back();
-
-    for (int y = ymin - max_dist; y < ymax + max_dist + 1; y++) {
-        for (int x = xmin - max_dist; x < xmax + max_dist + 1; x++) {
-            if (x < 0 || y < 0 || x >= (int)bboard[0].size()
-                || y >= (int)bboard.size())
-                continue;
-            auto blk_type =
-                    board_layout_.get_blk_type(static_cast<uint32_t>(x),
-                                               static_cast<uint32_t>(y));
-            if (bboard[y][x] and blk_type == clb_type_)
-                empty_cells.emplace_back(std::make_pair(x, y));
-        }
-    }
-}
-
 void GlobalPlacer::anneal() {
     // in a very rare situation where the annealing will fail
     // (very small netlists)
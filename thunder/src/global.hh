@@ -3,7 +3,9 @@
 
 #include "include/spline.h"
 #include "anneal.hh"
+#include "density.hh"
 #include "layout.hh"
+#include <memory>
 #include <unordered_set>
 
 
@@ -43,10 +45,17 @@ public:
                  const Layout &board_layout);
 
     void solve();
+    // multilevel V-cycle. clusters are merged with heavy-edge matching until
+    // at most coarsest_size are left. the coarsest level is placed with
+    // solve() and anneal(), then every finer level starts from its parent's
+    // position and is refined. anneal() afterwards only refines this level
+    void solve_multilevel(uint32_t coarsest_size = 16);
     void anneal() override;
     std::map<std::string, std::map<char, std::set<std::pair<int, int>>>>
     realize();
     void set_seed(uint32_t seed);
+    // threads used for the density bins. 0 uses all the cores
+    void set_num_threads(uint32_t num_threads) { num_threads_ = num_threads; }
 
     double anneal_param_factor = 1.0;
     char EMPTY_BLK = ' ';
@@ -61,7 +70,7 @@ protected:
 private:
 
     double line_search(const std::vector<std::pair<double, double>> &grad_f);
-    double eval_f(double overlap_param=1) const;
+    double eval_f(double overlap_param=1);
     void eval_grad_f(std::vector<std::pair<double, double>> &, const uint32_t);
     double find_beta(const std::vector<std::pair<double, double>> &grad_f,
                      const std::vector<std::pair<double, double>> &last_grad_f);
@@ -73,23 +82,28 @@ private:
     void create_fixed_boxes();
     void create_boxes();
     double compute_hpwl() const;
-    void
-    find_exterior_set(const std::vector<std::vector<bool>> &bboard,
-                      const std::set<std::pair<int, int>> &assigned,
-                      std::vector<std::pair<int, int>> &empty_cells,
-                      const int &max_dist) const;
-
     std::pair<std::vector<std::vector<int>>, std::map<std::string, uint32_t>>
     collapse_netlist(std::map<std::string, std::vector<std::string>>);
 
     void get_clb_types_();
 
+    // electrostatic density
+    void init_density();
+    void update_density();
+    void density_grad(std::vector<std::pair<double, double>> &grad);
+
+    // multilevel
+    std::vector<std::vector<std::string>> match_clusters() const;
+    void interpolate(const GlobalPlacer &coarse,
+                     const std::map<std::string, std::string> &parent_of);
+
     // SA
     void bound_box(ClusterBox &box);
 
     char clb_type_;
     std::map<std::string, std::set<std::string>> clusters_;
     std::vector<std::vector<int>> netlists_;
+    std::map<std::string, std::vector<std::string>> raw_netlists_;
     std::map<std::string, std::pair<int, int>> fixed_pos_;
     Layout board_layout_;
     std::vector<std::vector<char>> reduced_board_layout_;
@@ -99,6 +113,7 @@ private:
     std::map<std::string, std::map<char, int>> box_dsp_blocks_;
     std::map<std::string, uint32_t> intra_count_;
     randutils::random_generator<std::mt19937> global_rand_;
+    uint32_t seed_ = 0;
     std::unordered_set<char> clb_types_;
 
     // helper values
@@ -109,10 +124,17 @@ private:
     std::vector<double> gaussian_table_;
     double gaussian_sigma_2_ = 1;
     void compute_gaussian_table();
+    std::unique_ptr<DensityGrid> density_;
+    std::vector<DensityRect> density_rects_;
+    std::vector<int> density_index_;
+    uint32_t num_threads_ = 0;
 
     // CG parameters
     double hpwl_param_ = .05;
     double potential_param_ = 0.05;
+    // scaled in init_density() so that the density force starts out
+    // balanced with the wire length
+    double density_param_ = 0;
     double legal_param_ = .05;
     double aspect_param_ = 1;
 
@@ -1,12 +1,21 @@
+#include <cstdio>
+#include <fstream>
+#include <iomanip>
+#include <random>
+#include <sstream>
+#include <thread>
 #include "graph.hh"
+#include "include/cxxpool.h"
 #include "../lib/leidenalg/include/ModularityVertexPartition.h"
 #include "../lib/leidenalg/include/GraphHelper.h"
 #include "../lib/leidenalg/include/Optimiser.h"
 
-std::map<uint32_t, std::string>
-construct_igraph(igraph_t *graph,
-                 const std::map<std::string,
-                                std::vector<std::string>> &netlists) {
+constexpr uint32_t partition_num_iter = 15;
+
+static std::map<uint32_t, std::string>
+index_netlist(const std::map<std::string,
+                             std::vector<std::string>> &netlists,
+              std::vector<igraph_real_t> &edges) {
     std::map<std::string, uint32_t> blk_to_id;
     std::map<uint32_t, std::string> id_to_block;
     for (auto const &iter: netlists) {
@@ -18,10 +27,7 @@ construct_igraph(igraph_t *graph,
             }
         }
     }
-    // construct the graph
-    auto num_blks = static_cast<uint32_t >(blk_to_id.size());
-    igraph_empty(graph, num_blks, true);
-    // add edges
+    // flattened (src, dst) pairs
     for (auto const &iter: netlists) {
         auto const &net = iter.second;
         auto const &src_node = net[0];
@@ -29,19 +35,35 @@ construct_igraph(igraph_t *graph,
         for (uint32_t i = 1; i < net.size(); i++) {
             auto const &dst_node = net[i];
             auto const dst_id = blk_to_id.at(dst_node);
-            igraph_add_edge(graph, src_id, dst_id);
+            edges.emplace_back(src_id);
+            edges.emplace_back(dst_id);
         }
     }
-
     return id_to_block;
 }
 
-std::map<int, std::set<std::string>>
-get_cluster(igraph_t* graph,
-            const std::map<uint32_t, std::string> &id_to_block,
-            uint32_t num_iter,
-            uint32_t seed) {
+static void build_igraph(igraph_t *graph, uint32_t num_blks,
+                         const std::vector<igraph_real_t> &edges) {
+    igraph_empty(graph, num_blks, true);
+    // add all the edges at once from a view on the edge list
+    igraph_vector_t edge_vector;
+    igraph_vector_view(&edge_vector, edges.data(),
+                       static_cast<long int>(edges.size()));
+    igraph_add_edges(graph, &edge_vector, nullptr);
+}
 
+std::map<uint32_t, std::string>
+construct_igraph(igraph_t *graph,
+                 const std::map<std::string,
+                                std::vector<std::string>> &netlists) {
+    std::vector<igraph_real_t> edges;
+    auto id_to_block = index_netlist(netlists, edges);
+    build_igraph(graph, static_cast<uint32_t>(id_to_block.size()), edges);
+    return id_to_block;
+}
+
+static std::pair<std::vector<size_t>, double>
+optimise_membership(igraph_t *graph, uint32_t num_iter, uint32_t seed) {
     auto g = Graph(graph, false);
 
     auto partition = ModularityVertexPartition(&g);
@@ -52,24 +74,184 @@ get_cluster(igraph_t* graph,
     for (uint32_t i = 0; i < num_iter; i++) {
         opt.optimise_partition(&partition);
     }
+    return {partition.membership(), partition.quality()};
+}
 
-    const auto &membership = partition.membership();
+static std::map<int, std::set<std::string>>
+membership_to_cluster(const std::vector<size_t> &membership,
+                      const std::map<uint32_t, std::string> &id_to_block) {
     std::map<int, std::set<std::string>> result;
 
     for (const auto &[g_id, blk_id]: id_to_block) {
-        auto const cluster_id = membership[g_id];
+        auto const cluster_id = static_cast<int>(membership[g_id]);
         result[cluster_id].insert(blk_id);
     }
 
     return result;
 }
 
+std::map<int, std::set<std::string>>
+get_cluster(igraph_t* graph,
+            const std::map<uint32_t, std::string> &id_to_block,
+            uint32_t num_iter,
+            uint32_t seed) {
+    auto const membership = optimise_membership(graph, num_iter, seed).first;
+    return membership_to_cluster(membership, id_to_block);
+}
+
 std::map<int, std::set<std::string>>
 partition_netlist(const std::map<std::string,
         std::vector<std::string>> &netlists) {
     igraph_t graph;
     auto const &id_to_blk = construct_igraph(&graph, netlists);
-    const auto &result = get_cluster(&graph, id_to_blk, 15, 0);
+    const auto &result = get_cluster(&graph, id_to_blk, partition_num_iter, 0);
     igraph_destroy(&graph);
     return result;
-}
\ No newline at end of file
+}
+
+std::map<int, std::set<std::string>>
+partition_netlist(const std::map<std::string,
+                                 std::vector<std::string>> &netlists,
+                  uint32_t num_seeds, uint32_t num_threads) {
+    if (num_seeds <= 1)
+        return partition_netlist(netlists);
+
+    std::vector<igraph_real_t> edges;
+    auto const id_to_blk = index_netlist(netlists, edges);
+    auto const num_blks = static_cast<uint32_t>(id_to_blk.size());
+
+    if (num_threads == 0)
+        num_threads = std::thread::hardware_concurrency();
+#if !defined(IGRAPH_THREAD_SAFE) || !IGRAPH_THREAD_SAFE
+    // igraph keeps its error handling stack in a global variable unless it
+    // is built with thread local storage
+    num_threads = 1;
+#endif
+    num_threads = std::max(1u, std::min(num_threads, num_seeds));
+
+    // every task builds its own graph since the partitioner caches
+    // neighbors inside the graph object
+    cxxpool::thread_pool pool{num_threads};
+    std::vector<std::future<std::pair<std::vector<size_t>, double>>> tasks;
+    for (uint32_t seed = 0; seed < num_seeds; seed++) {
+        tasks.emplace_back(pool.push([&edges, num_blks, seed]() {
+            igraph_t graph;
+            build_igraph(&graph, num_blks, edges);
+            auto result = optimise_membership(&graph, partition_num_iter,
+                                              seed);
+            igraph_destroy(&graph);
+            return result;
+        }));
+    }
+
+    // ties go to the lower seed
+    std::vector<size_t> best_membership;
+    double best_quality = 0;
+    for (uint32_t seed = 0; seed < num_seeds; seed++) {
+        auto [membership, quality] = tasks[seed].get();
+        if (seed == 0 || quality > best_quality) {
+            best_membership = std::move(membership);
+            best_quality = quality;
+        }
+    }
+    return membership_to_cluster(best_membership, id_to_blk);
+}
+
+uint64_t netlist_hash(const std::map<std::string,
+                                     std::vector<std::string>> &netlists) {
+    // FNV-1a. the hash has to be the same across runs so std::hash is not
+    // an option
+    uint64_t hash = 14695981039346656037ull;
+    auto update = [&hash](const std::string &value) {
+        for (const char c : value) {
+            hash ^= static_cast<uint8_t>(c);
+            hash *= 1099511628211ull;
+        }
+        // separator
+        hash ^= 0xffu;
+        hash *= 1099511628211ull;
+    };
+    for (auto const &[net_id, net] : netlists) {
+        update(net_id);
+        for (auto const &blk : net)
+            update(blk);
+    }
+    return hash;
+}
+
+static bool
+load_partition(const std::string &filename,
+               const std::map<std::string,
+                              std::vector<std::string>> &netlists,
+               std::map<int, std::set<std::string>> &clusters) {
+    std::ifstream stream(filename);
+    if (!stream.good())
+        return false;
+    // each line is the cluster id followed by its blocks
+    std::string line;
+    std::set<std::string> blks;
+    while (std::getline(stream, line)) {
+        std::istringstream line_stream(line);
+        int cluster_id;
+        if (!(line_stream >> cluster_id))
+            return false;
+        auto &cluster = clusters[cluster_id];
+        std::string blk;
+        while (line_stream >> blk) {
+            cluster.insert(blk);
+            blks.insert(blk);
+        }
+    }
+    // make sure it is the same design in case of a hash collision or an
+    // incomplete file
+    for (auto const &iter : netlists) {
+        for (auto const &blk : iter.second) {
+            if (blks.find(blk) == blks.end())
+                return false;
+        }
+    }
+    return true;
+}
+
+static void
+save_partition(const std::string &filename,
+               const std::map<int, std::set<std::string>> &clusters) {
+    // write to a temporary file first so that concurrent runs never see a
+    // partial result
+    std::random_device rd;
+    auto const temp_filename = filename + "." + std::to_string(rd()) + ".tmp";
+    {
+        std::ofstream stream(temp_filename);
+        if (!stream.good())
+            return;
+        for (auto const &[cluster_id, blks] : clusters) {
+            stream << cluster_id;
+            for (auto const &blk : blks)
+                stream << " " << blk;
+            stream << std::endl;
+        }
+    }
+    if (std::rename(temp_filename.c_str(), filename.c_str()) != 0)
+        std::remove(temp_filename.c_str());
+}
+
+std::map<int, std::set<std::string>>
+partition_netlist_cached(const std::map<std::string,
+                                        std::vector<std::string>> &netlists,
+                         const std::string &cache_dir, uint32_t num_seeds,
+                         uint32_t num_threads) {
+    if (cache_dir.empty())
+        return partition_netlist(netlists, num_seeds, num_threads);
+    num_seeds = std::max(1u, num_seeds);
+    std::ostringstream filename;
+    filename << cache_dir << "/" << std::hex << std::setw(16)
+             << std::setfill('0') << netlist_hash(netlists) << std::dec
+             << "_" << num_seeds << ".partition";
+
+    std::map<int, std::set<std::string>> result;
+    if (load_partition(filename.str(), netlists, result))
+        return result;
+    result = partition_netlist(netlists, num_seeds, num_threads);
+    save_partition(filename.str(), result);
+    return result;
+}
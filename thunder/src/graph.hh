@@ -23,4 +23,26 @@ std::map<int, std::set<std::string>>
 partition_netlist(const std::map<std::string,
                                  std::vector<std::string>> &netlists);
 
+// runs the partitioner with seeds 0 to num_seeds - 1 and keeps the one with
+// the best modularity. the seeds only run in parallel if igraph is built
+// thread safe (IGRAPH_THREAD_SAFE), otherwise num_threads is ignored and
+// num_seeds seeds take num_seeds times as long as one. num_threads = 0 uses
+// all the cores
+std::map<int, std::set<std::string>>
+partition_netlist(const std::map<std::string,
+                                 std::vector<std::string>> &netlists,
+                  uint32_t num_seeds, uint32_t num_threads);
+
+uint64_t netlist_hash(const std::map<std::string,
+                                     std::vector<std::string>> &netlists);
+
+// same as partition_netlist() but the result is stored in cache_dir, keyed
+// by the netlist hash, so that placing the same design again skips the
+// partitioning
+std::map<int, std::set<std::string>>
+partition_netlist_cached(const std::map<std::string,
+                                        std::vector<std::string>> &netlists,
+                         const std::string &cache_dir, uint32_t num_seeds,
+                         uint32_t num_threads);
+
 #endif //THUNDER_GRAPH_HH
@@ -404,8 +404,9 @@ load_id_to_name(const std::string &filename) {
 }
 
 
-std::map<std::string, std::pair<int, int>>
-load_placement(const std::string &filename) {
+static void read_placement(const std::string &filename,
+                           std::map<std::string, std::pair<int, int>> *placement,
+                           std::map<std::string, std::string> *id_to_name) {
     if (!::exists(filename))
         throw ::runtime_error(filename + " does not exist");
     ::ifstream in;
@@ -413,7 +414,6 @@ load_placement(const std::string &filename) {
 
     ::string line;
     uint32_t line_num = 0;
-    std::map<std::string, std::pair<int, int>> placement;
 
     while(std::getline(in, line)) {
         if (line_num < 2) {
@@ -429,9 +429,24 @@ load_placement(const std::string &filename) {
         auto y = std::stoi(tokens[2]);
         auto blk_id = tokens[3].substr(1, ::string::npos);
 
-        placement.insert({blk_id, {x, y}});
+        if (placement)
+            placement->insert({blk_id, {x, y}});
+        if (id_to_name)
+            id_to_name->insert({blk_id, tokens[0]});
         line_num++;
     }
+}
 
+std::map<std::string, std::pair<int, int>>
+load_placement(const std::string &filename) {
+    std::map<std::string, std::pair<int, int>> placement;
+    read_placement(filename, &placement, nullptr);
     return placement;
 }
+
+std::map<std::string, std::string>
+load_placement_id_to_name(const std::string &filename) {
+    std::map<std::string, std::string> id_to_name;
+    read_placement(filename, nullptr, &id_to_name);
+    return id_to_name;
+}
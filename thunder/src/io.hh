@@ -27,4 +27,8 @@ load_id_to_name(const std::string &filename);
 std::map<std::string, std::pair<int, int>>
 load_placement(const std::string &filename);
 
+// block names in a placement file, keyed by the block ID
+std::map<std::string, std::string>
+load_placement_id_to_name(const std::string &filename);
+
 #endif //THUNDER_IO_HH
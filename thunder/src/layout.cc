@@ -6,26 +6,22 @@ using std::runtime_error;
 
 
 Layer::Layer(char blk_type, uint32_t width,
-             uint32_t height) : blk_type(blk_type),
-                                layout_(height, ::vector<bool>(width, false)) {}
-
-Layer::Layer(const Layer &layer) {
-    auto height = layer.layout_.size();
-    blk_type = layer.blk_type;
-    layout_.reserve(height);
-    for (auto const &row: layer.layout_) {
-        auto vec = std::vector<bool>(row.begin(), row.end());
-        layout_.emplace_back(vec);
-    }
-}
+             uint32_t height) : blk_type(blk_type), width_(width),
+                                height_(height),
+                                layout_(width * height, 0) {}
+
+Layer::Layer(const Layer &layer) : blk_type(layer.blk_type),
+                                   width_(layer.width_),
+                                   height_(layer.height_),
+                                   layout_(layer.layout_) {}
 
 std::vector<std::pair<uint32_t, uint32_t>>
 Layer::produce_available_pos() const {
     ::vector<std::pair<uint32_t, uint32_t>> result;
 
-    for (uint32_t y = 0; y < layout_.size(); y++) {
-        for (uint32_t x = 0; x < layout_[y].size(); x++) {
-            if (layout_[y][x])
+    for (uint32_t y = 0; y < height_; y++) {
+        for (uint32_t x = 0; x < width_; x++) {
+            if (layout_[y * width_ + x])
                 result.emplace_back(std::make_pair(x, y));
         }
     }
@@ -34,11 +30,16 @@ Layer::produce_available_pos() const {
 
 bool Layer::operator[](const std::pair<uint32_t, uint32_t> &pos) const {
     auto [x, y] = pos;
-    return layout_[y][x];
+    return layout_[y * width_ + x];
+}
+
+std::vector<bool> Layer::operator[](uint32_t row) const {
+    auto begin = layout_.begin() + row * width_;
+    return std::vector<bool>(begin, begin + width_);
 }
 
 std::pair<uint64_t, uint64_t> Layer::get_size() const {
-    return {layout_[0].size(), layout_.size()};
+    return {width_, height_};
 }
 
 Layout::Layout(const std::map<char, std::vector<std::vector<bool>>> &layers) {
@@ -102,6 +103,7 @@ void Layout::add_layer(const Layer &layer, uint32_t priority_major,
 
     layers_priority_major_.insert({blk_type, priority_major});
     layers_priority_minor_.insert({blk_type, priority_minor});
+    clear_cache();
 }
 
 bool Layout::is_legal(const std::string &blk_id, uint32_t x, uint32_t y) {
@@ -153,12 +155,14 @@ void Layout::set_priority_major(char blk_type, uint32_t priority) {
     if (layers_priority_major_.find(blk_type) == layers_priority_major_.end())
         throw std::runtime_error(std::string(1, blk_type) + " not found");
     layers_priority_major_[blk_type] = priority;
+    clear_cache();
 }
 
 void Layout::set_priority_minor(char blk_type, uint32_t priority) {
     if (layers_priority_minor_.find(blk_type) == layers_priority_minor_.end())
         throw std::runtime_error(std::string(1, blk_type) + " not found");
     layers_priority_minor_[blk_type] = priority;
+    clear_cache();
 }
 
 std::set<char> Layout::get_layer_types() const {
@@ -183,6 +187,46 @@ Layout::produce_available_pos() const {
     return result;
 }
 
+std::shared_ptr<const std::vector<char>> Layout::blk_type_grid() const {
+    if (!blk_type_grid_) {
+        auto grid = std::make_shared<::vector<char>>(width_ * height_);
+        for (uint32_t y = 0; y < height_; y++) {
+            for (uint32_t x = 0; x < width_; x++) {
+                (*grid)[y * width_ + x] = get_blk_type(x, y);
+            }
+        }
+        blk_type_grid_ = grid;
+    }
+    return blk_type_grid_;
+}
+
+std::shared_ptr<const std::vector<int32_t>>
+Layout::available_pos(char blk_type) const {
+    if (!available_pos_) {
+        auto result = std::make_shared<std::map<char, std::shared_ptr<
+                const ::vector<int32_t>>>>();
+        for (auto const &[blk, positions]: produce_available_pos()) {
+            auto pos = std::make_shared<::vector<int32_t>>();
+            pos->reserve(positions.size() * 2);
+            for (auto const &[x, y]: positions) {
+                pos->emplace_back(x);
+                pos->emplace_back(y);
+            }
+            (*result)[blk] = pos;
+        }
+        available_pos_ = result;
+    }
+    auto iter = available_pos_->find(blk_type);
+    if (iter == available_pos_->end())
+        return std::make_shared<::vector<int32_t>>();
+    return iter->second;
+}
+
+void Layout::clear_cache() {
+    blk_type_grid_ = nullptr;
+    available_pos_ = nullptr;
+}
+
 std::tuple<uint32_t, uint32_t, uint32_t, uint32_t> Layout::get_layout_margin() {
     uint32_t margin_top = 0, margin_right = 0, margin_bottom = 0,
              margin_left = 0;
@@ -3,6 +3,7 @@
 #include <vector>
 #include <unordered_map>
 #include <map>
+#include <memory>
 #include <set>
 #include <iostream>
 
@@ -18,19 +19,25 @@ public:
     Layer(char blk_type, uint32_t width, uint32_t height);
     Layer(const Layer &layer);
     bool operator[](const std::pair<uint32_t, uint32_t> &pos) const;
-    std::vector<bool> operator[](uint32_t row) const
-    { return std::vector<bool>(layout_[row].begin(), layout_[row].end()); }
+    std::vector<bool> operator[](uint32_t row) const;
     std::pair<uint64_t, uint64_t> get_size() const;
 
     std::vector<std::pair<uint32_t, uint32_t>> produce_available_pos() const;
 
+    // row-major (height, width) storage, one byte per tile. used to expose
+    // zero-copy views
+    const uint8_t *data() const { return layout_.data(); }
+    uint8_t *data() { return layout_.data(); }
+
 private:
-    std::vector<std::vector<bool>> layout_;
+    uint32_t width_;
+    uint32_t height_;
+    std::vector<uint8_t> layout_;
 public:
     inline void mark_available(uint32_t x,
-                               uint32_t y) { layout_[y][x] = true; }
+                               uint32_t y) { layout_[y * width_ + x] = 1; }
     inline void mark_unavailable(uint32_t x,
-                                 uint32_t y) { layout_[y][x] = false; }
+                                 uint32_t y) { layout_[y * width_ + x] = 0; }
 };
 
 class LayerMask {
@@ -83,6 +90,15 @@ public:
     std::map<char, std::vector<std::pair<int, int>>>
     produce_available_pos() const;
 
+    // bulk views. both are computed once and cached until the layers or
+    // priorities change. the cached buffers are shared so views handed out
+    // earlier stay valid
+    // row-major (height, width) array of get_blk_type(x, y)
+    std::shared_ptr<const std::vector<char>> blk_type_grid() const;
+    // flattened (x, y) pairs of produce_available_pos()[blk_type]
+    std::shared_ptr<const std::vector<int32_t>>
+    available_pos(char blk_type) const;
+
     // masks
     const std::map<char, LayerMask> get_layer_masks() const
     { return layer_masks_; }
@@ -105,6 +121,11 @@ private:
     uint64_t height_ = 0;
 
     std::map<char, LayerMask> layer_masks_;
+
+    mutable std::shared_ptr<const std::vector<char>> blk_type_grid_;
+    mutable std::shared_ptr<const std::map<char, std::shared_ptr<
+            const std::vector<int32_t>>>> available_pos_;
+    void clear_cache();
 };
 
 
@@ -0,0 +1,348 @@
+#include <algorithm>
+#include <cmath>
+#include <functional>
+#include <limits>
+#include <map>
+#include <queue>
+#include <stdexcept>
+#include <tuple>
+#include "legalize.hh"
+
+using std::vector;
+using std::pair;
+using std::map;
+
+// min-cost flow with successive shortest paths. all the costs are
+// non-negative, so Dijkstra with potentials works from the start
+class MinCostFlow {
+public:
+    explicit MinCostFlow(uint32_t num_nodes) : graph_(num_nodes) {}
+
+    uint32_t add_edge(uint32_t from, uint32_t to, int64_t cap, int64_t cost) {
+        graph_[from].emplace_back(Edge{to, cap, cost,
+                                       static_cast<uint32_t>(graph_[to].size())});
+        graph_[to].emplace_back(Edge{from, 0, -cost,
+                                     static_cast<uint32_t>(
+                                             graph_[from].size() - 1)});
+        return static_cast<uint32_t>(graph_[from].size() - 1);
+    }
+
+    int64_t flow(uint32_t from, uint32_t index) const {
+        auto const &edge = graph_[from][index];
+        return graph_[edge.to][edge.rev].cap;
+    }
+
+    int64_t solve(uint32_t source, uint32_t sink) {
+        constexpr int64_t inf = std::numeric_limits<int64_t>::max();
+        const auto num_nodes = static_cast<uint32_t>(graph_.size());
+        ::vector<int64_t> potential(num_nodes, 0);
+        ::vector<int64_t> dist(num_nodes);
+        ::vector<uint32_t> prev_node(num_nodes);
+        ::vector<uint32_t> prev_edge(num_nodes);
+        int64_t total = 0;
+        using Entry = ::pair<int64_t, uint32_t>;
+        while (true) {
+            std::fill(dist.begin(), dist.end(), inf);
+            dist[source] = 0;
+            std::priority_queue<Entry, ::vector<Entry>,
+                                std::greater<>> queue;
+            queue.push({0, source});
+            while (!queue.empty()) {
+                auto [d, node] = queue.top();
+                queue.pop();
+                if (d > dist[node])
+                    continue;
+                for (uint32_t i = 0; i < graph_[node].size(); i++) {
+                    auto const &edge = graph_[node][i];
+                    if (edge.cap <= 0)
+                        continue;
+                    auto const next = d + edge.cost + potential[node] -
+                                      potential[edge.to];
+                    if (next < dist[edge.to]) {
+                        dist[edge.to] = next;
+                        prev_node[edge.to] = node;
+                        prev_edge[edge.to] = i;
+                        queue.push({next, edge.to});
+                    }
+                }
+            }
+            if (dist[sink] == inf)
+                break;
+            for (uint32_t i = 0; i < num_nodes; i++) {
+                if (dist[i] != inf)
+                    potential[i] += dist[i];
+            }
+            // push the bottleneck along the path
+            int64_t amount = inf;
+            for (auto node = sink; node != source; node = prev_node[node]) {
+                amount = std::min(amount,
+                                  graph_[prev_node[node]][prev_edge[node]].cap);
+            }
+            for (auto node = sink; node != source; node = prev_node[node]) {
+                auto &edge = graph_[prev_node[node]][prev_edge[node]];
+                edge.cap -= amount;
+                graph_[node][edge.rev].cap += amount;
+            }
+            total += amount;
+        }
+        return total;
+    }
+
+private:
+    struct Edge {
+        uint32_t to;
+        int64_t cap;
+        int64_t cost;
+        uint32_t rev;
+    };
+    ::vector<::vector<Edge>> graph_;
+};
+
+static double manhattan(double x, double y, const ::pair<int, int> &cell) {
+    return std::abs(x - cell.first) + std::abs(y - cell.second);
+}
+
+CellGrid::CellGrid(const ::vector<::pair<int, int>> &cells, uint32_t width,
+                   uint32_t height, uint32_t bucket_size)
+                   : width_(width), height_(height),
+                     bucket_size_(std::max(1u, bucket_size)),
+                     num_buckets_x_((width + bucket_size_ - 1) / bucket_size_),
+                     num_buckets_y_((height + bucket_size_ - 1) /
+                                    bucket_size_),
+                     buckets_(num_buckets_x_ * num_buckets_y_),
+                     slot_(static_cast<uint64_t>(width) * height, -1) {
+    for (auto const &[x, y] : cells) {
+        if (x < 0 || y < 0 || x >= static_cast<int>(width) ||
+            y >= static_cast<int>(height) || contains(x, y))
+            continue;
+        auto &bucket = buckets_[bucket_of(x, y)];
+        slot_[y * width_ + x] = static_cast<int64_t>(bucket.size());
+        bucket.emplace_back(x, y);
+        size_++;
+    }
+}
+
+bool CellGrid::contains(int x, int y) const {
+    if (x < 0 || y < 0 || x >= static_cast<int>(width_) ||
+        y >= static_cast<int>(height_))
+        return false;
+    return slot_[y * width_ + x] >= 0;
+}
+
+void CellGrid::remove(int x, int y) {
+    if (!contains(x, y))
+        return;
+    // swap with the last one in the free list
+    auto &bucket = buckets_[bucket_of(x, y)];
+    auto const slot = slot_[y * width_ + x];
+    auto const last = bucket.back();
+    bucket[slot] = last;
+    slot_[last.second * width_ + last.first] = slot;
+    bucket.pop_back();
+    slot_[y * width_ + x] = -1;
+    size_--;
+}
+
+uint32_t CellGrid::bucket_of(int x, int y) const {
+    return (y / bucket_size_) * num_buckets_x_ + x / bucket_size_;
+}
+
+uint32_t CellGrid::bucket_of(double x, double y) const {
+    auto const cx = std::clamp<int64_t>(static_cast<int64_t>(std::floor(x)), 0,
+                                        width_ - 1);
+    auto const cy = std::clamp<int64_t>(static_cast<int64_t>(std::floor(y)), 0,
+                                        height_ - 1);
+    return bucket_of(static_cast<int>(cx), static_cast<int>(cy));
+}
+
+// visits the buckets at Chebyshev distance ring from (bx, by). returns
+// false once the ring is completely off the grid
+static bool
+visit_ring(int bx, int by, int ring, int num_x, int num_y,
+           const std::function<void(uint32_t)> &func) {
+    if (bx - ring < 0 && by - ring < 0 && bx + ring >= num_x &&
+        by + ring >= num_y)
+        return false;
+    for (int y = by - ring; y <= by + ring; y++) {
+        if (y < 0 || y >= num_y)
+            continue;
+        // only the edge of the ring
+        const int step = (y == by - ring || y == by + ring) ? 1 : 2 * ring;
+        for (int x = bx - ring; x <= bx + ring; x += std::max(step, 1)) {
+            if (x >= 0 && x < num_x)
+                func(static_cast<uint32_t>(y * num_x + x));
+        }
+    }
+    return true;
+}
+
+::vector<::pair<int, int>> CellGrid::take_nearest(double x, double y,
+                                                  uint64_t count) {
+    ::vector<::pair<int, int>> result;
+    if (count == 0 || size_ == 0)
+        return result;
+    x = std::clamp<double>(x, 0, width_ - 1);
+    y = std::clamp<double>(y, 0, height_ - 1);
+    const auto center = bucket_of(x, y);
+    const int bx = static_cast<int>(center % num_buckets_x_);
+    const int by = static_cast<int>(center / num_buckets_x_);
+
+    // anything outside ring r is further than r * bucket_size away, so the
+    // search stops once there are enough cells within that distance
+    using Candidate = std::tuple<double, int, int>;
+    ::vector<Candidate> candidates;
+    for (int ring = 0; ; ring++) {
+        bool inside = visit_ring(bx, by, ring, num_buckets_x_, num_buckets_y_,
+                                 [&](uint32_t bucket) {
+            for (auto const &cell : buckets_[bucket]) {
+                candidates.emplace_back(manhattan(x, y, cell), cell.first,
+                                        cell.second);
+            }
+        });
+        if (!inside)
+            break;
+        const double bound = static_cast<double>(ring) * bucket_size_;
+        auto const num_within = std::count_if(
+                candidates.begin(), candidates.end(),
+                [bound](const Candidate &c) { return std::get<0>(c) <= bound; });
+        if (static_cast<uint64_t>(num_within) >= count)
+            break;
+    }
+    count = std::min<uint64_t>(count, candidates.size());
+    std::partial_sort(candidates.begin(), candidates.begin() + count,
+                      candidates.end());
+    for (uint64_t i = 0; i < count; i++) {
+        auto const [dist, cx, cy] = candidates[i];
+        result.emplace_back(cx, cy);
+        remove(cx, cy);
+    }
+    return result;
+}
+
+::vector<uint32_t> CellGrid::buckets_near(double x, double y,
+                                          uint64_t min_capacity) const {
+    ::vector<uint32_t> result;
+    const auto center = bucket_of(x, y);
+    const int bx = static_cast<int>(center % num_buckets_x_);
+    const int by = static_cast<int>(center / num_buckets_x_);
+    uint64_t capacity = 0;
+    int last_ring = -1;
+    for (int ring = 0; last_ring < 0 || ring <= last_ring; ring++) {
+        bool inside = visit_ring(bx, by, ring, num_buckets_x_, num_buckets_y_,
+                                 [&](uint32_t bucket) {
+            if (buckets_[bucket].empty())
+                return;
+            result.emplace_back(bucket);
+            capacity += buckets_[bucket].size();
+        });
+        if (!inside)
+            break;
+        if (last_ring < 0 && capacity >= min_capacity)
+            last_ring = ring + 1;
+    }
+    return result;
+}
+
+::vector<::pair<int, int>> CellGrid::take_from_bucket(uint32_t bucket,
+                                                      double x, double y,
+                                                      uint64_t count) {
+    auto cells = buckets_[bucket];
+    count = std::min<uint64_t>(count, cells.size());
+    std::partial_sort(cells.begin(), cells.begin() + count, cells.end(),
+                      [x, y](const auto &a, const auto &b) {
+        return std::make_tuple(manhattan(x, y, a), a.first, a.second) <
+               std::make_tuple(manhattan(x, y, b), b.first, b.second);
+    });
+    cells.resize(count);
+    for (auto const &[cx, cy] : cells)
+        remove(cx, cy);
+    return cells;
+}
+
+::vector<::vector<::pair<int, int>>>
+CellGrid::assign(const ::vector<::pair<double, double>> &centers,
+                 const ::vector<uint64_t> &demands) {
+    const auto num_clusters = static_cast<uint32_t>(demands.size());
+    ::vector<::vector<::pair<int, int>>> result(num_clusters);
+    uint64_t total_demand = 0;
+    for (auto const demand : demands)
+        total_demand += demand;
+    if (total_demand > size_)
+        throw std::runtime_error("cannot find enough space de-overlapping");
+    if (total_demand == 0)
+        return result;
+
+    // flow network: source -> cluster -> bucket -> sink. a cluster only
+    // connects to the buckets around it that could hold twice its demand
+    ::vector<::vector<uint32_t>> cluster_buckets(num_clusters);
+    ::map<uint32_t, uint32_t> bucket_node;
+    for (uint32_t i = 0; i < num_clusters; i++) {
+        if (demands[i] == 0)
+            continue;
+        auto const &[x, y] = centers[i];
+        cluster_buckets[i] = buckets_near(x, y, 2 * demands[i]);
+        for (auto const bucket : cluster_buckets[i])
+            bucket_node.emplace(bucket, 0);
+    }
+    const uint32_t source = 0;
+    const uint32_t sink = 1;
+    uint32_t num_nodes = 2 + num_clusters;
+    for (auto &iter : bucket_node)
+        iter.second = num_nodes++;
+
+    // bucket costs are measured to the centroid of their free cells
+    ::map<uint32_t, ::pair<double, double>> bucket_center;
+    for (auto const &[bucket, node] : bucket_node) {
+        double x_sum = 0, y_sum = 0;
+        for (auto const &[x, y] : buckets_[bucket]) {
+            x_sum += x;
+            y_sum += y;
+        }
+        const double num_cells = buckets_[bucket].size();
+        bucket_center[bucket] = {x_sum / num_cells, y_sum / num_cells};
+    }
+
+    MinCostFlow flow(num_nodes);
+    ::vector<::vector<::pair<uint32_t, uint32_t>>> edges(num_clusters);
+    for (uint32_t i = 0; i < num_clusters; i++) {
+        if (demands[i] == 0)
+            continue;
+        flow.add_edge(source, 2 + i, static_cast<int64_t>(demands[i]), 0);
+        auto const &[x, y] = centers[i];
+        for (auto const bucket : cluster_buckets[i]) {
+            auto const &[bx, by] = bucket_center.at(bucket);
+            auto const cost = std::llround(
+                    (std::abs(x - bx) + std::abs(y - by)) * 16);
+            auto const edge = flow.add_edge(2 + i, bucket_node.at(bucket),
+                                            static_cast<int64_t>(demands[i]),
+                                            cost);
+            edges[i].emplace_back(bucket, edge);
+        }
+    }
+    for (auto const &[bucket, node] : bucket_node) {
+        flow.add_edge(node, sink,
+                      static_cast<int64_t>(buckets_[bucket].size()), 0);
+    }
+    flow.solve(source, sink);
+
+    for (uint32_t i = 0; i < num_clusters; i++) {
+        auto const &[x, y] = centers[i];
+        for (auto const &[bucket, edge] : edges[i]) {
+            auto const amount = flow.flow(2 + i, edge);
+            if (amount <= 0)
+                continue;
+            auto cells = take_from_bucket(bucket, x, y,
+                                          static_cast<uint64_t>(amount));
+            result[i].insert(result[i].end(), cells.begin(), cells.end());
+        }
+    }
+    // whatever the local buckets could not hold goes to the nearest cells
+    for (uint32_t i = 0; i < num_clusters; i++) {
+        if (result[i].size() >= demands[i])
+            continue;
+        auto const &[x, y] = centers[i];
+        auto cells = take_nearest(x, y, demands[i] - result[i].size());
+        result[i].insert(result[i].end(), cells.begin(), cells.end());
+    }
+    return result;
+}
@@ -0,0 +1,56 @@
+#ifndef THUNDER_LEGALIZE_HH
+#define THUNDER_LEGALIZE_HH
+
+#include <cstdint>
+#include <utility>
+#include <vector>
+
+// free cells of a single block type, bucketed on a coarse grid. every
+// bucket keeps its cells in a free list, so taking a cell is O(1) and a
+// nearest cell query only visits the buckets around the query point
+class CellGrid {
+public:
+    CellGrid(const std::vector<std::pair<int, int>> &cells, uint32_t width,
+             uint32_t height, uint32_t bucket_size = 8);
+
+    uint64_t size() const { return size_; }
+    bool contains(int x, int y) const;
+    void remove(int x, int y);
+
+    // takes the count free cells closest to (x, y) in Manhattan distance.
+    // ties go to the smaller x, then the smaller y. returns fewer cells if
+    // the grid runs out
+    std::vector<std::pair<int, int>> take_nearest(double x, double y,
+                                                  uint64_t count);
+
+    // assigns demands[i] cells to the cluster centered at centers[i] with
+    // the minimum total distance. clusters are matched to buckets with a
+    // min-cost flow first, then take their closest cells inside each bucket.
+    // throws if there are not enough free cells
+    std::vector<std::vector<std::pair<int, int>>>
+    assign(const std::vector<std::pair<double, double>> &centers,
+           const std::vector<uint64_t> &demands);
+
+private:
+    uint32_t bucket_of(int x, int y) const;
+    uint32_t bucket_of(double x, double y) const;
+    // buckets in rings around (x, y) until the free cells in them add up
+    // to min_capacity, plus one more ring
+    std::vector<uint32_t> buckets_near(double x, double y,
+                                       uint64_t min_capacity) const;
+    std::vector<std::pair<int, int>> take_from_bucket(uint32_t bucket,
+                                                      double x, double y,
+                                                      uint64_t count);
+
+    uint32_t width_;
+    uint32_t height_;
+    uint32_t bucket_size_;
+    uint32_t num_buckets_x_;
+    uint32_t num_buckets_y_;
+    uint64_t size_ = 0;
+    std::vector<std::vector<std::pair<int, int>>> buckets_;
+    // position of each cell inside its bucket, -1 if it is not free
+    std::vector<int64_t> slot_;
+};
+
+#endif //THUNDER_LEGALIZE_HH
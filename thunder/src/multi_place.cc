@@ -1,4 +1,8 @@
+#include <algorithm>
 #include <cassert>
+#include <chrono>
+#include <cmath>
+#include <random>
 #include <thread>
 #include <iostream>
 #include "include/cxxpool.h"
@@ -13,84 +17,173 @@ using std::pair;
 using std::set;
 
 
+FixedPosOverlay::FixedPosOverlay(::map<::string, ::pair<int, int>> base)
+    : base_(std::make_shared<const ::map<::string, ::pair<int, int>>>(
+            std::move(base))), overlay_(), removed_() {}
+
+FixedPosOverlay
+FixedPosOverlay::derive(const ::map<::string, ::pair<int, int>> &overlay,
+                        const ::set<::string> &removed) const {
+    FixedPosOverlay result(*this);
+    for (auto const &blk_id : removed) {
+        result.overlay_.erase(blk_id);
+        result.removed_.insert(blk_id);
+    }
+    for (auto const &[blk_id, pos] : overlay)
+        result.overlay_[blk_id] = pos;
+    return result;
+}
+
+::map<::string, ::pair<int, int>> FixedPosOverlay::materialize() const {
+    ::map<::string, ::pair<int, int>> result(*base_);
+    for (auto const &blk_id : removed_)
+        result.erase(blk_id);
+    for (auto const &[blk_id, pos] : overlay_)
+        result[blk_id] = pos;
+    return result;
+}
+
 ::map<std::string, std::pair<int, int>>  multi_place(
         const ::map<::string, ::set<::string>> &clusters,
         const ::map<::string, ::map<char, ::set<std::pair<int, int>>>> &cells,
         const ::map<::string, ::map<::string, ::vector<::string>>> &netlists,
         const ::map<::string, ::map<::string, ::pair<int, int>>> &fixed_blocks,
         char clb_type, bool fold_reg, uint32_t seed) {
+    ::map<::string, FixedPosOverlay> fixed_pos;
+    for (auto const &[cluster_id, pos] : fixed_blocks)
+        fixed_pos.emplace(cluster_id, FixedPosOverlay(pos));
+    return multi_place(clusters, cells, netlists, fixed_pos, clb_type,
+                       fold_reg, seed);
+}
+
+uint32_t cluster_seed(uint32_t seed, const ::string &cluster_id) {
+    // FNV-1a on the cluster id so that the seeds don't depend on the
+    // std::hash implementation
+    uint32_t hash = 2166136261u;
+    for (const char c : cluster_id) {
+        hash ^= static_cast<uint8_t>(c);
+        hash *= 16777619u;
+    }
+    std::seed_seq seq{seed, hash};
+    uint32_t result;
+    seq.generate(&result, &result + 1);
+    return result;
+}
+
+double cluster_cost(const ::set<::string> &cluster,
+                    const ::map<::string, ::vector<::string>> &netlist) {
+    // same form as the default runtime model in runtime_model.py, fitted on
+    // annealing runs: the number of swaps grows with the blocks and each
+    // swap touches the pins on the nets
+    uint64_t num_pins = 0;
+    for (auto const &iter : netlist)
+        num_pins += iter.second.size();
+    return cluster_cost(cluster.size(), num_pins);
+}
+
+double cluster_cost(uint64_t num_blocks, uint64_t num_pins) {
+    return std::pow(static_cast<double>(num_blocks), 0.75) *
+           std::pow(static_cast<double>(num_pins + 1), 0.85);
+}
+
+::map<std::string, std::pair<int, int>>  multi_place(
+        const ::map<::string, ::set<::string>> &clusters,
+        const ::map<::string, ::map<char, ::set<std::pair<int, int>>>> &cells,
+        const ::map<::string, ::map<::string, ::vector<::string>>> &netlists,
+        const ::map<::string, FixedPosOverlay> &fixed_blocks,
+        char clb_type, bool fold_reg, uint32_t seed) {
+    return multi_place(clusters, cells, netlists, fixed_blocks, clb_type,
+                       fold_reg, seed, 0, 0, nullptr);
+}
+
+::map<std::string, std::pair<int, int>>  multi_place(
+        const ::map<::string, ::set<::string>> &clusters,
+        const ::map<::string, ::map<char, ::set<std::pair<int, int>>>> &cells,
+        const ::map<::string, ::map<::string, ::vector<::string>>> &netlists,
+        const ::map<::string, FixedPosOverlay> &fixed_blocks,
+        char clb_type, bool fold_reg, uint32_t seed, uint32_t num_threads,
+        double time_budget, ::map<::string, double> *runtimes,
+        const ::map<::string, double> *costs) {
 
     uint64_t num_clusters = clusters.size();
     // make sure that they have the same size
     assert (num_clusters == cells.size() && num_clusters == netlists.size()
             && num_clusters == fixed_blocks.size());
-    uint32_t num_cpus = std::thread::hardware_concurrency();
-    // 0 will be returned if it's not detected.
-    num_cpus = std::max(1u, num_cpus);
+    uint32_t num_cpus = num_threads;
+    if (num_cpus == 0) {
+        num_cpus = std::thread::hardware_concurrency();
+        // 0 will be returned if it's not detected.
+        num_cpus = std::max(1u, num_cpus);
+    }
     // use as much resource as possible
-    num_cpus = std::min((uint32_t)num_clusters, num_cpus);
-
-    cxxpool::thread_pool pool{num_cpus};
-
-    ::vector<std::future<::map<::string, ::pair<int, int>>>> thread_tasks;
-
-    ::vector<::vector<::string>> clusters_args;
-    ::vector<::map<char, ::vector<::pair<int, int>>>> available_pos_args;
-    ::vector<::map<std::string, std::vector<std::string>>> netlists_args;
-    ::vector<::map<std::string, std::pair<int, int>>> fixed_pos_args;
-
-    for (auto const &iter : clusters) {
-        ::string cluster_id = iter.first;
-        auto const &cluster_set = clusters.at(cluster_id);
-        auto cluster = ::vector<::string>(cluster_set.begin(),
-                                          cluster_set.end());
+    num_cpus = std::max(1u, std::min((uint32_t)num_clusters, num_cpus));
 
+    // longest processing time first: the pool runs the tasks in the order
+    // they are pushed, so the expensive clusters don't end up last
+    ::vector<::pair<double, ::string>> schedule;
+    schedule.reserve(num_clusters);
+    for (auto const &[cluster_id, cluster_set] : clusters) {
         // check to make sure that we have everything
         assert (cells.find(cluster_id) != cells.end());
         assert (netlists.find(cluster_id) != netlists.end());
         assert (fixed_blocks.find(cluster_id) != fixed_blocks.end());
-
-        auto available_pos_set = cells.at(cluster_id);
-        ::map<char, ::vector<::pair<int, int>>> available_pos;
-        for (const auto &iter2 : available_pos_set) {
-            auto pos = ::vector<::pair<int, int>>(iter2.second.begin(),
-                                                  iter2.second.end());
-            available_pos.insert({iter2.first, pos});
-        }
-        auto netlist = netlists.at(cluster_id);
-        auto fixed_pos = fixed_blocks.at(cluster_id);
-
-        // assign args
-        clusters_args.emplace_back(cluster);
-        netlists_args.emplace_back(netlist);
-        available_pos_args.emplace_back(available_pos);
-        fixed_pos_args.emplace_back(fixed_pos);
+        if (costs && costs->find(cluster_id) != costs->end())
+            schedule.emplace_back(costs->at(cluster_id), cluster_id);
+        else
+            schedule.emplace_back(cluster_cost(cluster_set,
+                                               netlists.at(cluster_id)),
+                                  cluster_id);
     }
+    std::stable_sort(schedule.begin(), schedule.end(),
+                     [](const auto &a, const auto &b) {
+                         return a.first > b.first;
+                     });
 
-    for (uint32_t i = 0; i < clusters_args.size(); i++) {
-        auto cluster = clusters_args[i];
-        auto netlist = netlists_args[i];
-        auto available_pos = available_pos_args[i];
-        auto fixed_pos = fixed_pos_args[i];
-
-        auto task = pool.push([=](::vector<::string> blks,
-                                 ::map<::string, ::vector<std::string>> n,
-                ::map<char, ::vector<::pair<int, int>>> p,
-                ::map<::string, ::pair<int, int>> f,
-                char c,
-                bool fold) {
-            DetailedPlacer placer(blks, n, p, f, c, fold);
-            placer.set_seed(seed);
+    cxxpool::thread_pool pool{num_cpus};
+
+    using TaskResult = ::pair<::map<::string, ::pair<int, int>>, double>;
+    ::vector<::pair<::string, std::future<TaskResult>>> thread_tasks;
+
+    for (auto const &[cost, cluster_id] : schedule) {
+        // the inputs outlive the tasks, so only references are captured.
+        // the placer inputs are built when the task runs, which keeps at
+        // most one copy per worker thread alive
+        auto const *cluster_set = &clusters.at(cluster_id);
+        auto const *available_pos_set = &cells.at(cluster_id);
+        auto const *netlist = &netlists.at(cluster_id);
+        auto const *fixed_pos = &fixed_blocks.at(cluster_id);
+        const uint32_t task_seed = cluster_seed(seed, cluster_id);
+
+        auto task = pool.push([=]() {
+            auto start = std::chrono::steady_clock::now();
+            auto cluster = ::vector<::string>(cluster_set->begin(),
+                                              cluster_set->end());
+            ::map<char, ::vector<::pair<int, int>>> available_pos;
+            for (const auto &iter2 : *available_pos_set) {
+                auto pos = ::vector<::pair<int, int>>(iter2.second.begin(),
+                                                      iter2.second.end());
+                available_pos.insert({iter2.first, pos});
+            }
+            DetailedPlacer placer(cluster, *netlist, std::move(available_pos),
+                                  fixed_pos->materialize(), clb_type,
+                                  fold_reg);
+            placer.set_seed(task_seed);
+            placer.set_time_budget(time_budget);
             placer.anneal();
             // placer.refine(1000, 0.001, true);
-            return placer.realize();
-        }, cluster, netlist, available_pos, fixed_pos, clb_type, fold_reg);
-        thread_tasks.emplace_back(std::move(task));
+            auto placement = placer.realize();
+            auto end = std::chrono::steady_clock::now();
+            double runtime = std::chrono::duration<double>(end - start).count();
+            return TaskResult(std::move(placement), runtime);
+        });
+        thread_tasks.emplace_back(cluster_id, std::move(task));
     }
 
     ::map<::string, ::pair<int, int>> result;
-    for (auto &task : thread_tasks) {
-        auto task_result = task.get();
+    for (auto &[cluster_id, task] : thread_tasks) {
+        auto [task_result, runtime] = task.get();
+        if (runtimes)
+            (*runtimes)[cluster_id] = runtime;
         for (const auto &iter :task_result) {
             // remove fixed cluster center and dummy blocks
             if (iter.first[0] != 'x')
@@ -119,26 +212,23 @@ detailed_placement(const std::map<std::string, std::set<std::string>> &clusters,
                    const std::map<std::string,
                                   std::map<char,
                                   std::set<std::pair<int, int>>>> &gp_result,
-                   const Layout &layout) {
+                   const Layout &layout, uint32_t num_threads,
+                   double time_budget, ::map<::string, double> *runtimes) {
     auto centroids = compute_centroids(gp_result);
     // substitutes the clusters
     auto cluster_fixed_pos = get_cluster_fixed_pos(fixed_pos,
                                                    centroids);
-    map<string, map<string,
-            vector<string>>> multi_netlists;
-    // need to replicate the fix pos as well
-    map<string, map<string,
-            pair<int, int>>> multi_fixed_pos;
+    auto multi_netlists = reduce_cluster_graphs(netlist, clusters,
+                                                cluster_fixed_pos);
+    // all the clusters share the same fixed pos
+    FixedPosOverlay shared_fixed_pos(cluster_fixed_pos);
+    map<string, FixedPosOverlay> multi_fixed_pos;
     for (const auto &iter : clusters) {
-        auto cluster_netlist = reduce_cluster_graph(netlist,
-                                                    clusters,
-                                                    cluster_fixed_pos,
-                                                    iter.first);
-        multi_netlists[iter.first] = cluster_netlist;
-        multi_fixed_pos[iter.first] = cluster_fixed_pos;
+        multi_fixed_pos.emplace(iter.first, shared_fixed_pos);
     }
     // multi-core placement
-    auto dp_result = multi_place(clusters, gp_result, multi_netlists,
-                                 multi_fixed_pos, layout.get_clb_type(), true);
-    return dp_result;
+    constexpr uint32_t seed = 0;
+    return multi_place(clusters, gp_result, multi_netlists, multi_fixed_pos,
+                       layout.get_clb_type(), true, seed, num_threads,
+                       time_budget, runtimes);
 }
\ No newline at end of file
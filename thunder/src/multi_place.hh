@@ -1,10 +1,37 @@
 #ifndef THUNDER_MULTI_PLACE_HH
 #define THUNDER_MULTI_PLACE_HH
 #include <map>
+#include <memory>
 #include <set>
 #include <vector>
 #include "layout.hh"
 
+// fixed positions seen by one cluster: a base table shared by all the
+// clusters plus a small per-cluster overlay. the full table is only
+// materialized by the task placing the cluster
+class FixedPosOverlay {
+public:
+    FixedPosOverlay() : FixedPosOverlay(
+            std::map<std::string, std::pair<int, int>>()) {}
+    explicit FixedPosOverlay(std::map<std::string, std::pair<int, int>> base);
+
+    // new overlay on the same base. entries in overlay take precedence over
+    // the removed ones
+    FixedPosOverlay
+    derive(const std::map<std::string, std::pair<int, int>> &overlay,
+           const std::set<std::string> &removed) const;
+
+    std::map<std::string, std::pair<int, int>> materialize() const;
+
+    uint64_t base_size() const { return base_->size(); }
+    uint64_t overlay_size() const { return overlay_.size() + removed_.size(); }
+
+private:
+    std::shared_ptr<const std::map<std::string, std::pair<int, int>>> base_;
+    std::map<std::string, std::pair<int, int>> overlay_;
+    std::set<std::string> removed_;
+};
+
 
 std::map<std::string, std::pair<int, int>>  multi_place(
         const std::map<std::string, std::set<std::string>> &clusters,
@@ -26,6 +53,41 @@ std::map<std::string, std::pair<int, int>>  multi_place(
                 std::pair<int, int>>> &fixed_blocks,
         char clb_type, bool fold_reg);
 
+std::map<std::string, std::pair<int, int>>  multi_place(
+        const std::map<std::string, std::set<std::string>> &clusters,
+        const std::map<std::string, std::map<char,
+                std::set<std::pair<int, int>>>> &cells,
+        const std::map<std::string, std::map<std::string,
+                std::vector<std::string>>> &netlists,
+        const std::map<std::string, FixedPosOverlay> &fixed_blocks,
+        char clb_type, bool fold_reg, uint32_t seed);
+
+// clusters are scheduled longest first based on their estimated cost and each
+// one gets its own seed derived from the master seed. num_threads = 0 uses all
+// the cores and time_budget = 0 disables the per-cluster budget (seconds).
+// the wall clock time of each cluster is stored in runtimes if not null.
+// costs overrides cluster_cost() for the clusters it has, e.g. with the
+// runtimes predicted by a calibrated model
+std::map<std::string, std::pair<int, int>>  multi_place(
+        const std::map<std::string, std::set<std::string>> &clusters,
+        const std::map<std::string, std::map<char,
+                std::set<std::pair<int, int>>>> &cells,
+        const std::map<std::string, std::map<std::string,
+                std::vector<std::string>>> &netlists,
+        const std::map<std::string, FixedPosOverlay> &fixed_blocks,
+        char clb_type, bool fold_reg, uint32_t seed, uint32_t num_threads,
+        double time_budget, std::map<std::string, double> *runtimes,
+        const std::map<std::string, double> *costs = nullptr);
+
+uint32_t cluster_seed(uint32_t seed, const std::string &cluster_id);
+
+// uncalibrated runtime estimate, only the ratios between clusters matter.
+// netlist is the reduced netlist of the cluster
+double cluster_cost(const std::set<std::string> &cluster,
+                    const std::map<std::string,
+                                   std::vector<std::string>> &netlist);
+double cluster_cost(uint64_t num_blocks, uint64_t num_pins);
+
 std::map<std::string, std::pair<int, int>>
 detailed_placement(const std::map<std::string, std::set<std::string>> &clusters,
                    const std::map<std::string, std::vector<std::string>> &netlist,
@@ -33,6 +95,8 @@ detailed_placement(const std::map<std::string, std::set<std::string>> &clusters,
                    const std::map<std::string,
                          std::map<char,
                                   std::set<std::pair<int, int>>>> &gp_result,
-                   const Layout &layout);
+                   const Layout &layout, uint32_t num_threads = 0,
+                   double time_budget = 0,
+                   std::map<std::string, double> *runtimes = nullptr);
 
 #endif //THUNDER_MULTI_PLACE_HH
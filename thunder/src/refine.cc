@@ -0,0 +1,235 @@
+#include <algorithm>
+#include <thread>
+#include "include/cxxpool.h"
+#include "refine.hh"
+#include "detailed.hh"
+#include "multi_place.hh"
+#include "rudy.hh"
+
+using std::map;
+using std::pair;
+using std::set;
+using std::string;
+using std::vector;
+
+PlacementWindow
+make_window(const ::vector<bool> &covered, uint32_t width,
+            const ::map<::string, ::pair<int, int>> &placement,
+            const ::map<::string, ::vector<::string>> &netlist,
+            const ::map<::string, ::vector<::string>> &blk_nets,
+            const ::map<char, ::set<::pair<int, int>>> &free_pos) {
+    auto is_covered = [&](const ::pair<int, int> &pos) {
+        return covered[pos.second * width + pos.first];
+    };
+
+    PlacementWindow window;
+    for (auto const &iter : blk_nets) {
+        auto const &pos = placement.at(iter.first);
+        if (is_covered(pos)) {
+            window.placement.emplace(iter.first, pos);
+            window.cells[iter.first[0]].emplace_back(pos);
+        }
+    }
+    if (window.placement.empty())
+        return window;
+    for (auto const &[blk_type, pos_set] : free_pos) {
+        for (auto const &pos : pos_set) {
+            if (is_covered(pos))
+                window.cells[blk_type].emplace_back(pos);
+        }
+    }
+
+    // register chains are pulled in as a whole, the folding check needs the
+    // net driving every register
+    ::vector<::string> working_nets;
+    for (auto const &iter : window.placement) {
+        auto const &nets = blk_nets.at(iter.first);
+        working_nets.insert(working_nets.end(), nets.begin(), nets.end());
+    }
+    while (!working_nets.empty()) {
+        auto const net_id = working_nets.back();
+        working_nets.pop_back();
+        if (window.netlist.find(net_id) != window.netlist.end())
+            continue;
+        auto const &net = netlist.at(net_id);
+        window.netlist.emplace(net_id, net);
+        for (auto const &blk : net) {
+            if (window.placement.find(blk) == window.placement.end())
+                window.fixed_pos.emplace(blk, placement.at(blk));
+            if (blk[0] == DetailedPlacer::REG_BLK_TYPE) {
+                auto const &nets = blk_nets.at(blk);
+                working_nets.insert(working_nets.end(), nets.begin(),
+                                    nets.end());
+            }
+        }
+    }
+    return window;
+}
+
+static double
+total_hpwl(const ::map<::string, ::vector<::string>> &netlist,
+           const ::map<::string, ::pair<int, int>> &placement) {
+    double result = 0;
+    for (auto const &iter : netlist) {
+        int xmin = INT32_MAX, xmax = INT32_MIN;
+        int ymin = INT32_MAX, ymax = INT32_MIN;
+        for (auto const &blk : iter.second) {
+            auto const [x, y] = placement.at(blk);
+            xmin = std::min(xmin, x);
+            xmax = std::max(xmax, x);
+            ymin = std::min(ymin, y);
+            ymax = std::max(ymax, y);
+        }
+        result += (xmax - xmin) + (ymax - ymin);
+    }
+    return result;
+}
+
+::map<::string, ::pair<int, int>>
+refine_global(const ::map<::string, ::pair<int, int>> &placement,
+              const ::map<::string, ::vector<::string>> &netlist,
+              const ::map<::string, ::pair<int, int>> &fixed_pos,
+              const Layout &layout, bool fold_reg, uint32_t num_threads,
+              uint32_t seed, uint32_t window_size, uint32_t halo,
+              uint32_t max_passes, double threshold,
+              double congestion_weight, double congestion_capacity,
+              double timing_weight, const TimingDelay &timing_delay) {
+    // windows of the same color are a window apart, so the halos must not
+    // reach half way
+    window_size = std::max(window_size, 2 * halo + 1);
+
+    auto result = placement;
+    for (auto const &[blk_id, pos] : fixed_pos)
+        result[blk_id] = pos;
+    ::map<::string, ::vector<::string>> blk_nets;
+    for (auto const &[net_id, net] : netlist) {
+        for (auto const &blk : net) {
+            if (fixed_pos.find(blk) == fixed_pos.end())
+                blk_nets[blk].emplace_back(net_id);
+        }
+    }
+
+    ::map<char, ::set<::pair<int, int>>> free_pos;
+    for (auto const &[blk_type, pos_list] : layout.produce_available_pos())
+        free_pos[blk_type].insert(pos_list.begin(), pos_list.end());
+    for (auto const &[blk_id, pos] : result) {
+        auto iter = free_pos.find(blk_id[0]);
+        if (iter != free_pos.end())
+            iter->second.erase(pos);
+    }
+
+    if (num_threads == 0)
+        num_threads = std::max(1u, std::thread::hardware_concurrency());
+    cxxpool::thread_pool pool{num_threads};
+
+    const auto width = static_cast<int>(layout.width());
+    const auto height = static_cast<int>(layout.height());
+    const auto size = static_cast<int>(window_size);
+    const auto h = static_cast<int>(halo);
+    const char clb_type = layout.get_clb_type();
+    double energy = total_hpwl(netlist, result);
+
+    for (uint32_t pass = 0; pass < max_passes; pass++) {
+        const int offset = (pass % 2) ? size / 2 : 0;
+        // four colors, no two windows of a color touch
+        for (int color = 0; color < 4; color++) {
+            using TaskResult = ::map<::string, ::pair<int, int>>;
+            ::vector<std::future<TaskResult>> tasks;
+            RudyMap demand;
+            if (congestion_weight > 0) {
+                demand = RudyMap(width, height, congestion_capacity);
+                demand.add_nets(netlist, result);
+            }
+            ::map<::string, double> criticality;
+            if (timing_weight > 0)
+                criticality = net_criticality(result, netlist, clb_type,
+                                              timing_delay);
+            for (int wy = -offset, j = 0; wy < height; wy += size, j++) {
+                for (int wx = -offset, i = 0; wx < width; wx += size, i++) {
+                    if ((i % 2) + 2 * (j % 2) != color)
+                        continue;
+                    ::vector<bool> covered(width * height, false);
+                    for (int y = std::max(wy - h, 0);
+                         y < std::min(wy + size + h, height); y++) {
+                        for (int x = std::max(wx - h, 0);
+                             x < std::min(wx + size + h, width); x++)
+                            covered[y * width + x] = true;
+                    }
+                    auto window = make_window(covered, width, result, netlist,
+                                              blk_nets, free_pos);
+                    if (window.netlist.empty())
+                        continue;
+                    const auto window_seed = cluster_seed(
+                            seed, std::to_string(pass) + "_" +
+                                  std::to_string(i) + "_" +
+                                  std::to_string(j));
+                    RudyMap base;
+                    if (congestion_weight > 0) {
+                        // the demand of the rest of the board
+                        base = demand;
+                        for (auto const &iter : window.netlist)
+                            base.update(bounding_box(iter.second, result), -1);
+                    }
+                    // the paths run through the rest of the board, so the
+                    // windows keep the criticalities of the whole board
+                    ::map<::string, double> window_criticality;
+                    if (timing_weight > 0) {
+                        for (auto const &iter : window.netlist)
+                            window_criticality.emplace(
+                                    iter.first, criticality.at(iter.first));
+                    }
+                    tasks.emplace_back(pool.push(
+                            [=, window = std::move(window),
+                             base = std::move(base),
+                             window_criticality = std::move(
+                                     window_criticality)]() {
+                        DetailedPlacer placer(window.placement, window.netlist,
+                                              window.cells, window.fixed_pos,
+                                              clb_type, fold_reg);
+                        placer.set_seed(window_seed);
+                        if (congestion_weight > 0) {
+                            placer.congestion_weight = congestion_weight;
+                            placer.set_congestion_base(base);
+                        }
+                        if (timing_weight > 0) {
+                            placer.timing_weight = timing_weight;
+                            placer.set_net_criticality(window_criticality);
+                        }
+                        // windows are small, so the moves only have to
+                        // scale with the blocks inside
+                        auto num_iter = static_cast<int>(
+                                100 * window.placement.size());
+                        placer.refine(num_iter, threshold, false);
+                        auto window_result = placer.realize();
+                        TaskResult moved;
+                        for (auto const &iter : window.placement)
+                            moved.emplace(iter.first,
+                                          window_result.at(iter.first));
+                        return moved;
+                    }));
+                }
+            }
+            // the windows of a color don't share any block or cell, so the
+            // order doesn't matter. free cells are swapped with the blocks
+            for (auto &task : tasks) {
+                for (auto const &[blk_id, pos] : task.get()) {
+                    auto &cells = free_pos[blk_id[0]];
+                    auto &old_pos = result.at(blk_id);
+                    cells.insert(old_pos);
+                    old_pos = pos;
+                }
+            }
+            for (auto const &iter : blk_nets)
+                free_pos[iter.first[0]].erase(result.at(iter.first));
+        }
+
+        const double new_energy = total_hpwl(netlist, result);
+        const double improvement = energy > 0 ?
+                                   (energy - new_energy) / energy : 0;
+        energy = new_energy;
+        // keep going until both window offsets have converged
+        if (pass % 2 == 1 && improvement < threshold)
+            break;
+    }
+    return result;
+}
@@ -0,0 +1,51 @@
+#ifndef THUNDER_REFINE_HH
+#define THUNDER_REFINE_HH
+
+#include <map>
+#include <set>
+#include <string>
+#include <vector>
+#include "layout.hh"
+#include "timing.hh"
+
+// a region of the board that is placed again on its own. the blocks inside
+// can move over the cells of the region, the blocks outside that share a net
+// with them are fixed
+struct PlacementWindow {
+    std::map<std::string, std::pair<int, int>> placement;
+    std::map<char, std::vector<std::pair<int, int>>> cells;
+    std::map<std::string, std::vector<std::string>> netlist;
+    std::map<std::string, std::pair<int, int>> fixed_pos;
+};
+
+// covered is a width x height mask of the region. placement holds every
+// block, blk_nets the nets of the blocks that can move and free_pos the
+// legal cells that are not used
+PlacementWindow
+make_window(const std::vector<bool> &covered, uint32_t width,
+            const std::map<std::string, std::pair<int, int>> &placement,
+            const std::map<std::string, std::vector<std::string>> &netlist,
+            const std::map<std::string, std::vector<std::string>> &blk_nets,
+            const std::map<char, std::set<std::pair<int, int>>> &free_pos);
+
+// region-parallel refinement of a legal placement. the board is cut into
+// windows of window_size plus a halo on each side, and windows that are
+// not adjacent are refined at the same time, checkerboard style. odd passes
+// shift the windows by half a window so that blocks can cross the borders.
+// every window only sees the placement from before its phase and has its
+// own seed, so the result doesn't depend on the number of threads.
+// with a congestion_weight the windows also minimize the RUDY overflow of
+// the board, the nets outside a window count as a fixed demand. with a
+// timing_weight the nets are weighted by their criticality, estimated on the
+// whole board before every phase
+std::map<std::string, std::pair<int, int>>
+refine_global(const std::map<std::string, std::pair<int, int>> &placement,
+              const std::map<std::string, std::vector<std::string>> &netlist,
+              const std::map<std::string, std::pair<int, int>> &fixed_pos,
+              const Layout &layout, bool fold_reg, uint32_t num_threads = 0,
+              uint32_t seed = 0, uint32_t window_size = 12, uint32_t halo = 2,
+              uint32_t max_passes = 4, double threshold = 0.001,
+              double congestion_weight = 0, double congestion_capacity = 8,
+              double timing_weight = 0, const TimingDelay &timing_delay = {});
+
+#endif //THUNDER_REFINE_HH
@@ -0,0 +1,78 @@
+#include <algorithm>
+#include <cmath>
+#include "rudy.hh"
+
+using std::map;
+using std::pair;
+using std::string;
+using std::vector;
+
+BoundingBox bounding_box(const ::vector<::string> &net,
+                         const ::map<::string, ::pair<int, int>> &placement) {
+    BoundingBox box{INT32_MAX, INT32_MIN, INT32_MAX, INT32_MIN};
+    for (auto const &blk : net) {
+        auto const pos = placement.find(blk);
+        if (pos == placement.end())
+            continue;
+        auto const [x, y] = pos->second;
+        box.xmin = std::min(box.xmin, x);
+        box.xmax = std::max(box.xmax, x);
+        box.ymin = std::min(box.ymin, y);
+        box.ymax = std::max(box.ymax, y);
+    }
+    return box;
+}
+
+RudyMap::RudyMap(uint32_t width, uint32_t height, double capacity)
+        : width_(width), height_(height),
+          capacity_(static_cast<int64_t>(std::llround(capacity * SCALE))),
+          demand_(width * height, 0) {}
+
+double RudyMap::update(const BoundingBox &box, int sign) {
+    const int xmin = std::max(box.xmin, 0);
+    const int ymin = std::max(box.ymin, 0);
+    const int xmax = std::min(box.xmax, static_cast<int>(width_) - 1);
+    const int ymax = std::min(box.ymax, static_cast<int>(height_) - 1);
+    if (xmin > xmax || ymin > ymax)
+        return 0;
+    // a net over w x h tiles needs about w + h tracks
+    const int64_t w = xmax - xmin + 1;
+    const int64_t h = ymax - ymin + 1;
+    const int64_t density = sign * std::llround((w + h) * SCALE / (w * h));
+    int64_t delta = 0;
+    for (int y = ymin; y <= ymax; y++) {
+        auto *row = &demand_[y * width_];
+        for (int x = xmin; x <= xmax; x++) {
+            const int64_t old_demand = row[x];
+            const int64_t new_demand = old_demand + density;
+            row[x] = new_demand;
+            delta += std::max<int64_t>(new_demand - capacity_, 0) -
+                     std::max<int64_t>(old_demand - capacity_, 0);
+        }
+    }
+    overflow_ += delta;
+    return delta / SCALE;
+}
+
+void RudyMap::add_nets(const ::map<::string, ::vector<::string>> &netlist,
+                       const ::map<::string, ::pair<int, int>> &placement) {
+    for (auto const &iter : netlist)
+        update(bounding_box(iter.second, placement), 1);
+}
+
+double RudyMap::demand(uint32_t x, uint32_t y) const {
+    return demand_[y * width_ + x] / SCALE;
+}
+
+double RudyMap::max_demand() const {
+    if (demand_.empty())
+        return 0;
+    return *std::max_element(demand_.begin(), demand_.end()) / SCALE;
+}
+
+::vector<double> RudyMap::demand_map() const {
+    ::vector<double> result(demand_.size());
+    for (uint64_t i = 0; i < demand_.size(); i++)
+        result[i] = demand_[i] / SCALE;
+    return result;
+}
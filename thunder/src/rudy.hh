@@ -0,0 +1,57 @@
+#ifndef THUNDER_RUDY_HH
+#define THUNDER_RUDY_HH
+
+#include <cstdint>
+#include <map>
+#include <string>
+#include <vector>
+
+struct BoundingBox {
+    int xmin = 0;
+    int xmax = -1;
+    int ymin = 0;
+    int ymax = -1;
+};
+
+// of the blocks in net that are in placement
+BoundingBox
+bounding_box(const std::vector<std::string> &net,
+             const std::map<std::string, std::pair<int, int>> &placement);
+
+// RUDY (rectangular uniform wire density) estimate of the routing demand.
+// every net spreads its HPWL evenly over the tiles of its bounding box, and
+// the demand above capacity on a tile is its overflow. the demand is kept
+// in fixed point so that removing a net undoes adding it exactly
+class RudyMap {
+public:
+    RudyMap() = default;
+    RudyMap(uint32_t width, uint32_t height, double capacity);
+
+    // adds the demand of a net bounding box, or removes it with sign -1.
+    // returns the change of the overflow
+    double update(const BoundingBox &box, int sign);
+    void add_nets(
+            const std::map<std::string, std::vector<std::string>> &netlist,
+            const std::map<std::string, std::pair<int, int>> &placement);
+
+    uint32_t width() const { return width_; }
+    uint32_t height() const { return height_; }
+    double capacity() const { return capacity_ / SCALE; }
+    // total overflow over all tiles, in tracks
+    double overflow() const { return overflow_ / SCALE; }
+    double demand(uint32_t x, uint32_t y) const;
+    double max_demand() const;
+    // demand of every tile, row by row
+    std::vector<double> demand_map() const;
+
+private:
+    static constexpr double SCALE = 1 << 16;
+
+    uint32_t width_ = 0;
+    uint32_t height_ = 0;
+    int64_t capacity_ = 0;
+    int64_t overflow_ = 0;
+    std::vector<int64_t> demand_;
+};
+
+#endif //THUNDER_RUDY_HH
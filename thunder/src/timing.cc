@@ -0,0 +1,193 @@
+#include <algorithm>
+#include <cmath>
+#include <stdexcept>
+#include "timing.hh"
+
+using std::map;
+using std::pair;
+using std::string;
+using std::vector;
+
+constexpr char MEM_BLK_TYPE = 'm';
+constexpr char REG_BLK_TYPE = 'r';
+
+TimingEstimate::TimingEstimate(const ::vector<Net> &netlist,
+                               const ::vector<Instance> &instances,
+                               char clb_type, const TimingDelay &delay)
+                               : delay_(delay) {
+    const auto num_blocks = static_cast<int>(instances.size());
+    registered_.resize(num_blocks);
+    node_delay_.resize(num_blocks);
+    for (int i = 0; i < num_blocks; i++) {
+        const char blk_type = instances[i].name[0];
+        registered_[i] = blk_type != clb_type;
+        if (blk_type == clb_type)
+            node_delay_[i] = delay_.clb_op;
+        else if (blk_type == MEM_BLK_TYPE)
+            node_delay_[i] = delay_.mem;
+        else if (blk_type == REG_BLK_TYPE)
+            node_delay_[i] = delay_.reg;
+    }
+
+    for (int net_id = 0; net_id < static_cast<int>(netlist.size()); net_id++) {
+        auto const &blks = netlist[net_id].instances;
+        for (uint64_t i = 1; i < blks.size(); i++) {
+            if (blks[i] == blks.front())
+                continue;
+            edge_net_.emplace_back(net_id);
+            edge_src_.emplace_back(blks.front());
+            edge_dst_.emplace_back(blks[i]);
+        }
+    }
+    const auto num_edges = static_cast<int>(edge_net_.size());
+    edge_delay_.resize(num_edges);
+
+    // compressed edge lists of every block
+    auto index = [&](const ::vector<int> &ends, ::vector<int> &edges,
+                     ::vector<int> &start) {
+        start.assign(num_blocks + 1, 0);
+        for (auto const blk : ends)
+            start[blk + 1]++;
+        for (int i = 0; i < num_blocks; i++)
+            start[i + 1] += start[i];
+        edges.resize(num_edges);
+        auto next = start;
+        for (int e = 0; e < num_edges; e++)
+            edges[next[ends[e]]++] = e;
+    };
+    index(edge_dst_, in_edges_, in_start_);
+    index(edge_src_, out_edges_, out_start_);
+
+    // Kahn's algorithm over the combinational blocks. a loop without a
+    // register is not legal, its blocks are appended in any order
+    ::vector<int> in_degree(num_blocks, 0);
+    for (int e = 0; e < num_edges; e++) {
+        if (!registered_[edge_src_[e]])
+            in_degree[edge_dst_[e]]++;
+    }
+    ::vector<bool> sorted(num_blocks, false);
+    for (int i = 0; i < num_blocks; i++) {
+        if (!registered_[i] && in_degree[i] == 0) {
+            order_.emplace_back(i);
+            sorted[i] = true;
+        }
+    }
+    for (uint64_t i = 0; i < order_.size(); i++) {
+        const int blk = order_[i];
+        for (int k = out_start_[blk]; k < out_start_[blk + 1]; k++) {
+            const int dst = edge_dst_[out_edges_[k]];
+            if (!registered_[dst] && --in_degree[dst] == 0) {
+                order_.emplace_back(dst);
+                sorted[dst] = true;
+            }
+        }
+    }
+    for (int i = 0; i < num_blocks; i++) {
+        if (!registered_[i] && !sorted[i])
+            order_.emplace_back(i);
+    }
+
+    arrival_.resize(num_blocks);
+    required_.resize(num_blocks);
+    criticality_.resize(netlist.size());
+}
+
+double TimingEstimate::update(const ::vector<Instance> &instances) {
+    for (uint64_t e = 0; e < edge_delay_.size(); e++) {
+        auto const &src = instances[edge_src_[e]];
+        auto const &dst = instances[edge_dst_[e]].pos;
+        const int hops = std::abs(src.pos.x - dst.x) +
+                         std::abs(src.pos.y - dst.y);
+        if (hops == 0) {
+            edge_delay_[e] = 0;
+            continue;
+        }
+        // the first hop leaves through the switch box of the driver
+        const double sb = src.name[0] == MEM_BLK_TYPE ? delay_.mem_sb :
+                          delay_.clb_sb;
+        edge_delay_[e] = sb + (hops - 1) * delay_.clb_sb + hops * delay_.rmux;
+    }
+
+    // arrival times at the outputs
+    for (uint64_t i = 0; i < arrival_.size(); i++)
+        arrival_[i] = registered_[i] ? node_delay_[i] : 0;
+    for (auto const blk : order_) {
+        double t = 0;
+        for (int k = in_start_[blk]; k < in_start_[blk + 1]; k++) {
+            const int e = in_edges_[k];
+            t = std::max(t, arrival_[edge_src_[e]] + edge_delay_[e]);
+        }
+        arrival_[blk] = t + node_delay_[blk];
+    }
+    critical_path_ = 0;
+    for (uint64_t e = 0; e < edge_delay_.size(); e++) {
+        if (registered_[edge_dst_[e]])
+            critical_path_ = std::max(critical_path_,
+                                      arrival_[edge_src_[e]] + edge_delay_[e]);
+    }
+    for (auto const blk : order_) {
+        if (out_start_[blk] == out_start_[blk + 1])
+            critical_path_ = std::max(critical_path_, arrival_[blk]);
+    }
+
+    // required times at the outputs, every path has to end by the critical
+    // path delay
+    auto required_input = [&](int blk) {
+        return registered_[blk] ? critical_path_ :
+               required_[blk] - node_delay_[blk];
+    };
+    for (auto iter = order_.rbegin(); iter != order_.rend(); iter++) {
+        const int blk = *iter;
+        double t = critical_path_;
+        for (int k = out_start_[blk]; k < out_start_[blk + 1]; k++) {
+            const int e = out_edges_[k];
+            t = std::min(t, required_input(edge_dst_[e]) - edge_delay_[e]);
+        }
+        required_[blk] = t;
+    }
+
+    std::fill(criticality_.begin(), criticality_.end(), 0);
+    if (critical_path_ <= 0)
+        return critical_path_;
+    for (uint64_t e = 0; e < edge_delay_.size(); e++) {
+        const double slack = required_input(edge_dst_[e]) -
+                             arrival_[edge_src_[e]] - edge_delay_[e];
+        const double crit = std::clamp(1 - slack / critical_path_, 0.0, 1.0);
+        auto &net_crit = criticality_[edge_net_[e]];
+        net_crit = std::max(net_crit, crit);
+    }
+    return critical_path_;
+}
+
+::map<::string, double>
+net_criticality(const ::map<::string, ::pair<int, int>> &placement,
+                const ::map<::string, ::vector<::string>> &netlist,
+                char clb_type, const TimingDelay &delay,
+                double *critical_path) {
+    ::vector<Instance> instances;
+    ::map<::string, int> blk_ids;
+    for (auto const &[blk_id, pos] : placement) {
+        blk_ids.emplace(blk_id, static_cast<int>(instances.size()));
+        instances.emplace_back(blk_id, pos, static_cast<int>(instances.size()));
+    }
+    ::vector<Net> nets;
+    for (auto const &[net_id, blks] : netlist) {
+        Net net{net_id, {}};
+        for (auto const &blk : blks) {
+            auto const iter = blk_ids.find(blk);
+            if (iter == blk_ids.end())
+                throw std::runtime_error("unknown block " + blk);
+            net.instances.emplace_back(iter->second);
+        }
+        nets.emplace_back(net);
+    }
+
+    TimingEstimate timing(nets, instances, clb_type, delay);
+    const double path_delay = timing.update(instances);
+    if (critical_path)
+        *critical_path = path_delay;
+    ::map<::string, double> result;
+    for (uint64_t i = 0; i < nets.size(); i++)
+        result.emplace(nets[i].net_id, timing.criticality()[i]);
+    return result;
+}
@@ -0,0 +1,71 @@
+#ifndef THUNDER_TIMING_HH
+#define THUNDER_TIMING_HH
+
+#include <map>
+#include <string>
+#include <vector>
+#include "util.hh"
+
+// delays of the timing model the router retimes with. the defaults are
+// the ones of get_default_timing_info() in cyclone/src/timing.hh
+struct TimingDelay {
+    double clb_op = 1000;
+    double mem = 0;
+    double clb_sb = 200;
+    double mem_sb = 300;
+    double rmux = 10;
+    double reg = 0;
+};
+
+// static timing estimate of a placement before it is routed. every
+// connection is taken as a shortest path, one switch box and routing mux per
+// hop. memories, registers and IO start and end the paths, the CLBs in
+// between add the delay of their operator. the driver is the first block of
+// every net
+class TimingEstimate {
+public:
+    TimingEstimate() = default;
+    TimingEstimate(const std::vector<Net> &netlist,
+                   const std::vector<Instance> &instances, char clb_type,
+                   const TimingDelay &delay = {});
+
+    // returns the critical path delay and updates the criticality of the
+    // nets. instances has to be in the same order as in the constructor
+    double update(const std::vector<Instance> &instances);
+    // slack based, 1 for the nets on the critical path and 0 for the ones
+    // with a slack as large as the critical path
+    const std::vector<double> &criticality() const { return criticality_; }
+    double critical_path() const { return critical_path_; }
+
+private:
+    TimingDelay delay_;
+    // combinational blocks in topological order
+    std::vector<int> order_;
+    std::vector<bool> registered_;
+    std::vector<double> node_delay_;
+    // one edge from the driver to each sink of a net
+    std::vector<int> edge_net_;
+    std::vector<int> edge_src_;
+    std::vector<int> edge_dst_;
+    std::vector<double> edge_delay_;
+    // edges of every block, indexed by in_start_ and out_start_
+    std::vector<int> in_edges_;
+    std::vector<int> in_start_;
+    std::vector<int> out_edges_;
+    std::vector<int> out_start_;
+
+    std::vector<double> arrival_;
+    std::vector<double> required_;
+    std::vector<double> criticality_;
+    double critical_path_ = 0;
+};
+
+// criticality of every net of a placement by name. the critical path delay
+// is stored in critical_path if given
+std::map<std::string, double>
+net_criticality(const std::map<std::string, std::pair<int, int>> &placement,
+                const std::map<std::string, std::vector<std::string>> &netlist,
+                char clb_type, const TimingDelay &delay = {},
+                double *critical_path = nullptr);
+
+#endif //THUNDER_TIMING_HH
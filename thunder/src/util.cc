@@ -187,41 +187,86 @@ compute_centroids(const ::map<std::string,
     return result;
 }
 
+std::unordered_map<std::string, std::string>
+build_cluster_index(const std::map<std::string,
+                                   std::set<std::string>> &clusters) {
+    std::unordered_map<::string, ::string> index;
+    for (auto const &[c_id, c_set] : clusters) {
+        for (auto const &blk : c_set)
+            index.insert({blk, c_id});
+    }
+    return index;
+}
+
+// cluster id of each block in the net. fixed blocks map to themselves
+::vector<::string>
+get_net_cluster_ids(const ::vector<::string> &net,
+                    const std::unordered_map<::string, ::string> &index,
+                    const ::map<::string, ::pair<int, int>> &fixed_blocks) {
+    ::vector<::string> ids;
+    ids.reserve(net.size());
+    for (auto const &blk : net) {
+        auto iter = index.find(blk);
+        if (iter != index.end()) {
+            ids.emplace_back(iter->second);
+        } else if (fixed_blocks.find(blk) != fixed_blocks.end()) {
+            ids.emplace_back(blk);
+        } else {
+            throw std::runtime_error("cannot find blk " + blk);
+        }
+    }
+    return ids;
+}
+
+::vector<::string> reduce_net(const ::vector<::string> &net,
+                              const ::vector<::string> &ids,
+                              const ::string &cluster_id) {
+    ::vector<::string> new_net;
+    new_net.reserve(net.size());
+    for (uint32_t i = 0; i < net.size(); i++) {
+        // use the cluster id for blocks outside the cluster
+        new_net.emplace_back(ids[i] == cluster_id ? net[i] : ids[i]);
+    }
+    return new_net;
+}
+
 std::map<std::string, std::vector<std::string>>
 reduce_cluster_graph(const ::map<::string, std::vector<::string>> &netlist,
                      const std::map<std::string, std::set<::string>> &clusters,
                      const std::map<std::string,
                                     std::pair<int, int>> &fixed_blocks,
                      const ::string &cluster_id) {
+    auto index = build_cluster_index(clusters);
     std::map<std::string, std::vector<std::string>> result;
     for (auto const &[net_id, net] : netlist) {
-        std::vector<::string> new_net;
-        // brute force searching for net ids
-        for (auto const &blk : net) {
-            ::string id;
-            for (auto const &[c_id, c_set] : clusters) {
-                if (c_set.find(blk) != c_set.end()) {
-                    id = c_id;
-                    break;
-                }
-            }
-            if (id.length() == 0) {
-                // maybe in the fixed blks
-                if (fixed_blocks.find(blk) != fixed_blocks.end())
-                    id = blk;
-            }
-            if (id.length() == 0) {
-                throw std::runtime_error("cannot find blk " + blk);
-            }
+        auto ids = get_net_cluster_ids(net, index, fixed_blocks);
+        result.insert({net_id, reduce_net(net, ids, cluster_id)});
+    }
+    return result;
+}
 
-            if (id == cluster_id) {
-                new_net.emplace_back(blk);
-            } else {
-                // use the cluster id instead
-                new_net.emplace_back(id);
-            }
+std::map<std::string, std::map<std::string, std::vector<std::string>>>
+reduce_cluster_graphs(const ::map<::string, ::vector<::string>> &netlist,
+                      const ::map<::string, ::set<::string>> &clusters,
+                      const ::map<::string, ::pair<int, int>> &fixed_blocks) {
+    auto index = build_cluster_index(clusters);
+    ::map<::string, ::map<::string, ::vector<::string>>> result;
+    for (auto const &iter : clusters)
+        result[iter.first];
+    for (auto const &[net_id, net] : netlist) {
+        auto ids = get_net_cluster_ids(net, index, fixed_blocks);
+        // only the clusters the net touches, the other ones only see fixed
+        // blocks on it
+        ::set<::string> net_clusters;
+        for (auto const &c_id : ids) {
+            if (net_clusters.find(c_id) != net_clusters.end())
+                continue;
+            auto iter = result.find(c_id);
+            if (iter == result.end())
+                continue;
+            net_clusters.emplace(c_id);
+            iter->second.insert({net_id, reduce_net(net, ids, c_id)});
         }
-        result.insert({net_id, new_net});
     }
     return result;
 }
@@ -6,6 +6,7 @@
 #include <climits>
 #include <iterator>
 #include <set>
+#include <unordered_map>
 
 struct Net;
 
@@ -89,6 +90,21 @@ reduce_cluster_graph(const std::map<std::string,
                              std::pair<int, int>> &fixed_blocks,
                      const std::string &cluster_id);
 
+// block to the first cluster holding it
+std::unordered_map<std::string, std::string>
+build_cluster_index(const std::map<std::string,
+                                   std::set<std::string>> &clusters);
+
+// reduce_cluster_graph() for every cluster, sharing one block lookup per net.
+// a cluster only gets the nets it has blocks on, same as util.py
+std::map<std::string, std::map<std::string, std::vector<std::string>>>
+reduce_cluster_graphs(const std::map<std::string,
+                                     std::vector<std::string>> &netlist,
+                      const std::map<std::string,
+                                     std::set<std::string>> &clusters,
+                      const std::map<std::string,
+                                     std::pair<int, int>> &fixed_blocks);
+
 std::map<std::string, std::pair<int, int>>
 get_cluster_fixed_pos(const std::map<std::string,
                                      std::pair<int, int>> &fixed_blocks,
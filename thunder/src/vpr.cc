@@ -26,6 +26,7 @@ VPRPlacer::VPRPlacer(std::map<std::string, std::pair<int, int>> init_placement,
 void VPRPlacer::anneal() {
     auto temp = tmax;
     curr_energy = init_energy();
+    start_stats();
     // anneal loop
     while (temp >= 0.005 * curr_energy / netlist_.size()) {
         uint32_t accept = 0;
@@ -55,8 +56,12 @@ void VPRPlacer::anneal() {
             alpha = 0.8;
         printf("Wirelength: %f T: %f r_accept: %f alpha: %f d_limit: %f%%\n",
                curr_energy, temp, r_accept, alpha, d_limit_ / max_dim_);
+        bool stop = end_iteration(temp, num_swap_, accept, d_limit_);
         temp *= alpha;
         d_limit_ = d_limit_ * (1 - 0.44 + r_accept);
         d_limit_ = CLAMP(d_limit_, 1, max_dim_);
+        if (stop)
+            break;
     }
+    finish_stats();
 }
\ No newline at end of file
@@ -1,54 +1,101 @@
 from __future__ import division
 import json
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+def build_cluster_index(clusters):
+    """maps each block to the IDs of the clusters holding it, in the cluster
+    order"""
+    index = {}
+    for c_id in clusters:
+        for blk_id in clusters[c_id]:
+            if blk_id in index:
+                index[blk_id].append(c_id)
+            else:
+                index[blk_id] = [c_id]
+    return index
 
 
 def reduce_cluster_graph(netlists, clusters, fixed_blocks,
-                         cluster_id=None):
+                         cluster_id=None, cluster_index=None):
     """NOTE: cluster_blocks holds block IDs, not cell locations"""
     if cluster_id is None:
         cluster_id = 0
         condense_self = True
     else:
         condense_self = False
-    current_cluster = clusters[cluster_id]
+    if cluster_index is None:
+        cluster_index = build_cluster_index(clusters)
     new_netlist = {}
     for net_id in netlists:
-        netlist = []
-        for blk_id in netlists[net_id]:
-            if blk_id not in netlist:
-                netlist.append(blk_id)
-        netlist_set = set(netlist)
-        if len(netlist_set.intersection(current_cluster)) > 0:
-            # we need to reduce the net
-            new_net = []
-            for blk_id in netlist:
-                if blk_id in current_cluster:
-                    if condense_self:
-                        new_node = "x" + str(cluster_id)
-                        new_net.append(new_node)
-                    else:
-                        new_net.append(blk_id)
-                elif blk_id in fixed_blocks:
-                    new_net.append(blk_id)
-                else:
-                    # search for all the other netlists
-                    # we use "x" for clusters
-                    found = False
-                    for cid in clusters:
-                        if cid == cluster_id:
-                            continue
-                        if blk_id in clusters[cid]:
-                            new_node = "x" + str(cid)
-                            new_net.append(new_node)
-                            found = True
-                            break
-                    if not found:
-                        raise Exception("not found blk", blk_id)
-
-            new_netlist[net_id] = new_net
+        netlist = unique_blocks(netlists[net_id])
+        net_clusters = get_net_clusters(netlist, cluster_index)
+        if cluster_id in net_clusters:
+            new_netlist[net_id] = reduce_net(netlist, cluster_id,
+                                             condense_self, fixed_blocks,
+                                             cluster_index)
     return new_netlist
 
 
+def reduce_cluster_graphs(netlists, clusters, fixed_blocks,
+                          cluster_index=None):
+    """reduce_cluster_graph() for every cluster in one pass over the nets.
+    returns {cluster_id: new_netlist}"""
+    if cluster_index is None:
+        cluster_index = build_cluster_index(clusters)
+    result = {}
+    for c_id in clusters:
+        result[c_id] = {}
+    for net_id in netlists:
+        netlist = unique_blocks(netlists[net_id])
+        for c_id in get_net_clusters(netlist, cluster_index):
+            result[c_id][net_id] = reduce_net(netlist, c_id, False,
+                                              fixed_blocks, cluster_index)
+    return result
+
+
+def unique_blocks(net):
+    netlist = []
+    visited = set()
+    for blk_id in net:
+        if blk_id not in visited:
+            netlist.append(blk_id)
+            visited.add(blk_id)
+    return netlist
+
+
+def get_net_clusters(netlist, cluster_index):
+    net_clusters = []
+    for blk_id in netlist:
+        for c_id in cluster_index.get(blk_id, ()):
+            if c_id not in net_clusters:
+                net_clusters.append(c_id)
+    return net_clusters
+
+
+def reduce_net(netlist, cluster_id, condense_self, fixed_blocks,
+               cluster_index):
+    new_net = []
+    for blk_id in netlist:
+        c_ids = cluster_index.get(blk_id, ())
+        if cluster_id in c_ids:
+            if condense_self:
+                new_net.append("x" + str(cluster_id))
+            else:
+                new_net.append(blk_id)
+        elif blk_id in fixed_blocks:
+            new_net.append(blk_id)
+        elif c_ids:
+            # we use "x" for clusters
+            new_net.append("x" + str(c_ids[0]))
+        else:
+            raise Exception("not found blk", blk_id)
+    return new_net
+
+
 def compute_centroid(cluster_cells):
     if type(cluster_cells) == list or type(cluster_cells) == set:
         x_sum = 0
@@ -155,8 +202,49 @@ def choose_resource(estimated_time, config_file):
     return result
 
 
+class FixedPosOverlay(Mapping):
+    """read-only fixed positions made of a base table shared by all the
+    clusters and a small per-cluster overlay. entries in overlay take
+    precedence over the removed ones"""
+    def __init__(self, base, overlay=None, removed=()):
+        self.base = base
+        self.overlay = overlay if overlay is not None else {}
+        self.removed = frozenset(removed)
+
+    def __getitem__(self, blk_id):
+        if blk_id in self.overlay:
+            return self.overlay[blk_id]
+        if blk_id in self.removed:
+            raise KeyError(blk_id)
+        return self.base[blk_id]
+
+    def __contains__(self, blk_id):
+        if blk_id in self.overlay:
+            return True
+        return blk_id not in self.removed and blk_id in self.base
+
+    def __iter__(self):
+        for blk_id in self.base:
+            if blk_id not in self.removed and blk_id not in self.overlay:
+                yield blk_id
+        for blk_id in self.overlay:
+            yield blk_id
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def to_dict(self):
+        result = self.base.copy()
+        for blk_id in self.removed:
+            result.pop(blk_id, None)
+        result.update(self.overlay)
+        return result
+
+
 class SetEncoder(json.JSONEncoder):
     def default(self, obj):
         if isinstance(obj, set):
             return list(obj)
+        if isinstance(obj, FixedPosOverlay):
+            return obj.to_dict()
         return json.JSONEncoder.default(self, obj)